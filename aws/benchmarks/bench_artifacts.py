@@ -0,0 +1,190 @@
+"""Compressed artifacts: bytes stored/transferred and codec cost per stage.
+
+Part 1 encodes and decodes synthetic extracted text of growing size with each
+codec (identity, gzip, and zstd when ``zstandard`` is installed): stored size,
+ratio, and encode/decode throughput.
+
+Part 2 runs the pipeline in-process (AWS fakes + StubGemini) once per codec:
+pdf_extractor on a --pages PDF, gemini_quiz, quiz_variants and --polls
+get_json_link reads, counting the S3 bytes each stage wrote and read. A
+legacy (uncompressed, no Content-Encoding) data.txt is read back as a check.
+
+Usage: python benchmarks/bench_artifacts.py [--mb 1 8 32] [--pages 60] [--polls 20]
+"""
+import os
+
+os.environ.setdefault("GEMINI_RATE_PER_SEC", "100")
+os.environ.setdefault("GEMINI_BURST", "20")
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import tempfile
+import time
+
+from fakes import BUCKET, DEFAULT_PARAMS, FakeAws, FakeS3
+from corpus import make_document, paragraph
+from stub_gemini import StubGemini, fake_quiz
+
+import artifacts
+import gemini_client
+import gemini_quiz
+import get_json_link_lambda
+import llm_cache
+import pdf_extractor
+import question_bank
+import quiz_variants_lambda
+import runtime_context
+
+
+class CountingS3(FakeS3):
+    """FakeS3 tallying body bytes per stage."""
+
+    def __init__(self):
+        super().__init__()
+        self.stage = "setup"
+        self.bytes = {}
+
+    def _add(self, kind: str, n: int):
+        row = self.bytes.setdefault(self.stage, {"written": 0, "read": 0})
+        row[kind] += n
+
+    def put_object(self, Bucket, Key, Body=b"", **kw):
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        elif not isinstance(Body, (bytes, bytearray)):
+            Body = Body.read()
+        self._add("written", len(Body))
+        return super().put_object(Bucket=Bucket, Key=Key, Body=Body, **kw)
+
+    def get_object(self, Bucket, Key, **kw):
+        obj = super().get_object(Bucket=Bucket, Key=Key, **kw)
+        self._add("read", obj["ContentLength"])
+        return obj
+
+
+def _codecs():
+    out = [artifacts.IDENTITY, artifacts.GZIP]
+    if artifacts._zstd() is not None:
+        out.append(artifacts.ZSTD)
+    return out
+
+
+def _text(mb: float, seed: int = 3) -> bytes:
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < mb * 1024 * 1024:
+        p = paragraph(rng)
+        parts.append(p)
+        size += len(p) + 2
+    return "\n\n".join(parts).encode("utf-8")
+
+
+def bench_codec(mb: float, rounds: int = 3) -> dict:
+    data = _text(mb)
+    out = {"mb": mb}
+    for enc in _codecs():
+        enc_s, dec_s = [], []
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            body, _ = artifacts.encode(data, enc)
+            enc_s.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            back = artifacts.read_body({"Body": io.BytesIO(body), "ContentEncoding": enc})
+            dec_s.append(time.perf_counter() - t0)
+        assert back == data
+        out[enc] = {
+            "stored_bytes": len(body),
+            "ratio": round(len(data) / len(body), 2),
+            "encode_mb_s": round(len(data) / min(enc_s) / 1e6, 1),
+            "decode_mb_s": round(len(data) / min(dec_s) / 1e6, 1),
+        }
+    return out
+
+
+def _prefix(param: str) -> str:
+    return DEFAULT_PARAMS[param].split(BUCKET + "/", 1)[1]
+
+
+def bench_pipeline(pdf: str, polls: int) -> dict:
+    report = {}
+    for enc in _codecs():
+        artifacts.ENCODING = enc
+        artifacts.PUBLIC_ENCODING = enc if enc != artifacts.ZSTD else artifacts.GZIP
+        aws = FakeAws()
+        s3 = aws.clients["s3"] = CountingS3()
+        runtime_context.set_client_factory(aws.factory)
+        runtime_context.reset()
+        llm_cache.reset()
+        key = f"{_prefix('/ai-quiz/pdf-extract/input-folder')}bench/doc.pdf"
+        with open(pdf, "rb") as f:
+            s3.put_object(Bucket=BUCKET, Key=key, Body=f.read())
+        timings = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            s3.stage = "extract"
+            resp = json.loads(pdf_extractor.lambda_handler({"Records": [{
+                "eventSource": "aws:s3", "s3": {"bucket": {"name": BUCKET}, "object": {"key": key}}}]}, None)["body"])
+            job_id = resp["jobId"]
+            timings["extract"] = resp["extract"]
+            s3.stage = "generate"
+            gen = json.loads(gemini_quiz.lambda_handler({"job_id": job_id, "mode": "single"}, None)["body"])
+            timings["generate"] = gen.get("timings", {})
+            s3.stage = "variants"
+            var = json.loads(quiz_variants_lambda.lambda_handler(
+                {"job_id": job_id, "variants": [{"difficulty": "easy"}, {"difficulty": "hard"}]}, None)["body"])
+            timings["variants"] = var.get("timings", {})
+            s3.stage = "poll"
+            t0 = time.perf_counter()
+            codes = [get_json_link_lambda.lambda_handler({"pathParameters": {"jobId": job_id}}, None)["statusCode"]
+                     for _ in range(polls)]
+            poll_ms = (time.perf_counter() - t0) * 1000 / max(1, polls)
+        report[enc] = {
+            "bytes": s3.bytes,
+            "data_txt": timings["extract"].get("stored"),
+            "text_bytes": timings["extract"].get("bytes"),
+            "generate_s3_read_ms": timings["generate"].get("s3_read_ms"),
+            "generate_s3_write_ms": timings["generate"].get("s3_write_ms"),
+            "variants_s3_read_ms": timings["variants"].get("s3_read_ms"),
+            "poll_status": sorted(set(codes)),
+            "poll_ms_mean": round(poll_ms, 2),
+        }
+    return report
+
+
+def legacy_read() -> dict:
+    """An object written before compression (no Content-Encoding) still reads as-is."""
+    s3 = FakeS3()
+    text = "legacy data.txt\n\n" + paragraph(random.Random(1))
+    s3.put_object(Bucket=BUCKET, Key="legacy/data.txt", Body=text.encode("utf-8"), ContentType="text/plain")
+    return {"legacy_roundtrip": gemini_quiz._s3_get_text(s3, BUCKET, "legacy/data.txt") == text}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mb", type=float, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--pages", type=int, default=60)
+    ap.add_argument("--polls", type=int, default=20)
+    ap.add_argument("--llm-latency-ms", type=float, default=50)
+    args = ap.parse_args()
+    question_bank.ENABLED = False
+    stub = StubGemini(latency=args.llm_latency_ms / 1000,
+                      responder=lambda prompt: json.dumps(fake_quiz(prompt))).start()
+    gemini_client.DEFAULT_BASE_URL = stub.base_url
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            pdf = os.path.join(tmp, "doc.pdf")
+            make_document(pdf, args.pages, seed=9)
+            report = {
+                "codecs": [bench_codec(mb) for mb in args.mb],
+                "pipeline": bench_pipeline(pdf, args.polls),
+                "compat": legacy_read(),
+            }
+    finally:
+        stub.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Bulk upload: one invocation per object vs one batched S3->SQS invocation.
+
+Usage: python benchmarks/bench_batch_extract.py [--files 24] [--pages 4] [--latency-ms 20]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+from fakes import BUCKET, DEFAULT_PARAMS, FakeAws
+from bench_extract_engine import make_pdf
+
+import runtime_context
+import pdf_extractor
+
+
+def _s3_record(key: str) -> dict:
+    return {"eventSource": "aws:s3", "s3": {"bucket": {"name": BUCKET}, "object": {"key": key}}}
+
+
+def _sqs_batch(keys) -> dict:
+    return {"Records": [{"eventSource": "aws:sqs", "messageId": f"m{i}",
+                         "body": json.dumps({"Records": [_s3_record(k)]})} for i, k in enumerate(keys)]}
+
+
+def run(mode: str, files: int, pages: int, latency: float) -> dict:
+    aws = FakeAws(latency)
+    runtime_context.set_client_factory(aws.factory)
+    runtime_context.reset()
+    in_prefix = DEFAULT_PARAMS["/ai-quiz/pdf-extract/input-folder"].split(BUCKET + "/", 1)[1]
+    keys = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(files):
+            path = os.path.join(tmp, f"{i}.pdf")
+            make_pdf(path, pages + i % 3)  # distinct bytes -> distinct jobs
+            keys.append(f"{in_prefix}course/{i}.pdf")
+            with open(path, "rb") as f:
+                aws.clients["s3"].put_object(Bucket=BUCKET, Key=keys[-1], Body=f.read())
+
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "per-object":
+            for k in keys:
+                pdf_extractor.lambda_handler({"Records": [_s3_record(k)]}, None)
+            failures = 0
+        else:
+            failures = len(pdf_extractor.lambda_handler(_sqs_batch(keys), None)["batchItemFailures"])
+    return {
+        "wall_ms": round((time.perf_counter() - t0) * 1000, 1),
+        "invocations": files if mode == "per-object" else 1,
+        "put_events_calls": aws.clients["events"].calls.get("put_events", 0),
+        "events_published": len(aws.clients["events"].entries),
+        "batch_item_failures": failures,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=24)
+    ap.add_argument("--pages", type=int, default=4)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    args = ap.parse_args()
+    report = {mode: run(mode, args.files, args.pages, args.latency_ms / 1000) for mode in ("per-object", "batch")}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Extraction throughput and peak Python memory: legacy join vs the streaming engine.
+
+Runs on the bundled PDFs plus synthetic documents of increasing page count.
+Usage: python benchmarks/bench_extract_engine.py [--pages 50 200 800] [--workers 4]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import fitz  # PyMuPDF
+
+from fakes import AWS_DIR
+
+import extract_engine
+from text_clean import sanitize
+
+LOREM = ("Amazon S3 stores objects in buckets. Lambda functions scale with demand and are billed "
+         "per millisecond of execution. EventBridge routes events between services. ")
+
+
+def make_pdf(path: str, pages: int):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        body = f"Page {i + 1}\n" + "\n".join(LOREM * 2 for _ in range(18))
+        page.insert_textbox(fitz.Rect(36, 36, 560, 806), body, fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def legacy(path: str) -> int:
+    doc = fitz.open(path)
+    parts = [page.get_text() for page in doc]
+    doc.close()
+    return len(sanitize("\n".join(parts).strip()).encode("utf-8"))
+
+
+def engine(path: str, workers: int) -> int:
+    return extract_engine.extract_to(path, _NullSink(), sanitize, workers=workers).bytes_written
+
+
+class _NullSink:
+    def write(self, b):
+        return len(b)
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn(*args)
+    ms = (time.perf_counter() - t0) * 1000
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"ms": round(ms, 1), "peak_kb": peak // 1024, "bytes": out}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, nargs="*", default=[50, 200, 800])
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = ap.parse_args()
+
+    docs = [(name, os.path.join(AWS_DIR, name)) for name in ("Vision_Board_Rubric.pdf", "LinkedIn_2025.pdf")]
+    tmp = tempfile.mkdtemp()
+    for n in args.pages:
+        path = os.path.join(tmp, f"synthetic_{n}.pdf")
+        make_pdf(path, n)
+        docs.append((f"synthetic_{n}p", path))
+
+    report = {}
+    for name, path in docs:
+        pages = extract_engine.page_count(path)
+        report[name] = {
+            "pages": pages,
+            "legacy": measure(legacy, path),
+            "engine_1_worker": measure(engine, path, 1),
+            f"engine_{args.workers}_workers": measure(engine, path, args.workers),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
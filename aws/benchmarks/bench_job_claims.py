@@ -0,0 +1,141 @@
+"""At-least-once delivery against the job state machine (claims, leases, dead-letter).
+
+Runs gemini_quiz in-process (AWS fakes + StubGemini), with the status record
+in the fake S3 bucket (conditional PUTs) or in MemoryStatusStore:
+
+  duplicates  --deliveries copies of one EventBridge event at once; only one
+              may reach the LLM, the rest are skipped as "leased"/"ready"
+  crash       a worker claims the job and dies; redeliveries are refused until
+              the lease expires, then the next one takes over as attempt 2
+  dead        the model only returns garbage; every delivery is retried by
+              raising until MAX_ATTEMPTS, then the job is DEAD and
+              get_json_link answers 500 with the reason
+
+Usage: python benchmarks/bench_job_claims.py [--deliveries 8] [--store s3|memory] [--llm-latency-ms 200]
+"""
+import os
+
+os.environ.setdefault("GEMINI_RATE_PER_SEC", "100")
+os.environ.setdefault("GEMINI_BURST", "20")
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fakes import BUCKET, DEFAULT_PARAMS, FakeAws
+from corpus import paragraph
+from stub_gemini import StubGemini, fake_quiz
+
+import gemini_client
+import gemini_quiz
+import get_json_link_lambda
+import job_status
+import llm_cache
+import question_bank
+import revisions
+import runtime_context
+
+
+def _setup(store: str, job_id: str) -> FakeAws:
+    aws = FakeAws()
+    runtime_context.set_client_factory(aws.factory)
+    runtime_context.reset()
+    llm_cache.reset()  # new containers too: the scenarios share one text
+    job_status.set_store(job_status.MemoryStatusStore() if store == "memory" else None)
+    prefix = DEFAULT_PARAMS["/ai-quiz/pdf-extract/text-output-folder"].split(BUCKET + "/", 1)[1]
+    rng = random.Random(7)
+    aws.clients["s3"].put_object(Bucket=BUCKET, Key=f"{prefix}{job_id}/data.txt",
+                                 Body="\n\n".join(paragraph(rng) for _ in range(10)))
+    job_status.enqueue(job_id, outputs={"data": "data.txt"})
+    return aws
+
+
+def _deliver(job_id: str) -> str:
+    event = {"source": "pdf.extractor", "detail-type": "pdf-extract-finished", "detail": {"jobId": job_id}}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            body = json.loads(gemini_quiz.lambda_handler(event, None)["body"])
+    except gemini_quiz.RetryLater:
+        return "retry"
+    return body.get("skipped") or body.get("dedup") or "error"
+
+
+def _tally(outcomes):
+    out = {}
+    for o in outcomes:
+        out[o] = out.get(o, 0) + 1
+    return out
+
+
+def duplicates(stub: StubGemini, store: str, deliveries: int) -> dict:
+    _setup(store, "dup")
+    before = stub.requests
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=deliveries) as pool:
+        outcomes = list(pool.map(lambda _: _deliver("dup"), range(deliveries)))
+    record, _ = job_status.store().get("dup")
+    return {"deliveries": deliveries, "outcomes": _tally(outcomes), "llm_requests": stub.requests - before,
+            "state": record["state"], "attempts": record.get("attempts"),
+            "wall_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+
+def crash(stub: StubGemini, store: str, lease_sec: float) -> dict:
+    _setup(store, "crash")
+    saved, job_status.LEASE_SEC = job_status.LEASE_SEC, lease_sec
+    try:
+        lease, _ = job_status.claim("crash")  # this worker never finishes
+        during = _deliver("crash")
+        time.sleep(lease_sec * 1.2)
+        after = _deliver("crash")
+    finally:
+        job_status.LEASE_SEC = saved
+    record, _ = job_status.store().get("crash")
+    return {"first_attempt": lease["attempt"], "redelivery_during_lease": during,
+            "redelivery_after_expiry": after, "state": record["state"], "attempts": record.get("attempts")}
+
+
+def dead(stub: StubGemini, store: str) -> dict:
+    _setup(store, "dead")
+    saved = stub.responder
+    stub.responder = lambda prompt: "this is not a quiz"
+    try:
+        outcomes = [_deliver("dead") for _ in range(job_status.MAX_ATTEMPTS + 1)]
+    finally:
+        stub.responder = saved
+    record, _ = job_status.store().get("dead")
+    with contextlib.redirect_stdout(io.StringIO()):
+        resp = get_json_link_lambda.lambda_handler({"pathParameters": {"jobId": "dead"}}, None)
+    return {"deliveries": outcomes, "state": record["state"], "attempts": record.get("attempts"),
+            "get_json_link": {"status": resp["statusCode"], "body": json.loads(resp["body"])}}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--deliveries", type=int, default=8)
+    ap.add_argument("--store", choices=["s3", "memory"], default="s3")
+    ap.add_argument("--lease-sec", type=float, default=0.5)
+    ap.add_argument("--llm-latency-ms", type=float, default=200)
+    args = ap.parse_args()
+    question_bank.ENABLED = revisions.ENABLED = False
+    stub = StubGemini(latency=args.llm_latency_ms / 1000,
+                      responder=lambda prompt: json.dumps(fake_quiz(prompt))).start()
+    gemini_client.DEFAULT_BASE_URL = stub.base_url
+    try:
+        report = {
+            "store": args.store,
+            "duplicates": duplicates(stub, args.store, args.deliveries),
+            "crash": crash(stub, args.store, args.lease_sec),
+            "dead": dead(stub, args.store),
+        }
+    finally:
+        stub.stop()
+        job_status.set_store(None)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Polls per job: fixed-interval polling vs status-record long-polling.
+
+A background "pipeline" walks one job through EXTRACTED -> GENERATING -> READY
+(+ pdf) while a client polls get_json_link and then get_pdf_link the way the
+website does. Time is scaled down so a 60 s job runs in well under a second.
+
+"memory" long-polls against MemoryStatusStore, the local stand-in store.
+
+Usage: python benchmarks/bench_job_status.py [--job-sec 60] [--scale 0.005]
+"""
+import argparse
+import contextlib
+import io
+import json
+import threading
+import time
+
+from fakes import BUCKET, DEFAULT_PARAMS, FakeAws
+
+import job_status
+import runtime_context
+import get_json_link_lambda
+import get_pdf_link_lambda
+
+JOB = "job-1"
+POLL_INTERVAL_SEC = 7
+
+
+def _pipeline(s3, out_prefix: str, job_sec: float, scale: float, with_status: bool):
+    body = b'{"title":"t","questions":[]}'
+    put = lambda name, data: s3.put_object(Bucket=BUCKET, Key=f"{out_prefix}{JOB}/{name}", Body=data)
+    steps = [  # (fraction of job time, S3 output, status update)
+        (0.1, None, lambda: job_status.update(JOB, job_status.EXTRACTED, outputs={"data": "data.txt"})),
+        (0.2, None, lambda: job_status.update(JOB, job_status.GENERATING)),
+        (0.9, lambda: put("quiz.json", body),
+         lambda: job_status.update(JOB, job_status.READY, outputs={"json": "quiz.json",
+                                                                   "jsonETag": job_status.etag_of(body)})),
+        (1.0, lambda: put("quiz.pdf", b"%PDF"), lambda: job_status.update(JOB, outputs={"pdf": "quiz.pdf"})),
+    ]
+    start = time.perf_counter()
+    for frac, output, status in steps:
+        time.sleep(max(0.0, start + frac * job_sec * scale - time.perf_counter()))
+        if output:
+            output()
+        if with_status:
+            status()
+
+
+def _poll(handler, done_code: int, query: dict, interval: float) -> int:
+    event = {"pathParameters": {"jobId": JOB}, "queryStringParameters": query}
+    n = 0
+    while True:
+        n += 1
+        with contextlib.redirect_stdout(io.StringIO()):
+            code = handler(event, None)["statusCode"]
+        if code == done_code:
+            return n
+        time.sleep(interval)
+
+
+def run(mode: str, job_sec: float, scale: float) -> dict:
+    aws = FakeAws()
+    runtime_context.set_client_factory(aws.factory)
+    runtime_context.reset()
+    out_prefix = DEFAULT_PARAMS["/ai-quiz/gen-quiz/quiz-output-folder"].split(BUCKET + "/", 1)[1]
+    s3 = aws.clients["s3"]
+    long_poll = mode in ("long-poll", "memory")
+    job_status.set_store(job_status.MemoryStatusStore() if mode == "memory" else None)
+
+    saved_interval = job_status.LONG_POLL_INTERVAL_SEC
+    job_status.LONG_POLL_INTERVAL_SEC = 1.0 * scale
+    saved_max = job_status.LONG_POLL_MAX_SEC
+    try:
+        pipe = threading.Thread(target=_pipeline, args=(s3, out_prefix, job_sec, scale, mode != "legacy"))
+        pipe.start()
+        # wait= is in scaled seconds so the long-poll cap matches a real 20 s request
+        job_status.LONG_POLL_MAX_SEC = saved_max * scale
+        query = {"wait": str(saved_max * scale)} if long_poll else None
+        interval = 0 if long_poll else POLL_INTERVAL_SEC * scale
+        calls0 = aws.total_calls()
+        json_polls = _poll(get_json_link_lambda.lambda_handler, 200, query, interval)
+        pdf_polls = _poll(get_pdf_link_lambda.lambda_handler, 200, query, interval)
+        pipe.join()
+        return {"json_polls": json_polls, "pdf_polls": pdf_polls,
+                "s3_calls": aws.total_calls() - calls0}
+    finally:
+        job_status.LONG_POLL_INTERVAL_SEC = saved_interval
+        job_status.LONG_POLL_MAX_SEC = saved_max
+        job_status.set_store(None)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--job-sec", type=float, default=60.0)
+    ap.add_argument("--scale", type=float, default=0.005)
+    args = ap.parse_args()
+    report = {mode: run(mode, args.job_sec, args.scale) for mode in ("legacy", "status", "long-poll", "memory")}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""LLM response cache: which generations reach Gemini, and the latency a hit saves.
+
+gemini_quiz runs in-process (AWS fakes + StubGemini at --llm-latency-ms)
+over a sequence of jobs whose texts repeat. The question bank and revision
+reuse are off, so every job goes to the LLM path and only llm_cache can
+absorb it:
+
+  first              new text, single prompt                       -> miss, stored
+  same_text          same text, other jobId, whitespace shuffled   -> memory hit
+  cold_container     memory tier dropped, same text again          -> S3 hit
+  mapreduce_first    long text, map-reduce                         -> one miss per chunk
+  mapreduce_repeat   same long text, other jobId                   -> one hit per chunk
+  model_change       same text, gemini-model parameter changed     -> miss
+  template_change    same text, prompt template wording edited     -> miss
+  expired            entry older than LLM_CACHE_TTL_SEC, cold      -> miss (S3 entry deleted)
+  forced             same text, force_regenerate                   -> no lookup, entry refreshed
+
+Reported per job: Gemini requests, cache hits per tier and misses,
+llm_cache_saved_ms / llm_cache_read_ms from the handler's timings, and wall
+time; then llm_cache.stats() of each simulated container (they end at a cold start).
+
+Usage: python benchmarks/bench_llm_cache.py [--llm-latency-ms 300] [--paragraphs 10]
+"""
+import os
+
+os.environ.setdefault("GEMINI_RATE_PER_SEC", "100")
+os.environ.setdefault("GEMINI_BURST", "20")
+os.environ.setdefault("QUESTION_BANK", "0")
+os.environ.setdefault("REVISIONS", "0")
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import time
+
+from fakes import BUCKET, DEFAULT_PARAMS, FakeAws
+from corpus import paragraph
+from stub_gemini import StubGemini
+
+import gemini_client
+import gemini_quiz
+import llm_cache
+import runtime_context
+
+MODEL_PARAM = "/ai-quiz/gen-quiz/gemini-model"
+
+
+def _shuffle_whitespace(text: str, rng: random.Random) -> str:
+    # what a second extraction of the same document tends to differ in: spacing
+    # within paragraphs, not where they break
+    return "\n\n".join(" ".join(w + rng.choice(["", " ", "\t", "\u00a0"]) for w in p.split())
+                       for p in text.split("\n\n"))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--llm-latency-ms", type=float, default=300)
+    ap.add_argument("--paragraphs", type=int, default=10)
+    args = ap.parse_args()
+
+    aws = FakeAws()
+    runtime_context.set_client_factory(aws.factory)
+    runtime_context.reset()
+    llm_cache.reset()
+    stub = StubGemini(latency=args.llm_latency_ms / 1000).start()
+    gemini_client.DEFAULT_BASE_URL = stub.base_url
+    s3 = aws.clients["s3"]
+    prefix = DEFAULT_PARAMS["/ai-quiz/pdf-extract/text-output-folder"].split(BUCKET + "/", 1)[1]
+    rng = random.Random(4)
+    short = "\n\n".join(paragraph(rng, 6) for _ in range(args.paragraphs))
+    long = "\n\n".join(paragraph(rng, 10) for _ in range(args.paragraphs * 12))
+    build_prompt = gemini_quiz._build_prompt
+
+    def edited_template(src_text, job_id, count=gemini_quiz.QUESTION_COUNT):
+        return build_prompt(src_text, job_id, count).replace("You are a quiz generator.", "You are a careful quiz generator.")
+
+    def run(name: str, text: str, mode: str = "single", **event) -> dict:
+        s3.put_object(Bucket=BUCKET, Key=f"{prefix}{name}/data.txt", Body=text)
+        before = stub.requests
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            resp = gemini_quiz.lambda_handler(dict(event, job_id=name, mode=mode), None)
+        body = json.loads(resp["body"])
+        t = body.get("timings", {})
+        return {"status": resp["statusCode"], "gemini_requests": stub.requests - before,
+                "memory_hits": t.get("llm_cache_memory_hits", 0), "s3_hits": t.get("llm_cache_s3_hits", 0),
+                "misses": t.get("llm_cache_misses", 0), "saved_ms": t.get("llm_cache_saved_ms", 0.0),
+                "cache_read_ms": t.get("llm_cache_read_ms", 0.0), "llm_call_ms": t.get("llm_call_ms", 0.0),
+                "wall_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+    report, containers = {}, []
+
+    def cold_start():
+        containers.append(llm_cache.stats())
+        llm_cache.reset()
+
+    try:
+        report["first"] = run("first", short)
+        report["same_text"] = run("same-text", _shuffle_whitespace(short, rng))
+        cold_start()
+        report["cold_container"] = run("cold", short)
+        report["mapreduce_first"] = run("long-1", long, "mapreduce")
+        report["mapreduce_repeat"] = run("long-2", long, "mapreduce")
+
+        model = aws.clients["ssm"].params[MODEL_PARAM]
+        aws.clients["ssm"].params[MODEL_PARAM] = model + "-next"
+        runtime_context.reset()
+        report["model_change"] = run("model", short)
+        aws.clients["ssm"].params[MODEL_PARAM] = model
+        runtime_context.reset()
+
+        gemini_quiz._build_prompt = edited_template
+        try:
+            report["template_change"] = run("template", short)
+        finally:
+            gemini_quiz._build_prompt = build_prompt
+
+        ttl = llm_cache.TTL_SEC
+        llm_cache.TTL_SEC = 0.5
+        other = "\n\n".join(paragraph(rng, 6) for _ in range(args.paragraphs))
+        run("ttl-1", other)
+        llm_cache.TTL_SEC = ttl
+        cold_start()
+        time.sleep(0.6)
+        report["expired"] = run("ttl-2", other)
+
+        report["forced"] = run("forced", short, force_regenerate=True)
+        containers.append(llm_cache.stats())
+        report["containers"] = containers
+        report["s3_entries"] = sum(1 for k in s3.objects if llm_cache.CACHE_DIR in k[1])
+    finally:
+        stub.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
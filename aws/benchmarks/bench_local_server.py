@@ -0,0 +1,186 @@
+"""The self-hosted server under load, over real HTTP on localhost.
+
+Starts local_server with file storage in a temp directory and StubGemini as
+the model, then:
+
+  uploads     --docs PDFs PUT at once; each client polls /return_json/... every
+              --poll-ms until the quiz is ready (upload-to-quiz latency)
+  poll_storm  --clients keep-alive connections each sending --requests GETs
+              for finished and unknown jobs (requests/s, latency)
+  files       one ?delivery=url link fetched through /files/, then again with
+              If-None-Match (expects 200, then 304)
+
+Usage: python benchmarks/bench_local_server.py [--docs 12] [--clients 200] [--requests 50]
+       [--llm-latency-ms 200] [--generators 8]
+"""
+import os
+
+os.environ.setdefault("GEMINI_RATE_PER_SEC", "100")
+os.environ.setdefault("GEMINI_BURST", "20")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("GEMINI_API_KEY", "bench-key")
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import statistics
+import tempfile
+import time
+import urllib.parse
+
+from corpus import make_corpus
+from stub_gemini import StubGemini, fake_quiz
+
+import gemini_client
+import local_server
+import pdf_extractor
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, body: bytes = b"", headers=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n"
+        head += "".join(f"{k}: {v}\r\n" for k, v in (headers or {}).items())
+        self.writer.write((head + "\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+        lines = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        resp_headers = {k.strip().lower(): v.strip() for k, v in
+                        (ln.split(":", 1) for ln in lines[1:] if ":" in ln)}
+        data = await self.reader.readexactly(int(resp_headers.get("content-length", 0)))
+        return status, resp_headers, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _pct(samples, q):
+    if not samples:
+        return 0.0
+    s = sorted(samples)
+    return round(s[min(len(s) - 1, int(q * len(s)))] * 1000, 1)
+
+
+async def uploads(port: int, docs, poll_ms: float) -> dict:
+    async def one(path):
+        with open(path, "rb") as f:
+            data = f.read()
+        job_id = pdf_extractor._job_id_from_digest(hashlib.sha256(data).digest())
+        c = Client(port)
+        t0 = time.perf_counter()
+        status, _, _ = await c.request("PUT", f"/upload_to_s3/upload/{os.path.basename(path)}", data,
+                                       {"Content-Type": "application/pdf"})
+        put_s = time.perf_counter() - t0
+        polls = 0
+        while True:
+            polls += 1
+            code, _, _ = await c.request("GET", f"/return_json/return_json_data/{job_id}")
+            if code != 404:
+                break
+            await asyncio.sleep(poll_ms / 1000)
+        c.close()
+        return job_id, status, code, put_s, time.perf_counter() - t0, polls
+
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(one(p) for p, _ in docs))
+    return {
+        "docs": len(docs),
+        "upload_status": sorted({r[1] for r in results}),
+        "final_status": sorted({r[2] for r in results}),
+        "put_ms_p50": _pct([r[3] for r in results], 0.5),
+        "ready_ms_p50": _pct([r[4] for r in results], 0.5),
+        "ready_ms_max": _pct([r[4] for r in results], 1.0),
+        "polls": sum(r[5] for r in results),
+        "wall_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }, [r[0] for r in results]
+
+
+async def poll_storm(port: int, job_ids, clients: int, requests: int) -> dict:
+    latencies, codes = [], {}
+
+    async def one(i):
+        c = Client(port)
+        for n in range(requests):
+            job = job_ids[(i + n) % len(job_ids)] if n % 4 else f"unknown-{i}-{n}"
+            t0 = time.perf_counter()
+            code, _, _ = await c.request("GET", f"/return_json/return_json_data/{job}")
+            latencies.append(time.perf_counter() - t0)
+            codes[code] = codes.get(code, 0) + 1
+        c.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(clients)))
+    wall = time.perf_counter() - t0
+    return {"clients": clients, "requests": len(latencies), "status": codes,
+            "req_per_sec": round(len(latencies) / wall, 1), "p50_ms": _pct(latencies, 0.5),
+            "p99_ms": _pct(latencies, 0.99), "mean_ms": round(statistics.mean(latencies) * 1000, 2)}
+
+
+async def files(port: int, job_id: str) -> dict:
+    c = Client(port)
+    _, _, body = await c.request("GET", f"/return_json/return_json_data/{job_id}?delivery=url")
+    url = urllib.parse.urlsplit(json.loads(body)["url"])
+    path = f"{url.path}?{url.query}"
+    first, headers, data = await c.request("GET", path)
+    second, _, _ = await c.request("GET", path, headers={"If-None-Match": headers.get("etag", "")})
+    forged, _, _ = await c.request("GET", path.replace("sig=", "sig=0"))
+    c.close()
+    return {"first": first, "bytes": len(data), "conditional": second, "forged_signature": forged}
+
+
+async def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = make_corpus(os.path.join(tmp, "corpus"), [args.pages] * args.docs)
+        server = local_server.build(os.path.join(tmp, "store"), None, "quiz-ai-bucket", "http://127.0.0.1",
+                                    generators=args.generators, processes=args.processes)
+        port = await server.start("127.0.0.1", 0)
+        server.s3.base_url = f"http://127.0.0.1:{port}"
+        try:
+            up, job_ids = await uploads(port, docs, args.poll_ms)
+            await server.drain()
+            report = {
+                "uploads": up,
+                "poll_storm": await poll_storm(port, job_ids, args.clients, args.requests),
+                "files": await files(port, job_ids[0]),
+                "server": dict(server.stats),
+            }
+        finally:
+            await server.stop()
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=12)
+    ap.add_argument("--pages", type=int, default=8)
+    ap.add_argument("--clients", type=int, default=200)
+    ap.add_argument("--requests", type=int, default=50)
+    ap.add_argument("--poll-ms", type=float, default=100)
+    ap.add_argument("--llm-latency-ms", type=float, default=200)
+    ap.add_argument("--generators", type=int, default=8)
+    ap.add_argument("--processes", type=int, default=0)
+    args = ap.parse_args()
+    stub = StubGemini(latency=args.llm_latency_ms / 1000,
+                      responder=lambda prompt: json.dumps(fake_quiz(prompt))).start()
+    gemini_client.DEFAULT_BASE_URL = stub.base_url
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = asyncio.run(run(args))
+    finally:
+        stub.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Per-call cost of the old "DEBUG - Line N" prints vs telemetry's level-gated logger.
+
+Output goes to /dev/null so only formatting and the write call are measured.
+Usage: python benchmarks/bench_logging.py [--n 200000]
+"""
+import argparse
+import contextlib
+import inspect
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # aws/
+
+import telemetry
+
+
+def get_current_line():
+    return inspect.currentframe().f_back.f_lineno
+
+
+def legacy(i: int, bucket: str, key: str):
+    print(f"DEBUG - Line {get_current_line()}: Getting S3 object: s3://{bucket}/{key}")
+
+
+def structured(log, i: int, bucket: str, key: str):
+    log.debug("read s3://%s/%s", bucket, key, chars=i)
+
+
+def _time(fn, n: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - t0) / n * 1e9
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200_000)
+    args = ap.parse_args()
+    log = telemetry.get_logger("bench")
+    bucket, key = "quiz-ai-bucket", "ai-quiz/pdf-extract/text-output-folder/job/data.txt"
+    report = {}
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        report["legacy_print_ns"] = _time(lambda i: legacy(i, bucket, key), args.n)
+        telemetry.set_level("INFO")
+        report["debug_disabled_ns"] = _time(lambda i: structured(log, i, bucket, key), args.n)
+        telemetry.set_level("DEBUG")
+        report["debug_enabled_ns"] = _time(lambda i: structured(log, i, bucket, key), args.n)
+        telemetry.set_level("INFO")
+    print(json.dumps({k: round(v, 1) for k, v in report.items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""Offline end-to-end benchmark: upload -> extract -> EventBridge -> generate -> poll.
+
+All four handlers run in-process against the in-memory AWS fakes and the
+deterministic StubGemini server. EventBridge entries are dispatched to
+gemini_quiz on a worker pool, the way the rule invokes it asynchronously.
+Per-stage timings come from the EMF records the handlers already emit.
+
+Profiles:
+  concurrent   distinct PDFs uploaded at once; clients poll get_json_link until ready
+  duplicates   one PDF uploaded under many keys (dedup should absorb all but one)
+  poll_storm   many clients hammering the read lambdas for finished and unknown jobs
+
+Usage:
+  python benchmarks/bench_pipeline.py [--profiles concurrent duplicates poll_storm]
+         [--docs 12] [--llm-latency-ms 200] [--aws-latency-ms 5]
+         [--write-baseline baseline.json] [--compare baseline.json --tolerance 0.3]
+
+--compare exits 1 when a p50/p99 regresses by more than --tolerance.
+"""
+import os
+
+# Before the aws modules read their settings: the harness measures the
+# pipeline, not the production Gemini quota.
+os.environ.setdefault("GEMINI_RATE_PER_SEC", "100")
+os.environ.setdefault("GEMINI_BURST", "20")
+
+import argparse
+import contextlib
+import io
+import json
+import queue
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from fakes import BUCKET, DEFAULT_PARAMS, FakeAws, FakeEvents
+from corpus import make_corpus
+from stub_gemini import StubGemini
+
+import dedup
+import gemini_client
+import job_status
+import llm_cache
+import runtime_context
+import pdf_extractor
+import gemini_quiz
+import get_json_link_lambda
+import get_pdf_link_lambda
+
+HIST_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+def _prefix(param: str) -> str:
+    return DEFAULT_PARAMS[param].split(BUCKET + "/", 1)[1]
+
+
+def summarize(samples: List[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    s = sorted(samples)
+    pct = lambda p: s[min(len(s) - 1, int(p * len(s)))]
+    hist, i = {}, 0
+    for bound in HIST_BOUNDS_MS + (float("inf"),):
+        n = 0
+        while i < len(s) and s[i] <= bound:
+            n += 1
+            i += 1
+        if n:
+            hist["le_inf" if bound == float("inf") else f"le_{bound}"] = n
+    return {"count": len(s), "p50": round(pct(0.50), 2), "p90": round(pct(0.90), 2),
+            "p99": round(pct(0.99), 2), "max": round(s[-1], 2), "hist": hist}
+
+
+class DispatchingEvents(FakeEvents):
+    """EventBridge stand-in that hands every accepted entry to a queue."""
+
+    def __init__(self, sink: "queue.Queue", latency: float = 0.0):
+        super().__init__(latency)
+        self.sink = sink
+
+    def put_events(self, Entries):
+        resp = super().put_events(Entries)
+        for e in Entries:
+            self.sink.put(e)
+        return resp
+
+
+class Harness:
+    def __init__(self, llm_latency: float, aws_latency: float, generators: int):
+        self.events = queue.Queue()
+        self.aws = FakeAws(aws_latency)
+        self.aws.clients["events"] = DispatchingEvents(self.events, aws_latency)
+        runtime_context.set_client_factory(self.aws.factory)
+        runtime_context.reset()
+        llm_cache.reset()
+        job_status.set_store(None)
+        self.stub = StubGemini(latency=llm_latency).start()
+        gemini_client.DEFAULT_BASE_URL = self.stub.base_url
+        self.in_prefix = _prefix("/ai-quiz/pdf-extract/input-folder")
+        self.generator_results = []
+        self._gen_pool = ThreadPoolExecutor(max_workers=generators, thread_name_prefix="gen")
+        self._stop = False
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def _dispatch(self):
+        while not self._stop:
+            try:
+                entry = self.events.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            detail = json.loads(entry["Detail"])
+            event = {"source": entry["Source"], "detail-type": entry["DetailType"], "detail": detail}
+            self._gen_pool.submit(self._generate, event)
+
+    def _generate(self, event: dict):
+        try:
+            resp = gemini_quiz.lambda_handler(event, None)
+            self.generator_results.append(resp["statusCode"])
+        finally:
+            self.events.task_done()
+
+    def upload(self, name: str, body: bytes) -> str:
+        key = f"{self.in_prefix}{name}"
+        self.aws.clients["s3"].put_object(Bucket=BUCKET, Key=key, Body=body)
+        resp = pdf_extractor.lambda_handler({"Records": [{
+            "eventSource": "aws:s3", "s3": {"bucket": {"name": BUCKET}, "object": {"key": key}}}]}, None)
+        return json.loads(resp["body"]).get("jobId")
+
+    def poll_json(self, job_id: str) -> int:
+        return get_json_link_lambda.lambda_handler({"pathParameters": {"jobId": job_id}}, None)["statusCode"]
+
+    def poll_pdf(self, job_id: str) -> int:
+        return get_pdf_link_lambda.lambda_handler({"pathParameters": {"jobId": job_id}}, None)["statusCode"]
+
+    def drain(self):
+        self.events.join()
+
+    def close(self):
+        self.drain()
+        self._stop = True
+        self._dispatcher.join()
+        self._gen_pool.shutdown(wait=True)
+        self.stub.stop()
+
+
+def profile_concurrent(h: Harness, docs, args) -> dict:
+    """Every document uploaded at once; one client per upload polls until its quiz is ready."""
+    e2e, polls = [], []
+
+    def client(i, path):
+        with open(path, "rb") as f:
+            body = f.read()
+        t0 = time.perf_counter()
+        job_id = h.upload(f"bench/{i}-{os.path.basename(path)}", body)
+        n = 0
+        while True:
+            n += 1
+            if h.poll_json(job_id) == 200:
+                break
+            time.sleep(args.poll_interval_ms / 1000)
+        e2e.append((time.perf_counter() - t0) * 1000)
+        polls.append(n)
+
+    with ThreadPoolExecutor(max_workers=args.uploaders) as pool:
+        list(pool.map(lambda d: client(*d), enumerate(p for p, _ in docs)))
+    h.drain()
+    return {"jobs": len(docs), "e2e_ms": summarize(e2e), "polls_per_job": summarize(polls)}
+
+
+def profile_duplicates(h: Harness, docs, args) -> dict:
+    """The same bytes under many keys: one extraction and one quiz, the rest are dedup hits."""
+    with open(docs[0][0], "rb") as f:
+        body = f.read()
+    h.upload("bench/dup-0.pdf", body)
+    h.drain()
+    llm_before = h.stub.requests
+    t0 = time.perf_counter()
+    lat = []
+
+    def one(i):
+        t = time.perf_counter()
+        h.upload(f"bench/dup-{i}.pdf", body)
+        lat.append((time.perf_counter() - t) * 1000)
+
+    with ThreadPoolExecutor(max_workers=args.uploaders) as pool:
+        list(pool.map(one, range(1, args.duplicates + 1)))
+    h.drain()
+    return {"jobs": args.duplicates, "upload_ms": summarize(lat),
+            "llm_requests_for_duplicates": h.stub.requests - llm_before,
+            "dedup": dedup.stats(), "wall_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+
+def profile_poll_storm(h: Harness, docs, args) -> dict:
+    """Clients polling finished and unknown jobs as fast as the handlers answer."""
+    job_ids = []
+    for i, (path, _) in enumerate(docs[:4]):
+        with open(path, "rb") as f:
+            job_ids.append(h.upload(f"bench/storm-{i}.pdf", f.read()))
+    h.drain()
+    job_ids += [f"unknown-{i}" for i in range(len(job_ids))]
+    lat = {"get_json_link": [], "get_pdf_link": []}
+
+    def client(seed):
+        rng = random.Random(seed)
+        for _ in range(args.polls_per_client):
+            job_id = rng.choice(job_ids)
+            name, fn = rng.choice((("get_json_link", h.poll_json), ("get_pdf_link", h.poll_pdf)))
+            t = time.perf_counter()
+            fn(job_id)
+            lat[name].append((time.perf_counter() - t) * 1000)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.pollers) as pool:
+        list(pool.map(client, range(args.pollers)))
+    wall = time.perf_counter() - t0
+    total = sum(len(v) for v in lat.values())
+    return {"requests": total, "requests_per_s": round(total / wall, 1),
+            **{f"{k}_ms": summarize(v) for k, v in lat.items()}}
+
+
+PROFILES = {"concurrent": profile_concurrent, "duplicates": profile_duplicates, "poll_storm": profile_poll_storm}
+
+
+def _stage_histograms(log_text: str) -> dict:
+    stages: Dict[str, List[float]] = {}
+    for line in log_text.splitlines():
+        if not line.startswith('{"_aws"'):
+            continue
+        rec = json.loads(line)
+        handler = rec.get("Handler")
+        if not handler:
+            continue
+        for m in rec["_aws"]["CloudWatchMetrics"][0]["Metrics"]:
+            if m["Unit"] == "Milliseconds":
+                stages.setdefault(f"{handler}.{m['Name']}", []).append(rec[m["Name"]])
+    return {k: summarize(v) for k, v in sorted(stages.items())}
+
+
+def run_profile(name: str, docs, args) -> dict:
+    dedup.STATS.clear()
+    h = Harness(args.llm_latency_ms / 1000, args.aws_latency_ms / 1000, args.generators)
+    out = io.StringIO()
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(out):
+            result = PROFILES[name](h, docs, args)
+            h.close()
+    finally:
+        wall = time.perf_counter() - t0
+        py_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+        if args.tracemalloc:
+            tracemalloc.stop()
+    result.update({
+        "wall_s": round(wall, 3),
+        "throughput_jobs_per_s": round(result.get("jobs", 0) / wall, 2) if result.get("jobs") else None,
+        "llm_requests": h.stub.requests,
+        "aws_calls": h.aws.total_calls(),
+        "generator_errors": sum(1 for c in h.generator_results if c >= 400),
+        "memory": {
+            "py_peak_mb": round(py_peak / 2 ** 20, 1) if py_peak is not None else None,
+            # ru_maxrss is KiB on Linux and only ever grows, so this is the peak so far
+            "rss_peak_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "rss_growth_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss0) / 1024, 1),
+        },
+        "stages": _stage_histograms(out.getvalue()),
+    })
+    return result
+
+
+def _flatten(report: dict, prefix: str = "") -> Dict[str, float]:
+    """Every p50/p99 in the report, keyed by its path."""
+    flat = {}
+    for k, v in report.items():
+        path = f"{prefix}.{k}" if prefix else k
+        if isinstance(v, dict):
+            flat.update(_flatten(v, path))
+        elif k in ("p50", "p99") and isinstance(v, (int, float)):
+            flat[path] = v
+    return flat
+
+
+def compare(current: dict, baseline: dict, tolerance: float, floor_ms: float) -> List[str]:
+    cur, base = _flatten(current["profiles"]), _flatten(baseline["profiles"])
+    regressions = []
+    for k, b in base.items():
+        c = cur.get(k)
+        if c is not None and c > b * (1 + tolerance) and c - b > floor_ms:
+            regressions.append(f"{k}: {b} -> {c} (+{(c / b - 1) * 100 if b else float('inf'):.0f}%)")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    ap.add_argument("--docs", type=int, default=12)
+    ap.add_argument("--pages", type=int, nargs="+", default=[1, 3, 8, 20],
+                    help="page counts cycled through the corpus")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--llm-latency-ms", type=float, default=200.0)
+    ap.add_argument("--aws-latency-ms", type=float, default=5.0)
+    ap.add_argument("--uploaders", type=int, default=8)
+    ap.add_argument("--generators", type=int, default=8)
+    ap.add_argument("--poll-interval-ms", type=float, default=50.0)
+    ap.add_argument("--duplicates", type=int, default=20)
+    ap.add_argument("--pollers", type=int, default=16)
+    ap.add_argument("--polls-per-client", type=int, default=100)
+    ap.add_argument("--tracemalloc", action="store_true", help="track Python heap peaks (slower)")
+    ap.add_argument("--write-baseline")
+    ap.add_argument("--compare")
+    ap.add_argument("--tolerance", type=float, default=0.3)
+    ap.add_argument("--floor-ms", type=float, default=2.0, help="ignore regressions smaller than this")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = make_corpus(tmp, [args.pages[i % len(args.pages)] for i in range(args.docs)], args.seed)
+        report = {
+            "config": {k: v for k, v in vars(args).items() if k not in ("write_baseline", "compare")},
+            "profiles": {name: run_profile(name, docs, args) for name in args.profiles},
+        }
+    print(json.dumps(report, indent=2))
+
+    if args.write_baseline:
+        with open(args.write_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.floor_ms)
+        for r in regressions:
+            print(f"REGRESSION {r}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Prompt packing: input tokens per job before/after, and what the selection costs.
+
+Part 1 packs synthetic extractions of growing size (body paragraphs mixed
+with a table of contents, a repeated disclaimer and tables of figures) and
+reports estimated tokens, pieces dropped and selection time. Part 2 runs
+gemini_quiz in-process (AWS fakes + StubGemini) on one document with
+PROMPT_PACK off and on, measuring the prompt characters that reached the model.
+
+Usage: python benchmarks/bench_prompt_pack.py [--paragraphs 20 100 400] [--llm-latency-ms 400]
+"""
+import os
+
+os.environ.setdefault("GEMINI_RATE_PER_SEC", "100")
+os.environ.setdefault("GEMINI_BURST", "20")
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import statistics
+import time
+
+from fakes import BUCKET, DEFAULT_PARAMS, FakeAws
+from corpus import paragraph
+from stub_gemini import StubGemini, fake_quiz
+
+import gemini_client
+import gemini_quiz
+import llm_cache
+import prompt_pack
+import question_bank
+import revisions
+import runtime_context
+
+DISCLAIMER = ("This document is provided for training purposes only. All trademarks are the property "
+              "of their respective owners. Do not distribute without written permission.")
+
+
+def make_text(paragraphs: int, seed: int = 6) -> str:
+    rng = random.Random(seed)
+    toc = "\n".join(f"{i + 1}. {' '.join(paragraph(rng, 1).split()[:4])} .......... {3 + 4 * i}"
+                    for i in range(max(3, paragraphs // 10)))
+    parts = ["Contents\n" + toc]
+    for i in range(paragraphs):
+        parts.append(paragraph(rng))
+        if i % 8 == 7:
+            parts.append(DISCLAIMER)
+        if i % 15 == 14:
+            parts.append("\n".join(" ".join(f"{rng.uniform(0, 999):.1f}" for _ in range(6)) for _ in range(5)))
+    return "\n\n".join(parts)
+
+
+def bench_pack(paragraphs: int, rounds: int = 5) -> dict:
+    text = make_text(paragraphs)
+    samples, stats = [], {}
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        _, stats = prompt_pack.pack(text)
+        samples.append(time.perf_counter() - t0)
+    return {
+        "paragraphs": paragraphs,
+        "tokens_before": stats["tokensBefore"],
+        "tokens_after": stats["tokensAfter"],
+        "pieces": stats["pieces"],
+        "kept": stats["kept"],
+        "duplicates": stats["duplicates"],
+        "low_value": stats["lowValue"],
+        "select_ms_p50": round(statistics.median(samples) * 1000, 2),
+    }
+
+
+def bench_pipeline(paragraphs: int, llm_latency: float) -> dict:
+    prompts = []
+
+    def responder(prompt: str) -> str:
+        prompts.append(len(prompt))
+        return json.dumps(fake_quiz(prompt))
+
+    stub = StubGemini(latency=llm_latency, responder=responder).start()
+    gemini_client.DEFAULT_BASE_URL = stub.base_url
+    prefix = DEFAULT_PARAMS["/ai-quiz/pdf-extract/text-output-folder"].split(BUCKET + "/", 1)[1]
+    question_bank.ENABLED = revisions.ENABLED = False
+    report = {}
+    try:
+        for label, enabled in (("unpacked", False), ("packed", True)):
+            aws = FakeAws()
+            runtime_context.set_client_factory(aws.factory)
+            runtime_context.reset()
+            llm_cache.reset()
+            aws.clients["s3"].put_object(Bucket=BUCKET, Key=f"{prefix}pack/data.txt", Body=make_text(paragraphs))
+            prompt_pack.ENABLED = enabled
+            del prompts[:]
+            with contextlib.redirect_stdout(io.StringIO()):
+                resp = gemini_quiz.lambda_handler({"job_id": "pack", "mode": "single"}, None)
+            t = json.loads(resp["body"]).get("timings", {})
+            report[label] = {
+                "status": resp["statusCode"],
+                "prompt_chars": sum(prompts),
+                "est_input_tokens": sum(prompts) // 4,
+                "prompt_pack_ms": t.get("prompt_pack_ms", 0.0),
+            }
+    finally:
+        stub.stop()
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--paragraphs", type=int, nargs="+", default=[20, 100, 400])
+    ap.add_argument("--llm-latency-ms", type=float, default=400)
+    args = ap.parse_args()
+    print(json.dumps({
+        "pack": [bench_pack(n) for n in args.paragraphs],
+        "pipeline": bench_pipeline(max(args.paragraphs), args.llm_latency_ms / 1000),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Question bank: index size and load/lookup cost, and LLM work saved on overlapping documents.
+
+Part 1 builds a bank of --passages synthetic passages and times
+serialisation, from_bytes() (what a container pays when the object changed)
+and lookups. Part 2 runs gemini_quiz in-process (AWS fakes + StubGemini)
+on an original document, a revised edition that shares most of its
+paragraphs, and an unrelated document, and reports how much source text and
+how many questions still went to the LLM.
+
+Usage: python benchmarks/bench_question_bank.py [--passages 5000] [--overlap 0.8] [--llm-latency-ms 400]
+"""
+import os
+
+os.environ.setdefault("GEMINI_RATE_PER_SEC", "100")
+os.environ.setdefault("GEMINI_BURST", "20")
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import re
+import statistics
+import time
+
+from fakes import BUCKET, DEFAULT_PARAMS, FakeAws
+from corpus import paragraph
+from stub_gemini import StubGemini
+
+import gemini_client
+import gemini_quiz
+import question_bank
+import runtime_context
+
+
+def _source_responder(prompt: str) -> str:
+    # Questions that quote the source, so they can be attributed to passages like real ones.
+    n = int((re.search(r"exactly (\d+) multiple", prompt) or [0, 10])[1])
+    src = prompt.split("=== SOURCE TEXT START ===", 1)[-1].split("=== SOURCE TEXT END ===", 1)[0]
+    sentences = [s.strip() for s in src.split(".") if len(s.split()) > 6] or ["empty source text here"]
+    qs = []
+    for i in range(n):
+        words = sentences[(i * 7) % len(sentences)].split()
+        qs.append({"question": f"Which term completes: {' '.join(words[:8])} ...?",
+                   "options": [words[-1], words[0], words[1], "none"], "correctAnswer": words[-1],
+                   "explanation": " ".join(words)})
+    return json.dumps({"title": "Quiz from the document", "questions": qs})
+
+
+def bench_index(n: int, seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    bank = question_bank.QuestionBank()
+    texts = [paragraph(rng, 12) for _ in range(n)]
+    t0 = time.perf_counter()
+    sketches = [question_bank.sketch(t) for t in texts]
+    t_sketch = time.perf_counter() - t0
+    q = {"question": "q", "options": ["a", "b"], "correctAnswer": "a", "explanation": "e"}
+    for i, sk in enumerate(sketches):
+        bank.add(sk, f"job-{i // 8}", [q, q])
+    t0 = time.perf_counter()
+    blob = bank.to_bytes()
+    t_save = time.perf_counter() - t0
+    loads = []
+    for _ in range(5):
+        t0 = time.perf_counter()
+        loaded = question_bank.QuestionBank.from_bytes(blob)
+        loads.append(time.perf_counter() - t0)
+    probes = [sketches[rng.randrange(n)] for _ in range(200)] + [question_bank.sketch(paragraph(rng, 12)) for _ in range(200)]
+    lookups, hits = [], 0
+    for sk in probes:
+        t0 = time.perf_counter()
+        pid, _ = loaded.lookup(sk)
+        lookups.append(time.perf_counter() - t0)
+        hits += pid >= 0
+    return {
+        "passages": n,
+        "bytes": len(blob),
+        "bytes_per_passage": round(len(blob) / n, 1),
+        "sketch_us_per_passage": round(t_sketch / n * 1e6, 1),
+        "to_bytes_ms": round(t_save * 1000, 1),
+        "from_bytes_ms_p50": round(statistics.median(loads) * 1000, 2),
+        "lookup_us_p50": round(statistics.median(lookups) * 1e6, 1),
+        "hits_known_200_unknown_200": hits,
+    }
+
+
+def bench_pipeline(overlap: float, llm_latency: float, paragraphs: int = 12, seed: int = 2) -> dict:
+    aws = FakeAws()
+    runtime_context.set_client_factory(aws.factory)
+    runtime_context.reset()
+    question_bank.reset()
+    stub = StubGemini(latency=llm_latency, responder=_source_responder).start()
+    gemini_client.DEFAULT_BASE_URL = stub.base_url
+    prefix = DEFAULT_PARAMS["/ai-quiz/pdf-extract/text-output-folder"].split(BUCKET + "/", 1)[1]
+    rng = random.Random(seed)
+    original = [paragraph(rng, 8) for _ in range(paragraphs)]
+    keep = int(paragraphs * overlap)
+    docs = {
+        "original": original,
+        "revised": original[:keep] + [paragraph(rng, 8) for _ in range(paragraphs - keep)],
+        "unrelated": [paragraph(rng, 8) for _ in range(paragraphs)],
+    }
+    report = {}
+    try:
+        for name, paras in docs.items():
+            text = "\n\n".join(paras)
+            aws.clients["s3"].put_object(Bucket=BUCKET, Key=f"{prefix}{name}/data.txt", Body=text)
+            before = stub.requests
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                resp = gemini_quiz.lambda_handler({"job_id": name, "mode": "single"}, None)
+            wall_ms = (time.perf_counter() - t0) * 1000
+            body = json.loads(resp["body"])
+            t = body.get("timings", {})
+            report[name] = {
+                "status": resp["statusCode"],
+                "mode": body.get("mode"),
+                "source_chars": len(text),
+                "passages": t.get("bank_passages"),
+                "bank_hits": t.get("bank_hits"),
+                "questions_from_bank": t.get("bank_questions"),
+                "llm_requests": stub.requests - before,
+                "bank_lookup_ms": t.get("bank_lookup_ms"),
+                "llm_call_ms": t.get("llm_call_ms", 0.0),
+                "wall_ms": round(wall_ms, 1),
+            }
+    finally:
+        stub.stop()
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--passages", type=int, default=5000)
+    ap.add_argument("--overlap", type=float, default=0.8)
+    ap.add_argument("--llm-latency-ms", type=float, default=400)
+    args = ap.parse_args()
+    print(json.dumps({"index": bench_index(args.passages), "pipeline": bench_pipeline(args.overlap, args.llm_latency_ms / 1000)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
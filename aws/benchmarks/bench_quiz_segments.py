@@ -0,0 +1,158 @@
+"""Columnar quiz segments: scanning and listing every quiz vs one GET per job.
+
+Fills the fake bucket (--aws-latency-ms per call) with --quizzes quiz.json
+objects, then measures:
+
+  per_job      the old path: one get_object + json.loads per jobId
+               (--concurrency threads), i.e. what a full scan cost before
+  compact      the first compaction run, then an incremental run after
+               --new-pct more quizzes and a forced regeneration of a few
+  scan         quiz_segments.scan over all segments (questions counted)
+  list         list_quizzes_lambda paging through everything (limit 1000),
+               plus a filtered query and an include=questions page
+
+Usage: python benchmarks/bench_quiz_segments.py [--quizzes 20000] [--aws-latency-ms 5] [--concurrency 16]
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fakes import BUCKET, DEFAULT_PARAMS, FakeAws
+from corpus import VOCAB
+
+import artifacts
+import list_quizzes_lambda
+import quiz_segments
+import runtime_context
+
+PREFIX = DEFAULT_PARAMS["/ai-quiz/gen-quiz/quiz-output-folder"].split(BUCKET + "/", 1)[1]
+
+
+def _quiz(rng: random.Random, n: int = 10) -> dict:
+    def words(k):
+        return " ".join(rng.choice(VOCAB) for _ in range(k))
+    questions = []
+    for _ in range(n):
+        opts = [words(3) for _ in range(4)]
+        questions.append({"question": words(12).capitalize() + "?", "options": opts,
+                          "correctAnswer": rng.choice(opts), "explanation": words(20).capitalize() + "."})
+    return {"title": "Quiz: " + words(3), "questions": questions}
+
+
+def _fill(s3, start: int, count: int, seed: int = 0):
+    rng = random.Random(seed + start)
+    for i in range(start, start + count):
+        body = json.dumps(_quiz(rng), ensure_ascii=False).encode("utf-8")
+        artifacts.put(s3, BUCKET, f"{PREFIX}job-{i:07d}/quiz.json", body, "application/json; charset=utf-8",
+                      encoding=artifacts.PUBLIC_ENCODING)
+        if i % 5 == 0:  # the other objects that live next to quiz.json
+            s3.put_object(Bucket=BUCKET, Key=f"{PREFIX}job-{i:07d}/quiz.pdf", Body=b"%PDF")
+
+
+def _calls(s3) -> int:
+    return sum(s3.calls.values())
+
+
+def per_job(s3, concurrency: int) -> dict:
+    keys = [k for (_, k) in s3.objects if k.endswith("/quiz.json") and "/_" not in k]
+    before = _calls(s3)
+    t0 = time.perf_counter()
+
+    def read(key):
+        return len(json.loads(artifacts.read_body(s3.get_object(Bucket=BUCKET, Key=key)))["questions"])
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        questions = sum(pool.map(read, keys))
+    return {"quizzes": len(keys), "questions": questions, "s3_requests": _calls(s3) - before,
+            "seconds": round(time.perf_counter() - t0, 2)}
+
+
+def _compact(s3) -> dict:
+    before = _calls(s3)
+    t0 = time.perf_counter()
+    stats = quiz_segments.compact(s3, BUCKET, PREFIX)
+    return dict({k: stats[k] for k in ("listed", "new", "changed", "segmentsWritten", "merged", "quizzes",
+                                       "segments")},
+                s3_requests=_calls(s3) - before, seconds=round(time.perf_counter() - t0, 2))
+
+
+def scan(s3) -> dict:
+    quiz_segments.reset()
+    before = _calls(s3)
+    t0 = time.perf_counter()
+    quizzes = questions = 0
+    for seg, rows in quiz_segments.scan(s3, BUCKET, PREFIX):
+        quizzes += len(rows)
+        questions += sum(seg.q_start[r + 1] - seg.q_start[r] for r in rows)
+    return {"quizzes": quizzes, "questions": questions, "s3_requests": _calls(s3) - before,
+            "seconds": round(time.perf_counter() - t0, 2)}
+
+
+def _get(query: dict) -> dict:
+    resp = list_quizzes_lambda.lambda_handler({"queryStringParameters": query}, None)
+    assert resp["statusCode"] == 200, resp
+    return json.loads(resp["body"])
+
+
+def listing(s3) -> dict:
+    quiz_segments.reset()
+    before = _calls(s3)
+    pages, seen, cursor = [], 0, None
+    while True:
+        t0 = time.perf_counter()
+        body = _get({"limit": "1000", **({"cursor": cursor} if cursor else {})})
+        pages.append(time.perf_counter() - t0)
+        seen += body["count"]
+        cursor = body["nextCursor"]
+        if not cursor:
+            break
+    t0 = time.perf_counter()
+    filtered = _get({"q": VOCAB[7], "limit": "50"})
+    filtered_ms = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    full = _get({"limit": "100", "include": "questions"})
+    include_ms = (time.perf_counter() - t0) * 1000
+    return {"pages": len(pages), "listed": seen, "page_ms_p50": round(statistics.median(pages) * 1000, 2),
+            "first_page_ms": round(pages[0] * 1000, 2), "s3_requests": _calls(s3) - before,
+            "filtered_q": VOCAB[7], "filtered_count": filtered["count"], "filtered_ms": round(filtered_ms, 2),
+            "include_questions_count": sum(len(i["quiz"]["questions"]) for i in full["items"]),
+            "include_ms": round(include_ms, 2)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--quizzes", type=int, default=20000)
+    ap.add_argument("--new-pct", type=float, default=2.0)
+    ap.add_argument("--aws-latency-ms", type=float, default=5)
+    ap.add_argument("--concurrency", type=int, default=16)
+    args = ap.parse_args()
+
+    aws = FakeAws()
+    s3 = aws.clients["s3"]
+    runtime_context.set_client_factory(aws.factory)
+    runtime_context.reset()
+    quiz_segments.reset()
+    _fill(s3, 0, args.quizzes)
+    s3.latency = args.aws_latency_ms / 1000
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = {"per_job": per_job(s3, args.concurrency), "compact": {"initial": _compact(s3)}}
+        s3.latency = 0
+        new = max(1, int(args.quizzes * args.new_pct / 100))
+        _fill(s3, args.quizzes, new, seed=1)
+        _fill(s3, 0, 3, seed=2)  # forced regeneration: same jobIds, new content
+        s3.latency = args.aws_latency_ms / 1000
+        report["compact"]["incremental"] = _compact(s3)
+        report["scan"] = scan(s3)
+        report["list"] = listing(s3)
+    report["speedup_scan_x"] = round(report["per_job"]["seconds"] / max(report["scan"]["seconds"], 1e-3), 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
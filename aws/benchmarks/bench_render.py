@@ -0,0 +1,104 @@
+"""Quiz PDF rendering: the old flat-text renderer vs quiz_render, on 10/100/1000-question quizzes.
+
+Usage: python benchmarks/bench_render.py [--sizes 10 100 1000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # aws/
+from stub_gemini import fake_quiz
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.pdfgen import canvas
+
+import quiz_render
+
+
+def legacy_render(quiz: dict) -> bytes:
+    # gemini_quiz._make_pdf_bytes before the rendering engine, including the flat-text step.
+    text = f"{quiz['title']}\n\n"
+    for i, q in enumerate(quiz["questions"]):
+        text += f"{i + 1}. {q['question']}\n"
+        for j, option in enumerate(q["options"]):
+            text += f"   {chr(65 + j)}. {option}\n"
+        text += f"Answer: {q['correctAnswer']}\n"
+        if q.get("explanation"):
+            text += f"Explanation: {q['explanation']}\n"
+        text += "\n"
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    width, height = A4
+    left, top, max_w, line_h = 2 * cm, height - 2 * cm, width - 4 * cm, 0.6 * cm
+
+    def wrap(s):
+        words, line, lines = s.split(), "", []
+        for w in words:
+            t = (line + " " + w).strip()
+            if c.stringWidth(t) <= max_w:
+                line = t
+            else:
+                if line:
+                    lines.append(line)
+                line = w
+        if line:
+            lines.append(line)
+        return lines
+
+    c.setFont("Times-Roman", 11)
+    y = top
+    for para in text.splitlines():
+        if not para.strip():
+            y -= line_h
+            continue
+        for ln in wrap(para):
+            if y < 2 * cm:
+                c.showPage()
+                c.setFont("Times-Roman", 11)
+                y = top
+            c.drawString(left, y, ln)
+            y -= line_h
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def make_quiz(n: int) -> dict:
+    quiz = fake_quiz(f"exactly {n} multiple", n)
+    for q in quiz["questions"]:
+        q["question"] += " " + "Consider the long scenario described in section four of the handout. " * 3
+        q["explanation"] = "The handout explains the reasoning in detail, covering each alternative in turn. " * 4
+    return quiz
+
+
+def bench(fn, quiz, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(quiz)
+        samples.append(time.perf_counter() - t0)
+    return {"median_ms": round(statistics.median(samples) * 1000, 1), "pdf_kb": len(out) // 1024}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="*", default=[10, 100, 1000])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    report = {}
+    for n in args.sizes:
+        quiz = make_quiz(n)
+        report[f"{n}_questions"] = {
+            "legacy": bench(legacy_render, quiz, args.repeat),
+            "quiz_render": bench(quiz_render.render_quiz, quiz, args.repeat),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Revised documents: pages and questions reused from the prior edition.
+
+Builds a --pages deck and a revision with --changed pages rewritten (a new
+jobId, since the bytes differ), then runs pdf_extractor and gemini_quiz
+in-process (AWS fakes + StubGemini) on both. The revision is run twice:
+with the page index (REVISIONS on) and as a cold upload, and the report
+compares pages extracted, extraction time, questions kept and the source
+text that still went to the LLM.
+
+Usage: python benchmarks/bench_revisions.py [--pages 40] [--changed 4] [--llm-latency-ms 400]
+"""
+import os
+
+os.environ.setdefault("GEMINI_RATE_PER_SEC", "100")
+os.environ.setdefault("GEMINI_BURST", "20")
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+from fakes import BUCKET, DEFAULT_PARAMS, FakeAws
+from corpus import paragraph
+from stub_gemini import StubGemini
+from bench_question_bank import _source_responder
+
+import gemini_client
+import gemini_quiz
+import llm_cache
+import pdf_extractor
+import question_bank
+import revisions
+import runtime_context
+
+
+def _prefix(param: str) -> str:
+    return DEFAULT_PARAMS[param].split(BUCKET + "/", 1)[1]
+
+
+def _write_pdf(path: str, pages):
+    doc = fitz.open()
+    for i, body in enumerate(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(36, 36, 560, 806), f"Chapter {i + 1}\n\n{body}", fontsize=9)
+    doc.set_metadata({})
+    doc.save(path, garbage=0, deflate=False, no_new_id=True)
+    doc.close()
+
+
+def _decks(directory: str, pages: int, changed: int, seed: int = 4):
+    rng = random.Random(seed)
+    original = ["\n\n".join(paragraph(rng) for _ in range(6)) for _ in range(pages)]
+    revised = list(original)
+    for i in rng.sample(range(pages), min(changed, pages)):
+        revised[i] = "\n\n".join(paragraph(rng) for _ in range(6))
+    paths = []
+    for name, deck in (("original", original), ("revised", revised)):
+        path = os.path.join(directory, f"{name}.pdf")
+        _write_pdf(path, deck)
+        paths.append(path)
+    return paths
+
+
+def _run(aws: FakeAws, stub: StubGemini, name: str, path: str) -> dict:
+    key = f"{_prefix('/ai-quiz/pdf-extract/input-folder')}bench/{name}.pdf"
+    with open(path, "rb") as f:
+        aws.clients["s3"].put_object(Bucket=BUCKET, Key=key, Body=f.read())
+    before = stub.requests
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        resp = pdf_extractor.lambda_handler({"Records": [{
+            "eventSource": "aws:s3", "s3": {"bucket": {"name": BUCKET}, "object": {"key": key}}}]}, None)
+        extract_ms = (time.perf_counter() - t0) * 1000
+        body = json.loads(resp["body"])
+        job_id = body["jobId"]
+        t0 = time.perf_counter()
+        quiz = json.loads(gemini_quiz.lambda_handler({"job_id": job_id, "mode": "single"}, None)["body"])
+        quiz_ms = (time.perf_counter() - t0) * 1000
+    t = quiz.get("timings", {})
+    return {
+        "pages": body["extract"].get("pages"),
+        "reused_pages": body["extract"].get("reusedPages", 0),
+        "extract_ms": round(extract_ms, 1),
+        "kept_questions": t.get("revision_kept_questions", 0),
+        "changed_pages": t.get("revision_changed_pages"),
+        "llm_requests": stub.requests - before,
+        "quiz_ms": round(quiz_ms, 1),
+    }
+
+
+def bench(pages: int, changed: int, llm_latency: float) -> dict:
+    stub = StubGemini(latency=llm_latency, responder=_source_responder).start()
+    gemini_client.DEFAULT_BASE_URL = stub.base_url
+    report = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            original, revised = _decks(tmp, pages, changed)
+            for label, enabled in (("cold", False), ("revision", True)):
+                aws = FakeAws()
+                runtime_context.set_client_factory(aws.factory)
+                runtime_context.reset()
+                llm_cache.reset()
+                revisions.reset()
+                question_bank.reset()
+                revisions.ENABLED, question_bank.ENABLED = enabled, False
+                _run(aws, stub, "original", original)
+                report[label] = _run(aws, stub, "revised", revised)
+    finally:
+        stub.stop()
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=40)
+    ap.add_argument("--changed", type=int, default=4)
+    ap.add_argument("--llm-latency-ms", type=float, default=400)
+    args = ap.parse_args()
+    print(json.dumps(bench(args.pages, args.changed, args.llm_latency_ms / 1000), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Cold vs warm invocation latency of the read handlers against stubbed AWS clients.
+
+Usage: python benchmarks/bench_runtime_context.py [--n 200] [--latency-ms 15]
+"""
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+
+from fakes import BUCKET, DEFAULT_PARAMS, FakeAws
+
+import runtime_context
+import get_json_link_lambda
+import get_pdf_link_lambda
+
+
+def _run(handler, aws: FakeAws, n: int, cold: bool):
+    event = {"pathParameters": {"jobId": "job-1"}}
+    samples = []
+    for _ in range(n):
+        if cold:
+            runtime_context.reset()
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            handler(event, None)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200)
+    ap.add_argument("--latency-ms", type=float, default=15.0)
+    ap.add_argument("--client-init-ms", type=float, default=40.0)
+    args = ap.parse_args()
+
+    out_prefix = DEFAULT_PARAMS["/ai-quiz/gen-quiz/quiz-output-folder"].split(BUCKET + "/", 1)[1]
+    report = {}
+    for name, handler in (("get_json_link", get_json_link_lambda.lambda_handler),
+                          ("get_pdf_link", get_pdf_link_lambda.lambda_handler)):
+        for mode in ("cold", "warm"):
+            aws = FakeAws(args.latency_ms / 1000, args.client_init_ms / 1000)
+            aws.clients["s3"].put_object(Bucket=BUCKET, Key=f"{out_prefix}job-1/quiz.json", Body=b'{"title":"t","questions":[]}')
+            aws.clients["s3"].put_object(Bucket=BUCKET, Key=f"{out_prefix}job-1/quiz.pdf", Body=b"%PDF")
+            aws.clients["s3"].calls.clear()
+            runtime_context.set_client_factory(aws.factory)
+            runtime_context.reset()
+            samples = _run(handler, aws, args.n, cold=(mode == "cold"))
+            report[f"{name}.{mode}"] = {
+                "p50_ms": round(statistics.median(samples), 2),
+                "p99_ms": round(sorted(samples)[int(len(samples) * 0.99) - 1], 2),
+                "aws_calls_per_invocation": round(aws.total_calls() / args.n, 2),
+                "clients_created": aws.created,
+            }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Fair-share scheduling: one bulk uploader vs a few single-file uploaders on one model quota.
+
+A simulated model admits --quota concurrent calls and answers 429 to the
+rest; each job makes ``cost`` calls of --call-ms (up to QUIZ_MAP_CONCURRENCY
+at once, like map-reduce), retrying a 429 with backoff like gemini_client
+(--client-retries). Two runs over the same
+arrivals, --bulk jobs from one uploader at t=0 and --others uploaders with
+--per-other jobs each shortly after:
+
+  direct     the old path: every extraction event starts its generation at
+             once (Lambda scales out), a failed attempt is redelivered after
+             --redeliver-ms like Lambda's async retries
+  scheduled  events go through generation_scheduler (queue object in the fake
+             S3, conditional writes); FakeLambda invokes run the job on a
+             thread pool and report back with finish()
+
+Reported per run: 429s, jobs that never finished, completion time (arrival to done) for the small
+uploaders and for the bulk one, and for the scheduled run how close the
+QUEUED record's estimated start was to the actual dispatch.
+
+The scheduler's cap (SCHED_MAX_IN_FLIGHT, default here 12) is set above the
+real quota on purpose, so the AIMD back-off has something to do.
+
+Usage: SCHED_MAX_IN_FLIGHT=12 python benchmarks/bench_scheduler.py [--bulk 120] [--others 10] [--quota 8] [--call-ms 50]
+"""
+import os
+
+os.environ.setdefault("SCHED_MAX_IN_FLIGHT", "12")
+os.environ.setdefault("SCHED_CALL_SEC", "0.05")
+os.environ.setdefault("SCHED_RETRY_DELAYS_SEC", "0.2,0.4")
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fakes import FakeAws
+
+import generation_scheduler
+import job_status
+import quiz_mapreduce
+import runtime_context
+
+
+class Model:
+    """--quota concurrent calls; the rest get 429."""
+
+    def __init__(self, quota: int, call_sec: float):
+        self.quota = quota
+        self.call_sec = call_sec
+        self.active = 0
+        self.throttled = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def call(self) -> bool:
+        with self._lock:
+            if self.active >= self.quota:
+                self.throttled += 1
+                return False
+            self.active += 1
+            self.calls += 1
+        time.sleep(self.call_sec)
+        with self._lock:
+            self.active -= 1
+        return True
+
+
+def _call(model: Model, retries: int, seed: int) -> bool:
+    rng = random.Random(seed)
+    for attempt in range(retries + 1):
+        if model.call():
+            return True
+        if attempt < retries:
+            time.sleep(min(1.0, 0.02 * 2 ** attempt) * (0.5 + rng.random()))
+    return False
+
+
+def _run_job(model: Model, cost: int, retries: int, rng: random.Random) -> bool:
+    """One generation attempt: ``cost`` calls, each retried on 429 with exponential backoff."""
+    with ThreadPoolExecutor(max_workers=min(cost, quiz_mapreduce.MAP_CONCURRENCY)) as pool:
+        return all(pool.map(lambda seed: _call(model, retries, seed), [rng.random() for _ in range(cost)]))
+
+
+def _arrivals(args) -> list:
+    """(offset sec, detail) in arrival order."""
+    rng = random.Random(3)
+    chunk_chars = quiz_mapreduce.CHUNK_TOKENS * quiz_mapreduce.CHARS_PER_TOKEN
+    out = [(0.0, {"jobId": f"bulk-{i:04d}", "uploader": "bulk", "chars": rng.randint(1, 4) * chunk_chars - 100})
+           for i in range(args.bulk)]
+    for u in range(args.others):
+        for j in range(args.per_other):
+            out.append((0.1 + 0.05 * u, {"jobId": f"u{u:02d}-{j}", "uploader": f"user-{u:02d}",
+                                         "chars": chunk_chars - 100}))
+    return out
+
+
+def _summary(arrivals: list, t0: float, done: dict, model: Model) -> dict:
+    small = [done[d["jobId"]] - (t0 + off) for off, d in arrivals if d["uploader"] != "bulk" and d["jobId"] in done]
+    bulk = [done[d["jobId"]] - (t0 + off) for off, d in arrivals if d["uploader"] == "bulk" and d["jobId"] in done]
+    small.sort()
+    return {"completed": len(done), "failed": len(arrivals) - len(done), "model_calls": model.calls,
+            "throttled_429": model.throttled,
+            "small_p50_s": round(statistics.median(small), 2),
+            "small_p95_s": round(small[int(0.95 * (len(small) - 1))], 2),
+            "small_max_s": round(small[-1], 2), "bulk_makespan_s": round(max(bulk), 2)}
+
+
+def direct(args, arrivals: list) -> dict:
+    model = Model(args.quota, args.call_ms / 1000)
+    done, lock = {}, threading.Lock()
+    t0 = time.monotonic()
+
+    def one(off, detail, seed):
+        rng = random.Random(seed)
+        time.sleep(max(0.0, t0 + off - time.monotonic()))
+        for attempt in range(3):  # first delivery + Lambda's two async retries
+            if _run_job(model, generation_scheduler.cost_of(detail), args.client_retries, rng):
+                with lock:
+                    done[detail["jobId"]] = time.monotonic()
+                return
+            if attempt < 2:
+                time.sleep(args.redeliver_ms / 1000)
+
+    threads = [threading.Thread(target=one, args=(off, d, i)) for i, (off, d) in enumerate(arrivals)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return _summary(arrivals, t0, done, model)
+
+
+def scheduled(args, arrivals: list) -> dict:
+    aws = FakeAws()
+    runtime_context.set_client_factory(aws.factory)
+    runtime_context.reset()
+    job_status.set_store(None)
+    generation_scheduler.set_store(None)
+    model = Model(args.quota, args.call_ms / 1000)
+    pool = ThreadPoolExecutor(max_workers=64)
+    done, started, estimates, lock = {}, {}, {}, threading.Lock()
+    all_done = threading.Event()
+    rng = random.Random(5)
+
+    def work(event):
+        ticket = event["detail"]["ticket"]
+        with lock:
+            started[ticket["jobId"]] = time.time()
+        t = time.perf_counter()
+        ok = _run_job(model, generation_scheduler.cost_of(event["detail"]), args.client_retries, rng)
+        generation_scheduler.finish(ticket, generation_scheduler.DONE if ok else generation_scheduler.THROTTLED,
+                                    time.perf_counter() - t)
+        if ok:
+            with lock:
+                done[ticket["jobId"]] = time.monotonic()
+                if len(done) == len(arrivals):
+                    all_done.set()
+
+    aws.clients["lambda"].handler = lambda event: pool.submit(work, event)
+    stop = threading.Event()
+
+    def ticker():
+        while not stop.wait(0.05):
+            generation_scheduler.tick()
+
+    threading.Thread(target=ticker, daemon=True).start()
+    t0 = time.monotonic()
+    i = 0
+    while i < len(arrivals):
+        # SQS batches of up to 10 events, handled one batch at a time
+        time.sleep(max(0.0, t0 + arrivals[i][0] - time.monotonic()))
+        batch = [d for off, d in arrivals[i:i + 10] if t0 + off <= time.monotonic() + 1e-3] or [arrivals[i][1]]
+        generation_scheduler.submit(batch)
+        for d in batch:
+            record, _ = job_status.store().get(d["jobId"])
+            if record and record.get("queue"):
+                estimates[d["jobId"]] = record["queue"]["startAt"]
+        i += len(batch)
+    all_done.wait(300)
+    stop.set()
+    pool.shutdown()
+    out = _summary(arrivals, t0, done, model)
+    errors = [abs(started[j] - estimates[j]) for j in estimates if j in started]
+    out.update(estimate_abs_err_p50_s=round(statistics.median(errors), 2),
+               queue_writes=aws.clients["s3"].calls.get("put_object", 0),
+               snapshot=generation_scheduler.snapshot())
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bulk", type=int, default=120)
+    ap.add_argument("--others", type=int, default=10)
+    ap.add_argument("--per-other", type=int, default=1)
+    ap.add_argument("--quota", type=int, default=8)
+    ap.add_argument("--call-ms", type=float, default=50)
+    ap.add_argument("--client-retries", type=int, default=3)
+    ap.add_argument("--redeliver-ms", type=float, default=200)
+    args = ap.parse_args()
+
+    arrivals = _arrivals(args)
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = {"jobs": len(arrivals), "cap": generation_scheduler.MAX_IN_FLIGHT,
+                  "direct": direct(args, arrivals), "scheduled": scheduled(args, arrivals)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
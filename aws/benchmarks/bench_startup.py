@@ -0,0 +1,80 @@
+"""Cold import time per handler module, measured in fresh interpreters.
+
+Every sample is a new ``python`` process, so nothing is cached in
+sys.modules. "eager" preloads the dependencies a handler used to import at
+module load (PyMuPDF for the extractor; reportlab and asyncio for the
+generator) to show what lazy loading saves. For the read lambdas the first
+invocation (a 404 poll against the in-memory fakes) is timed too; that is
+what users feel on their first poll.
+
+Usage: python benchmarks/bench_startup.py [--runs 15]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from fakes import AWS_DIR
+
+HANDLERS = ("pdf_extractor", "gemini_quiz", "get_json_link_lambda", "get_pdf_link_lambda")
+READ_HANDLERS = ("get_json_link_lambda", "get_pdf_link_lambda")
+EAGER = {
+    "pdf_extractor": ("fitz",),
+    "gemini_quiz": ("reportlab.pdfgen.canvas", "reportlab.pdfbase.pdfmetrics", "asyncio"),
+}
+HEAVY = ("boto3", "fitz", "reportlab", "asyncio", "multiprocessing")
+
+_PROBE = r"""
+import json, sys, time, io, contextlib
+eager = {eager!r}
+t0 = time.perf_counter()
+for m in eager:
+    __import__(m)
+import {module} as handler
+import_ms = (time.perf_counter() - t0) * 1000
+out = {{"import_ms": import_ms, "loaded": [m for m in {heavy!r} if m in sys.modules]}}
+if {first_call!r}:
+    sys.path.insert(0, "benchmarks")
+    import fakes, runtime_context
+    runtime_context.set_client_factory(fakes.FakeAws().factory)
+    t1 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        handler.lambda_handler({{"pathParameters": {{"jobId": "cold-job"}}}}, None)
+    out["first_call_ms"] = (time.perf_counter() - t1) * 1000
+print(json.dumps(out))
+"""
+
+
+def _sample(module: str, eager: bool) -> dict:
+    code = _PROBE.format(module=module, eager=EAGER[module] if eager else (), heavy=HEAVY,
+                         first_call=module in READ_HANDLERS and not eager)
+    out = subprocess.run([sys.executable, "-c", code], cwd=AWS_DIR, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _stats(values):
+    values = sorted(values)
+    return {"p50": round(statistics.median(values), 1), "p90": round(values[int(0.9 * (len(values) - 1))], 1)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=15)
+    args = ap.parse_args()
+    report = {}
+    for module in HANDLERS:
+        lazy = [_sample(module, False) for _ in range(args.runs)]
+        entry = {"import_ms": _stats([s["import_ms"] for s in lazy]), "loaded_at_import": lazy[0]["loaded"]}
+        if module in EAGER:
+            eager = [_sample(module, True) for _ in range(args.runs)]
+            entry["eager_import_ms"] = _stats([s["import_ms"] for s in eager])
+            entry["saved_ms_p50"] = round(entry["eager_import_ms"]["p50"] - entry["import_ms"]["p50"], 1)
+        if "first_call_ms" in lazy[0]:
+            entry["first_call_ms"] = _stats([s["first_call_ms"] for s in lazy])
+        report[module] = entry
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Several quizzes from one extraction: repeated gemini_quiz runs vs one quiz_variants_lambda call.
+
+Before the variants API, every extra quiz meant another full gemini_quiz run
+(forced regeneration), each reading data.txt again and calling the model on
+its own. The variants handler reads the text once and sends all variant
+prompts together. Both run in-process against the AWS fakes and StubGemini.
+
+Usage: python benchmarks/bench_variants.py [--variants 5] [--llm-latency-ms 400] [--rounds 3]
+"""
+import os
+
+os.environ.setdefault("GEMINI_RATE_PER_SEC", "100")
+os.environ.setdefault("GEMINI_BURST", "20")
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import statistics
+import time
+
+from fakes import BUCKET, DEFAULT_PARAMS, FakeAws
+from corpus import paragraph
+from stub_gemini import StubGemini
+
+import gemini_client
+import gemini_quiz
+import quiz_variants_lambda
+import runtime_context
+
+SPECS = [
+    {"count": 10, "difficulty": "easy"},
+    {"count": 10, "difficulty": "hard"},
+    {"count": 15, "difficulty": "mixed"},
+    {"count": 10, "difficulty": "medium", "focus": "encryption and access policies"},
+    {"count": 10, "difficulty": "medium", "language": "Vietnamese"},
+    {"count": 5, "difficulty": "hard", "focus": "scaling"},
+    {"count": 20, "difficulty": "easy"},
+    {"count": 10, "difficulty": "mixed", "language": "French"},
+]
+
+
+def _setup(aws_latency: float, job_id: str) -> FakeAws:
+    aws = FakeAws(aws_latency)
+    runtime_context.set_client_factory(aws.factory)
+    runtime_context.reset()
+    rng = random.Random(3)
+    text = "\n\n".join(paragraph(rng) for _ in range(40))
+    prefix = DEFAULT_PARAMS["/ai-quiz/pdf-extract/text-output-folder"].split(BUCKET + "/", 1)[1]
+    aws.clients["s3"].put_object(Bucket=BUCKET, Key=f"{prefix}{job_id}/data.txt", Body=text)
+    return aws
+
+
+def _repeated(n: int, job_id: str):
+    for _ in range(n):
+        resp = gemini_quiz.lambda_handler({"job_id": job_id, "force_regenerate": True}, None)
+        assert resp["statusCode"] == 200, resp
+
+
+def _variants(n: int, job_id: str):
+    resp = quiz_variants_lambda.lambda_handler(
+        {"pathParameters": {"jobId": job_id}, "body": json.dumps({"variants": SPECS[:n], "force_regenerate": True})},
+        None)
+    body = json.loads(resp["body"])
+    assert resp["statusCode"] == 200 and all(v["status"] == "created" for v in body["variants"]), body
+
+
+def _measure(fn, n: int, rounds: int, aws_latency: float) -> dict:
+    samples, reads = [], 0
+    for r in range(rounds):
+        aws = _setup(aws_latency, f"bench-variants-{r}")
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn(n, f"bench-variants-{r}")
+        samples.append(time.perf_counter() - t0)
+        reads = aws.clients["s3"].calls.get("get_object", 0)
+    wall = statistics.median(samples)
+    return {"wall_ms_p50": round(wall * 1000, 1), "quizzes_per_sec": round(n / wall, 2), "s3_get_object": reads}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--variants", type=int, default=5)
+    ap.add_argument("--llm-latency-ms", type=float, default=400)
+    ap.add_argument("--aws-latency-ms", type=float, default=5)
+    ap.add_argument("--rounds", type=int, default=3)
+    args = ap.parse_args()
+    n = max(1, min(args.variants, len(SPECS)))
+
+    stub = StubGemini(latency=args.llm_latency_ms / 1000).start()
+    gemini_client.DEFAULT_BASE_URL = stub.base_url
+    try:
+        before = _measure(_repeated, n, args.rounds, args.aws_latency_ms / 1000)
+        after = _measure(_variants, n, args.rounds, args.aws_latency_ms / 1000)
+    finally:
+        stub.stop()
+    report = {
+        "variants": n,
+        "repeated_gemini_quiz": before,
+        "variants_api": after,
+        "throughput_x": round(after["quizzes_per_sec"] / before["quizzes_per_sec"], 2),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
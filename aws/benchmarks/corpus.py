@@ -0,0 +1,48 @@
+"""Deterministic synthetic PDF corpus for the benchmarks.
+
+Documents are built from a fixed vocabulary with a seeded RNG, so the same
+(seed, pages) always produces the same bytes and therefore the same jobId.
+
+    docs = make_corpus("/tmp/corpus", [1, 5, 20, 80], seed=1)
+"""
+import os
+import random
+from typing import List, Tuple
+
+import fitz  # PyMuPDF
+
+VOCAB = ("lambda function bucket object event bridge queue message retry timeout memory region "
+         "encryption policy role token latency throughput partition index cache replica quota "
+         "network subnet gateway endpoint certificate deployment container image layer runtime "
+         "invocation concurrency scaling storage archive lifecycle version snapshot").split()
+
+
+def paragraph(rng: random.Random, sentences: int = 5) -> str:
+    out = []
+    for _ in range(sentences):
+        words = [rng.choice(VOCAB) for _ in range(rng.randint(8, 18))]
+        out.append(" ".join(words).capitalize() + ".")
+    return " ".join(out)
+
+
+def make_document(path: str, pages: int, seed: int = 0, paragraphs_per_page: int = 6):
+    rng = random.Random(f"{seed}:{pages}")
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        body = f"Chapter {i + 1}\n\n" + "\n\n".join(paragraph(rng) for _ in range(paragraphs_per_page))
+        page.insert_textbox(fitz.Rect(36, 36, 560, 806), body, fontsize=9)
+    doc.set_metadata({})  # no creation/modification dates, so the bytes are reproducible
+    doc.save(path, garbage=0, deflate=False, no_new_id=True)
+    doc.close()
+
+
+def make_corpus(directory: str, page_counts: List[int], seed: int = 0) -> List[Tuple[str, int]]:
+    """One PDF per entry of ``page_counts`` (repeats give distinct documents); returns (path, pages)."""
+    os.makedirs(directory, exist_ok=True)
+    docs = []
+    for i, pages in enumerate(page_counts):
+        path = os.path.join(directory, f"doc-{i:03d}-{pages}p.pdf")
+        make_document(path, pages, seed=seed * 1000 + i)
+        docs.append((path, pages))
+    return docs
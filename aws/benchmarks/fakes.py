@@ -0,0 +1,229 @@
+"""In-memory stand-ins for the AWS clients used by the Lambda handlers.
+
+Every call sleeps for ``latency`` seconds to approximate a network round trip,
+so benchmarks can compare code paths by how many calls they make.
+"""
+import io
+import hashlib
+import os
+import sys
+import time
+import threading
+import json
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+AWS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if AWS_DIR not in sys.path:
+    sys.path.insert(0, AWS_DIR)
+
+
+def _client_error(code: str, op: str):
+    return ClientError({"Error": {"Code": code, "Message": code}}, op)
+
+
+def _etag(body: bytes) -> str:
+    # what S3 reports for a single-part PUT
+    return '"' + hashlib.md5(body).hexdigest() + '"'
+
+
+class _Meta:
+    region_name = "us-east-2"
+
+
+class _Fake:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = {}
+        self.meta = _Meta()
+        self._calls_lock = threading.Lock()
+
+    def _call(self, op: str):
+        with self._calls_lock:
+            self.calls[op] = self.calls.get(op, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class FakeS3(_Fake):
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        self.objects = {}
+        self._objects_lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body=b"", IfMatch=None, IfNoneMatch=None, **kw):
+        self._call("put_object")
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        elif not isinstance(Body, (bytes, bytearray)):
+            Body = Body.read()
+        with self._objects_lock:
+            # conditional writes as S3 does them: 412 when the precondition does not hold
+            cur = self.objects.get((Bucket, Key))
+            if IfNoneMatch == "*" and cur is not None:
+                raise _client_error("PreconditionFailed", "PutObject")
+            if IfMatch is not None and (cur is None or _etag(cur["Body"]) != IfMatch):
+                raise _client_error("PreconditionFailed", "PutObject")
+            self.objects[(Bucket, Key)] = {"Body": bytes(Body), "Meta": kw, "Tags": [], "Modified": time.time()}
+        return {"ETag": _etag(bytes(Body))}
+
+    def get_object(self, Bucket, Key, **kw):
+        self._call("get_object")
+        obj = self.objects.get((Bucket, Key))
+        if obj is None:
+            raise _client_error("NoSuchKey", "GetObject")
+        out = {
+            "Body": io.BytesIO(obj["Body"]),
+            "ContentLength": len(obj["Body"]),
+            "ETag": _etag(obj["Body"]),
+            "ContentType": obj["Meta"].get("ContentType", "binary/octet-stream"),
+            "Metadata": obj["Meta"].get("Metadata", {}),
+        }
+        if "ContentEncoding" in obj["Meta"]:
+            out["ContentEncoding"] = obj["Meta"]["ContentEncoding"]
+        return out
+
+    def head_object(self, Bucket, Key, **kw):
+        self._call("head_object")
+        obj = self.objects.get((Bucket, Key))
+        if obj is None:
+            raise _client_error("404", "HeadObject")
+        return {"ContentLength": len(obj["Body"]), "ETag": _etag(obj["Body"]), "Metadata": obj["Meta"].get("Metadata", {})}
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
+        # Signing is local in botocore, so no _call() latency here either.
+        query = "&".join(f"{k}={v}" for k, v in sorted(Params.items()) if k not in ("Bucket", "Key"))
+        return (f"https://{Params['Bucket']}.s3.fake.amazonaws.com/{Params['Key']}"
+                f"?X-Amz-Expires={ExpiresIn}&X-Amz-Signature=fake" + (f"&{query}" if query else ""))
+
+    def download_file(self, Bucket, Key, Filename):
+        body = self.get_object(Bucket=Bucket, Key=Key)["Body"].read()
+        with open(Filename, "wb") as f:
+            f.write(body)
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None):
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj.read(), **(ExtraArgs or {}))
+
+    def delete_object(self, Bucket, Key):
+        self._call("delete_object")
+        with self._objects_lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None, StartAfter=None, MaxKeys=1000):
+        self._call("list_objects_v2")
+        with self._objects_lock:
+            keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix))
+            after = ContinuationToken or StartAfter
+            if after:
+                keys = [k for k in keys if k > after]
+            page = keys[:MaxKeys]
+            contents = [{"Key": k, "Size": len(self.objects[(Bucket, k)]["Body"]),
+                         "ETag": _etag(self.objects[(Bucket, k)]["Body"]),
+                         "LastModified": datetime.fromtimestamp(self.objects[(Bucket, k)]["Modified"], timezone.utc)}
+                        for k in page]
+        out = {"Contents": contents, "KeyCount": len(page), "IsTruncated": len(keys) > len(page)}
+        if out["IsTruncated"]:
+            out["NextContinuationToken"] = page[-1]
+        return out
+
+    def put_object_tagging(self, Bucket, Key, Tagging):
+        self._call("put_object_tagging")
+        if (Bucket, Key) in self.objects:
+            self.objects[(Bucket, Key)]["Tags"] = Tagging["TagSet"]
+        return {}
+
+
+class FakeSSM(_Fake):
+    def __init__(self, params: dict, latency: float = 0.0):
+        super().__init__(latency)
+        self.params = dict(params)
+
+    def get_parameter(self, Name, WithDecryption=False):
+        self._call("get_parameter")
+        if Name not in self.params:
+            raise _client_error("ParameterNotFound", "GetParameter")
+        return {"Parameter": {"Name": Name, "Value": self.params[Name]}}
+
+    def get_parameters_by_path(self, Path, Recursive=False, WithDecryption=False, NextToken=None):
+        self._call("get_parameters_by_path")
+        root = Path.rstrip("/") + "/"
+        found = [{"Name": k, "Value": v} for k, v in sorted(self.params.items()) if k.startswith(root)]
+        return {"Parameters": found}
+
+
+class FakeSecrets(_Fake):
+    def __init__(self, secrets: dict, latency: float = 0.0):
+        super().__init__(latency)
+        self.secrets = dict(secrets)
+
+    def get_secret_value(self, SecretId):
+        self._call("get_secret_value")
+        return {"SecretString": json.dumps(self.secrets[SecretId])}
+
+
+class FakeEvents(_Fake):
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        self.entries = []
+
+    def put_events(self, Entries):
+        self._call("put_events")
+        if len(Entries) > 10:
+            raise _client_error("ValidationException", "PutEvents")
+        self.entries.extend(Entries)
+        return {"FailedEntryCount": 0, "Entries": [{"EventId": str(len(self.entries) - i)} for i in range(len(Entries))]}
+
+
+class FakeLambda(_Fake):
+    """Invokes are recorded and, if a ``handler`` is set, handed to it (the caller decides how it runs)."""
+
+    def __init__(self, latency: float = 0.0, handler=None):
+        super().__init__(latency)
+        self.handler = handler
+        self.invocations = []
+
+    def invoke(self, FunctionName, Payload=b"", InvocationType="RequestResponse", **kw):
+        self._call("invoke")
+        event = json.loads(Payload or b"{}")
+        self.invocations.append((FunctionName, event))
+        if self.handler is not None:
+            self.handler(event)
+        return {"StatusCode": 202 if InvocationType == "Event" else 200}
+
+
+BUCKET = "quiz-ai-bucket"
+
+DEFAULT_PARAMS = {
+    "/ai-quiz/gen-quiz/gemini-model": "gemini-2.5-flash",
+    "/ai-quiz/pdf-extract/input-folder": f"s3://{BUCKET}/ai-quiz/pdf-extract/input-folder/",
+    "/ai-quiz/pdf-extract/text-output-folder": f"s3://{BUCKET}/ai-quiz/pdf-extract/text-output-folder/",
+    "/ai-quiz/gen-quiz/quiz-output-folder": f"s3://{BUCKET}/ai-quiz/gen-quiz/quiz-output-folder/",
+}
+
+DEFAULT_SECRETS = {"/ai-quiz/gen-quiz/gemini-api-key": {"apiKey": "fake-key"}}
+
+
+class FakeAws:
+    """One set of fake clients, plus a factory compatible with ``boto3.client``."""
+
+    def __init__(self, latency: float = 0.0, client_init_latency: float = 0.0):
+        self.client_init_latency = client_init_latency
+        self.clients = {
+            "s3": FakeS3(latency),
+            "ssm": FakeSSM(DEFAULT_PARAMS, latency),
+            "secretsmanager": FakeSecrets(DEFAULT_SECRETS, latency),
+            "events": FakeEvents(latency),
+            "lambda": FakeLambda(latency),
+        }
+        self.created = 0
+
+    def factory(self, service: str, *args, **kwargs):
+        self.created += 1
+        if self.client_init_latency:
+            time.sleep(self.client_init_latency)
+        return self.clients[service]
+
+    def total_calls(self) -> int:
+        return sum(sum(c.calls.values()) for c in self.clients.values())
@@ -0,0 +1,120 @@
+"""A local stand-in for the Gemini generateContent / streamGenerateContent REST endpoints.
+
+Responses are deterministic. Latency, error injection (429/503) and slow
+tail requests are configurable, so client behaviour can be exercised
+without network access:
+
+    server = StubGemini(latency=0.02, error_rate=0.1).start()
+    client = GeminiClient("k", "m", base_url=server.base_url)
+"""
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_quiz(prompt: str, n: int = 10) -> dict:
+    m = re.search(r"exactly (\d+) multiple", prompt)
+    n = int(m.group(1)) if m else n
+    seed = zlib.crc32(prompt.encode("utf-8")) % 10_000  # stable across processes, unlike hash()
+    return {
+        "title": "Quiz from the document",
+        "questions": [
+            {
+                "question": f"Question {seed}-{i}: which option is correct?",
+                "options": [f"opt {i}a", f"opt {i}b", f"opt {i}c", f"opt {i}d"],
+                "correctAnswer": f"opt {i}a",
+                "explanation": "Because the source says so.",
+            }
+            for i in range(n)
+        ],
+    }
+
+
+class StubGemini:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, error_status: int = 429,
+                 slow_rate: float = 0.0, slow_latency: float = 1.0, responder=None, seed: int = 7,
+                 stream_piece: int = 64, stream_delay: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.responder = responder or (lambda prompt: json.dumps(fake_quiz(prompt)))
+        self.rng = random.Random(seed)
+        self.stream_piece = stream_piece
+        self.stream_delay = stream_delay
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with stub._lock:
+                    stub.requests += 1
+                    roll, slow = stub.rng.random(), stub.rng.random()
+                time.sleep(stub.slow_latency if slow < stub.slow_rate else stub.latency)
+                if roll < stub.error_rate:
+                    out, status = json.dumps({"error": {"code": stub.error_status}}).encode(), stub.error_status
+                else:
+                    prompt = body["contents"][0]["parts"][0]["text"]
+                    text = stub.responder(prompt)
+                    if ":streamGenerateContent" in self.path:
+                        return self._stream(text)
+                    out = json.dumps({"candidates": [{"content": {"parts": [{"text": text}]}}]}).encode()
+                    status = 200
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(out)
+
+            def _stream(self, text: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i in range(0, len(text), stub.stream_piece):
+                    event = {"candidates": [{"content": {"parts": [{"text": text[i:i + stub.stream_piece]}]}}]}
+                    data = b"data: " + json.dumps(event).encode() + b"\r\n\r\n"
+                    self.wfile.write(b"%X\r\n%s\r\n" % (len(data), data))
+                    if stub.stream_delay:
+                        time.sleep(stub.stream_delay)
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+    def start(self) -> "StubGemini":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1beta"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,70 @@
+import os
+import json
+from datetime import datetime, timezone
+from typing import Optional
+
+from botocore.exceptions import ClientError
+
+import telemetry
+
+# ---------- content-addressed dedup ----------
+# Job IDs are content hashes, so an existing manifest.json / quiz.json under a
+# job prefix means the work was already done for identical bytes.
+
+MANIFEST_NAME = "manifest.json"
+FORCE_ENV = "DEDUP_FORCE"
+_TRUTHY = ("1", "true", "yes", "on")
+
+# Per-container counters keyed by (stage, outcome); every decision is also
+# emitted as an EMF metric line.
+STATS = {}
+
+
+def is_forced(*flags) -> bool:
+    values = (os.getenv(FORCE_ENV, ""),) + flags
+    return any(str(v).strip().lower() in _TRUTHY for v in values if v is not None)
+
+
+def object_exists(s3, bucket: str, key: str) -> bool:
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+def read_manifest(s3, bucket: str, job_prefix: str) -> Optional[dict]:
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=f"{job_prefix}{MANIFEST_NAME}")
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return json.loads(obj["Body"].read().decode("utf-8"))
+
+
+def write_manifest(s3, bucket: str, job_prefix: str, manifest: dict) -> dict:
+    manifest = dict(manifest, updatedAt=datetime.now(timezone.utc).isoformat())
+    s3.put_object(
+        Bucket=bucket,
+        Key=f"{job_prefix}{MANIFEST_NAME}",
+        Body=json.dumps(manifest, ensure_ascii=False).encode("utf-8"),
+        ContentType="application/json",
+    )
+    return manifest
+
+
+def stats() -> dict:
+    """The counters as ``{stage: {outcome: n}}``."""
+    out = {}
+    for (stage, outcome), n in sorted(STATS.items()):
+        out.setdefault(stage, {})[outcome] = n
+    return out
+
+
+def record(stage: str, outcome: str, job_id: str):
+    """Count a dedup decision (outcome: hit | miss | forced) and log it as a CloudWatch EMF metric."""
+    STATS[(stage, outcome)] = STATS.get((stage, outcome), 0) + 1
+    telemetry.emit_metrics({"Dedup": 1}, {"Dedup": "Count"}, {"Stage": stage, "Outcome": outcome}, jobId=job_id)
@@ -0,0 +1,52 @@
+import os
+from typing import Optional
+
+# ---------- quiz delivery ----------
+# Quiz artifacts live under content-hash job IDs, but a forced regeneration
+# rewrites the same quiz.json / quiz.pdf / variant keys. So they are cached
+# only briefly and then revalidated against their ETag, which is cheap (a 304
+# with no body) and never serves a replaced quiz for longer than
+# QUIZ_CACHE_MAX_AGE_SEC. Objects are handed out as presigned GET URLs (signed
+# locally by botocore, no S3 round trip) or, for quiz.json, as the stored
+# bytes passed straight through.
+
+URL_EXPIRES_SEC = int(os.getenv("QUIZ_URL_EXPIRES_SEC", "3600"))
+CACHE_MAX_AGE_SEC = int(os.getenv("QUIZ_CACHE_MAX_AGE_SEC", "60"))
+JSON_DELIVERY = os.getenv("QUIZ_JSON_DELIVERY", "raw").strip().lower()  # raw | url
+
+REVALIDATE = f"public, max-age={CACHE_MAX_AGE_SEC}, must-revalidate"
+NO_STORE = "no-store"
+
+
+def link_cache_control(expires_in: int = URL_EXPIRES_SEC) -> str:
+    """For responses that carry a presigned URL: cacheable for well under the URL's lifetime."""
+    return f"private, max-age={max(0, expires_in // 2)}"
+
+
+def presigned_get(s3, bucket: str, key: str, expires_in: int = URL_EXPIRES_SEC,
+                  content_type: Optional[str] = None, filename: Optional[str] = None) -> str:
+    # Signed with the function's role credentials: the URL stops working when
+    # either expires_in passes or the role session does, whichever is first.
+    params = {"Bucket": bucket, "Key": key}
+    if content_type:
+        params["ResponseContentType"] = content_type
+    if filename:
+        params["ResponseContentDisposition"] = f'inline; filename="{filename}"'
+    return s3.generate_presigned_url("get_object", Params=params, ExpiresIn=expires_in)
+
+
+def mode(event: dict) -> str:
+    """``?delivery=url|raw`` overrides QUIZ_JSON_DELIVERY for one request."""
+    query = (event or {}).get("queryStringParameters") or {}
+    m = str(query.get("delivery") or JSON_DELIVERY).lower()
+    return m if m in ("raw", "url") else "raw"
+
+
+def expires_in(event: dict) -> int:
+    """``?expires=N`` asks for a shorter-lived URL; never longer than URL_EXPIRES_SEC."""
+    query = (event or {}).get("queryStringParameters") or {}
+    try:
+        n = int(query.get("expires") or URL_EXPIRES_SEC)
+    except ValueError:
+        n = URL_EXPIRES_SEC
+    return max(1, min(n, URL_EXPIRES_SEC))
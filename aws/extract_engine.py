@@ -0,0 +1,319 @@
+import os
+import hashlib
+import tempfile
+from collections import deque
+import concurrent.futures
+from typing import BinaryIO, Callable, Collection, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import telemetry
+
+# ---------- streaming, page-parallel PDF text extraction ----------
+# Pages are split into ranges and extracted by a process pool that lives for
+# the lifetime of the container. Results come back in page order and are
+# yielded one page at a time, so callers never hold the whole document text.
+
+log = telemetry.get_logger("extract_engine")
+
+MAX_PAGES = int(os.getenv("EXTRACT_MAX_PAGES", "2000"))
+MAX_BYTES = int(os.getenv("EXTRACT_MAX_BYTES", str(20 * 1024 * 1024)))
+WORKERS = int(os.getenv("EXTRACT_WORKERS", "0"))  # 0 = one per CPU
+PAGES_PER_TASK = int(os.getenv("EXTRACT_PAGES_PER_TASK", "16"))
+PAGE_SEPARATOR = "\n"
+
+Source = Union[str, bytes]
+
+_pool = None
+_pool_workers = 0
+_pool_broken = False
+_pool_shared = False
+_fitz = None
+
+
+def _open(source: Source):
+    # PyMuPDF costs ~100 ms to import; load it on the first document instead of
+    # at cold start, which dedup hits and skipped objects never need.
+    global _fitz
+    if _fitz is None:
+        import fitz  # PyMuPDF
+        _fitz = fitz
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return _fitz.open(stream=source, filetype="pdf")
+    return _fitz.open(source)
+
+
+def _extract_pages(source: Source, pages: Sequence[int]) -> List[str]:
+    doc = _open(source)
+    try:
+        return [doc[i].get_text() for i in pages]
+    finally:
+        doc.close()
+
+
+def _extract_shared(ref: Tuple[str, int], pages: Sequence[int]) -> List[str]:
+    # an in-memory document, handed over as (shared memory block name, size)
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=ref[0])
+    try:
+        data = bytes(shm.buf[:ref[1]])
+    finally:
+        shm.close()
+    return _extract_pages(data, pages)
+
+
+def _share(data):
+    """A shared memory block holding ``data``; the caller closes and unlinks it."""
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(create=True, size=len(data))
+    shm.buf[:len(data)] = data
+    return shm
+
+
+def page_groups(pages: Sequence[int], per_task: int = PAGES_PER_TASK) -> List[Sequence[int]]:
+    per_task = max(1, per_task)
+    return [pages[i:i + per_task] for i in range(0, len(pages), per_task)]
+
+
+def _resource_digest(doc, xref: int, seen: Dict[int, bytes]) -> bytes:
+    # streams only, not object numbers, which a re-export is free to renumber
+    if xref not in seen:
+        raw = doc.xref_stream_raw(xref) if xref > 0 and doc.xref_is_stream(xref) else b""
+        seen[xref] = hashlib.blake2b(raw or b"", digest_size=16).digest()
+    return seen[xref]
+
+
+def _page_signature(doc, page, seen: Dict[int, bytes]) -> str:
+    h = hashlib.blake2b(page.read_contents(), digest_size=8)
+    # A page drawn from form XObjects (e.g. pages placed with show_pdf_page) has
+    # a content stream of just "q /Frm Do Q": its text is in the forms, and
+    # which glyphs map to which characters is in its fonts.
+    for xref, *_ in page.get_xobjects():  # nested forms included
+        h.update(b"x" + _resource_digest(doc, xref, seen))
+    for xref, _ext, ftype, basefont, _name, encoding, *_ in page.get_fonts(full=True):
+        h.update(f"f{ftype}/{basefont}/{encoding}".encode("utf-8"))
+        kind, value = doc.xref_get_key(xref, "ToUnicode")
+        if kind == "xref":
+            h.update(_resource_digest(doc, int(value.split()[0]), seen))
+    for image in page.get_images(full=True):
+        h.update(b"i" + _resource_digest(doc, image[0], seen))
+    return h.hexdigest()
+
+
+def page_signatures(source: Source, max_pages: int = MAX_PAGES) -> List[str]:
+    """A hash of each page's raw content stream and the resources it draws, without any text extraction.
+
+    Re-exporting a deck after a small edit leaves the streams of untouched
+    pages byte-identical, so equal signatures mean the page text can be reused.
+    """
+    doc = _open(source)
+    seen = {}  # resources are usually shared across pages: hash each once
+    try:
+        return [_page_signature(doc, doc[i], seen) for i in range(min(doc.page_count, max_pages))]
+    finally:
+        doc.close()
+
+
+def _worker_count(workers: Optional[int]) -> int:
+    n = WORKERS if workers is None else workers
+    return n if n > 0 else (os.cpu_count() or 1)
+
+
+def _get_pool(workers: int):
+    """Reuse one pool per container; None where processes are unavailable (e.g. Lambda without /dev/shm)."""
+    global _pool, _pool_workers, _pool_broken
+    if _pool_shared:
+        return _pool
+    if _pool_broken or workers < 2:
+        return None
+    if _pool is not None and _pool_workers == workers:
+        return _pool
+    try:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        # attribute access, not a top-level import: multiprocessing loads only when a pool is made
+        _pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    except (OSError, NotImplementedError, ImportError) as e:
+        log.warning("process pool unavailable, extracting sequentially: %s", e)
+        _pool, _pool_workers, _pool_broken = None, 0, True
+    return _pool
+
+
+def share_pool(pool, workers: int):
+    """Use a pool owned by the caller (the local server) for every document, however short.
+
+    In a long-running process with many uploads at once, even single-group
+    documents go to the pool so extraction never holds the serving process's GIL.
+    """
+    global _pool, _pool_workers, _pool_shared
+    _pool, _pool_workers, _pool_shared = pool, workers, True
+
+
+def page_count(source: Source) -> int:
+    doc = _open(source)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+
+def iter_pages(source: Source, max_pages: int = MAX_PAGES, workers: Optional[int] = None,
+               total_pages: Optional[int] = None, skip: Collection[int] = ()) -> Iterator[str]:
+    """Yield raw page text in page order for at most ``max_pages`` pages, leaving out ``skip``."""
+    if total_pages is None:
+        total_pages = page_count(source)
+    pages = [i for i in range(min(total_pages, max_pages)) if i not in skip]
+    if not pages:
+        return
+    groups = page_groups(pages)
+    n_workers = _worker_count(workers)
+    pool = _get_pool(n_workers) if len(groups) > 1 or _pool_shared else None
+
+    if pool is None:
+        doc = _open(source)
+        try:
+            for i in pages:
+                yield doc[i].get_text()
+        finally:
+            doc.close()
+        return
+
+    # Submitting an in-memory document itself would pickle all of it for every
+    # group: it is copied into shared memory once and the workers read it from
+    # there. Where shared memory is unavailable it is written to /tmp instead.
+    task, ref, shm, spill = _extract_pages, source, None, None
+    if not isinstance(source, str) and len(groups) > 1:
+        try:
+            shm = _share(source)
+            task, ref = _extract_shared, (shm.name, len(source))
+        except (OSError, ImportError) as e:
+            log.warning("shared memory unavailable, passing the document through /tmp: %s", e)
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as f:
+                f.write(source)
+            ref = spill = f.name
+
+    # Keep a bounded window of page groups in flight so memory stays flat.
+    pending = deque()
+    it = iter(groups)
+    try:
+        for group in it:
+            pending.append(pool.submit(task, ref, group))
+            if len(pending) >= n_workers * 2:
+                break
+        while pending:
+            texts = pending.popleft().result()
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.append(pool.submit(task, ref, nxt))
+            yield from texts
+    finally:
+        for f in pending:
+            f.cancel()
+        # a worker still on a group that could not be cancelled keeps what it already read
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+        if spill is not None:
+            os.unlink(spill)
+
+
+class ExtractStats:
+    def __init__(self):
+        self.total_pages = 0
+        self.pages = 0
+        self.bytes_written = 0
+        self.truncated = False
+        self.reused_pages = 0
+        # per page: {"t": text hash, "s": start, "e": end} byte span of its text in the output
+        self.page_records: List[dict] = []
+
+    def as_dict(self) -> dict:
+        return {"totalPages": self.total_pages, "pages": self.pages, "reusedPages": self.reused_pages,
+                "bytes": self.bytes_written, "truncated": self.truncated}
+
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.strip().encode("utf-8"), digest_size=8).hexdigest()
+
+
+def iter_text(source: Source, sanitize: Callable[[str], str], max_pages: int = MAX_PAGES,
+              workers: Optional[int] = None, total_pages: Optional[int] = None,
+              reuse: Optional[Dict[int, str]] = None) -> Iterator[str]:
+    """Sanitized pages joined by PAGE_SEPARATOR, as a stream of chunks.
+
+    Pages in ``reuse`` (page index -> already sanitized text) are neither
+    extracted nor sanitized again; a ``sanitize`` with an ``observe`` method
+    (text_clean.Cleaner) is still shown them, in order.
+    """
+    reuse = reuse or {}
+    observe = getattr(sanitize, "observe", None)
+    if total_pages is None:
+        total_pages = page_count(source)
+    raw = iter_pages(source, max_pages, workers, total_pages, skip=reuse)
+    try:
+        for i in range(min(total_pages, max_pages)):
+            if i in reuse:
+                text = reuse[i]
+                if observe is not None:
+                    observe(text)
+            else:
+                text = sanitize(next(raw))
+            yield text if i == 0 else PAGE_SEPARATOR + text
+    finally:
+        raw.close()
+
+
+def extract_to(source: Source, sink: BinaryIO, sanitize: Callable[[str], str],
+               max_pages: int = MAX_PAGES, max_bytes: int = MAX_BYTES,
+               workers: Optional[int] = None, reuse: Optional[Dict[int, str]] = None) -> ExtractStats:
+    """Stream UTF-8 text into ``sink``; the output equals ``"\\n".join(pages).strip()`` up to the caps."""
+    stats = ExtractStats()
+    stats.total_pages = page_count(source)
+    stats.truncated = stats.total_pages > max_pages
+    stats.reused_pages = len(reuse or ())
+    chunks = iter_text(source, sanitize, max_pages, workers, stats.total_pages, reuse)
+    try:
+        stats.pages = _write_stream(chunks, sink, stats, max_bytes)
+    finally:
+        chunks.close()
+    return stats
+
+
+def _write_stream(chunks: Iterator[str], sink: BinaryIO, stats: ExtractStats, max_bytes: int) -> int:
+    pages = 0
+    started = False
+    held_ws = ""  # trailing whitespace is only written once more text follows it
+    offset = 0    # bytes of all chunks so far, before any stripping
+    lead = 0      # bytes stripped from the start of the document
+    for chunk in chunks:
+        sep = len(PAGE_SEPARATOR) if pages else 0
+        pages += 1
+        size = len(chunk.encode("utf-8"))
+        # a page's text sits verbatim in the output, shifted only by the leading strip
+        stats.page_records.append({"t": text_hash(chunk[sep:]), "s": offset + sep, "e": offset + size})
+        offset += size
+        if not started:
+            stripped = chunk.lstrip()
+            lead += size - len(stripped.encode("utf-8"))
+            chunk = stripped
+            if not chunk:
+                continue
+            started = True
+        body = chunk.rstrip()
+        if not body:
+            held_ws += chunk
+            continue
+        data = (held_ws + body).encode("utf-8")
+        held_ws = chunk[len(body):]
+        room = max_bytes - stats.bytes_written
+        if len(data) > room:
+            data = data[:room].decode("utf-8", errors="ignore").encode("utf-8")
+            sink.write(data)
+            stats.bytes_written += len(data)
+            stats.truncated = True
+            break
+        sink.write(data)
+        stats.bytes_written += len(data)
+    for r in stats.page_records:
+        r["s"] = min(max(0, r["s"] - lead), stats.bytes_written)
+        r["e"] = min(max(r["s"], r["e"] - lead), stats.bytes_written)
+    return pages
@@ -0,0 +1,355 @@
+import os
+import json
+import time
+import random
+import socket
+import threading
+import http.client
+import urllib.parse
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import telemetry
+
+# ---------- reusable Gemini REST client ----------
+# One client per (api key, model) lives for the container: it keeps a pool of
+# persistent HTTP connections, rate-limits with a token bucket, retries only
+# retryable failures with full-jitter backoff and can hedge slow requests.
+
+log = telemetry.get_logger("gemini_client")
+
+DEFAULT_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+RATE_PER_SEC = float(os.getenv("GEMINI_RATE_PER_SEC", "5"))
+BURST = int(os.getenv("GEMINI_BURST", "5"))
+POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "8"))
+HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "0"))  # 0 disables hedging
+HEDGE_MIN_SAMPLES = 20
+
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+_RETRYABLE_EXC = (socket.timeout, TimeoutError, ConnectionError, http.client.HTTPException, OSError)
+
+
+class GeminiError(RuntimeError):
+    def __init__(self, msg: str, status: Optional[int] = None, retryable: bool = False,
+                 retry_after: Optional[float] = None):
+        super().__init__(msg)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class StreamInterrupted(GeminiError):
+    """A streamed response failed after its first deltas; the deltas already yielded stand."""
+
+
+def classify(exc: BaseException) -> GeminiError:
+    if isinstance(exc, GeminiError):
+        return exc
+    if isinstance(exc, _RETRYABLE_EXC):
+        return GeminiError(f"{type(exc).__name__}: {exc}", retryable=True)
+    return GeminiError(f"{type(exc).__name__}: {exc}", retryable=False)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, burst: int):
+        self.rate = rate_per_sec
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_s = (1 - self._tokens) / self.rate
+            time.sleep(wait_s)
+
+
+class _ConnectionPool:
+    def __init__(self, base_url: str, size: int, timeout: float):
+        u = urllib.parse.urlsplit(base_url)
+        self.scheme = u.scheme
+        self.host = u.hostname
+        self.port = u.port
+        self.base_path = u.path.rstrip("/")
+        self.size = size
+        self.timeout = timeout
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def _new(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def get(self) -> http.client.HTTPConnection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._new()
+
+    def put(self, conn: http.client.HTTPConnection):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for c in idle:
+            c.close()
+
+
+def _response_text(data: dict) -> str:
+    fb = data.get("promptFeedback") or {}
+    if fb.get("blockReason"):
+        raise GeminiError(f"prompt blocked: {fb['blockReason']}", retryable=False)
+    txt = ""
+    for c in data.get("candidates", []):
+        for p in (c.get("content") or {}).get("parts", []):
+            if "text" in p:
+                txt += p["text"]
+    return txt.strip()
+
+
+class GeminiClient:
+    def __init__(self, api_key: str, model: str, base_url: str = DEFAULT_BASE_URL,
+                 timeout: float = 60, max_retries: int = 5, rate_per_sec: float = RATE_PER_SEC,
+                 burst: int = BURST, pool_size: int = POOL_SIZE, hedge_percentile: float = HEDGE_PERCENTILE,
+                 backoff_base: float = 0.5, backoff_cap: float = 20.0):
+        self.api_key = api_key
+        self.model = model
+        self.max_retries = max_retries
+        self.hedge_percentile = hedge_percentile
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.bucket = TokenBucket(rate_per_sec, burst)
+        self.pool = _ConnectionPool(base_url, pool_size, timeout)
+        # hedged sends and asyncio callers get separate pools so one can never starve the other
+        self._executor = ThreadPoolExecutor(max_workers=pool_size * 2, thread_name_prefix="gemini-send")
+        self._async_executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="gemini-async")
+        self._latencies = deque(maxlen=200)
+        self._lat_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "hedges": 0, "hedge_wins": 0}
+
+    # ----- transport -----
+    def _path(self, method: str, query: str = "") -> str:
+        return f"{self.pool.base_path}/models/{self.model}:{method}?{query}key={urllib.parse.quote(self.api_key)}"
+
+    def _post(self, method: str, payload: dict) -> Tuple[int, Dict[str, str], bytes]:
+        body = json.dumps(payload).encode("utf-8")
+        conn = self.pool.get()
+        try:
+            conn.request("POST", self._path(method), body=body, headers={"Content-Type": "application/json"})
+            r = conn.getresponse()
+            data = r.read()
+        except Exception:
+            conn.close()
+            raise
+        if r.will_close:
+            conn.close()
+        else:
+            self.pool.put(conn)
+        return r.status, {k.lower(): v for k, v in r.getheaders()}, data
+
+    @staticmethod
+    def _http_error(status: int, headers: Dict[str, str], data: bytes) -> GeminiError:
+        retry_after = headers.get("retry-after")
+        return GeminiError(
+            f"HTTP {status}: {data[:200].decode('utf-8', errors='ignore')}",
+            status=status,
+            retryable=status in RETRYABLE_STATUS,
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+        )
+
+    def _send_once(self, payload: dict) -> str:
+        self.stats["requests"] += 1
+        t0 = time.monotonic()
+        status, headers, data = self._post("generateContent", payload)
+        if status != 200:
+            raise self._http_error(status, headers, data)
+        txt = _response_text(json.loads(data.decode("utf-8", errors="ignore")))
+        if not txt:
+            raise GeminiError("empty response", status=status, retryable=True)
+        with self._lat_lock:
+            self._latencies.append(time.monotonic() - t0)
+        return txt
+
+    # ----- hedging -----
+    def _hedge_after(self) -> Optional[float]:
+        if self.hedge_percentile <= 0:
+            return None
+        with self._lat_lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))]
+
+    def _send_hedged(self, payload: dict) -> str:
+        delay = self._hedge_after()
+        if delay is None:
+            return self._send_once(payload)
+        first = self._executor.submit(self._send_once, payload)
+        done, _ = wait([first], timeout=delay)
+        if done or not self.bucket.try_acquire():
+            return first.result()
+        self.stats["hedges"] += 1
+        second = self._executor.submit(self._send_once, payload)
+        pending = {first, second}
+        last_exc = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    if f is second:
+                        self.stats["hedge_wins"] += 1
+                    return f.result()
+                last_exc = f.exception()
+        raise last_exc
+
+    # ----- public API -----
+    def _backoff(self, attempt: int, err: GeminiError) -> float:
+        if err.retry_after is not None:
+            return min(self.backoff_cap, err.retry_after)
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def generate(self, prompt: str, generation_config: Optional[dict] = None) -> str:
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        last_err = None
+        for attempt in range(self.max_retries):
+            self.bucket.acquire()
+            try:
+                return self._send_hedged(payload)
+            except Exception as e:
+                last_err = classify(e)
+                log.warning("attempt %d/%d failed: %s", attempt + 1, self.max_retries, last_err)
+                if not last_err.retryable or attempt == self.max_retries - 1:
+                    break
+                self.stats["retries"] += 1
+                time.sleep(self._backoff(attempt, last_err))
+        raise GeminiError(f"gemini failed: {last_err}", status=getattr(last_err, "status", None))
+
+    def _stream_once(self, payload: dict) -> Iterator[str]:
+        self.stats["requests"] += 1
+        conn = self.pool.get()
+        reusable = False
+        try:
+            conn.request("POST", self._path("streamGenerateContent", "alt=sse&"),
+                         body=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"})
+            r = conn.getresponse()
+            if r.status != 200:
+                data = r.read()
+                reusable = not r.will_close
+                raise self._http_error(r.status, {k.lower(): v for k, v in r.getheaders()}, data)
+            while True:
+                line = r.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if line.startswith(b"data:"):
+                    delta = _response_text(json.loads(line[5:].decode("utf-8", errors="ignore")))
+                    if delta:
+                        yield delta
+            reusable = not r.will_close
+        finally:
+            if reusable:
+                self.pool.put(conn)
+            else:
+                conn.close()
+
+    def stream_generate(self, prompt: str, generation_config: Optional[dict] = None) -> Iterator[str]:
+        """Yield text deltas as they arrive; retries only happen before the first delta.
+
+        A failure after it raises StreamInterrupted, so the caller can keep what arrived.
+        """
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        last_err = None
+        for attempt in range(self.max_retries):
+            self.bucket.acquire()
+            started = False
+            try:
+                for delta in self._stream_once(payload):
+                    started = True
+                    yield delta
+                if started:
+                    return
+                raise GeminiError("empty response", retryable=True)
+            except GeneratorExit:
+                raise
+            except Exception as e:
+                last_err = classify(e)
+                log.warning("stream attempt %d/%d failed: %s", attempt + 1, self.max_retries, last_err)
+                if started:
+                    raise StreamInterrupted(f"gemini stream cut off: {last_err}", status=last_err.status,
+                                            retryable=last_err.retryable, retry_after=last_err.retry_after)
+                if not last_err.retryable or attempt == self.max_retries - 1:
+                    break
+                self.stats["retries"] += 1
+                time.sleep(self._backoff(attempt, last_err))
+        raise GeminiError(f"gemini stream failed: {last_err}", status=getattr(last_err, "status", None))
+
+    # asyncio is imported inside the coroutines: any caller already has it loaded,
+    # and the synchronous Lambda path skips its ~50 ms import.
+    async def agenerate(self, prompt: str, generation_config: Optional[dict] = None) -> str:
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._async_executor, self.generate, prompt, generation_config)
+
+    async def agenerate_many(self, prompts: List[str], concurrency: int = 4,
+                             generation_config: Optional[dict] = None, return_exceptions: bool = False) -> list:
+        import asyncio
+        sem = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(p: str):
+            async with sem:
+                return await self.agenerate(p, generation_config)
+
+        return await asyncio.gather(*(one(p) for p in prompts), return_exceptions=return_exceptions)
+
+    def close(self):
+        self.pool.close()
+        self._executor.shutdown(wait=False)
+        self._async_executor.shutdown(wait=False)
+
+
+_clients: Dict[Tuple[str, str, str], GeminiClient] = {}
+_clients_lock = threading.Lock()
+
+
+def shared(api_key: str, model: str, base_url: Optional[str] = None) -> GeminiClient:
+    """The container-wide client for this key/model, created on first use."""
+    base_url = base_url or DEFAULT_BASE_URL
+    key = (api_key, model, base_url)
+    with _clients_lock:
+        c = _clients.get(key)
+        if c is None:
+            c = GeminiClient(api_key, model, base_url=base_url)
+            _clients[key] = c
+        return c
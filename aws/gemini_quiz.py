@@ -1,13 +1,28 @@
 import os
 import json
 import time
-import inspect
-from typing import Tuple
+import traceback
 import base64
+from concurrent.futures import ThreadPoolExecutor
 
-import boto3
 from botocore.exceptions import ClientError
 
+import artifacts
+import dedup
+import delivery
+import gemini_client
+import generation_scheduler
+import job_status
+import llm_cache
+import prompt_pack
+import question_bank
+import quiz_mapreduce
+import quiz_render
+import quiz_response
+import revisions
+import runtime_context
+import telemetry
+
 
 def _compute_job_id_from_content(file_path: str) -> str:
     hasher = hashlib.sha256()
@@ -20,129 +35,60 @@ def _compute_job_id_from_content(file_path: str) -> str:
     hash_bytes = hasher.digest()
     return base64.b64encode(hash_bytes).decode('utf-8')
 
-def get_current_line():
-    return inspect.currentframe().f_back.f_lineno
-
-# Optional Gemini SDK / PDF
-try:
-    import google.generativeai as genai
-    _HAS_GENAI = True
-    print(f"DEBUG - Line {get_current_line()}: Successfully imported google.generativeai")
-except Exception as e:
-    _HAS_GENAI = False
-    print(f"DEBUG - Line {get_current_line()}: Failed to import google.generativeai: {str(e)}")
-
-try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.units import cm
-    _HAS_PDF = True
-    print(f"DEBUG - Line {get_current_line()}: Successfully imported reportlab")
-except Exception as e:
-    _HAS_PDF = False
-    print(f"DEBUG - Line {get_current_line()}: Failed to import reportlab: {str(e)}")
+QUESTION_COUNT = 10
+# Above this many characters, "auto" mode switches from one prompt to map-reduce.
+SINGLE_PROMPT_MAX_CHARS = 12000
+# Follow-up requests allowed for questions that failed validation.
+REPAIR_ROUNDS = int(os.getenv("QUIZ_REPAIR_ROUNDS", "2"))
+
+# Background S3 uploads that overlap with PDF rendering.
+_io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="quiz-io")
+
+log = telemetry.get_logger("gemini_quiz")
 
 # --------- Helper Functions ----------
 def _resp(code: int, obj) -> dict:
-    print(f"DEBUG - Line {get_current_line()}: Creating response with code {code}")
     return {"statusCode": code, "headers": {"Content-Type": "application/json"}, "body": json.dumps(obj, ensure_ascii=False)}
 
 def _ok(obj) -> dict:
-    print(f"DEBUG - Line {get_current_line()}: Returning OK response")
     return _resp(200, obj)
 
 def _bad(msg: str) -> dict:
-    print(f"DEBUG - Line {get_current_line()}: Returning BAD response: {msg}")
+    log.warning("bad request: %s", msg)
     return _resp(400, {"error": msg})
 
 def _err(msg: str) -> dict:
-    print(f"DEBUG - Line {get_current_line()}: Returning ERROR response: {msg}")
+    log.error("%s", msg)
     return _resp(500, {"error": msg})
 
 def _normalize_prefix(p: str) -> str:
-    result = p if p.endswith("/") else p + "/"
-    print(f"DEBUG - Line {get_current_line()}: Normalized prefix '{p}' to '{result}'")
-    return result
-
-def _get_ssm_param(ssm_client, name: str, decrypt: bool = True) -> str:
-    print(f"DEBUG - Line {get_current_line()}: Getting SSM parameter: {name}")
-    try:
-        r = ssm_client.get_parameter(Name=name, WithDecryption=decrypt)
-        v = (r.get("Parameter") or {}).get("Value", "").strip()
-        if not v:
-            raise ValueError(f"empty ssm value: {name}")
-        print(f"DEBUG - Line {get_current_line()}: Successfully got SSM parameter: {name}")
-        return v
-    except Exception as e:
-        print(f"DEBUG - Line {get_current_line()}: ERROR getting SSM parameter {name}: {str(e)}")
-        raise
-
-def _get_secret(secrets_client, secret_name: str) -> str:
-    print(f"DEBUG - Line {get_current_line()}: Getting secret: {secret_name}")
-    try:
-        response = secrets_client.get_secret_value(SecretId=secret_name)
-        secret_value = json.loads(response['SecretString'])
-        api_key = secret_value.get('apiKey', '').strip()
-        if not api_key:
-            raise ValueError(f"empty api key in secret: {secret_name}")
-        print(f"DEBUG - Line {get_current_line()}: Successfully got secret: {secret_name}")
-        return api_key
-    except Exception as e:
-        print(f"DEBUG - Line {get_current_line()}: ERROR getting secret {secret_name}: {str(e)}")
-        raise
-
-def _parse_s3_location(value: str) -> Tuple[str, str]:
-    print(f"DEBUG - Line {get_current_line()}: Parsing S3 location: {value}")
-    try:
-        if value.startswith("s3://"):
-            rest = value[5:]
-            if "/" in rest:
-                b, pref = rest.split("/", 1)
-            else:
-                b, pref = rest, ""
-            result = b, _normalize_prefix(pref)
-            print(f"DEBUG - Line {get_current_line()}: Parsed S3 location: bucket={b}, prefix={pref}")
-            return result
-        if value.startswith("arn:aws:s3:::"):
-            rest = value[len("arn:aws:s3:::"):]
-            if "/" in rest:
-                b, pref = rest.split("/", 1)
-            else:
-                b, pref = rest, ""
-            result = b, _normalize_prefix(pref)
-            print(f"DEBUG - Line {get_current_line()}: Parsed S3 location: bucket={b}, prefix={pref}")
-            return result
-        raise ValueError(f"invalid s3 location: {value}")
-    except Exception as e:
-        print(f"DEBUG - Line {get_current_line()}: ERROR parsing S3 location: {str(e)}")
-        raise
+    return p if p.endswith("/") else p + "/"
 
 def _s3_get_text(s3_client, bucket: str, key: str) -> str:
-    print(f"DEBUG - Line {get_current_line()}: Getting S3 object: s3://{bucket}/{key}")
-    try:
-        obj = s3_client.get_object(Bucket=bucket, Key=key)
-        text = obj["Body"].read().decode("utf-8", errors="ignore")
-        print(f"DEBUG - Line {get_current_line()}: Successfully got S3 object, length: {len(text)}")
-        return text
-    except Exception as e:
-        print(f"DEBUG - Line {get_current_line()}: ERROR getting S3 object: {str(e)}")
-        raise
-
-def _s3_put_text(s3_client, bucket: str, key: str, text: str):
-    print(f"DEBUG - Line {get_current_line()}: Putting text to S3: s3://{bucket}/{key}")
-    s3_client.put_object(Bucket=bucket, Key=key, Body=text.encode("utf-8"), ContentType="text/plain; charset=utf-8")
-    print(f"DEBUG - Line {get_current_line()}: Successfully put text to S3")
-
-def _s3_put_bytes(s3_client, bucket: str, key: str, body: bytes, content_type: str):
-    print(f"DEBUG - Line {get_current_line()}: Putting bytes to S3: s3://{bucket}/{key}")
-    s3_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType=content_type)
-    print(f"DEBUG - Line {get_current_line()}: Successfully put bytes to S3")
-
-def _build_prompt(src_text: str, job_id: str) -> str:
-    print(f"DEBUG - Line {get_current_line()}: Building prompt for job_id: {job_id}")
+    # decompressed as it streams in; objects stored before compression read as-is
+    obj = s3_client.get_object(Bucket=bucket, Key=key)
+    text = artifacts.read_body(obj).decode("utf-8", errors="ignore")
+    log.debug("read s3://%s/%s", bucket, key, chars=len(text), stored=obj.get("ContentLength"))
+    return text
+
+def _s3_put_text(s3_client, bucket: str, key: str, text: str,
+                 content_type: str = "text/plain; charset=utf-8", cache_control: str = None,
+                 encoding: str = None) -> bytes:
+    """Store ``text`` in the artifact encoding; returns the stored body."""
+    return artifacts.put(s3_client, bucket, key, text.encode("utf-8"), content_type, cache_control, encoding)
+
+def _s3_put_bytes(s3_client, bucket: str, key: str, body: bytes, content_type: str, cache_control: str = None,
+                  content_encoding: str = artifacts.IDENTITY):
+    extra = artifacts.extra_args(content_encoding)
+    if cache_control:
+        extra["CacheControl"] = cache_control
+    s3_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType=content_type, **extra)
+    log.debug("wrote s3://%s/%s", bucket, key, bytes=len(body))
+
+def _build_prompt(src_text: str, job_id: str, count: int = QUESTION_COUNT) -> str:
     prompt = (
         "You are a quiz generator. Your task is to generate a quiz from the source text. "
-        "The quiz must have exactly 10 multiple-choice questions.\n"
+        f"The quiz must have exactly {count} multiple-choice questions.\n"
         "Your response must be a single JSON object with the following structure:\n"
         "{\n"
         "  \"title\": \"Quiz from the document\",\n"
@@ -153,233 +99,443 @@ def _build_prompt(src_text: str, job_id: str) -> str:
         "      \"correctAnswer\": \"string\",\n"
         "      \"explanation\": \"string\"\n"
         "    }\n"
-        "    // ... 9 more question objects\n"
+        f"    // ... {count - 1} more question objects\n"
         "  ]\n"
         "}\n\n"
         "Ensure the JSON is well-formed and does not contain any extra text or code blocks.\n\n"
-        f"JOB_ID: {job_id}\n\n=== SOURCE TEXT START ===\n{src_text[:12000]}\n=== SOURCE TEXT END ===\n"
+        f"JOB_ID: {job_id}\n\n=== SOURCE TEXT START ===\n{src_text[:SINGLE_PROMPT_MAX_CHARS]}\n=== SOURCE TEXT END ===\n"
     )
-    print(f"DEBUG - Line {get_current_line()}: Prompt built, length: {len(prompt)}")
+    log.debug("prompt built", chars=len(prompt))
     return prompt
 
 def _build_prompt1(src_text: str, job_id: str) -> str:
-    print(f"DEBUG - Line {get_current_line()}: Building prompt for job_id: {job_id}")
     prompt = (
         "You are a quiz generator.\n"
         "Write 10 multiple-choice questions (A-D) with exactly one correct answer.\n"
         "Output format (strict):\n"
         "Q1. <question>\nA) ...\nB) ...\nC) ...\nD) ...\nAnswer: <A|B|C|D>\n\n"
-        f"JOB_ID: {job_id}\n\n=== SOURCE TEXT START ===\n{src_text[:12000]}\n=== SOURCE TEXT END ===\n"
+        f"JOB_ID: {job_id}\n\n=== SOURCE TEXT START ===\n{src_text[:SINGLE_PROMPT_MAX_CHARS]}\n=== SOURCE TEXT END ===\n"
     )
-    print(f"DEBUG - Line {get_current_line()}: Prompt built, length: {len(prompt)}")
+    log.debug("prompt built", chars=len(prompt))
     return prompt
 
-def _call_gemini(prompt: str, model: str, api_key: str, max_retries: int = 5, timeout_sec: int = 60) -> str:
-    print(f"DEBUG - Line {get_current_line()}: Calling Gemini API, model: {model}")
-    backoff = 1.5
-    last_err = None
-    for i in range(max_retries):
-        print(f"DEBUG - Line {get_current_line()}: Gemini attempt {i+1}/{max_retries}")
+def _build_chunk_prompt(chunk_text: str, job_id: str, n_questions: int, idx: int, total: int) -> str:
+    return (
+        "You are a quiz generator. The source text below is one section of a longer document "
+        f"(part {idx + 1} of {total}). Write exactly {n_questions} multiple-choice questions that "
+        "can be answered from this section alone.\n"
+        "Your response must be a single JSON object with the following structure:\n"
+        "{\n"
+        "  \"questions\": [\n"
+        "    {\n"
+        "      \"question\": \"string\",\n"
+        "      \"options\": [\"string\", \"string\", \"string\", \"string\"],\n"
+        "      \"correctAnswer\": \"string\",\n"
+        "      \"explanation\": \"string\"\n"
+        "    }\n"
+        "  ]\n"
+        "}\n\n"
+        "Ensure the JSON is well-formed and does not contain any extra text or code blocks.\n\n"
+        f"JOB_ID: {job_id}\n\n=== SOURCE TEXT START ===\n{chunk_text}\n=== SOURCE TEXT END ===\n"
+    )
+
+def _build_repair_prompt(src_text: str, job_id: str, n_questions: int, avoid: list) -> str:
+    # Only the questions that failed validation are asked for again.
+    avoid_text = "\n".join(f"- {q}" for q in avoid) or "- (none)"
+    return (
+        f"You are a quiz generator. Write exactly {n_questions} new multiple-choice questions from the source text. "
+        "Each question needs at least 2 options and a correctAnswer that is copied exactly from its options.\n"
+        "Do not repeat any of these existing questions:\n"
+        f"{avoid_text}\n\n"
+        "Respond with a single JSON object: {\"questions\": [{\"question\": \"string\", \"options\": [\"string\", ...], "
+        "\"correctAnswer\": \"string\", \"explanation\": \"string\"}]}\n\n"
+        f"JOB_ID: {job_id}\n\n=== SOURCE TEXT START ===\n{src_text[:SINGLE_PROMPT_MAX_CHARS]}\n=== SOURCE TEXT END ===\n"
+    )
+
+def _timed_stream(chunks, inv: telemetry.Invocation):
+    # Time spent waiting on the next delta is llm_call; the rest of collect() is parse.
+    it = iter(chunks)
+    while True:
+        with inv.span("llm_call"):
+            chunk = next(it, None)
+        if chunk is None:
+            return
+        yield chunk
+
+def _until_cut_off(chunks, cut: dict):
+    # A stream that fails part-way still delivered whole questions: end it there
+    # and let the repair round ask for the rest.
+    try:
+        yield from chunks
+    except gemini_client.StreamInterrupted as e:
+        log.warning("keeping the questions streamed before: %s", e)
+        cut["error"] = e
+
+def _cache_key(prompt: str, job_id: str, model: str, config: dict = None) -> str:
+    # JOB_ID is only there for tracing: the same text under another jobId is the same request
+    return llm_cache.key(model, prompt.replace(f"JOB_ID: {job_id}\n", "", 1), config)
+
+def _stream_questions(prompt: str, model: str, api_key: str, inv: telemetry.Invocation,
+                      job_id: str = "", fresh: bool = False):
+    client = gemini_client.shared(api_key, model)
+    t0 = time.perf_counter()
+
+    def on_question(q):
+        inv.timings.setdefault("first_question_ms", round((time.perf_counter() - t0) * 1000, 1))
+
+    def run(config):
+        cache_key = _cache_key(prompt, job_id, model, config)
+        cached = None if fresh else llm_cache.get(cache_key, inv)
+        if cached is not None:
+            with inv.span("parse"):
+                return quiz_response.collect([cached], on_question)
+        llm_before = inv.timings.get("llm_call_ms", 0.0)
+        t = time.perf_counter()
+        cut = {}
         try:
-            if _HAS_GENAI:
-                genai.configure(api_key=api_key)
-                mdl = genai.GenerativeModel(model)
-                resp = mdl.generate_content(prompt, request_options={"timeout": timeout_sec})
-                txt = (getattr(resp, "text", "") or "").strip()
-            else:
-                import json as _json
-                from urllib.request import Request, urlopen
-                url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
-                payload = _json.dumps({"contents": [{"parts": [{"text": prompt}]}]}).encode("utf-8")
-                req = Request(url, data=payload, headers={"Content-Type": "application/json"})
-                with urlopen(req, timeout=timeout_sec) as r:
-                    data = _json.loads(r.read().decode("utf-8", errors="ignore"))
-                txt = ""
-                for c in data.get("candidates", []):
-                    parts = c.get("content", {}).get("parts", [])
-                    for p in parts:
-                        if "text" in p:
-                            txt += p["text"]
-                txt = (txt or "").strip()
-            if not txt:
-                raise RuntimeError("empty response")
-            print(f"DEBUG - Line {get_current_line()}: Gemini API call successful, response length: {len(txt)}")
-            return txt
-        except Exception as e:
-            last_err = e
-            print(f"DEBUG - Line {get_current_line()}: Gemini attempt {i+1} failed: {str(e)}")
-            time.sleep(backoff)
-            backoff *= 1.8
-    raise RuntimeError(f"gemini failed: {last_err}")
-
-def _make_pdf_bytes(text: str) -> bytes:
-    print(f"DEBUG - Line {get_current_line()}: Creating PDF from text")
-    if not _HAS_PDF:
-        raise RuntimeError("reportlab not installed")
-    from io import BytesIO
-    buf = BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
-    width, height = A4
-    left = 2 * cm
-    top = height - 2 * cm
-    max_w = width - 4 * cm
-    line_h = 0.6 * cm
-
-    def wrap(s: str):
-        words, line, lines = s.split(), "", []
-        for w in words:
-            t = (line + " " + w).strip()
-            if c.stringWidth(t) <= max_w:
-                line = t
-            else:
-                if line:
-                    lines.append(line)
-                line = w
-        if line:
-            lines.append(line)
-        return lines
-
-    c.setFont("Times-Roman", 11)
-    y = top
-    for para in text.splitlines():
-        if not para.strip():
-            y -= line_h
-            continue
-        for ln in wrap(para):
-            if y < 2 * cm:
-                c.showPage()
-                c.setFont("Times-Roman", 11)
-                y = top
-            c.drawString(left, y, ln)
-            y -= line_h
-    c.showPage()
-    c.save()
-    buf.seek(0)
-    print(f"DEBUG - Line {get_current_line()}: PDF created successfully")
-    return buf.read()
+            result = quiz_response.collect(_until_cut_off(_timed_stream(client.stream_generate(prompt, config), inv), cut),
+                                           on_question)
+        finally:
+            llm = inv.timings.get("llm_call_ms", 0.0) - llm_before
+            inv.add("parse", max(0.0, (time.perf_counter() - t) * 1000 - llm))
+        if cut:
+            inv.timings["streams_cut_off"] = inv.timings.get("streams_cut_off", 0) + 1
+        elif result[0]:
+            llm_cache.put(cache_key, result[3], inv.timings.get("llm_call_ms", 0.0) - llm_before, model)
+        return result
+
+    config = quiz_response.generation_config()
+    try:
+        valid, invalid, title, _ = run(config)
+    except gemini_client.GeminiError as e:
+        if not config or e.status != 400:
+            raise
+        # Model without JSON mode / response schema support: ask again in plain text.
+        log.warning("JSON mode rejected, retrying without it: %s", e)
+        valid, invalid, title, _ = run(None)
+    return valid, invalid, title
+
+def _generate_single(source_text: str, job_id: str, model: str, api_key: str, inv: telemetry.Invocation,
+                     count: int = QUESTION_COUNT, fresh: bool = False) -> dict:
+    valid, invalid, title = _stream_questions(_build_prompt(source_text, job_id, count), model, api_key, inv,
+                                              job_id, fresh)
+    n_invalid = len(invalid)
+    rounds = 0
+    while len(valid) < count and rounds < REPAIR_ROUNDS:
+        missing = count - len(valid)
+        log.info("re-requesting %d invalid/missing questions", missing)
+        prompt = _build_repair_prompt(source_text, job_id, missing, [q["question"] for q in valid])
+        try:
+            more, bad, _ = _stream_questions(prompt, model, api_key, inv, job_id, fresh)
+        except gemini_client.GeminiError as e:
+            if not valid:
+                raise
+            # a short quiz beats failing the job over questions already validated
+            log.warning("re-request failed, keeping %d questions: %s", len(valid), e)
+            break
+        valid += more[:missing]
+        n_invalid += len(bad)
+        rounds += 1
+    inv.timings["invalid_questions"] = n_invalid
+    inv.timings["repair_rounds"] = rounds
+    if not valid:
+        raise ValueError("no valid questions in Gemini response")
+    return {"title": title or "Quiz from the document", "questions": valid[:count]}
+
+def _generation_mode(event: dict, source_text: str) -> str:
+    mode = str(event.get("mode") or os.getenv("QUIZ_GEN_MODE", "auto")).lower()
+    if mode == "auto":
+        return "mapreduce" if len(source_text) > SINGLE_PROMPT_MAX_CHARS else "single"
+    return mode
+
+def _generate_mapreduce(source_text: str, job_id: str, model: str, api_key: str, inv: telemetry.Invocation,
+                        count: int = QUESTION_COUNT, fresh: bool = False) -> dict:
+    # llm_call/parse are summed over the concurrent chunk calls; map_ms is the wall time.
+    def gen_chunk(chunk_text: str, idx: int, total: int, n_questions: int):
+        prompt = _build_chunk_prompt(chunk_text, job_id, n_questions, idx, total)
+        config = quiz_response.generation_config()
+        cache_key = _cache_key(prompt, job_id, model, config)
+        text = None if fresh else llm_cache.get(cache_key, inv)
+        call_ms = None
+        if text is None:
+            t = time.perf_counter()
+            with inv.span("llm_call"):
+                text = _call_gemini(prompt, model=model, api_key=api_key, generation_config=config)
+            call_ms = (time.perf_counter() - t) * 1000
+        with inv.span("parse"):
+            questions = quiz_response.parse_questions(text)[0]
+        if questions and call_ms is not None:
+            llm_cache.put(cache_key, text, call_ms, model)
+        return questions
+
+    questions = quiz_mapreduce.generate(source_text, count, gen_chunk, timings=inv.timings)
+    log.info("map-reduce selected %d questions", len(questions), chunks=inv.timings.get("chunks"))
+    return {"title": "Quiz from the document", "questions": questions}
+
+def _call_gemini(prompt: str, model: str, api_key: str, generation_config: dict = None) -> str:
+    # The shared client keeps its connections and rate limiter warm across invocations.
+    txt = gemini_client.shared(api_key, model).generate(prompt, generation_config)
+    log.debug("gemini call done", model=model, chars=len(txt))
+    return txt
+
+class RetryLater(Exception):
+    """Raised to hand an EventBridge delivery back to Lambda's asynchronous retries."""
+
+def _attempt_failed(event: dict, job_id: str, lease: dict, msg: str, inv: telemetry.Invocation,
+                    throttled: bool = False) -> dict:
+    # A job dispatched by generation_scheduler goes back to its queue with a
+    # delay. A plain EventBridge event was invoked asynchronously: an exception
+    # makes Lambda deliver it again, and the next claim counts the attempt.
+    # Direct invocations get the error back and can retry themselves.
+    state = job_status.fail(job_id, lease, msg)
+    if state == job_status.RETRYING:
+        if generation_scheduler.ticket_of(event) is not None:
+            inv.bind(requeue=generation_scheduler.THROTTLED if throttled else generation_scheduler.RETRY)
+        elif "detail" in event:
+            raise RetryLater(msg)
+    return _err(msg)
+
+def _revision_plan(s3, in_bucket: str, in_prefix: str, out_bucket: str, out_prefix: str,
+                   job_id: str, source_text: str):
+    """For a revised document: (prior questions to keep, changed-page text, stats), or None."""
+    pages = revisions.read_pages(s3, in_bucket, f"{in_prefix}{job_id}/")
+    base = (pages or {}).get("basedOn")
+    if not base:
+        return None
+    prior_pages = revisions.read_pages(s3, in_bucket, f"{in_prefix}{base}/")
+    try:
+        prior_quiz = json.loads(_s3_get_text(s3, out_bucket, f"{out_prefix}{base}/quiz.json"))
+        prior_data = artifacts.get_bytes(s3, in_bucket, f"{in_prefix}{base}/data.txt")
+    except ClientError:
+        return None  # the prior job never got a quiz; generate this one from scratch
+    if not prior_pages:
+        return None
+    kept, changed_text, stats = revisions.plan_questions(
+        prior_data, prior_pages, prior_quiz.get("questions") or [],
+        source_text.encode("utf-8"), pages, QUESTION_COUNT)
+    return kept, changed_text, dict(stats, basedOn=base)
+
+def _bank_plan(s3, bucket: str, bank_key: str, source_text: str):
+    """Split the document into passages and find the ones the question bank already covers.
+
+    Returns (passages, sketches, reused) where reused[i] holds the bank's
+    questions for passage i, or None when it has to go to the LLM.
+    """
+    texts = question_bank.passages(source_text)
+    sketches = [question_bank.sketch(t) for t in texts]
+    bank, _ = question_bank.load(s3, bucket, bank_key)
+    reused = []
+    for sk in sketches:
+        pid, _ = bank.lookup(sk)
+        reused.append(bank.questions(pid) if pid >= 0 else None)
+    return texts, sketches, reused
+
+def _bank_questions(texts: list, reused: list) -> list:
+    # Share of the quiz the bank may supply = share of the text it covers.
+    total = sum(len(t) for t in texts) or 1
+    covered = sum(len(t) for t, r in zip(texts, reused) if r)
+    want = round(QUESTION_COUNT * covered / total)
+    picked = quiz_mapreduce.select([r for r in reused if r], want) if want else []
+    return [{k: v for k, v in q.items() if k != "sourceChunk"} for q in picked]
 
 # --------- Lambda Handler ----------
 def lambda_handler(event, context):
+    timings = {}
+    ticket = generation_scheduler.ticket_of(event)
+    with telemetry.Invocation("gemini_quiz", timings) as inv:
+        if ticket is None:
+            return inv.result(_handle(event, inv, context))
+        # dispatched by generation_scheduler: hand the slot back however the attempt ends
+        timings["queue_wait_ms"] = round((ticket["dispatchedAt"] - ticket["admittedAt"]) * 1000, 1)
+        t0 = time.perf_counter()
+        outcome = generation_scheduler.RETRY
+        try:
+            resp = _handle(event, inv, context)
+            outcome = inv.properties.get("requeue") or generation_scheduler.DONE
+            return inv.result(resp)
+        finally:
+            with inv.span("schedule_next"):
+                generation_scheduler.finish(ticket, outcome, time.perf_counter() - t0)
+
+def _handle(event: dict, inv: telemetry.Invocation, context=None) -> dict:
+    timings = inv.timings
+    job_id = lease = None
     try:
-        print(f"DEBUG - Line {get_current_line()}: === LAMBDA STARTED ===")
-        
-        # Create AWS clients
-        print(f"DEBUG - Line {get_current_line()}: Creating AWS clients")
-        s3 = boto3.client("s3")
-        ssm = boto3.client("ssm")
-        secrets = boto3.client("secretsmanager")
-        print(f"DEBUG - Line {get_current_line()}: AWS clients created successfully")
-
-        # Log raw event
-        print(f"DEBUG - Line {get_current_line()}: === RAW EVENT ===")
-        print(json.dumps(event, indent=2, ensure_ascii=False))
+        # Reuse the container's AWS clients
+        s3 = runtime_context.client("s3")
+        log.debug("event received", event=event)
 
         # Extract job_id
-        print(f"DEBUG - Line {get_current_line()}: Extracting job_id from event")
-        job_id = None
+        force = dedup.is_forced(event.get("force_regenerate"))
         if "detail" in event and isinstance(event["detail"], dict):
             job_id = str(event["detail"].get("jobId", "")).strip()
+            force = force or dedup.is_forced(event["detail"].get("forceRegenerate"))
         if not job_id:
             job_id = str(event.get("job_id", "")).strip()
 
-        print(f"DEBUG - Line {get_current_line()}: Extracted job_id: {job_id}")
-
         if not job_id:
-            print(f"DEBUG - Line {get_current_line()}: ERROR: Missing job_id")
             return _bad("missing job_id")
+        inv.bind(jobId=job_id)
 
         # Get SSM parameters
-        print(f"DEBUG - Line {get_current_line()}: Getting SSM parameters")
-        try:
-            in_uri = _get_ssm_param(ssm, "/ai-quiz/pdf-extract/text-output-folder")
-            out_uri = _get_ssm_param(ssm, "/ai-quiz/gen-quiz/quiz-output-folder")
-            print(f"DEBUG - Line {get_current_line()}: Got SSM parameters: in_uri={in_uri}, out_uri={out_uri}")
-        except Exception as e:
-            print(f"DEBUG - Line {get_current_line()}: ERROR getting SSM parameters: {str(e)}")
-            raise
+        with inv.span("ssm_fetch"):
+            in_bucket, in_prefix = runtime_context.get_s3_location("/ai-quiz/pdf-extract/text-output-folder")
+            out_bucket, out_prefix = runtime_context.get_s3_location("/ai-quiz/gen-quiz/quiz-output-folder")
 
-        in_bucket, in_prefix = _parse_s3_location(in_uri)
-        out_bucket, out_prefix = _parse_s3_location(out_uri)
-        print(f"DEBUG - Line {get_current_line()}: Parsed S3 locations: in_bucket={in_bucket}, out_bucket={out_bucket}")
+        out_base = f"{out_prefix}{job_id}/"
+        json_key = f"{out_base}quiz.json"
+        pdf_key = f"{out_base}quiz.pdf"
+
+        # Same content hash -> same quiz; skip the Gemini call unless forced
+        if not force and dedup.object_exists(s3, out_bucket, json_key):
+            dedup.record("generate", "hit", job_id)
+            inv.bind(dedup="hit")
+            return _ok({
+                "job_id": job_id,
+                "dedup": "hit",
+                "output": {
+                    "json": {"bucket": out_bucket, "key": json_key},
+                    "pdf": {"bucket": out_bucket, "key": pdf_key, "saved": dedup.object_exists(s3, out_bucket, pdf_key)},
+                },
+            })
+        # Only one worker generates a job at a time, however often the event is delivered
+        lease, claimed = job_status.claim(job_id, force=force, lease_sec=job_status.lease_length(context))
+        if lease is None:
+            inv.bind(claim=claimed)
+            log.info("not generating %s: %s", job_id, claimed)
+            return _ok({"job_id": job_id, "skipped": claimed})
+        dedup.record("generate", "forced" if force else "miss", job_id)
+        inv.bind(attempt=lease["attempt"])
 
         # Read source text
         data_key = f"{in_prefix}{job_id}/data.txt"
-        print(f"DEBUG - Line {get_current_line()}: Checking S3 object: s3://{in_bucket}/{data_key}")
-        
-        try:
-            s3.head_object(Bucket=in_bucket, Key=data_key)
-            print(f"DEBUG - Line {get_current_line()}: S3 object exists")
-        except ClientError as e:
-            print(f"DEBUG - Line {get_current_line()}: ERROR: S3 object does not exist: {str(e)}")
-            return _bad(f"missing data.txt at s3://{in_bucket}/{data_key}")
-
-        source_text = _s3_get_text(s3, in_bucket, data_key)
-        print(f"DEBUG - Line {get_current_line()}: Source text retrieved, length: {len(source_text)}")
+        with inv.span("s3_read"):
+            try:
+                s3.head_object(Bucket=in_bucket, Key=data_key)
+            except ClientError as e:
+                log.error("source text missing: %s", e)
+                job_status.fail(job_id, lease, "missing data.txt", retryable=False)
+                return _bad(f"missing data.txt at s3://{in_bucket}/{data_key}")
+            source_text = _s3_get_text(s3, in_bucket, data_key)
 
         # Call Gemini API
-        print(f"DEBUG - Line {get_current_line()}: Getting Gemini parameters")
+        with inv.span("ssm_fetch"):
+            model = runtime_context.get_param("/ai-quiz/gen-quiz/gemini-model")
+            api_key = runtime_context.get_secret("/ai-quiz/gen-quiz/gemini-api-key")
+
+        # A revision of an earlier document keeps the questions of its unchanged
+        # pages; otherwise passages the question bank already covers are not
+        # sent to the LLM. A forced regeneration asks for new questions, so it
+        # skips both, and the LLM response cache too (see llm_cache).
+        bank_key = f"{out_prefix}{question_bank.BANK_NAME}"
+        texts = sketches = reused = None
+        reused_qs = []
+        llm_text = source_text
+        revision = None
+        if revisions.ENABLED and not force:
+            try:
+                with inv.span("revision_plan"):
+                    revision = _revision_plan(s3, in_bucket, in_prefix, out_bucket, out_prefix, job_id, source_text)
+            except Exception as e:
+                log.warning("revision plan failed: %s", e)
+        if revision is not None:
+            reused_qs, changed_text, stats = revision
+            llm_text = changed_text or source_text
+            inv.bind(basedOn=stats["basedOn"])
+            timings.update(revision_changed_pages=stats["changedPages"], revision_kept_questions=stats["keptQuestions"])
+        elif question_bank.ENABLED and not force:
+            try:
+                with inv.span("bank_lookup"):
+                    texts, sketches, reused = _bank_plan(s3, out_bucket, bank_key, source_text)
+                    reused_qs = _bank_questions(texts, reused)
+                uncovered = [t for t, r in zip(texts, reused) if not r]
+                if uncovered and len(uncovered) < len(texts):
+                    llm_text = "\n\n".join(uncovered)
+                timings.update(bank_passages=len(texts), bank_hits=len(texts) - len(uncovered),
+                               bank_questions=len(reused_qs))
+            except Exception as e:
+                log.warning("question bank unavailable: %s", e)
+                texts = None
+        n_llm = QUESTION_COUNT - len(reused_qs)
+
+        mode = _generation_mode(event, llm_text) if n_llm else "reuse"
+        inv.bind(mode=mode, model=model)
+        if prompt_pack.ENABLED and mode in ("single", "mapreduce"):
+            # single: the densest pieces within the prompt budget; map-reduce covers the
+            # whole document, so only duplicates and boilerplate are dropped
+            with inv.span("prompt_pack"):
+                llm_text, packed = prompt_pack.pack(llm_text, prompt_pack.BUDGET_TOKENS if mode == "single" else None)
+            timings.update(prompt_tokens_before=packed["tokensBefore"], prompt_tokens_after=packed["tokensAfter"],
+                           prompt_pieces_dropped=packed["pieces"] - packed["kept"])
+        log.info("generating quiz", chars=len(llm_text), questions=n_llm, reused=len(reused_qs))
         try:
-            model = _get_ssm_param(ssm, "/ai-quiz/gen-quiz/gemini-model")
-            api_key = _get_secret(secrets, "/ai-quiz/gen-quiz/gemini-api-key")
-            print(f"DEBUG - Line {get_current_line()}: Got Gemini parameters: model={model}")
-        except Exception as e:
-            print(f"DEBUG - Line {get_current_line()}: ERROR getting Gemini parameters: {str(e)}")
-            raise
-
-        prompt = _build_prompt(source_text, job_id)
-        print(f"DEBUG - Line {get_current_line()}: Calling Gemini API")
-        quiz_json_string = _call_gemini(prompt, model=model, api_key=api_key)
-        print(f"DEBUG - Line {get_current_line()}: Gemini API call successful")
-
-        # Parse the JSON for processing and PDF generation
-        try:
-            # Gemini might add '```json' and '```', so remove them
-            if quiz_json_string.strip().startswith("```json"):
-                quiz_json_string = quiz_json_string.strip()[7:-3].strip()
-            
-            quiz_data = json.loads(quiz_json_string)
-            print(f"DEBUG - Line {get_current_line()}: Successfully parsed Gemini response as JSON.")
-            
-            # Create text string for PDF from the JSON data
-            quiz_text_for_pdf = f"{quiz_data['title']}\n\n"
-            for i, q in enumerate(quiz_data['questions']):
-                quiz_text_for_pdf += f"{i + 1}. {q['question']}\n"
-                for j, option in enumerate(q['options']):
-                    quiz_text_for_pdf += f"   {chr(65 + j)}. {option}\n"
-                quiz_text_for_pdf += f"Answer: {q['correctAnswer']}\n"
-                if q.get('explanation'):
-                    quiz_text_for_pdf += f"Explanation: {q['explanation']}\n"
-                quiz_text_for_pdf += "\n"
-
-        except json.JSONDecodeError as e:
-            print(f"DEBUG - Line {get_current_line()}: ERROR parsing JSON response from Gemini: {e}")
-            return _err(f"failed to parse quiz JSON: {e}")
-        except KeyError as e:
-            print(f"DEBUG - Line {get_current_line()}: ERROR: Missing key in JSON response: {e}")
-            return _err(f"malformed quiz JSON: {e}")
-
-
-        # Save output
-        print(f"DEBUG - Line {get_current_line()}: Saving output to S3")
-        out_base = f"{out_prefix}{job_id}/"
-        json_key = f"{out_base}quiz.json"
-        pdf_key = f"{out_base}quiz.pdf"
-
-        # Save JSON file
-        _s3_put_text(s3, out_bucket, json_key, quiz_json_string)
-        print(f"DEBUG - Line {get_current_line()}: JSON output saved to: s3://{out_bucket}/{json_key}")
+            if mode == "reuse":
+                quiz_data = {"title": "Quiz from the document", "questions": []}
+            elif mode == "mapreduce":
+                quiz_data = _generate_mapreduce(llm_text, job_id, model, api_key, inv, n_llm, fresh=force)
+            else:
+                quiz_data = _generate_single(llm_text, job_id, model, api_key, inv, n_llm, fresh=force)
+        except ValueError as e:
+            return _attempt_failed(event, job_id, lease, f"failed to parse quiz JSON: {e}", inv)
+        new_questions = quiz_data["questions"]
+        quiz_data["questions"] = reused_qs + new_questions
+
+        # New questions are indexed under the passages they were written from
+        bank_save = None
+        fresh = [i for i, r in enumerate(reused) if not r] if texts is not None else []
+        if fresh and new_questions:
+            per_passage = question_bank.attribute([texts[i] for i in fresh], new_questions)
+            additions = [(sketches[i], job_id, qs) for i, qs in zip(fresh, per_passage) if qs]
+            if additions:
+                bank_save = _io_pool.submit(question_bank.save, s3, out_bucket, bank_key, additions)
+        quiz_json_string = json.dumps(quiz_data, ensure_ascii=False)
+        # encoded up front: the status record carries the ETag of the stored bytes
+        json_body, json_encoding = artifacts.encode(quiz_json_string.encode("utf-8"), artifacts.PUBLIC_ENCODING)
+
+        # Save output: the JSON upload runs while the PDF renders, so quiz.json
+        # becomes visible without waiting for reportlab
+        t_write = time.perf_counter()
+        # (a forced regeneration rewrites both keys, so they are only briefly
+        # cacheable; the Cache-Control is served by S3 itself to presigned-URL
+        # and CDN reads)
+        json_upload = _io_pool.submit(_s3_put_bytes, s3, out_bucket, json_key, json_body,
+                                      "application/json; charset=utf-8", delivery.REVALIDATE, json_encoding)
 
-        # Generate and save PDF file
         pdf_saved = False
+        pdf_bytes = pdf_error = None
         try:
-            pdf_bytes = _make_pdf_bytes(quiz_text_for_pdf)
-            _s3_put_bytes(s3, out_bucket, pdf_key, pdf_bytes, "application/pdf")
-            pdf_saved = True
-            print(f"DEBUG - Line {get_current_line()}: PDF output saved to: s3://{out_bucket}/{pdf_key}")
+            with inv.span("pdf_render"):
+                pdf_bytes = quiz_render.render(quiz_data)
         except Exception as e:
-            print(f"DEBUG - Line {get_current_line()}: [WARN] PDF generation failed: {e}")
+            log.warning("PDF generation failed: %s", e)
+            pdf_error = "PDF rendering failed"
 
-        print(f"DEBUG - Line {get_current_line()}: === LAMBDA COMPLETED SUCCESSFULLY ===")
+        json_upload.result()
+        job_status.complete(job_id, lease, outputs={
+            "json": json_key,
+            "jsonETag": job_status.etag_of(json_body),
+        })
+        if pdf_bytes is not None:
+            try:
+                _s3_put_bytes(s3, out_bucket, pdf_key, pdf_bytes, "application/pdf", delivery.REVALIDATE)
+                pdf_saved = True
+                job_status.update(job_id, outputs={"pdf": pdf_key})
+            except Exception as e:
+                log.warning("PDF upload failed: %s", e)
+                pdf_error = "PDF upload failed"
+        if pdf_error:
+            # get_pdf_link answers this job with an error instead of "processing"
+            job_status.update(job_id, pdfError=pdf_error)
+        if bank_save is not None:
+            try:
+                bank_save.result()
+            except Exception as e:
+                log.warning("question bank update failed: %s", e)
+        # wall time of the overlapped uploads, minus the render they ran alongside
+        inv.add("s3_write", (time.perf_counter() - t_write) * 1000 - timings.get("pdf_render_ms", 0.0))
+
+        log.info("quiz saved", json=f"s3://{out_bucket}/{json_key}", pdf_saved=pdf_saved,
+                 questions=len(quiz_data.get("questions", [])))
         return _ok({
             "job_id": job_id,
             "input": {"bucket": in_bucket, "key": data_key},
@@ -387,13 +543,17 @@ def lambda_handler(event, context):
                 "json": {"bucket": out_bucket, "key": json_key},
                 "pdf": {"bucket": out_bucket, "key": pdf_key, "saved": pdf_saved},
             },
-            "model": model
+            "model": model,
+            "mode": mode,
+            "timings": timings,
+            "dedup": "forced" if force else "miss",
         })
 
+    except RetryLater:
+        raise
     except Exception as e:
-        print(f"DEBUG - Line {get_current_line()}: === UNHANDLED EXCEPTION ===")
-        print(f"DEBUG - Line {get_current_line()}: Error type: {type(e).__name__}")
-        print(f"DEBUG - Line {get_current_line()}: Error message: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return _err(f"unhandled: {e}")
\ No newline at end of file
+        log.error("unhandled %s: %s", type(e).__name__, e, exc_info=traceback.format_exc())
+        if lease is not None:
+            throttled = isinstance(e, gemini_client.GeminiError) and e.status == 429
+            return _attempt_failed(event, job_id, lease, f"unhandled: {e}", inv, throttled)
+        return _err(f"unhandled: {e}")
@@ -0,0 +1,348 @@
+import os
+import json
+import math
+import time
+import uuid
+import random
+from contextlib import nullcontext
+from typing import Callable, List, Optional, Tuple
+
+import gemini_client
+import job_status
+import quiz_mapreduce
+import runtime_context
+import telemetry
+
+# ---------- fair-share generation scheduling ----------
+# Sits between extraction and generation: the pdf-extract-finished event goes
+# to generation_scheduler_lambda instead of gemini_quiz, and jobs reach
+# gemini_quiz (an asynchronous Lambda invoke) only while the model has room.
+#
+#   admit     the job joins its uploader's queue and its status record turns
+#             QUEUED with a position and an estimated start; an uploader (or
+#             the whole queue) past its cap is refused: the job is FAILED and
+#             a re-upload queues it again
+#   dispatch  weighted fair queuing across uploaders. A job's virtual finish
+#             tag is max(V, its uploader's last tag) + cost / weight, and the
+#             lowest (priority, tag) goes next, so one instructor's 300-file
+#             upload takes turns with everyone else's single files
+#   finish    gemini_quiz reports back when its attempt ends: the slot frees
+#             and the next jobs go out. A retryable failure is re-queued with
+#             a delay, instead of Lambda's async retries piling onto Gemini
+#
+# A job's cost is its expected Gemini calls (map-reduce chunks for its text
+# size). The in-flight cap counts cost units: by Little's law the model's rate
+# limit x a call's latency calls are in progress at once. An attempt that ends
+# throttled (HTTP 429) halves the cap; completions grow it back by one unit
+# per cap's worth of work (AIMD).
+#
+# The queue is one JSON object next to the quizzes, updated with the same
+# conditional writes as the job status records. Run the scheduler Lambda with
+# reserved concurrency 1 behind an SQS queue (several events per write) plus a
+# rate(1 minute) schedule, which re-queues attempts that never reported back
+# and releases delayed retries. gemini_quiz's own async retries should be 0.
+# lambda_template.yaml sets all of this up; update_image.bat deploys the code.
+
+log = telemetry.get_logger("generation_scheduler")
+
+QUEUE_NAME = "_scheduler/queue.json"
+MODEL_RPS = float(os.getenv("SCHED_MODEL_RPS", str(gemini_client.RATE_PER_SEC)))
+CALL_SEC = float(os.getenv("SCHED_CALL_SEC", "8"))
+MAX_IN_FLIGHT = float(os.getenv("SCHED_MAX_IN_FLIGHT", "0")) or max(1.0, round(MODEL_RPS * CALL_SEC))
+MIN_IN_FLIGHT = 1.0
+TENANT_MAX_QUEUED = int(os.getenv("SCHED_TENANT_MAX_QUEUED", "500"))
+MAX_QUEUED = int(os.getenv("SCHED_MAX_QUEUED", "5000"))
+RETRY_DELAYS_SEC = [float(x) for x in os.getenv("SCHED_RETRY_DELAYS_SEC", "30,120").split(",") if x.strip()]
+GENERATOR_FUNCTION = os.getenv("SCHED_GENERATOR_FUNCTION", "gemini_quiz")
+# {"uploader": weight}; everyone else weighs 1
+WEIGHTS = json.loads(os.getenv("SCHED_TENANT_WEIGHTS") or "{}")
+PRIORITIES = {"high": 0, "normal": 1, "bulk": 2}
+ANONYMOUS = "anonymous"
+CAS_RETRIES = 20
+# An attempt is lost once its worker's lease (job_status.LEASE_SEC, about the
+# generator's timeout) has passed, plus the time an asynchronous invoke may
+# wait before the worker starts and takes the lease.
+START_SLACK_SEC = float(os.getenv("SCHED_START_SLACK_SEC", "15"))
+SERVICE_EWMA = 0.2
+
+# what gemini_quiz reports for an attempt
+DONE, RETRY, THROTTLED = "done", "retry", "throttled"
+
+
+def _empty() -> dict:
+    return {"v": 0.0, "seq": 0, "tenants": {}, "queued": [], "running": {},
+            "limit": MAX_IN_FLIGHT, "unitSec": CALL_SEC}
+
+
+class S3QueueStore(job_status.S3StatusStore):
+    """The queue object under the quiz output folder."""
+
+    def key(self, name: str) -> str:
+        return f"{self.prefix}{name}"
+
+
+_store = None
+
+
+def set_store(store):
+    """A job_status-style store (e.g. job_status.MemoryStatusStore for local serving)."""
+    global _store
+    _store = store
+
+
+def store():
+    if _store is not None:
+        return _store
+    bucket, prefix = runtime_context.get_s3_location("/ai-quiz/gen-quiz/quiz-output-folder")
+    return S3QueueStore(runtime_context.client("s3"), bucket, prefix)
+
+
+def _transition(change: Callable[[dict, float], object]):
+    """Conditional read-modify-write of the queue; (state, change's result). Nothing is written if unchanged."""
+    st = store()
+    for attempt in range(CAS_RETRIES):
+        state, etag = st.get(QUEUE_NAME)
+        state = state or _empty()
+        before = json.dumps(state, sort_keys=True)
+        out = change(state, time.time())
+        if json.dumps(state, sort_keys=True) == before:
+            return state, out
+        try:
+            st.put(QUEUE_NAME, state, if_match=etag, if_none_match=etag is None)
+            return state, out
+        except job_status.PreconditionFailed:
+            # every submit and finish writes this one object: back off before re-reading
+            time.sleep(random.uniform(0, 0.02 * (attempt + 1)))
+    raise job_status.PreconditionFailed(QUEUE_NAME)
+
+
+# ---------- queue state (pure functions of the state dict) ----------
+def cost_of(detail: dict) -> int:
+    """Expected Gemini calls: one per map-reduce chunk, one when the text size is unknown."""
+    size = detail.get("chars")
+    if not size:
+        return 1
+    tokens = int(size) // quiz_mapreduce.CHARS_PER_TOKEN
+    return max(1, min(quiz_mapreduce.MAX_CHUNKS, math.ceil(tokens / quiz_mapreduce.CHUNK_TOKENS)))
+
+
+def _order(entry: dict):
+    return entry["prio"], entry["tag"], entry["seq"]
+
+
+def _tag(state: dict, entry: dict):
+    tenant = entry["tenant"]
+    start = max(state["v"], state["tenants"].get(tenant, 0.0))
+    entry["start"] = start
+    entry["tag"] = start + entry["cost"] / float(WEIGHTS.get(tenant, 1))
+    state["tenants"][tenant] = entry["tag"]
+    state["seq"] += 1
+    entry["seq"] = state["seq"]
+    state["queued"].append(entry)
+
+
+def _admit(state: dict, detail: dict, now: float) -> Tuple[str, Optional[dict]]:
+    job = detail["jobId"]
+    if job in state["running"] or any(e["job"] == job for e in state["queued"]):
+        return "duplicate", None
+    tenant = str(detail.get("uploader") or ANONYMOUS)
+    waiting = sum(1 for e in state["queued"] if e["tenant"] == tenant)
+    if waiting >= TENANT_MAX_QUEUED or len(state["queued"]) >= MAX_QUEUED:
+        return "rejected", None
+    prio = PRIORITIES.get(str(detail.get("priority") or "normal").lower(), PRIORITIES["normal"])
+    entry = {"job": job, "tenant": tenant, "cost": cost_of(detail), "prio": prio, "attempt": 1,
+             "admittedAt": round(now, 3), "notBefore": 0, "detail": detail}
+    _tag(state, entry)
+    return "queued", entry
+
+
+def _in_flight(state: dict) -> float:
+    return sum(r["cost"] for r in state["running"].values())
+
+
+def estimate(state: dict, entry: dict, now: float) -> Tuple[int, float]:
+    """(position, estimated start) of a queued entry.
+
+    Fluid estimate: work ahead of it plus the work in flight has to drain down
+    to the cap before it starts, at cap / unitSec cost units per second.
+    """
+    ahead = [e for e in state["queued"] if _order(e) < _order(entry)]
+    backlog = _in_flight(state) + sum(e["cost"] for e in ahead) + entry["cost"] - state["limit"]
+    start = now + max(0.0, backlog) * state["unitSec"] / state["limit"]
+    return len(ahead) + 1, max(start, entry.get("notBefore") or 0)
+
+
+def _dispatch(state: dict, now: float) -> List[dict]:
+    """Move due entries to running in fair order while the cap allows; returns the tickets."""
+    used = _in_flight(state)
+    out = []
+    for e in sorted((e for e in state["queued"] if e["notBefore"] <= now), key=_order):
+        # strictly in order, so a big job is not starved by smaller ones slipping past;
+        # one job always runs, even one costing more than the whole cap
+        if used > 0 and used + e["cost"] > state["limit"]:
+            break
+        state["queued"].remove(e)
+        state["v"] = max(state["v"], e["start"])
+        ticket = {"id": uuid.uuid4().hex[:16], "jobId": e["job"], "tenant": e["tenant"],
+                  "attempt": e["attempt"], "admittedAt": e["admittedAt"], "dispatchedAt": round(now, 3)}
+        state["running"][e["job"]] = dict(e, ticket=ticket["id"], startedAt=round(now, 3),
+                                          deadline=round(now + job_status.LEASE_SEC + START_SLACK_SEC, 3))
+        used += e["cost"]
+        out.append(dict(ticket, detail=e["detail"]))
+    # uploaders with nothing queued and no lead over V would start from V anyway
+    waiting = {e["tenant"] for e in state["queued"]}
+    for t in [t for t, tag in state["tenants"].items() if tag <= state["v"] and t not in waiting]:
+        del state["tenants"][t]
+    return out
+
+
+def _requeue(state: dict, run: dict, now: float):
+    delay = RETRY_DELAYS_SEC[min(run["attempt"] - 1, len(RETRY_DELAYS_SEC) - 1)] if RETRY_DELAYS_SEC else 0
+    entry = {k: run[k] for k in ("job", "tenant", "cost", "prio", "admittedAt", "detail")}
+    # no delay is due at once: now rounded to the millisecond can land after now
+    entry.update(attempt=run["attempt"] + 1, notBefore=round(now + delay, 3) if delay else 0)
+    _tag(state, entry)
+
+
+def _reap(state: dict, now: float) -> int:
+    """Re-queue attempts whose worker never reported back within the lease."""
+    lost = [r for r in state["running"].values() if r["deadline"] <= now]
+    for r in lost:
+        del state["running"][r["job"]]
+        _requeue(state, r, now)
+    return len(lost)
+
+
+def _release(state: dict, ticket: dict, outcome: str, seconds: float, now: float) -> bool:
+    run = state["running"].get(ticket.get("jobId"))
+    if run is None or run["ticket"] != ticket.get("id"):
+        return False  # already reaped and re-dispatched
+    del state["running"][run["job"]]
+    if outcome == THROTTLED:
+        state["limit"] = max(MIN_IN_FLIGHT, state["limit"] / 2)
+    elif outcome == DONE:
+        state["limit"] = min(MAX_IN_FLIGHT, state["limit"] + run["cost"] / state["limit"])
+        if seconds > 0:
+            unit = seconds / run["cost"]
+            state["unitSec"] = round((1 - SERVICE_EWMA) * state["unitSec"] + SERVICE_EWMA * unit, 3)
+    if outcome in (RETRY, THROTTLED):
+        _requeue(state, run, now)
+    return True
+
+
+# ---------- entry points ----------
+def _invoke(ticket: dict) -> bool:
+    detail = dict(ticket["detail"], ticket={k: v for k, v in ticket.items() if k != "detail"})
+    event = {"source": "ai-quiz.scheduler", "detail-type": "generation-dispatched", "detail": detail}
+    try:
+        runtime_context.client("lambda").invoke(FunctionName=GENERATOR_FUNCTION, InvocationType="Event",
+                                                Payload=json.dumps(event).encode("utf-8"))
+        return True
+    except Exception as e:
+        log.error("dispatch of %s failed: %s", ticket["jobId"], e)
+        return False
+
+
+def _send(tickets: List[dict], stats: dict, inv: Optional[telemetry.Invocation]):
+    """Invoke the generator for each ticket; tickets that could not be sent go back to the queue."""
+    now = time.time()
+    failed = [t for t in tickets if not _invoke(t)]
+    sent = [t for t in tickets if t not in failed]
+    stats["dispatched"] += len(sent)
+    if inv is not None and sent:
+        worst = max((now - t["admittedAt"]) * 1000 for t in sent)
+        inv.timings["queue_wait_max_ms"] = round(max(worst, inv.timings.get("queue_wait_max_ms", 0.0)), 1)
+    if failed:
+        def change(state, now):
+            for t in failed:
+                _release(state, t, RETRY, 0, now)
+
+        _transition(change)
+
+
+def _report(state: dict, stats: dict, inv: Optional[telemetry.Invocation]) -> dict:
+    out = dict(stats, queued=len(state["queued"]), running=len(state["running"]),
+               inFlight=_in_flight(state), limit=round(state["limit"], 2),
+               tenants=len({e["tenant"] for e in state["queued"]}))
+    if inv is not None:
+        inv.timings.update(queue_depth=out["queued"], in_flight=out["inFlight"], in_flight_limit=out["limit"],
+                           tenants_waiting=out["tenants"], admitted=stats["admitted"],
+                           rejected=stats["rejected"], dispatched=stats["dispatched"])
+    return out
+
+
+def submit(details: List[dict], inv: Optional[telemetry.Invocation] = None) -> dict:
+    """Admit extracted jobs (event details) and dispatch whatever the cap allows."""
+    stats = {"admitted": 0, "rejected": 0, "duplicate": 0, "dispatched": 0, "reaped": 0}
+    span = inv.span if inv is not None else (lambda _: nullcontext())
+
+    def change(state, now):
+        results = []
+        for d in details:
+            why, entry = _admit(state, d, now)
+            results.append((d["jobId"], why, entry))
+        stats["reaped"] = _reap(state, now)
+        # positions are read before dispatch, so jobs about to go out report position 1 and no wait
+        marks = [(job, why) + (estimate(state, entry, now) if entry else (0, 0.0)) for job, why, entry in results]
+        return marks, _dispatch(state, now)
+
+    with span("queue_write"):
+        state, (marks, tickets) = _transition(change)
+    with span("status_write"):
+        for job, why, position, start_at in marks:
+            if why == "queued":
+                stats["admitted"] += 1
+                job_status.queued(job, position, start_at)
+            elif why == "rejected":
+                stats["rejected"] += 1
+                log.warning("queue full, refusing %s", job)
+                job_status.update(job, state=job_status.FAILED,
+                                  error="generation queue is full for this uploader; upload again later")
+            else:
+                stats["duplicate"] += 1
+    with span("dispatch"):
+        _send(tickets, stats, inv)
+    return _report(state, stats, inv)
+
+
+def finish(ticket: dict, outcome: str, seconds: float) -> dict:
+    """Called by gemini_quiz when a dispatched attempt ends (DONE, RETRY or THROTTLED)."""
+    stats = {"admitted": 0, "rejected": 0, "duplicate": 0, "dispatched": 0, "reaped": 0}
+
+    def change(state, now):
+        if not _release(state, ticket, outcome, seconds, now):
+            log.info("stale ticket for %s", ticket.get("jobId"))
+        stats["reaped"] = _reap(state, now)
+        return _dispatch(state, now)
+
+    try:
+        state, tickets = _transition(change)
+        _send(tickets, stats, None)
+    except Exception as e:
+        # the next tick re-queues the job once its deadline passes
+        log.error("failed to release %s: %s", ticket.get("jobId"), e)
+        return {}
+    return _report(state, stats, None)
+
+
+def tick(inv: Optional[telemetry.Invocation] = None) -> dict:
+    """Scheduled run: re-queue lost attempts and send out due retries."""
+    return submit([], inv)
+
+
+def snapshot() -> dict:
+    """Queue depth per uploader, in-flight work and the current cap (read-only)."""
+    state, _ = store().get(QUEUE_NAME)
+    state = state or _empty()
+    depth = {}
+    for e in state["queued"]:
+        depth[e["tenant"]] = depth.get(e["tenant"], 0) + 1
+    return {"queued": len(state["queued"]), "running": len(state["running"]), "inFlight": _in_flight(state),
+            "limit": round(state["limit"], 2), "unitSec": state["unitSec"], "byUploader": depth}
+
+
+def ticket_of(event: dict) -> Optional[dict]:
+    """The scheduler's ticket of a dispatched generation event, or None for any other event."""
+    detail = (event or {}).get("detail")
+    ticket = detail.get("ticket") if isinstance(detail, dict) else None
+    return ticket if isinstance(ticket, dict) and ticket.get("id") else None
@@ -0,0 +1,55 @@
+import json
+
+import generation_scheduler
+import telemetry
+
+# ---------- generation scheduler entry point ----------
+# Targets:
+#   - the pdf-extract-finished EventBridge rule, directly or through an SQS
+#     queue (batches of events; reserved concurrency 1 keeps queue writes serial)
+#   - an EventBridge schedule, rate(1 minute): no jobs, just a tick that
+#     re-queues lost attempts and releases due retries
+# Jobs are handed to gemini_quiz by generation_scheduler (see there).
+
+log = telemetry.get_logger("generation_scheduler")
+
+
+def _resp(code: int, obj) -> dict:
+    return {"statusCode": code, "headers": {"Content-Type": "application/json"}, "body": json.dumps(obj)}
+
+
+def _details(event: dict) -> list:
+    """The job details of an EventBridge event or an SQS batch of them (empty for a scheduled tick)."""
+    events = []
+    for rec in event.get("Records") or []:
+        try:
+            events.append(json.loads(rec.get("body") or "{}"))
+        except ValueError:
+            log.warning("skipping unreadable SQS message %s", rec.get("messageId"))
+    if not events and isinstance(event.get("detail"), dict):
+        events.append(event)
+    out = []
+    for e in events:
+        detail = e.get("detail") if isinstance(e.get("detail"), dict) else {}
+        job_id = str(detail.get("jobId", "")).strip()
+        if job_id:
+            out.append(dict(detail, jobId=job_id))
+    return out
+
+
+def lambda_handler(event, context):
+    timings = {}
+    with telemetry.Invocation("generation_scheduler", timings) as inv:
+        return inv.result(_handle(event or {}, inv))
+
+
+def _handle(event: dict, inv: telemetry.Invocation) -> dict:
+    details = _details(event)
+    try:
+        stats = generation_scheduler.submit(details, inv) if details else generation_scheduler.tick(inv)
+    except Exception as e:
+        log.error("scheduling failed: %s", e)
+        if event.get("Records"):
+            raise  # admission is idempotent, so SQS may redeliver the whole batch
+        return _resp(500, {"error": f"scheduling failed: {e}"})
+    return _resp(200, dict(stats, timings=inv.timings))
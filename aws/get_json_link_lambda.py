@@ -1,24 +1,45 @@
-import os
 import json
-import boto3
 from botocore.exceptions import ClientError
 
-# Helper function to format the HTTP response
-def _resp(code: int, body_obj) -> dict:
-    return {
-        "statusCode": code,
-        "headers": {
-            "Content-Type": "application/json",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET",
-            "Access-Control-Allow-Headers": "Content-Type",
-        },
-        "body": json.dumps(body_obj, ensure_ascii=False),
+import artifacts
+import delivery
+import job_status
+import quiz_variants
+import runtime_context
+import telemetry
+
+log = telemetry.get_logger("get_json_link")
+
+# Helper function to format the HTTP response. ``raw_body`` is sent as-is
+# (quiz.json straight from S3, never parsed and re-serialised).
+def _resp(code: int, body_obj, etag: str = None, cache_control: str = delivery.NO_STORE,
+          raw_body: str = None) -> dict:
+    headers = {
+        "Content-Type": "application/json",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "GET",
+        "Access-Control-Allow-Headers": "Content-Type, If-None-Match",
+        "Access-Control-Expose-Headers": "ETag",
     }
+    if etag:
+        headers["ETag"] = etag
+    headers["Cache-Control"] = cache_control
+    if code == 304:
+        body = ""
+    elif raw_body is not None:
+        body = raw_body
+    else:
+        body = json.dumps(body_obj, ensure_ascii=False)
+    return {"statusCode": code, "headers": headers, "body": body}
+
+def _finished(record: dict) -> bool:
+    return record.get("state") == job_status.READY or record.get("state") in job_status.FAILED_STATES
 
 def lambda_handler(event, context):
-    print(f"DEBUG: === LAMBDA STARTED ===")
-    
+    with telemetry.Invocation("get_json_link") as inv:
+        return inv.result(_handle(event, inv))
+
+def _handle(event: dict, inv: telemetry.Invocation) -> dict:
     # 1. Get the jobId from the API Gateway path
     job_id = None
     if "pathParameters" in event and event["pathParameters"]:
@@ -27,59 +48,88 @@ def lambda_handler(event, context):
     if not job_id:
         return _resp(400, {"error": "Missing jobId in path."})
     
-    print(f"DEBUG: Extracted jobId: {job_id}")
+    # ?variant=<id> reads one of the quizzes made by quiz_variants_lambda instead
+    variant = (event.get("queryStringParameters") or {}).get("variant")
+    if variant is not None and not quiz_variants.is_variant_id(variant):
+        return _resp(400, {"error": "Invalid variant id."})
+
+    inv.bind(jobId=job_id)
+    if_none_match, wait = job_status.request_options(event)
 
     # 2. Get the S3 bucket information from SSM Parameter Store
     try:
-        ssm = boto3.client("ssm")
-        out_uri = ssm.get_parameter(Name="/ai-quiz/gen-quiz/quiz-output-folder", WithDecryption=False)["Parameter"]["Value"]
-        
-        # Parse the S3 URI
-        parts = out_uri.split("://")
-        out_bucket = parts[1].split("/")[0]
-        out_prefix = "/".join(parts[1].split("/")[1:])
-        if out_prefix and not out_prefix.endswith("/"):
-            out_prefix += "/"
-
+        with inv.span("ssm_fetch"):
+            out_bucket, out_prefix = runtime_context.get_s3_location("/ai-quiz/gen-quiz/quiz-output-folder")
     except Exception as e:
-        print(f"ERROR: Failed to get S3 path from SSM: {str(e)}")
+        log.error("failed to get S3 path from SSM: %s", e)
         return _resp(500, {"error": "Internal server error."})
-        
-    s3 = boto3.client("s3")
+
+    # 3. Answer from the job's status record while it is still processing
+    #    (?wait=N long-polls up to job_status.LONG_POLL_MAX_SEC for it to finish)
+    try:
+        with inv.span("status_read"):
+            record, _ = job_status.store().get(job_id)
+        if wait > 0 and (record is None or not _finished(record)):
+            with inv.span("long_poll"):
+                record, _ = job_status.wait_for_change(job_id, None, wait, done=_finished)
+    except Exception as e:
+        log.error("failed to read job status: %s", e)
+        record = None
+
+    if record is not None:
+        state = record.get("state")
+        outputs = record.get("outputs") or {}
+        if variant:
+            # variants only need the extracted text, not a finished main quiz
+            outputs = (outputs.get("variants") or {}).get(variant)
+            if outputs is None:
+                return _resp(404, {"error": "File not found.", "status": state})
+        elif state in job_status.FAILED_STATES:
+            return _resp(500, {"error": "Quiz generation failed.", **job_status.describe(record)})
+        elif state != job_status.READY:
+            # 404 keeps the website polling, exactly as before the status record existed
+            # (RETRYING included: another attempt is on its way)
+            return _resp(404, {"error": "File not found.", **job_status.describe(record)})
+        quiz_etag = outputs.get("jsonETag")
+        if quiz_etag and if_none_match == quiz_etag:
+            return _resp(304, None, quiz_etag, delivery.REVALIDATE)
+
+    s3 = runtime_context.client("s3")
     
-    # 3. Build the full path to the JSON file
-    json_key = f"{out_prefix}{job_id}/quiz.json"
+    # 4. Build the full path to the JSON file (jobs without a status record are read directly)
+    if variant:
+        json_key = quiz_variants.variant_key(out_prefix, job_id, variant)
+    else:
+        json_key = f"{out_prefix}{job_id}/quiz.json"
+
+    # ?delivery=url: hand out a presigned link instead of the body. Only for
+    # jobs known to be READY, since the link is not checked against S3.
+    if delivery.mode(event) == "url" and record is not None:
+        expires = delivery.expires_in(event)
+        url = delivery.presigned_get(s3, out_bucket, json_key, expires, content_type="application/json")
+        return _resp(200, {"status": "ready", "url": url, "expiresIn": expires},
+                     cache_control=delivery.link_cache_control(expires))
     
-    # 4. Attempt to get the file content from S3
+    # 5. Attempt to get the file content from S3
     try:
-        response = s3.get_object(Bucket=out_bucket, Key=json_key)
-        
-        # Read the file content
-        file_content = response['Body'].read().decode('utf-8')
-        
-        # Parse the JSON content
-        quiz_data = json.loads(file_content)
+        with inv.span("s3_read"):
+            response = s3.get_object(Bucket=out_bucket, Key=json_key)
+
+            # Read the file content
+            file_content = artifacts.read_body(response).decode('utf-8')
         
-        # Return the JSON content directly
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET",
-                "Access-Control-Allow-Headers": "Content-Type",
-            },
-            "body": json.dumps(quiz_data, ensure_ascii=False)
-        }
+        # quiz.json is returned byte-for-byte; a forced regeneration rewrites it
+        # in place, so caches hold it briefly and then revalidate by ETag
+        return _resp(200, None, response.get("ETag"), delivery.REVALIDATE, raw_body=file_content)
     
     except ClientError as e:
         if e.response['Error']['Code'] == 'NoSuchKey':
             # File not found
             return _resp(404, {"error": "File not found."})
         else:
-            print(f"ERROR: S3 error: {str(e)}")
+            log.error("S3 error: %s", e)
             return _resp(500, {"error": "Internal S3 error."})
     
     except Exception as e:
-        print(f"ERROR: Unhandled exception: {str(e)}")
-        return _resp(500, {"error": "An unexpected error occurred."})
\ No newline at end of file
+        log.error("unhandled exception: %s", e)
+        return _resp(500, {"error": "An unexpected error occurred."})
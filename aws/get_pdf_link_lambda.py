@@ -1,24 +1,56 @@
-import os
 import json
-import boto3
+from datetime import datetime, timezone
+from typing import Optional
+
 from botocore.exceptions import ClientError
 
+import delivery
+import job_status
+import runtime_context
+import telemetry
+
+log = telemetry.get_logger("get_pdf_link")
+
 # Helper function to format the HTTP response
-def _resp(code: int, obj) -> dict:
+def _resp(code: int, obj, etag: str = None, cache_control: str = delivery.NO_STORE) -> dict:
+    headers = {
+        "Content-Type": "application/json",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "GET",
+        "Access-Control-Allow-Headers": "Content-Type, If-None-Match",
+        "Access-Control-Expose-Headers": "ETag",
+    }
+    if etag:
+        headers["ETag"] = etag
+    headers["Cache-Control"] = cache_control
     return {
         "statusCode": code,
-        "headers": {
-            "Content-Type": "application/json",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET",
-            "Access-Control-Allow-Headers": "Content-Type",
-        },
-        "body": json.dumps(obj, ensure_ascii=False),
+        "headers": headers,
+        "body": "" if code == 304 else json.dumps(obj, ensure_ascii=False),
     }
 
+def _pdf_missing(record: dict) -> Optional[str]:
+    """Why a READY job will never get its PDF, or None while it may still arrive."""
+    if record.get("state") != job_status.READY or (record.get("outputs") or {}).get("pdf"):
+        return None
+    if record.get("pdfError"):
+        return record["pdfError"]
+    # the generator uploads the PDF right after marking the job READY; once its
+    # lease would have run out, it died in between
+    ready_at = (record.get("stages") or {}).get(job_status.READY)
+    if ready_at and (datetime.now(timezone.utc) - datetime.fromisoformat(ready_at)).total_seconds() > job_status.LEASE_SEC:
+        return "PDF was not saved"
+    return None
+
+def _pdf_settled(record: dict) -> bool:
+    return (bool((record.get("outputs") or {}).get("pdf")) or record.get("state") in job_status.FAILED_STATES
+            or _pdf_missing(record) is not None)
+
 def lambda_handler(event, context):
-    print(f"DEBUG: === LAMBDA STARTED ===")
-    
+    with telemetry.Invocation("get_pdf_link") as inv:
+        return inv.result(_handle(event, inv))
+
+def _handle(event: dict, inv: telemetry.Invocation) -> dict:
     # 1. Get the jobId from the API Gateway path
     job_id = None
     if "pathParameters" in event and event["pathParameters"]:
@@ -27,49 +59,75 @@ def lambda_handler(event, context):
     if not job_id:
         return _resp(400, {"error": "Missing jobId in path."})
     
-    print(f"DEBUG: Extracted jobId: {job_id}")
+    inv.bind(jobId=job_id)
+    if_none_match, wait = job_status.request_options(event)
 
     # 2. Get the S3 bucket information from SSM Parameter Store
     try:
-        ssm = boto3.client("ssm")
-        out_uri = ssm.get_parameter(Name="/ai-quiz/gen-quiz/quiz-output-folder", WithDecryption=False)["Parameter"]["Value"]
-        
-        # Parse the S3 URI
-        parts = out_uri.split("://")
-        out_bucket = parts[1].split("/")[0]
-        out_prefix = "/".join(parts[1].split("/")[1:])
-        if out_prefix and not out_prefix.endswith("/"):
-            out_prefix += "/"
-
+        with inv.span("ssm_fetch"):
+            out_bucket, out_prefix = runtime_context.get_s3_location("/ai-quiz/gen-quiz/quiz-output-folder")
     except Exception as e:
-        print(f"ERROR: Failed to get S3 path from SSM: {str(e)}")
+        log.error("failed to get S3 path from SSM: %s", e)
         return _resp(500, {"error": "Internal server error."})
-        
-    s3 = boto3.client("s3")
-    s3_region = s3.meta.region_name
+
+    s3 = runtime_context.client("s3")
     
-    # 3. Build the full path to the PDF file
+    # 3. Build the full path to the PDF file. The bucket blocks public access,
+    #    so the website gets a presigned link (signed locally, no S3 call).
     pdf_key = f"{out_prefix}{job_id}/quiz.pdf"
-    pdf_url = f"https://{out_bucket}.s3.{s3_region}.amazonaws.com/{pdf_key}"
-    
-    # 4. Check if the file exists
+    expires = delivery.expires_in(event)
+
+    def ready() -> dict:
+        # Every call signs a fresh URL, so this response carries no ETag and is
+        # only cacheable for part of the URL's lifetime.
+        pdf_url = delivery.presigned_get(s3, out_bucket, pdf_key, expires,
+                                         content_type="application/pdf", filename="quiz.pdf")
+        return _resp(200, {"status": "ready", "pdfUrl": pdf_url, "expiresIn": expires},
+                     cache_control=delivery.link_cache_control(expires))
+
+    # 4. Answer from the job's status record; ?wait=N long-polls until the PDF lands
+    try:
+        with inv.span("status_read"):
+            record, etag = job_status.store().get(job_id)
+        if wait > 0 and (record is None or not _pdf_settled(record)):
+            with inv.span("long_poll"):
+                record, etag = job_status.wait_for_change(job_id, None, wait, done=_pdf_settled)
+    except Exception as e:
+        log.error("failed to read job status: %s", e)
+        record = None
+
+    if record is not None:
+        if (record.get("outputs") or {}).get("pdf"):
+            return ready()
+        status = job_status.describe(record)
+        missing = _pdf_missing(record)
+        if missing:
+            # the quiz itself is there (get_json_link); regenerate to get a PDF. Checked
+            # before If-None-Match: a dead generator turns the same record terminal.
+            return _resp(409, {"error": "PDF not available for this quiz.", "reason": missing, **status}, etag)
+        if etag and if_none_match == etag:
+            return _resp(304, None, etag)
+        if record.get("state") in job_status.FAILED_STATES:
+            return _resp(500, {"error": "Quiz generation failed.", **status}, etag)
+        return _resp(202, {"status": "processing", "message": "PDF file not ready yet.",
+                           "state": status.pop("status"), **status}, etag)
+
+    # 5. No status record (job predates it): check if the file exists
     try:
-        s3.head_object(Bucket=out_bucket, Key=pdf_key)
+        with inv.span("s3_read"):
+            s3.head_object(Bucket=out_bucket, Key=pdf_key)
         
         # If the file exists, return the URL
-        return _resp(200, {
-            "status": "ready",
-            "pdfUrl": pdf_url
-        })
+        return ready()
     
     except ClientError as e:
         if e.response['Error']['Code'] == '404':
             # File is not ready yet
             return _resp(202, {"status": "processing", "message": "PDF file not ready yet."})
         else:
-            print(f"ERROR: S3 error: {str(e)}")
+            log.error("S3 error: %s", e)
             return _resp(500, {"error": "Internal S3 error."})
     
     except Exception as e:
-        print(f"ERROR: Unhandled exception: {str(e)}")
+        log.error("unhandled exception: %s", e)
         return _resp(500, {"error": "An unexpected error occurred."})
\ No newline at end of file
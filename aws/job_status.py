@@ -0,0 +1,404 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+import runtime_context
+import telemetry
+
+# ---------- job status records ----------
+# One compact JSON record per job, written by each pipeline stage and read by
+# the polling lambdas, so a poll costs one small GET instead of HEAD/GET on
+# the outputs plus config lookups.
+#
+#   {"jobId", "state", "updatedAt", "stages": {state: ts}, "outputs": {...},
+#    "attempts": n, "lease": {"owner", "expiresAt"}, "error": "..."}
+#
+# The record is also the job's state machine. Every write is conditional on
+# the ETag that was read (If-None-Match: * for a new record), so under
+# at-least-once delivery exactly one generator claims a job:
+#
+#   EXTRACTED --claim--> GENERATING --complete--> READY
+#       |                  |    ^
+#       | admit      fail  v    | claim (next delivery, or lease expired)
+#       v                RETRYING ----(MAX_ATTEMPTS used)----> DEAD
+#     QUEUED --claim--> GENERATING
+#
+# A claim holds a lease; a worker that dies mid-generation leaves an expired
+# lease that the next delivery takes over, and that attempt counts. FAILED is
+# kept for errors a retry cannot fix (e.g. no extracted text). QUEUED is set
+# by generation_scheduler while the job waits for a generation slot; the
+# record then carries {"queue": {"position", "startAt"}}.
+
+log = telemetry.get_logger("job_status")
+
+EXTRACTED = "EXTRACTED"
+QUEUED = "QUEUED"
+GENERATING = "GENERATING"
+READY = "READY"
+RETRYING = "RETRYING"
+FAILED = "FAILED"
+DEAD = "DEAD"
+# states the read lambdas report as a failed job
+FAILED_STATES = (FAILED, DEAD)
+
+STATUS_NAME = "status.json"
+LONG_POLL_MAX_SEC = 20
+LONG_POLL_INTERVAL_SEC = 1.0
+# A lease outlives its worker's Lambda timeout by LEASE_MARGIN_SEC, so it only
+# expires when the worker is gone: a timed-out invocation never reports back,
+# and its job waits out the lease before another worker may take it. Claims
+# made in Lambda derive it from the invocation's remaining time (lease_length);
+# the default fits gemini_quiz's deployed 30 s timeout.
+LEASE_MARGIN_SEC = float(os.getenv("JOB_LEASE_MARGIN_SEC", "15"))
+LEASE_SEC = float(os.getenv("JOB_LEASE_SEC", "45"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+CAS_RETRIES = 5
+
+
+class PreconditionFailed(Exception):
+    """A conditional write lost to a concurrent writer."""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def etag_of(body: bytes) -> str:
+    # Same value S3 reports for a single-part PUT, so both stores agree.
+    return '"' + hashlib.md5(body).hexdigest() + '"'
+
+
+def _encode(record: dict) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+class S3StatusStore:
+    def __init__(self, s3, bucket: str, prefix: str):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def key(self, job_id: str) -> str:
+        return f"{self.prefix}{job_id}/{STATUS_NAME}"
+
+    def get(self, job_id: str) -> Tuple[Optional[dict], Optional[str]]:
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=self.key(job_id))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None, None
+            raise
+        body = obj["Body"].read()
+        return json.loads(body.decode("utf-8")), obj.get("ETag") or etag_of(body)
+
+    def put(self, job_id: str, record: dict, if_match: Optional[str] = None, if_none_match: bool = False) -> str:
+        body = _encode(record)
+        cond = {"IfMatch": if_match} if if_match else ({"IfNoneMatch": "*"} if if_none_match else {})
+        try:
+            self.s3.put_object(Bucket=self.bucket, Key=self.key(job_id), Body=body,
+                               ContentType="application/json", CacheControl="no-cache", **cond)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("PreconditionFailed", "ConditionalRequestConflict", "412", "409"):
+                raise PreconditionFailed(job_id)
+            raise
+        return etag_of(body)
+
+
+class MemoryStatusStore:
+    """Local stand-in with the same interface; also used when serving outside Lambda."""
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str) -> Tuple[Optional[dict], Optional[str]]:
+        with self._lock:
+            body = self._records.get(job_id)
+        if body is None:
+            return None, None
+        return json.loads(body.decode("utf-8")), etag_of(body)
+
+    def put(self, job_id: str, record: dict, if_match: Optional[str] = None, if_none_match: bool = False) -> str:
+        body = _encode(record)
+        with self._lock:
+            cur = self._records.get(job_id)
+            if (if_none_match and cur is not None) or (if_match and (cur is None or etag_of(cur) != if_match)):
+                raise PreconditionFailed(job_id)
+            self._records[job_id] = body
+        return etag_of(body)
+
+
+_store = None
+
+
+def set_store(store):
+    global _store
+    _store = store
+
+
+def store():
+    """The configured store; by default status.json objects under the quiz output folder."""
+    if _store is not None:
+        return _store
+    # runtime_context caches both the client and the location, so this is cheap per call
+    bucket, prefix = runtime_context.get_s3_location("/ai-quiz/gen-quiz/quiz-output-folder")
+    return S3StatusStore(runtime_context.client("s3"), bucket, prefix)
+
+
+def _transition(job_id: str, change: Callable[[Optional[dict]], Optional[dict]]) -> Tuple[Optional[dict], bool]:
+    """Read-modify-write with a conditional put, re-read and re-applied when another writer got in first.
+
+    ``change`` gets the current record (None if there is none) and returns the
+    new record, or None to leave it as it is. Returns (record, written).
+    """
+    st = store()
+    for _ in range(CAS_RETRIES):
+        record, etag = st.get(job_id)
+        new = change(json.loads(json.dumps(record)) if record is not None else None)
+        if new is None:
+            return record, False
+        new["updatedAt"] = _now()
+        try:
+            st.put(job_id, new, if_match=etag if record is not None else None, if_none_match=record is None)
+            return new, True
+        except PreconditionFailed:
+            continue
+    raise PreconditionFailed(job_id)
+
+
+def _set_state(record: Optional[dict], job_id: str, state: Optional[str]) -> dict:
+    record = record or {"jobId": job_id, "stages": {}, "outputs": {}}
+    if state:
+        record["state"] = state
+        record["stages"][state] = _now()
+    return record
+
+
+def update(job_id: str, state: Optional[str] = None, outputs: Optional[dict] = None, **fields) -> dict:
+    """Merge a stage's result into the job's record. Status writes never fail the pipeline."""
+    def change(record):
+        record = _set_state(record, job_id, state)
+        if outputs:
+            record["outputs"].update(outputs)
+        record.update(fields)
+        return record
+
+    try:
+        return _transition(job_id, change)[0]
+    except Exception as e:
+        log.warning("failed to update %s: %s", job_id, e)
+        return {}
+
+
+def _lease_live(record: dict) -> bool:
+    lease = record.get("lease")
+    return record.get("state") == GENERATING and bool(lease) and lease.get("expiresAt", 0) > time.time()
+
+
+def enqueue(job_id: str, outputs: Optional[dict] = None, force: bool = False) -> bool:
+    """Mark a job EXTRACTED and ready for a generator; False if it needs no new generation event.
+
+    A job that is READY, DEAD, QUEUED or leased to a live generator is left
+    alone, so a duplicate upload or S3 redelivery does not run Gemini again.
+    ``force`` re-queues anything except a live lease and resets the attempts.
+    """
+    def change(record):
+        if record is not None and (_lease_live(record) or (not force and record.get("state") in (READY, DEAD, QUEUED))):
+            return None
+        record = _set_state(record, job_id, EXTRACTED)
+        if outputs:
+            record["outputs"].update(outputs)
+        if force:
+            record["attempts"] = 0
+        record.pop("lease", None)
+        record.pop("error", None)
+        record.pop("queue", None)
+        return record
+
+    try:
+        return _transition(job_id, change)[1]
+    except Exception as e:
+        log.warning("failed to enqueue %s: %s", job_id, e)
+        return True  # status store down: fall back to publishing as before
+
+
+def queued(job_id: str, position: int, start_at: float) -> bool:
+    """Mark a job admitted by the scheduler as QUEUED, with its place in line and estimated start.
+
+    Only a job that is waiting (EXTRACTED, RETRYING or already QUEUED) is
+    changed; one a generator has meanwhile claimed keeps its state.
+    """
+    def change(record):
+        if record is not None and record.get("state") not in (EXTRACTED, RETRYING, QUEUED):
+            return None
+        if record is None or record.get("state") != QUEUED:
+            record = _set_state(record, job_id, QUEUED)
+        record["queue"] = {"position": position, "startAt": round(start_at, 1)}
+        return record
+
+    try:
+        return _transition(job_id, change)[1]
+    except Exception as e:
+        log.warning("failed to mark %s queued: %s", job_id, e)
+        return False
+
+
+def lease_length(context=None) -> float:
+    """How long a claim made in Lambda ``context`` should hold the job: its remaining time plus the margin."""
+    remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if remaining is None:
+        return LEASE_SEC
+    return remaining() / 1000 + LEASE_MARGIN_SEC
+
+
+def claim(job_id: str, force: bool = False, owner: Optional[str] = None,
+          lease_sec: Optional[float] = None) -> Tuple[Optional[dict], str]:
+    """Take the job for generation: (lease, "claimed"), or (None, why not).
+
+    Refused when the job is READY/FAILED/DEAD (unless ``force``), leased to a
+    live worker, or has used MAX_ATTEMPTS (it then moves to DEAD). Losing the
+    conditional write to another worker reads as "leased". If the status store
+    is unavailable the job runs untracked, as it did before claims existed.
+    The lease lasts ``lease_sec`` seconds (default LEASE_SEC).
+    """
+    owner = owner or uuid.uuid4().hex[:16]
+    lease_sec = LEASE_SEC if lease_sec is None else lease_sec
+    outcome = {"why": "claimed"}
+
+    def change(record):
+        if record is not None and _lease_live(record):
+            outcome["why"] = "leased"
+            return None
+        state = record.get("state") if record else None
+        if state in (READY, FAILED, DEAD) and not force:
+            outcome["why"] = state.lower()
+            return None
+        record = record or {"jobId": job_id, "stages": {}, "outputs": {}}
+        attempts = 0 if force and state in (READY, FAILED, DEAD) else record.get("attempts", 0)
+        if attempts >= MAX_ATTEMPTS:
+            # the last attempt's worker died holding the lease
+            outcome["why"] = "dead"
+            record = _set_state(record, job_id, DEAD)
+            record.pop("lease", None)
+            record.setdefault("error", f"no attempt finished within {MAX_ATTEMPTS} tries")
+            return record
+        outcome["why"] = "claimed"
+        record = _set_state(record, job_id, GENERATING)
+        record["attempts"] = attempts + 1
+        record["lease"] = {"owner": owner, "expiresAt": round(time.time() + lease_sec, 3)}
+        record.pop("error", None)
+        record.pop("queue", None)
+        return record
+
+    try:
+        record, _ = _transition(job_id, change)
+    except PreconditionFailed:
+        return None, "leased"
+    except Exception as e:
+        log.warning("status store unavailable, generating %s untracked: %s", job_id, e)
+        return {"owner": owner, "attempt": 1, "tracked": False}, "untracked"
+    if outcome["why"] != "claimed":
+        return None, outcome["why"]
+    return {"owner": owner, "attempt": record["attempts"], "tracked": True}, "claimed"
+
+
+def _holds(record: dict, lease: dict) -> bool:
+    # only the lease this worker was given: an expired one still counts until another
+    # worker takes it over, but a finished job or another owner's lease never does
+    current = record.get("lease") or {}
+    return record.get("state") == GENERATING and current.get("owner") == lease.get("owner")
+
+
+def complete(job_id: str, lease: dict, outputs: Optional[dict] = None) -> dict:
+    """GENERATING -> READY. The outputs are content-addressed, so a late finisher may still complete."""
+    def change(record):
+        if record is not None and not _holds(record, lease):
+            log.info("completing %s after its lease passed to another worker", job_id)
+        record = _set_state(record, job_id, READY)
+        if outputs:
+            record["outputs"].update(outputs)
+        record.pop("lease", None)
+        record.pop("error", None)
+        record.pop("pdfError", None)
+        return record
+
+    try:
+        return _transition(job_id, change)[0]
+    except Exception as e:
+        log.warning("failed to complete %s: %s", job_id, e)
+        return {}
+
+
+def fail(job_id: str, lease: dict, error: str, retryable: bool = True) -> Optional[str]:
+    """End an attempt: RETRYING, DEAD once MAX_ATTEMPTS are used, or FAILED if a retry cannot help.
+
+    Returns the job's state afterwards, or None when the attempt no longer
+    holds the job: another worker has taken over its lease, or the job is
+    already READY/FAILED/DEAD. The record is then left as it is.
+    """
+    def change(record):
+        if record is not None and not _holds(record, lease):
+            return None
+        attempts = (record or {}).get("attempts", lease.get("attempt", 1))
+        state = FAILED if not retryable else (DEAD if attempts >= MAX_ATTEMPTS else RETRYING)
+        record = _set_state(record, job_id, state)
+        record["attempts"] = attempts
+        record["error"] = error
+        record.pop("lease", None)
+        return record
+
+    try:
+        record, written = _transition(job_id, change)
+    except Exception as e:
+        log.warning("failed to record failure of %s: %s", job_id, e)
+        return FAILED if not retryable else RETRYING
+    if not written:
+        log.info("not failing %s: its attempt %s no longer holds the job", job_id, lease.get("attempt"))
+        return None
+    return record["state"]
+
+
+def describe(record: dict) -> dict:
+    """What the read lambdas tell a client about a job that is not READY."""
+    out = {"status": record.get("state")}
+    if record.get("attempts"):
+        out.update(attempts=record["attempts"], maxAttempts=MAX_ATTEMPTS)
+    if record.get("state") in (RETRYING,) + FAILED_STATES and record.get("error"):
+        out["reason"] = record["error"]
+    queue = record.get("queue")
+    if record.get("state") == QUEUED and queue:
+        out.update(queuePosition=queue.get("position"),
+                   estimatedWaitSec=max(0, round(queue.get("startAt", 0) - time.time())))
+    return out
+
+
+def wait_for_change(job_id: str, etag: Optional[str], wait_sec: float,
+                    done=lambda record: False) -> Tuple[Optional[dict], Optional[str]]:
+    """Long-poll: return once the record's ETag differs from ``etag``, ``done(record)`` holds, or time runs out."""
+    deadline = time.monotonic() + min(max(wait_sec, 0), LONG_POLL_MAX_SEC)
+    st = store()
+    while True:
+        record, cur = st.get(job_id)
+        if (record is not None and done(record)) or (etag is not None and cur != etag):
+            return record, cur
+        if time.monotonic() + LONG_POLL_INTERVAL_SEC > deadline:
+            return record, cur
+        time.sleep(LONG_POLL_INTERVAL_SEC)
+
+
+def request_options(event: dict) -> Tuple[Optional[str], float]:
+    """(If-None-Match, wait seconds) from an API Gateway event."""
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    query = event.get("queryStringParameters") or {}
+    try:
+        wait = float(query.get("wait") or 0)
+    except ValueError:
+        wait = 0.0
+    return headers.get("if-none-match"), wait
@@ -0,0 +1,118 @@
+import os
+import json
+import base64
+import binascii
+
+import delivery
+import quiz_segments
+import runtime_context
+import telemetry
+
+log = telemetry.get_logger("list_quizzes")
+
+# GET /quizzes: every compacted quiz, paginated by jobId, answered from the
+# segment index (one cached object) instead of one S3 read per job.
+#
+#   ?limit=N              page size (default 50, max 1000; max 100 with include)
+#   ?cursor=...           nextCursor of the previous page
+#   ?q=text               title contains text (case-insensitive)
+#   ?since=epoch          quiz.json written at or after this time
+#   ?minQuestions=N
+#   ?include=questions    each item also carries the full quiz, read from its segment
+#
+# Quizzes appear once quiz_compactor_lambda has rolled them into a segment.
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 1000
+MAX_INCLUDE = 100
+CACHE_SEC = int(os.getenv("LIST_CACHE_SEC", "30"))
+
+
+def _resp(code: int, obj) -> dict:
+    return {
+        "statusCode": code,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "GET",
+            "Access-Control-Allow-Headers": "Content-Type",
+            "Cache-Control": f"private, max-age={CACHE_SEC}" if code == 200 else delivery.NO_STORE,
+        },
+        "body": json.dumps(obj, ensure_ascii=False),
+    }
+
+
+def _encode_cursor(job_id: str) -> str:
+    return base64.urlsafe_b64encode(job_id.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> str:
+    return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+
+
+def _options(query: dict) -> dict:
+    """Parsed query string; raises ValueError on anything unusable."""
+    include = str(query.get("include") or "").strip().lower() == "questions"
+    try:
+        limit = int(query.get("limit") or DEFAULT_LIMIT)
+        since = float(query["since"]) if query.get("since") else None
+        min_q = int(query.get("minQuestions") or 0)
+    except ValueError:
+        raise ValueError("limit, since and minQuestions must be numbers")
+    if not 1 <= limit <= (MAX_INCLUDE if include else MAX_LIMIT):
+        raise ValueError(f"limit must be between 1 and {MAX_INCLUDE if include else MAX_LIMIT}")
+    cursor = None
+    if query.get("cursor"):
+        try:
+            cursor = _decode_cursor(str(query["cursor"]))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValueError("invalid cursor")
+    text = " ".join(str(query.get("q") or "").split()).lower()
+    return {"limit": limit, "cursor": cursor, "q": text, "since": since, "minQuestions": min_q,
+            "include": include}
+
+
+def page(idx: quiz_segments.QuizIndex, opts: dict):
+    """(index positions of one page, position to continue from or None)."""
+    out = []
+    i = idx.after(opts["cursor"])
+    while i < len(idx) and len(out) < opts["limit"]:
+        if ((not opts["q"] or opts["q"] in idx.titles[i].lower())
+                and (opts["since"] is None or idx.modified[i] >= opts["since"])
+                and idx.questions[i] >= opts["minQuestions"]):
+            out.append(i)
+        i += 1
+    return out, (i if i < len(idx) else None)
+
+
+def lambda_handler(event, context):
+    with telemetry.Invocation("list_quizzes") as inv:
+        return inv.result(_handle(event or {}, inv))
+
+
+def _handle(event: dict, inv: telemetry.Invocation) -> dict:
+    try:
+        opts = _options(event.get("queryStringParameters") or {})
+    except ValueError as e:
+        return _resp(400, {"error": str(e)})
+    try:
+        with inv.span("ssm_fetch"):
+            bucket, prefix = runtime_context.get_s3_location("/ai-quiz/gen-quiz/quiz-output-folder")
+        s3 = runtime_context.client("s3")
+        with inv.span("index_read"):
+            idx = quiz_segments.load_index(s3, bucket, prefix)
+        with inv.span("filter"):
+            positions, resume = page(idx, opts)
+        items = []
+        with inv.span("segment_read"):
+            for i in positions:
+                item = idx.entry(i)
+                del item["etag"]
+                if opts["include"]:
+                    item["quiz"] = quiz_segments.quiz(s3, bucket, idx, i)
+                items.append(item)
+    except Exception as e:
+        log.error("listing failed: %s", e)
+        return _resp(500, {"error": "Internal server error."})
+    # the cursor is the last jobId looked at, so filtered pages never rescan it
+    next_cursor = _encode_cursor(idx.jobs[resume - 1]) if resume is not None else None
+    return _resp(200, {"items": items, "count": len(items), "nextCursor": next_cursor, "total": len(idx)})
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+import artifacts
+import runtime_context
+import telemetry
+
+# ---------- LLM response cache ----------
+# Gemini responses stored under a key derived from what was sent:
+#
+#   key = blake2b(VERSION, model, generation config, normalized prompt)
+#
+# The caller takes the JOB_ID line out of the prompt, so what is hashed is the
+# prompt template filled in with the source text. The same text uploaded as
+# another PDF (a different content hash, hence jobId) maps to the same entry;
+# editing a template, asking for a different question count or switching the
+# model gives new keys, and the old entries are simply never read again.
+# Normalization is NFKC plus runs of whitespace collapsed to one space, the
+# differences extraction leaves between otherwise equal texts.
+# LLM_CACHE_VERSION covers changes the prompt doesn't show (how a response is
+# parsed, say).
+#
+# Two tiers:
+#   memory   LRU in the warm container (LLM_CACHE_MEMORY_ENTRIES / _BYTES)
+#   s3       one object per key, <quiz-output-folder>_llm_cache/<k[:2]>/<k>.json,
+#            shared by every container; an entry older than LLM_CACHE_TTL_SEC
+#            reads as a miss and is deleted (a lifecycle rule on the prefix
+#            removes the ones nobody asks for again)
+#
+# An S3 hit is copied into memory. Each entry keeps the latency of the call
+# that produced it, which is what a hit saves. Callers only put() responses
+# that parsed into usable questions, so a bad answer is not replayed on retry.
+
+log = telemetry.get_logger("llm_cache")
+
+ENABLED = os.getenv("LLM_CACHE", "1").strip().lower() in ("1", "true", "yes", "on")
+S3_ENABLED = os.getenv("LLM_CACHE_S3", "1").strip().lower() in ("1", "true", "yes", "on")
+VERSION = os.getenv("LLM_CACHE_VERSION", "1")
+TTL_SEC = float(os.getenv("LLM_CACHE_TTL_SEC", str(30 * 86400)))
+MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+MEMORY_BYTES = int(os.getenv("LLM_CACHE_MEMORY_BYTES", str(16 * 1024 * 1024)))
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", "_llm_cache/")
+
+_lock = threading.Lock()
+# key -> (response text, ms the call took, expires at epoch sec)
+_memory: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+_memory_bytes = 0
+STATS = {"memoryHits": 0, "s3Hits": 0, "misses": 0, "expired": 0, "puts": 0, "savedMs": 0.0}
+
+
+def normalize(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def key(model: str, prompt: str, config: Optional[dict] = None) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    for part in (VERSION, model, json.dumps(config, sort_keys=True) if config else "", normalize(prompt)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _location() -> Tuple[str, str]:
+    bucket, prefix = runtime_context.get_s3_location("/ai-quiz/gen-quiz/quiz-output-folder")
+    return bucket, f"{prefix}{CACHE_DIR}"
+
+
+def _object_key(prefix: str, k: str) -> str:
+    return f"{prefix}{k[:2]}/{k}.json"
+
+
+def _remember(k: str, text: str, call_ms: float, expires_at: float):
+    global _memory_bytes
+    with _lock:
+        old = _memory.pop(k, None)
+        if old is not None:
+            _memory_bytes -= len(old[0])
+        _memory[k] = (text, call_ms, expires_at)
+        _memory_bytes += len(text)
+        while _memory and (len(_memory) > MEMORY_ENTRIES or _memory_bytes > MEMORY_BYTES):
+            _, (dropped, _, _) = _memory.popitem(last=False)
+            _memory_bytes -= len(dropped)
+
+
+def _from_memory(k: str, now: float) -> Optional[Tuple[str, float]]:
+    global _memory_bytes
+    with _lock:
+        entry = _memory.get(k)
+        if entry is None:
+            return None
+        if entry[2] <= now:
+            del _memory[k]
+            _memory_bytes -= len(entry[0])
+            return None
+        _memory.move_to_end(k)
+        return entry[0], entry[1]
+
+
+def _from_s3(k: str, now: float) -> Optional[Tuple[str, float]]:
+    s3 = runtime_context.client("s3")
+    bucket, prefix = _location()
+    obj_key = _object_key(prefix, k)
+    try:
+        entry = json.loads(artifacts.get_bytes(s3, bucket, obj_key))
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+            log.warning("llm cache read failed: %s", e)
+        return None
+    if float(entry.get("expiresAt", 0)) <= now:
+        with _lock:
+            STATS["expired"] += 1
+        try:
+            s3.delete_object(Bucket=bucket, Key=obj_key)
+        except ClientError as e:
+            log.warning("expired llm cache entry not deleted: %s", e)
+        return None
+    _remember(k, entry["text"], float(entry.get("callMs", 0.0)), float(entry["expiresAt"]))
+    return entry["text"], float(entry.get("callMs", 0.0))
+
+
+def get(k: str, inv: Optional[telemetry.Invocation] = None) -> Optional[str]:
+    """The cached response for ``k``, or None; counts the hit or miss on ``inv``."""
+    if not ENABLED:
+        return None
+    t0 = time.perf_counter()
+    now = time.time()
+    tier = "memory"
+    found = _from_memory(k, now)
+    if found is None and S3_ENABLED:
+        tier = "s3"
+        try:
+            found = _from_s3(k, now)
+        except Exception as e:
+            log.warning("llm cache read failed: %s", e)
+    lookup_ms = (time.perf_counter() - t0) * 1000
+    saved_ms = max(0.0, found[1] - lookup_ms) if found is not None else 0.0
+    with _lock:
+        if found is None:
+            STATS["misses"] += 1
+        else:
+            STATS[f"{tier}Hits"] += 1
+            STATS["savedMs"] = round(STATS["savedMs"] + saved_ms, 1)
+    if inv is not None:
+        inv.add("llm_cache_read", lookup_ms)
+        if found is None:
+            inv.count("llm_cache_misses")
+        else:
+            inv.count("llm_cache_hits")
+            inv.count(f"llm_cache_{tier}_hits")
+            inv.add("llm_cache_saved", saved_ms)
+    if found is not None:
+        log.debug("llm cache hit", tier=tier, key=k, saved_ms=round(saved_ms, 1))
+    return found[0] if found is not None else None
+
+
+def put(k: str, text: str, call_ms: float, model: str = ""):
+    """Store a response that took ``call_ms`` to produce in both tiers; failures are only logged."""
+    if not ENABLED:
+        return
+    now = time.time()
+    expires_at = now + TTL_SEC
+    _remember(k, text, call_ms, expires_at)
+    with _lock:
+        STATS["puts"] += 1
+    if not S3_ENABLED:
+        return
+    entry = {"model": model, "createdAt": round(now, 3), "expiresAt": round(expires_at, 3),
+             "callMs": round(call_ms, 1), "text": text}
+    try:
+        bucket, prefix = _location()
+        artifacts.put(runtime_context.client("s3"), bucket, _object_key(prefix, k),
+                      json.dumps(entry, ensure_ascii=False).encode("utf-8"), "application/json")
+    except Exception as e:
+        log.warning("llm cache write failed: %s", e)
+
+
+def stats() -> dict:
+    """Container-wide counters since start: hits per tier, misses, hit rate and latency saved."""
+    with _lock:
+        out = dict(STATS, memoryEntries=len(_memory), memoryBytes=_memory_bytes)
+    lookups = out["memoryHits"] + out["s3Hits"] + out["misses"]
+    out["hitRate"] = round((out["memoryHits"] + out["s3Hits"]) / lookups, 3) if lookups else 0.0
+    return out
+
+
+def reset():
+    """Drop the memory tier and the counters (a cold container)."""
+    global _memory_bytes
+    with _lock:
+        _memory.clear()
+        _memory_bytes = 0
+        for k in STATS:
+            STATS[k] = 0.0 if k == "savedMs" else 0
@@ -0,0 +1,286 @@
+import os
+import io
+import json
+import hmac
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import urllib.parse
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+import telemetry
+
+# ---------- AWS stand-ins for serving outside Lambda ----------
+# local_server plugs these into runtime_context.set_client_factory(), so the
+# handlers run unchanged:
+#
+#   s3              FileS3 (objects under a directory), or a boto3 client for
+#                   any S3-compatible endpoint (MinIO, LocalStack, ...)
+#   ssm             LocalParams: the /ai-quiz parameters, pointing at one bucket
+#   secretsmanager  LocalSecrets: the Gemini key from GEMINI_API_KEY
+#   events          LocalEvents: put_events hands entries to a callback
+#   lambda          LocalLambda: asynchronous invokes go to a callback
+#
+# FileS3 keeps metadata (content type, cache control, user metadata, tags) in
+# a parallel tree under <root>/.meta/, and signs "presigned" URLs with a
+# per-process HMAC key for the server's /files/ route.
+
+log = telemetry.get_logger("local_backend")
+
+
+def _error(code: str, op: str, status: int = 400) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code},
+                        "ResponseMetadata": {"HTTPStatusCode": status}}, op)
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.md5(body).hexdigest() + '"'
+
+
+class FileS3:
+    """The slice of the S3 client API the handlers use, on the local filesystem."""
+
+    def __init__(self, root: str, base_url: str = "http://127.0.0.1:8080"):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+        self._key = os.urandom(32)
+        self._lock = threading.Lock()  # conditional writes: check and replace as one step
+
+    def _path(self, bucket: str, key: str, meta: bool = False) -> str:
+        parts = [p for p in key.split("/") if p not in ("", ".", "..")]
+        base = os.path.join(self.root, ".meta", bucket) if meta else os.path.join(self.root, bucket)
+        return os.path.join(base, *parts) + (".json" if meta else "")
+
+    def _read_meta(self, bucket: str, key: str) -> dict:
+        try:
+            with open(self._path(bucket, key, meta=True), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, bucket: str, key: str, fileobj, meta: dict) -> str:
+        if key.endswith("/"):  # "folder" marker objects: the directory is enough
+            os.makedirs(self._path(bucket, key), exist_ok=True)
+            return _etag(b"")
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        md5 = hashlib.md5()
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = fileobj.read(1 << 20)
+                    if not chunk:
+                        break
+                    md5.update(chunk)
+                    out.write(chunk)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        meta = dict(meta, ETag='"' + md5.hexdigest() + '"')
+        mpath = self._path(bucket, key, meta=True)
+        os.makedirs(os.path.dirname(mpath), exist_ok=True)
+        with open(mpath, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return meta["ETag"]
+
+    def _current_etag(self, bucket: str, key: str) -> Optional[str]:
+        if not os.path.isfile(self._path(bucket, key)):
+            return None
+        return self._read_meta(bucket, key).get("ETag")
+
+    def put_object(self, Bucket, Key, Body=b"", IfMatch=None, IfNoneMatch=None, **kw):
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        fileobj = io.BytesIO(Body) if isinstance(Body, (bytes, bytearray, memoryview)) else Body
+        meta = {k: kw[k] for k in ("ContentType", "CacheControl", "ContentEncoding", "Metadata") if k in kw}
+        with self._lock:
+            if IfMatch is not None or IfNoneMatch is not None:
+                cur = self._current_etag(Bucket, Key)
+                if (IfNoneMatch == "*" and cur is not None) or (IfMatch is not None and cur != IfMatch):
+                    raise _error("PreconditionFailed", "PutObject", 412)
+            etag = self._write(Bucket, Key, fileobj, meta)
+        return {"ETag": etag}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, **kw):
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj, **(ExtraArgs or {}))
+
+    def _stat(self, bucket: str, key: str, op: str):
+        path = self._path(bucket, key)
+        if not os.path.isfile(path):
+            raise _error("NoSuchKey" if op == "GetObject" else "404", op, 404)
+        meta = self._read_meta(bucket, key)
+        out = {"ContentLength": os.path.getsize(path), "ETag": meta.get("ETag"),
+               "ContentType": meta.get("ContentType", "binary/octet-stream"),
+               "Metadata": meta.get("Metadata", {})}
+        for k in ("CacheControl", "ContentEncoding"):
+            if k in meta:
+                out[k] = meta[k]
+        return path, out
+
+    def head_object(self, Bucket, Key, **kw):
+        return self._stat(Bucket, Key, "HeadObject")[1]
+
+    def get_object(self, Bucket, Key, **kw):
+        path, out = self._stat(Bucket, Key, "GetObject")
+        with open(path, "rb") as f:
+            out["Body"] = io.BytesIO(f.read())
+        return out
+
+    def download_file(self, Bucket, Key, Filename, **kw):
+        path, _ = self._stat(Bucket, Key, "GetObject")
+        shutil.copyfile(path, Filename)
+
+    def delete_object(self, Bucket, Key, **kw):
+        for p in (self._path(Bucket, Key), self._path(Bucket, Key, meta=True)):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None, StartAfter=None, MaxKeys=1000, **kw):
+        base = os.path.join(self.root, Bucket)
+        keys = []
+        for dirpath, dirnames, filenames in os.walk(base):
+            rel = os.path.relpath(dirpath, base).replace(os.sep, "/")
+            rel = "" if rel == "." else rel + "/"
+            # prune directories that cannot hold keys under Prefix
+            dirnames[:] = [d for d in dirnames
+                           if (rel + d + "/").startswith(Prefix) or Prefix.startswith(rel + d + "/")]
+            keys.extend(rel + f for f in filenames if not f.startswith(".tmp-") and (rel + f).startswith(Prefix))
+        keys.sort()
+        after = ContinuationToken or StartAfter
+        if after:
+            keys = [k for k in keys if k > after]
+        page = keys[:MaxKeys]
+        contents = []
+        for k in page:
+            path = self._path(Bucket, k)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            contents.append({"Key": k, "Size": st.st_size, "ETag": self._read_meta(Bucket, k).get("ETag"),
+                             "LastModified": datetime.fromtimestamp(st.st_mtime, timezone.utc)})
+        out = {"Contents": contents, "KeyCount": len(contents), "IsTruncated": len(keys) > len(page)}
+        if out["IsTruncated"]:
+            out["NextContinuationToken"] = page[-1]
+        return out
+
+    def put_object_tagging(self, Bucket, Key, Tagging, **kw):
+        with self._lock:
+            meta = self._read_meta(Bucket, Key)
+            meta["Tags"] = Tagging.get("TagSet", [])
+            mpath = self._path(Bucket, Key, meta=True)
+            os.makedirs(os.path.dirname(mpath), exist_ok=True)
+            with open(mpath, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        return {}
+
+    # ---------- presigned URLs for the server's /files/ route ----------
+    def _signature(self, bucket: str, key: str, expires: int) -> str:
+        msg = f"{bucket}\n{key}\n{expires}".encode("utf-8")
+        return hmac.new(self._key, msg, hashlib.sha256).hexdigest()
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600, **kw):
+        bucket, key = Params["Bucket"], Params["Key"]
+        expires = int(time.time() + ExpiresIn)
+        query = {"expires": expires, "sig": self._signature(bucket, key, expires)}
+        for k in ("ResponseContentType", "ResponseContentDisposition"):
+            if k in Params:
+                query[k] = Params[k]
+        return (f"{self.base_url}/files/{urllib.parse.quote(bucket)}/{urllib.parse.quote(key)}?"
+                + urllib.parse.urlencode(query))
+
+    def verify(self, bucket: str, key: str, expires: str, sig: str) -> bool:
+        try:
+            if int(expires) < time.time():
+                return False
+        except (TypeError, ValueError):
+            return False
+        return hmac.compare_digest(self._signature(bucket, key, int(expires)), sig or "")
+
+
+def s3_compatible(endpoint_url: str):
+    """A real S3 client pointed at an S3-compatible service (MinIO, LocalStack, ...)."""
+    import boto3
+    from botocore.config import Config
+    return boto3.client("s3", endpoint_url=endpoint_url,
+                        config=Config(signature_version="s3v4", s3={"addressing_style": "path"}))
+
+
+class LocalParams:
+    """SSM stand-in: every /ai-quiz location in one bucket, plus overrides from a JSON file."""
+
+    def __init__(self, bucket: str, model: str, overrides: Optional[Dict[str, str]] = None):
+        self.values = {
+            "/ai-quiz/pdf-extract/input-folder": f"s3://{bucket}/ai-quiz/pdf-extract/input-folder/",
+            "/ai-quiz/pdf-extract/text-output-folder": f"s3://{bucket}/ai-quiz/pdf-extract/text-output-folder/",
+            "/ai-quiz/gen-quiz/quiz-output-folder": f"s3://{bucket}/ai-quiz/gen-quiz/quiz-output-folder/",
+            "/ai-quiz/gen-quiz/gemini-model": model,
+        }
+        self.values.update(overrides or {})
+
+    def get_parameter(self, Name, WithDecryption=False):
+        if Name not in self.values:
+            raise _error("ParameterNotFound", "GetParameter")
+        return {"Parameter": {"Name": Name, "Value": self.values[Name]}}
+
+    def get_parameters_by_path(self, Path, Recursive=False, WithDecryption=False, NextToken=None):
+        prefix = Path.rstrip("/") + "/"
+        return {"Parameters": [{"Name": k, "Value": v} for k, v in self.values.items() if k.startswith(prefix)]}
+
+
+class LocalSecrets:
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    def get_secret_value(self, SecretId):
+        return {"SecretString": json.dumps({"apiKey": self.api_key})}
+
+
+class LocalEvents:
+    """EventBridge stand-in: accepted entries go to ``dispatch`` (the server's generator queue)."""
+
+    def __init__(self, dispatch: Callable[[dict], None]):
+        self.dispatch = dispatch
+
+    def put_events(self, Entries):
+        out = []
+        for e in Entries:
+            self.dispatch({"source": e.get("Source"), "detail-type": e.get("DetailType"),
+                           "detail": json.loads(e.get("Detail") or "{}")})
+            out.append({"EventId": hashlib.md5(json.dumps(e, sort_keys=True).encode()).hexdigest()})
+        return {"FailedEntryCount": 0, "Entries": out}
+
+
+class LocalLambda:
+    """Lambda stand-in for generation_scheduler's dispatch: "Event" invokes go to ``dispatch``."""
+
+    def __init__(self, dispatch: Callable[[dict], None]):
+        self.dispatch = dispatch
+
+    def invoke(self, FunctionName, Payload=b"", InvocationType="RequestResponse", **kw):
+        if InvocationType != "Event":
+            raise _error("InvalidParameterValueException", "Invoke")
+        self.dispatch(json.loads(Payload or b"{}"))
+        return {"StatusCode": 202}
+
+
+class ClientFactory:
+    """runtime_context client factory over the stand-ins above."""
+
+    def __init__(self, s3, params: LocalParams, secrets: LocalSecrets, events: LocalEvents,
+                 functions: Optional[LocalLambda] = None):
+        self.clients = {"s3": s3, "ssm": params, "secretsmanager": secrets, "events": events,
+                        "lambda": functions}
+
+    def __call__(self, service: str, *args, **kwargs):
+        return self.clients[service]
@@ -0,0 +1,439 @@
+import os
+import json
+import math
+import asyncio
+import argparse
+import urllib.parse
+from http import HTTPStatus
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import extract_engine
+import gemini_quiz
+import generation_scheduler
+import generation_scheduler_lambda
+import get_json_link_lambda
+import get_pdf_link_lambda
+import job_status
+import list_quizzes_lambda
+import llm_cache
+import local_backend
+import pdf_extractor
+import quiz_compactor_lambda
+import quiz_render
+import quiz_variants_lambda
+import runtime_context
+import telemetry
+
+# ---------- self-hosted serving ----------
+# Runs the whole pipeline in one warm process, for on-prem use and load tests:
+#
+#   PUT  /upload_to_s3/upload/{file}        store in the input folder, then pdf_extractor
+#                                           (x-amz-meta-* headers become object metadata,
+#                                           e.g. x-amz-meta-uploader for fair-share scheduling)
+#   GET  /return_json/return_json_data/{jobId}   get_json_link
+#   GET  /return_pdf/return_pdf_link/{jobId}     get_pdf_link
+#   POST /quiz/{jobId}/variants             quiz_variants_lambda
+#   GET  /quizzes                           list_quizzes_lambda (compacted every LOCAL_COMPACT_SEC)
+#   GET  /files/{bucket}/{key}              presigned reads (file storage only)
+#   GET  /healthz                           queue depth, scheduler state, LLM cache and counters
+#
+# (/upload/{file}, /quiz/{jobId} and /pdf/{jobId} are short aliases.) The
+# Lambda handlers run unchanged on a thread pool with the stand-ins from
+# local_backend. Extraction events go to generation_scheduler_lambda, as the
+# EventBridge rule does in AWS; its asynchronous invokes of gemini_quiz land on
+# an asyncio queue drained by generator workers, and a LOCAL_SCHED_TICK_SEC
+# timer stands in for its schedule. PDF extraction and quiz rendering go to
+# a process pool so they never hold the serving process's GIL. Clients, SSM
+# values and caches stay warm for the life of the process.
+#
+#   python local_server.py --storage ./data --port 8080
+#   python local_server.py --s3-endpoint http://localhost:9000 --bucket quiz-ai-bucket
+
+log = telemetry.get_logger("local_server")
+
+HANDLER_THREADS = int(os.getenv("LOCAL_HANDLER_THREADS", "64"))
+# 0: as many workers as the scheduler's in-flight cap can keep busy
+GENERATORS = int(os.getenv("LOCAL_GENERATORS", "0"))
+SCHED_TICK_SEC = float(os.getenv("LOCAL_SCHED_TICK_SEC", "1"))
+# generations here run without a Lambda timeout, so a lease has to cover the slowest one
+LEASE_SEC = float(os.getenv("LOCAL_LEASE_SEC", "900"))
+COMPACT_SEC = float(os.getenv("LOCAL_COMPACT_SEC", "300"))
+MAX_BODY_BYTES = int(os.getenv("LOCAL_MAX_BODY_BYTES", str(50 * 1024 * 1024)))
+HEADER_LIMIT = 64 * 1024
+IDLE_TIMEOUT_SEC = 75
+
+_CORS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, PUT, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, If-None-Match",
+    "Access-Control-Expose-Headers": "ETag",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """(method, target, lower-cased headers, body), or None when the client closed the connection."""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT_SEC)
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+        return None
+    except asyncio.LimitOverrunError:
+        raise HttpError(431, "request headers too large")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            headers[k.strip().lower()] = v.strip()
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = bytearray()
+        while True:
+            try:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            except (ValueError, asyncio.LimitOverrunError):
+                size = -1
+            if size < 0:
+                raise HttpError(400, "malformed chunk size")
+            if size == 0:
+                await reader.readuntil(b"\r\n")
+                break
+            if len(body) + size > MAX_BODY_BYTES:
+                raise HttpError(413, "body too large")
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+        return method, target, headers, bytes(body)
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise HttpError(400, "invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "body too large")
+    return method, target, headers, (await reader.readexactly(length) if length else b"")
+
+
+def _api_event(method: str, path: str, query: Dict[str, str], headers: Dict[str, str],
+               body: Optional[str], path_params: Optional[Dict[str, str]]) -> dict:
+    # the API Gateway proxy event shape the handlers already parse
+    return {"httpMethod": method, "path": path, "pathParameters": path_params,
+            "queryStringParameters": query or None, "headers": headers,
+            "body": body, "isBase64Encoded": False}
+
+
+class LocalServer:
+    def __init__(self, s3, bucket: str, generators: int = GENERATORS, handler_threads: int = HANDLER_THREADS,
+                 processes: int = 0, compact_sec: float = COMPACT_SEC, tick_sec: float = SCHED_TICK_SEC):
+        self.s3 = s3
+        self.bucket = bucket
+        self.generators = generators or max(1, math.ceil(generation_scheduler.MAX_IN_FLIGHT))
+        self.compact_sec = compact_sec
+        self.tick_sec = tick_sec
+        self.threads = ThreadPoolExecutor(max_workers=handler_threads, thread_name_prefix="handler")
+        self.processes = processes or (os.cpu_count() or 1)
+        self.procs: Optional[ProcessPoolExecutor] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.stats = {"requests": 0, "uploads": 0, "extractions": 0, "generations": 0, "skipped": 0,
+                      "failed": 0}
+        self._tasks = set()
+        self._server = None
+
+    # ---------- event dispatch (EventBridge and Lambda stand-ins) ----------
+    def dispatch(self, event: dict):
+        """Called from handler threads by LocalEvents.put_events: the event goes to the scheduler."""
+        self.loop.call_soon_threadsafe(lambda: self._background(self._schedule(event)))
+
+    def invoke(self, event: dict):
+        """Called by LocalLambda when the scheduler hands a job to gemini_quiz."""
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    async def _schedule(self, event: dict):
+        try:
+            await self.loop.run_in_executor(self.threads, generation_scheduler_lambda.lambda_handler, event, None)
+        except Exception as e:
+            log.error("scheduling crashed: %s", e)
+
+    async def _ticker(self):
+        # the scheduler's rate(1 minute) rule: lost attempts and due retries
+        while True:
+            await asyncio.sleep(self.tick_sec)
+            try:
+                await self.loop.run_in_executor(self.threads, generation_scheduler.tick)
+            except Exception as e:
+                log.error("scheduler tick crashed: %s", e)
+
+    async def _generator(self):
+        while True:
+            event = await self.queue.get()
+            try:
+                resp = await self.loop.run_in_executor(self.threads, gemini_quiz.lambda_handler, event, None)
+                body = json.loads(resp.get("body") or "{}")
+                key = "skipped" if body.get("skipped") else ("generations" if resp["statusCode"] < 400 else "failed")
+                self.stats[key] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                log.error("generator crashed: %s", e)
+            finally:
+                self.queue.task_done()
+
+    def _background(self, coro):
+        task = self.loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _compactor(self):
+        # the EventBridge schedule that runs quiz_compactor_lambda in AWS
+        while True:
+            await asyncio.sleep(self.compact_sec)
+            try:
+                await self.loop.run_in_executor(self.threads, quiz_compactor_lambda.lambda_handler, {}, None)
+            except Exception as e:
+                log.error("compaction crashed: %s", e)
+
+    async def _extract(self, key: str):
+        # the S3 ObjectCreated notification the input folder would have sent
+        event = {"Records": [{"eventSource": "aws:s3",
+                              "s3": {"bucket": {"name": self.bucket}, "object": {"key": urllib.parse.quote(key)}}}]}
+        try:
+            await self.loop.run_in_executor(self.threads, pdf_extractor.lambda_handler, event, None)
+            self.stats["extractions"] += 1
+        except Exception as e:
+            log.error("extraction crashed for %s: %s", key, e)
+
+    # ---------- HTTP ----------
+    async def _call(self, handler, event: dict) -> dict:
+        return await self.loop.run_in_executor(self.threads, handler, event, None)
+
+    async def _upload(self, name: str, headers: Dict[str, str], body: bytes) -> dict:
+        if not name or "/" in name:
+            return {"statusCode": 400, "body": json.dumps({"error": "Missing or invalid file name."})}
+        _, prefix = runtime_context.get_s3_location("/ai-quiz/pdf-extract/input-folder")
+        key = f"{prefix}{name}"
+        metadata = {k[len("x-amz-meta-"):]: v for k, v in headers.items() if k.startswith("x-amz-meta-")}
+        await self.loop.run_in_executor(self.threads, lambda: self.s3.put_object(
+            Bucket=self.bucket, Key=key, Body=body, ContentType=headers.get("content-type", "application/pdf"),
+            Metadata=metadata))
+        self.stats["uploads"] += 1
+        # API Gateway's S3 proxy answers once the object is stored; extraction follows asynchronously
+        self._background(self._extract(key))
+        return {"statusCode": 200, "headers": {"Content-Type": "application/json"},
+                "body": json.dumps({"bucket": self.bucket, "key": key})}
+
+    async def _file(self, bucket: str, key: str, query: Dict[str, str], headers: Dict[str, str]) -> dict:
+        if not isinstance(self.s3, local_backend.FileS3) or \
+                not self.s3.verify(bucket, key, query.get("expires"), query.get("sig")):
+            return {"statusCode": 403, "body": json.dumps({"error": "Invalid or expired link."})}
+        try:
+            obj = await self.loop.run_in_executor(self.threads, lambda: self.s3.get_object(Bucket=bucket, Key=key))
+        except Exception:
+            return {"statusCode": 404, "body": json.dumps({"error": "File not found."})}
+        out = {"Content-Type": query.get("ResponseContentType") or obj["ContentType"]}
+        for name, field in (("Cache-Control", "CacheControl"), ("Content-Encoding", "ContentEncoding"),
+                            ("ETag", "ETag")):
+            if obj.get(field):
+                out[name] = obj[field]
+        if query.get("ResponseContentDisposition"):
+            out["Content-Disposition"] = query["ResponseContentDisposition"]
+        if obj.get("ETag") and headers.get("if-none-match") == obj["ETag"]:
+            return {"statusCode": 304, "headers": out, "body": b""}
+        return {"statusCode": 200, "headers": out, "body": obj["Body"].read()}
+
+    async def route(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> dict:
+        url = urllib.parse.urlsplit(target)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        parts = [urllib.parse.unquote(p) for p in url.path.split("/") if p]
+        text = body.decode("utf-8", errors="replace") if body else None
+
+        def api(handler, job_id):
+            params = {"jobId": job_id} if job_id else None
+            return self._call(handler, _api_event(method, url.path, query, headers, text, params))
+
+        if method == "OPTIONS":
+            return {"statusCode": 204, "body": ""}
+        if method == "PUT" and parts[:2] == ["upload_to_s3", "upload"] and len(parts) == 3:
+            return await self._upload(parts[2], headers, body)
+        if method == "PUT" and parts[:1] == ["upload"] and len(parts) == 2:
+            return await self._upload(parts[1], headers, body)
+        if method == "GET":
+            if parts[:2] == ["return_json", "return_json_data"] and len(parts) == 3:
+                return await api(get_json_link_lambda.lambda_handler, parts[2])
+            if parts[:2] == ["return_pdf", "return_pdf_link"] and len(parts) == 3:
+                return await api(get_pdf_link_lambda.lambda_handler, parts[2])
+            if parts[:1] == ["quiz"] and len(parts) == 2:
+                return await api(get_json_link_lambda.lambda_handler, parts[1])
+            if parts[:1] == ["pdf"] and len(parts) == 2:
+                return await api(get_pdf_link_lambda.lambda_handler, parts[1])
+            if parts[:1] == ["files"] and len(parts) >= 3:
+                key = url.path.split("/", 3)[3]
+                return await self._file(parts[1], urllib.parse.unquote(key), query, headers)
+            if parts == ["quizzes"]:
+                return await api(list_quizzes_lambda.lambda_handler, None)
+            if parts == ["healthz"]:
+                scheduler = await self.loop.run_in_executor(self.threads, generation_scheduler.snapshot)
+                return {"statusCode": 200, "headers": {"Content-Type": "application/json"},
+                        "body": json.dumps(dict(self.stats, dispatched=self.queue.qsize(), scheduler=scheduler,
+                                                llm_cache=llm_cache.stats()))}
+        if method == "POST" and parts[:1] == ["quiz"] and len(parts) == 3 and parts[2] == "variants":
+            return await api(quiz_variants_lambda.lambda_handler, parts[1])
+        return {"statusCode": 404, "body": json.dumps({"error": "No such route."})}
+
+    async def _respond(self, writer: asyncio.StreamWriter, resp: dict, keep_alive: bool):
+        code = int(resp.get("statusCode", 200))
+        body = resp.get("body") or b""
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        headers = dict(_CORS)
+        headers.update(resp.get("headers") or {})
+        headers["Content-Length"] = str(len(body))
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        try:
+            reason = HTTPStatus(code).phrase
+        except ValueError:
+            reason = ""
+        head = f"HTTP/1.1 {code} {reason}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    req = await _read_request(reader)
+                except HttpError as e:
+                    await self._respond(writer, {"statusCode": e.status, "body": json.dumps({"error": str(e)})}, False)
+                    break
+                except (ValueError, asyncio.LimitOverrunError):
+                    await self._respond(writer, {"statusCode": 400, "body": json.dumps({"error": "malformed request"})}, False)
+                    break
+                if req is None:
+                    break
+                method, target, headers, body = req
+                self.stats["requests"] += 1
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    resp = await self.route(method, target, headers, body)
+                except Exception as e:
+                    log.error("request failed: %s %s: %s", method, target, e)
+                    resp = {"statusCode": 500, "body": json.dumps({"error": "Internal server error."})}
+                await self._respond(writer, resp, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # client went away, or the server is shutting down
+        finally:
+            writer.close()
+
+    # ---------- lifecycle ----------
+    async def start(self, host: str = "127.0.0.1", port: int = 8080):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.procs = ProcessPoolExecutor(max_workers=self.processes)
+        extract_engine.share_pool(self.procs, self.processes)
+        quiz_render.set_executor(self.procs)
+        telemetry.per_thread_context()
+        for _ in range(self.generators):
+            self._background(self._generator())
+        if self.tick_sec > 0:
+            self._background(self._ticker())
+        if self.compact_sec > 0:
+            self._background(self._compactor())
+        self._server = await asyncio.start_server(self._connection, host, port, limit=HEADER_LIMIT, backlog=1024)
+        sock = self._server.sockets[0].getsockname()
+        log.info("serving on http://%s:%d", sock[0], sock[1], generators=self.generators, processes=self.processes)
+        return sock[1]
+
+    async def drain(self):
+        """Wait until every extraction and every scheduled generation has finished (tests, benchmarks)."""
+        while True:
+            pending = [t for t in self._tasks if t.get_coro().__name__ in ("_extract", "_schedule")]
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                continue
+            await self.queue.join()
+            if any(t.get_coro().__name__ in ("_extract", "_schedule") for t in self._tasks):
+                continue
+            left = await self.loop.run_in_executor(self.threads, generation_scheduler.snapshot)
+            if not left["queued"] and not left["running"]:
+                return
+            await asyncio.sleep(0.05)  # delayed retries wait for the ticker
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for t in list(self._tasks):
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        quiz_render.set_executor(None)
+        self.threads.shutdown(wait=False)
+        if self.procs is not None:
+            self.procs.shutdown(wait=False)
+
+
+def build(storage: Optional[str], s3_endpoint: Optional[str], bucket: str, base_url: str,
+          status_store: str = "memory", params_file: Optional[str] = None, **kwargs) -> LocalServer:
+    """A LocalServer wired into runtime_context, storing in ``storage`` (a directory) or at ``s3_endpoint``."""
+    s3 = local_backend.s3_compatible(s3_endpoint) if s3_endpoint else local_backend.FileS3(storage or "./data", base_url)
+    overrides = None
+    if params_file:
+        with open(params_file, encoding="utf-8") as f:
+            overrides = json.load(f)
+    server = LocalServer(s3, bucket, **kwargs)
+    factory = local_backend.ClientFactory(
+        s3,
+        local_backend.LocalParams(bucket, os.getenv("GEMINI_MODEL", "gemini-2.5-flash"), overrides),
+        local_backend.LocalSecrets(os.getenv("GEMINI_API_KEY", "")),
+        local_backend.LocalEvents(server.dispatch),
+        local_backend.LocalLambda(server.invoke),
+    )
+    runtime_context.set_client_factory(factory)
+    runtime_context.reset()
+    # status records in memory by default (fast polls); "storage" keeps them as status.json objects
+    job_status.set_store(job_status.MemoryStatusStore() if status_store == "memory" else None)
+    generation_scheduler.set_store(job_status.MemoryStatusStore() if status_store == "memory" else None)
+    job_status.LEASE_SEC = LEASE_SEC
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve the quiz pipeline from one process.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--storage", default="./data", help="directory for objects (ignored with --s3-endpoint)")
+    ap.add_argument("--s3-endpoint", help="S3-compatible endpoint URL instead of the filesystem")
+    ap.add_argument("--bucket", default="quiz-ai-bucket")
+    ap.add_argument("--status-store", choices=["memory", "storage"], default="memory")
+    ap.add_argument("--params", help="JSON file of SSM parameter overrides")
+    ap.add_argument("--generators", type=int, default=GENERATORS, help="generator workers (0: the scheduler's cap)")
+    ap.add_argument("--processes", type=int, default=0, help="extraction/render processes (0: one per CPU)")
+    args = ap.parse_args()
+
+    async def run():
+        base_url = f"http://{args.host}:{args.port}"
+        server = build(args.storage, args.s3_endpoint, args.bucket, base_url, args.status_store, args.params,
+                       generators=args.generators, processes=args.processes)
+        await server.start(args.host, args.port)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
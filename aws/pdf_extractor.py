@@ -5,11 +5,25 @@ import hashlib
 import urllib.parse
 from datetime import datetime, timezone
 import base64
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
 
+import artifacts
+import dedup
+import extract_engine
+import job_status
+import revisions
+import runtime_context
+import telemetry
+import text_clean
 
-import boto3
-from botocore.exceptions import ClientError
-import fitz  # PyMuPDF
+SPOOL_MAX_BYTES = int(os.getenv("EXTRACT_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+INMEMORY_MAX_BYTES = int(os.getenv("EXTRACT_INMEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+READ_CHUNK_BYTES = 1024 * 1024
+RECORD_CONCURRENCY = int(os.getenv("EXTRACT_RECORD_CONCURRENCY", "4"))
+EVENTS_PER_CALL = 10  # PutEvents limit
+
+log = telemetry.get_logger("pdf_extractor")
 
 # ---------- small helpers ----------
 def _resp(code: int, obj) -> dict:
@@ -19,63 +33,100 @@ def _resp(code: int, obj) -> dict:
         "body": json.dumps(obj, ensure_ascii=False),
     }
 
-def _compute_job_id_from_content(file_path: str) -> str:
+def _job_id_from_digest(hash_bytes: bytes) -> str:
+    return base64.urlsafe_b64encode(hash_bytes).decode('utf-8').rstrip('=')
+
+def _download_and_hash(s3, bucket: str, key: str):
+    """Read the object once: hash it while buffering in memory, spilling to /tmp past INMEMORY_MAX_BYTES.
+
+    Returns (source, job_id, size, metadata); source is a bytearray or a temp file path the caller must remove.
+    """
+    obj = s3.get_object(Bucket=bucket, Key=key)
+    body = obj["Body"]
     hasher = hashlib.sha256()
-    with open(file_path, "rb") as f:
+    buf = bytearray()
+    spill = None
+    size = 0
+    try:
         while True:
-            chunk = f.read(4096)
+            chunk = body.read(READ_CHUNK_BYTES)
             if not chunk:
                 break
             hasher.update(chunk)
-    hash_bytes = hasher.digest()
-    return base64.urlsafe_b64encode(hash_bytes).decode('utf-8').rstrip('=')
+            size += len(chunk)
+            if spill is not None:
+                spill.write(chunk)
+                continue
+            buf += chunk
+            if len(buf) > INMEMORY_MAX_BYTES:
+                spill = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+                spill.write(buf)
+                buf = bytearray()
+    except Exception:
+        if spill is not None:
+            spill.close()
+            os.remove(spill.name)
+        raise
+    job_id = _job_id_from_digest(hasher.digest())
+    if spill is not None:
+        spill.close()
+        log.info("spilled %d bytes to %s", size, spill.name)
+        return spill.name, job_id, size, obj.get("Metadata") or {}
+    return buf, job_id, size, obj.get("Metadata") or {}
 
 
 def _bad(msg: str):
-    print(f"ERROR: {msg}")
+    log.warning("bad request: %s", msg)
     return _resp(400, {"error": msg})
 
 def _err(msg: str):
-    print(f"ERROR: {msg}")
+    log.error("%s", msg)
     return _resp(500, {"error": msg})
 
 def _ok(msg: str):
-    print(msg)
+    log.info("%s", msg)
     return _resp(200, {"result": msg})
 
 def _normalize_prefix(p: str) -> str:
     return p if p.endswith("/") else p + "/"
 
-def _get_ssm_param(ssm, name: str) -> str:
-    v = ssm.get_parameter(Name=name)["Parameter"]["Value"].strip()
-    if not v:
-        raise ValueError(f"SSM parameter empty: {name}")
-    return v
-
-def _parse_s3_location(value: str, fallback_bucket: str):
-    if value.startswith("s3://"):
-        body = value[5:]
-        parts = body.split("/", 1)
-        bkt = parts[0]
-        pref = parts[1] if len(parts) > 1 else ""
-        return bkt, _normalize_prefix(pref)
-    if value.startswith("arn:aws:s3:::"):
-        body = value[len("arn:aws:s3:::"):]
-        parts = body.split("/", 1)
-        bkt = parts[0]
-        pref = parts[1] if len(parts) > 1 else ""
-        return bkt, _normalize_prefix(pref)
-    return fallback_bucket, _normalize_prefix(value)
-
-def _extract_text_from_pdf(path: str) -> str:
-    doc = fitz.open(path)
-    parts = [page.get_text() for page in doc]
-    doc.close()
-    return ("\n".join(parts)).strip()
-
-def _sanitize_text(s: str) -> str:
-    s = s.replace("\r\n", "\n").replace("\r", "\n").replace("\x00", "")
-    return "".join(ch for ch in s if ch == "\n" or ord(ch) >= 32)
+def _extract_text_to_s3(s3, source, bucket: str, key: str, inv: telemetry.Invocation,
+                        reuse: dict = None) -> Tuple[extract_engine.ExtractStats, dict, dict]:
+    # Pages stream through a text_clean.Cleaner and the artifact compressor into
+    # a spooled buffer that spills to /tmp past SPOOL_MAX_BYTES (compressed
+    # bytes), then go to S3 as a (multipart) upload.
+    # Pages in ``reuse`` already have their text (from a prior revision).
+    cleaner = text_clean.Cleaner()
+    encoding = artifacts.resolve()
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as sink:
+        with inv.span("extract"):
+            writer = artifacts.compressor(sink, encoding)
+            try:
+                stats = extract_engine.extract_to(source, writer, cleaner, reuse=reuse)
+            finally:
+                writer.close()
+        stored = {"bytes": sink.tell(), "encoding": encoding}
+        sink.seek(0)
+        with inv.span("s3_write"):
+            s3.upload_fileobj(sink, bucket, key, ExtraArgs=dict(
+                artifacts.extra_args(encoding), ContentType="text/plain; charset=utf-8"))
+    return stats, cleaner.stats, stored
+
+def _find_revision(s3, source, bucket: str, prefix: str, job_id: str, force: bool):
+    """(page signatures, prior jobId or None, reusable page texts) for a new upload."""
+    sigs = extract_engine.page_signatures(source)
+    if force:
+        return sigs, None, {}
+    base, overlap = revisions.load_index(s3, bucket, f"{prefix}{revisions.INDEX_NAME}").closest(sigs, exclude=job_id)
+    if base is None or overlap < revisions.MIN_OVERLAP:
+        return sigs, None, {}
+    prior_pages = revisions.read_pages(s3, bucket, f"{prefix}{base}/")
+    if not prior_pages:
+        return sigs, None, {}
+    prior_data = artifacts.get_bytes(s3, bucket, f"{prefix}{base}/data.txt")
+    reuse = revisions.reusable_pages(sigs, prior_pages, prior_data)
+    log.info("revision of %s", base, overlap=round(overlap, 3), reused=len(reuse), pages=len(sigs))
+    return sigs, base, reuse
 
 def _compute_job_id(bucket: str, key: str, size: int) -> str:
     raw = f"{bucket}{key}{size}".encode("utf-8")
@@ -88,12 +139,14 @@ def _set_job_tag(s3, bucket: str, key: str, job_id: str) -> str:
         Key=key,
         Tagging={"TagSet": [{"Key": "jobID", "Value": job_id}]}
     )
-    print(f"Set/overwrite jobID tag = {job_id}")
     return job_id
 
-def _publish_eventbridge(job_id: str, bucket: str, key: str, status: str = "EXTRACTED"):
-    events = boto3.client("events")
-    bus_name = os.getenv("event_bus_name", "default")
+def _uploader(rec: dict, metadata: dict) -> str:
+    # x-amz-meta-uploader set by the upload route, else the principal that wrote the object
+    return (metadata.get("uploader") or ((rec.get("userIdentity") or {}).get("principalId")) or "").strip()
+
+def _event_entry(job_id: str, bucket: str, key: str, status: str = "EXTRACTED", force: bool = False,
+                 uploader: str = "", priority: str = "", chars: int = 0) -> dict:
     detail = {
         "jobId": job_id,
         "bucket": bucket,
@@ -101,80 +154,198 @@ def _publish_eventbridge(job_id: str, bucket: str, key: str, status: str = "EXTR
         "status": status,
         "ts": datetime.now(timezone.utc).isoformat()
     }
-    entry = {
+    if force:
+        detail["forceRegenerate"] = True
+    # what generation_scheduler queues the job by
+    for name, value in (("uploader", uploader), ("priority", priority), ("chars", chars)):
+        if value:
+            detail[name] = value
+    return {
         "Source": "ai-quiz.pdf-extract",
         "DetailType": "pdf-extract-finished",
         "Detail": json.dumps(detail),
-        "EventBusName": bus_name
+        "EventBusName": os.getenv("event_bus_name", "default")
     }
-    resp = events.put_events(Entries=[entry])
-    if resp.get("FailedEntryCount"):
-        print("eventbridge_put_failed:", resp)
-    else:
-        print("eventbridge_put_ok:", resp.get("Entries"))
 
-# ---------- lambda entry ----------
-def lambda_handler(event, context):
+def _publish_eventbridge(entries: list) -> set:
+    """put_events in batches of EVENTS_PER_CALL; returns the indexes of entries that failed."""
+    events = runtime_context.client("events")
+    failed = set()
+    for start in range(0, len(entries), EVENTS_PER_CALL):
+        batch = entries[start:start + EVENTS_PER_CALL]
+        try:
+            resp = events.put_events(Entries=batch)
+        except Exception as e:
+            log.error("eventbridge put failed: %s", e)
+            failed.update(range(start, start + len(batch)))
+            continue
+        if resp.get("FailedEntryCount"):
+            log.error("eventbridge put failed", failed=resp.get("FailedEntryCount"), entries=resp.get("Entries"))
+            failed.update(start + i for i, r in enumerate(resp.get("Entries", [])) if r.get("ErrorCode"))
+        else:
+            log.debug("eventbridge put ok", entries=resp.get("Entries"))
+    return failed
+
+def _s3_records(event: dict) -> list:
+    """(SQS messageId or None, S3 record) for every object in a direct S3 or S3->SQS batch."""
+    out = []
+    for rec in event["Records"]:
+        if rec.get("eventSource") == "aws:sqs":
+            try:
+                body = json.loads(rec.get("body") or "{}")
+            except ValueError:
+                body = {}
+            inner = body.get("Records") or []
+            if not inner and body.get("Event") != "s3:TestEvent":
+                out.append((rec.get("messageId"), {}))
+            out.extend((rec.get("messageId"), r) for r in inner)
+        else:
+            out.append((None, rec))
+    return out
+
+def _process_record(s3, rec: dict, inv: telemetry.Invocation):
+    """Extract one S3 object; returns (response, EventBridge entry or None)."""
     try:
-        if not (isinstance(event, dict) and "Records" in event and event["Records"]):
-            return _bad("Invalid event: not an S3 trigger")
-        rec = event["Records"][0]
         if rec.get("eventSource") != "aws:s3":
-            return _bad("Invalid eventSource: expecting aws:s3")
+            return _bad("Invalid eventSource: expecting aws:s3"), None
 
         event_bucket = rec["s3"]["bucket"]["name"]
         event_key = urllib.parse.unquote_plus(rec["s3"]["object"]["key"], encoding="utf-8")
 
-        s3 = boto3.client("s3")
-        ssm = boto3.client("ssm")
-
         in_param = "/ai-quiz/pdf-extract/input-folder"
         out_param = "/ai-quiz/pdf-extract/text-output-folder"
-        in_value = _get_ssm_param(ssm, in_param)
-        out_value = _get_ssm_param(ssm, out_param)
-        in_bucket, in_prefix = _parse_s3_location(in_value, event_bucket)
-        out_bucket, out_prefix = _parse_s3_location(out_value, event_bucket)
+        with inv.span("ssm_fetch"):
+            in_bucket, in_prefix = runtime_context.get_s3_location(in_param, event_bucket)
+            out_bucket, out_prefix = runtime_context.get_s3_location(out_param, event_bucket)
 
         if event_bucket != in_bucket or not event_key.startswith(in_prefix):
-            print(f"Object outside input folder, skipping: s3://{event_bucket}/{event_key}")
-            return _ok("skip")
+            log.info("object outside input folder, skipping: s3://%s/%s", event_bucket, event_key)
+            return _ok("skip"), None
 
-        # compute + always overwrite jobId tag
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            s3.download_file(event_bucket, event_key, tmp.name)
-            tmp_path = tmp.name
-        
- 
-        job_id = _compute_job_id_from_content(tmp_path)
-        print(f"Computed jobID from file content: {job_id}")
-
-        _set_job_tag(s3, event_bucket, event_key, job_id)
-        print(f"jobId={job_id} for s3://{event_bucket}/{event_key}")
-
-        try:
-            text = _extract_text_from_pdf(tmp_path)
-            text = _sanitize_text(text)
-        finally:
-            try: os.remove(tmp_path)
-            except: pass
+        # single pass: download + hash, then extract from the same buffer
+        with inv.span("s3_read"):
+            source, job_id, size, metadata = _download_and_hash(s3, event_bucket, event_key)
+        log.info("computed jobId from file content", jobId=job_id, bytes=size, source=f"s3://{event_bucket}/{event_key}")
 
         job_prefix = f"{out_prefix}{job_id}/"
         out_key = f"{job_prefix}data.txt"
-        s3.put_object(Bucket=out_bucket, Key=job_prefix, Body=b"")
-        s3.put_object(
-            Bucket=out_bucket,
-            Key=out_key,
-            Body=text.encode("utf-8"),
-            ContentType="text/plain; charset=utf-8",
-        )
+        force = dedup.is_forced(metadata.get("force-regenerate"))
+        queue_by = {"uploader": _uploader(rec, metadata), "priority": (metadata.get("priority") or "").strip()}
+        try:
+            _set_job_tag(s3, event_bucket, event_key, job_id)
 
-        print(f"Wrote data to: s3://{out_bucket}/{out_key}")
+            # identical bytes were already extracted: skip straight to the quiz check
+            manifest = None if force else dedup.read_manifest(s3, out_bucket, job_prefix)
+            if not force and (manifest or dedup.object_exists(s3, out_bucket, out_key)):
+                dedup.record("extract", "hit", job_id)
+                quiz_bucket, quiz_prefix = runtime_context.get_s3_location("/ai-quiz/gen-quiz/quiz-output-folder")
+                quiz_ready = dedup.object_exists(s3, quiz_bucket, f"{quiz_prefix}{job_id}/quiz.json")
+                entry = None
+                # no event while a generator holds the job or it already finished/died
+                if not quiz_ready and job_status.enqueue(job_id, outputs={"data": out_key}):
+                    entry = _event_entry(job_id, event_bucket, event_key, "EXTRACTED", **queue_by,
+                                         chars=((manifest or {}).get("extract") or {}).get("bytes") or 0)
+                return _resp(200, {"jobId": job_id, "output": f"s3://{out_bucket}/{out_key}",
+                                   "dedup": "hit", "quizReady": quiz_ready}), entry
+            dedup.record("extract", "forced" if force else "miss", job_id)
+
+            sigs, base, reuse = None, None, {}
+            if revisions.ENABLED:
+                try:
+                    with inv.span("revision_lookup"):
+                        sigs, base, reuse = _find_revision(s3, source, out_bucket, out_prefix, job_id, force)
+                except Exception as e:
+                    log.warning("revision lookup failed, extracting every page: %s", e)
+            extracted, cleaned, stored = _extract_text_to_s3(s3, source, out_bucket, out_key, inv, reuse)
+            stats = dict(extracted.as_dict(), clean=cleaned, stored=stored)
+        finally:
+            if isinstance(source, str):
+                try: os.remove(source)
+                except: pass
 
-        # always publish to EventBridge
-        _publish_eventbridge(job_id, event_bucket, event_key, "EXTRACTED")
+        log.info("wrote s3://%s/%s", out_bucket, out_key, jobId=job_id, extract=stats)
+        if sigs is not None:
+            # per-page signatures and spans, so the next revision of this document can reuse them
+            try:
+                revisions.write_pages(s3, out_bucket, job_prefix, {
+                    "jobId": job_id,
+                    "basedOn": base,
+                    "pages": [dict(r, c=c) for c, r in zip(sigs, extracted.page_records)],
+                })
+                revisions.index_job(s3, out_bucket, f"{out_prefix}{revisions.INDEX_NAME}", job_id, sigs)
+            except Exception as e:
+                log.warning("failed to record page signatures: %s", e)
+        dedup.write_manifest(s3, out_bucket, job_prefix, {
+            "jobId": job_id,
+            "source": f"s3://{event_bucket}/{event_key}",
+            "size": size,
+            "dataKey": out_key,
+            "basedOn": base,
+            "extract": stats,
+        })
 
-        return _resp(200, {"jobId": job_id, "output": f"s3://{out_bucket}/{out_key}"})
+        # status goes first: the generator may pick the event up and claim the job right away
+        queued = job_status.enqueue(job_id, outputs={"data": out_key}, force=force)
+
+        # publish to EventBridge (batched by the caller) unless a generator already has the job
+        entry = _event_entry(job_id, event_bucket, event_key, "EXTRACTED", force=force, **queue_by,
+                             chars=stats["bytes"]) if queued else None
+        return _resp(200, {"jobId": job_id, "output": f"s3://{out_bucket}/{out_key}", "extract": stats,
+                           "dedup": "forced" if force else "miss"}), entry
     except ValueError as ve:
-        return _bad(str(ve))
+        return _bad(str(ve)), None
+    except (KeyError, TypeError) as e:
+        return _bad(f"Invalid S3 record: {e}"), None
+    except Exception as e:
+        return _err(f"Unhandled error: {e}"), None
+
+# ---------- lambda entry ----------
+def lambda_handler(event, context):
+    with telemetry.Invocation("pdf_extractor") as inv:
+        return inv.result(_handle(event, inv))
+
+def _handle(event: dict, inv: telemetry.Invocation) -> dict:
+    try:
+        if not (isinstance(event, dict) and "Records" in event and event["Records"]):
+            return _bad("Invalid event: not an S3 trigger")
+        records = _s3_records(event)
+        s3 = runtime_context.client("s3")
+
+        # every record on a bounded pool sharing the container's clients
+        workers = max(1, min(RECORD_CONCURRENCY, len(records)))
+        if workers == 1:
+            results = [_process_record(s3, rec, inv) for _, rec in records]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(lambda r: _process_record(s3, r[1], inv), records))
+
+        # one put_events per EVENTS_PER_CALL entries instead of one per job
+        entries, owners = [], []
+        for i, (_, entry) in enumerate(results):
+            if entry is not None:
+                entries.append(entry)
+                owners.append(i)
+        with inv.span("publish"):
+            failed_entries = _publish_eventbridge(entries) if entries else set()
+        unpublished = {owners[i] for i in failed_entries}
+
+        # SQS partial-batch response: only server-side failures are worth a redelivery
+        failures = []
+        for i, ((message_id, _), (resp, _)) in enumerate(zip(records, results)):
+            if message_id and (resp["statusCode"] >= 500 or i in unpublished) and message_id not in failures:
+                failures.append(message_id)
+        inv.timings["records"] = len(records)
+        inv.timings["failed_records"] = sum(1 for i, (resp, _) in enumerate(results)
+                                            if resp["statusCode"] >= 500 or i in unpublished)
+        if any(message_id for message_id, _ in records):
+            return {"batchItemFailures": [{"itemIdentifier": m} for m in failures]}
+
+        if len(records) == 1:
+            resp = results[0][0]
+            return _err("EventBridge publish failed") if unpublished else resp
+        return _resp(200, {"results": [
+            dict(json.loads(resp["body"]), statusCode=500 if i in unpublished else resp["statusCode"])
+            for i, (resp, _) in enumerate(results)
+        ]})
     except Exception as e:
         return _err(f"Unhandled error: {e}")
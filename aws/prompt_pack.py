@@ -0,0 +1,130 @@
+import os
+import re
+import time
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import question_bank
+import quiz_mapreduce
+import telemetry
+
+# ---------- token-budgeted prompt packing ----------
+# The source text in a prompt used to be the first 12,000 characters, however
+# much of it was a table of contents, a repeated disclaimer or a table of
+# numbers. pack() cuts the text into paragraph pieces, drops duplicates and
+# low-value pieces, scores the rest by information density (TF-IDF weight per
+# token, computed with NumPy over the whole document) and fills the token
+# budget with the densest pieces, kept in document order.
+#
+# Token counts are the same local chars/4 estimate quiz_mapreduce uses.
+
+log = telemetry.get_logger("prompt_pack")
+
+ENABLED = os.getenv("PROMPT_PACK", "1").strip().lower() in ("1", "true", "yes", "on")
+BUDGET_TOKENS = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+PIECE_TOKENS = int(os.getenv("PROMPT_PIECE_TOKENS", "300"))
+MIN_WORDS = 5
+MIN_ALPHA = 0.5       # pieces with less than half letters are tables of numbers / symbols
+NEAR_DUP = 0.8        # MinHash Jaccard above which a piece repeats one already packed
+
+_TOC_LINE = re.compile(r"(?:\.{3,}|…+|\s{2,}|\s)\s*\d{1,4}\s*$")
+_DIGITS = re.compile(r"\d+")
+
+_np = None
+
+
+def _numpy():
+    # ~100 ms to import; only prompts that are actually built pay for it.
+    global _np
+    if _np is None:
+        import numpy
+        _np = numpy
+    return _np
+
+
+def _low_value(piece: str, words: List[str]) -> bool:
+    if len(words) < MIN_WORDS:
+        return True
+    if sum(ch.isalpha() for ch in piece) < MIN_ALPHA * len(piece.replace(" ", "")):
+        return True
+    lines = [ln for ln in piece.split("\n") if ln.strip()]
+    # table of contents: most lines end in a page number
+    return len(lines) >= 3 and sum(bool(_TOC_LINE.search(ln)) for ln in lines) >= 0.6 * len(lines)
+
+
+def _key(piece: str) -> bytes:
+    return hashlib.blake2b(_DIGITS.sub("#", " ".join(piece.lower().split())).encode("utf-8"),
+                           digest_size=8).digest()
+
+
+def density(docs: List[List[str]]) -> List[float]:
+    """TF-IDF weight per token for each piece's word list (sublinear tf, smoothed idf)."""
+    np = _numpy()
+    if not docs:
+        return []
+    vocab: Dict[str, int] = {}
+    rows, cols = [], []
+    for r, words in enumerate(docs):
+        for w in words:
+            rows.append(r)
+            cols.append(vocab.setdefault(w, len(vocab)))
+    n_docs, n_terms = len(docs), max(1, len(vocab))
+    pairs, tf = np.unique(np.asarray(rows, dtype=np.int64) * n_terms + np.asarray(cols, dtype=np.int64),
+                          return_counts=True)
+    r, c = pairs // n_terms, pairs % n_terms
+    df = np.bincount(c, minlength=n_terms)
+    idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+    weight = np.bincount(r, weights=(1.0 + np.log(tf)) * idf[c], minlength=n_docs)
+    lengths = np.maximum(np.asarray([len(d) for d in docs], dtype=np.float64), 1.0)
+    return (weight / lengths).tolist()
+
+
+def pack(text: str, budget_tokens: Optional[int] = BUDGET_TOKENS) -> Tuple[str, dict]:
+    """The text trimmed to ``budget_tokens`` (None: only drop duplicates and low-value pieces)."""
+    t0 = time.perf_counter()
+    est = quiz_mapreduce.estimate_tokens
+    pieces = quiz_mapreduce._pieces(text, max(1, PIECE_TOKENS) * quiz_mapreduce.CHARS_PER_TOKEN)
+    stats = {"tokensBefore": est(text), "pieces": len(pieces), "duplicates": 0, "lowValue": 0}
+
+    kept, words, seen = [], [], set()
+    for i, piece in enumerate(pieces):
+        w = quiz_mapreduce._WORD.findall(piece.lower())
+        if _low_value(piece, w):
+            stats["lowValue"] += 1
+            continue
+        k = _key(piece)
+        if k in seen:
+            stats["duplicates"] += 1
+            continue
+        seen.add(k)
+        kept.append(i)
+        words.append(w)
+
+    total = sum(est(pieces[i]) + 1 for i in kept)
+    if budget_tokens is None or total <= budget_tokens:
+        chosen = kept
+    else:
+        scores = density(words)
+        chosen, sketches, used = [], [], 0
+        for j in sorted(range(len(kept)), key=lambda j: -scores[j]):
+            piece = pieces[kept[j]]
+            cost = est(piece) + 1
+            if used + cost > budget_tokens:
+                continue
+            sk = question_bank.sketch(piece)
+            if any(question_bank.similarity(sk, s) >= NEAR_DUP for s in sketches):
+                stats["duplicates"] += 1
+                continue
+            sketches.append(sk)
+            chosen.append(kept[j])
+            used += cost
+        chosen.sort()
+
+    packed = "\n\n".join(pieces[i] for i in chosen)
+    if not packed.strip():
+        # nothing but boilerplate: better the raw text than an empty prompt
+        limit = None if budget_tokens is None else budget_tokens * quiz_mapreduce.CHARS_PER_TOKEN
+        packed = text[:limit]
+    stats.update(kept=len(chosen), tokensAfter=est(packed), selectMs=round((time.perf_counter() - t0) * 1000, 2))
+    log.debug("prompt packed", **stats)
+    return packed, stats
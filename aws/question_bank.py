@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import heapq
+import struct
+import zlib
+import random
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+import quiz_mapreduce
+import telemetry
+
+# ---------- question bank ----------
+# Generated questions indexed by the source passage they came from. Each
+# passage is fingerprinted with a bottom-k MinHash sketch over word shingles,
+# so a new document whose passages overlap heavily with indexed ones can take
+# questions from the bank and only send the uncovered passages to the LLM.
+#
+# The whole bank is one S3 object: a small header, flat uint32 arrays
+# (sketches and a sorted value -> passage posting list used for lookups) and
+# a JSON blob with the questions. Loading is a few array.frombytes() calls;
+# the JSON blob is only parsed on the first hit.
+
+log = telemetry.get_logger("question_bank")
+
+ENABLED = os.getenv("QUESTION_BANK", "1").strip().lower() in ("1", "true", "yes", "on")
+BANK_NAME = os.getenv("QUESTION_BANK_NAME", "_bank/question_bank.bin")
+PASSAGE_TOKENS = int(os.getenv("QUESTION_BANK_PASSAGE_TOKENS", "400"))
+MATCH_JACCARD = float(os.getenv("QUESTION_BANK_MATCH", "0.7"))
+CHECK_INTERVAL_SEC = float(os.getenv("QUESTION_BANK_CHECK_SEC", "30"))
+SAVE_RETRIES = 8
+SKETCH_K = 32
+SHINGLE = 5
+
+_MAGIC = b"QBK1"
+_HEADER = struct.Struct("<4sIIII")  # magic, k, passages, posting entries, json bytes
+
+
+def passages(text: str) -> List[str]:
+    """The document cut into the bank's unit of reuse (paragraph-aligned, ~PASSAGE_TOKENS each)."""
+    return quiz_mapreduce.segment(text, PASSAGE_TOKENS, max_chunks=0)
+
+
+def _words(text: str) -> List[str]:
+    return quiz_mapreduce._WORD.findall(text.lower())
+
+
+def sketch(text: str, k: int = SKETCH_K) -> List[int]:
+    """Bottom-k MinHash: the k smallest distinct crc32 values of the passage's word shingles."""
+    words = _words(text)
+    if len(words) < SHINGLE:
+        shingles = {" ".join(words)} if words else set()
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+    # crc32 rather than hash(): the values are persisted and must not change between processes
+    return sorted(heapq.nsmallest(k, {zlib.crc32(s.encode("utf-8")) for s in shingles}))
+
+
+def similarity(a, b, k: int = SKETCH_K) -> float:
+    """Jaccard estimate from two bottom-k sketches."""
+    if not a or not b:
+        return 0.0
+    sa, sb = set(a), set(b)
+    union = heapq.nsmallest(k, sa | sb)
+    return sum(1 for v in union if v in sa and v in sb) / len(union)
+
+
+class QuestionBank:
+    def __init__(self, k: int = SKETCH_K):
+        self.k = k
+        self.sketches = array("I")       # passage i -> sketch at [i*k, (i+1)*k), 0-padded
+        self.sizes = array("I")          # passage i -> number of real sketch values
+        self.q_offsets = array("I", [0])  # passage i -> questions[q_offsets[i]:q_offsets[i+1]]
+        self.post_values = array("I")    # sorted sketch values ...
+        self.post_ids = array("I")       # ... and the passage each belongs to
+        self._blob = b"{}"
+        self._meta: Optional[dict] = None  # {"questions": [...], "jobs": [...]} once parsed
+        self._pending: List[Tuple[List[int], str, List[dict]]] = []
+
+    def __len__(self) -> int:
+        return len(self.sizes) + len(self._pending)
+
+    @property
+    def meta(self) -> dict:
+        if self._meta is None:
+            self._meta = json.loads(self._blob.decode("utf-8")) or {}
+            self._meta.setdefault("questions", [])
+            self._meta.setdefault("jobs", [])
+        return self._meta
+
+    def _sketch_of(self, i: int) -> array:
+        return self.sketches[i * self.k:i * self.k + self.sizes[i]]
+
+    def lookup(self, sk: List[int], threshold: float = MATCH_JACCARD) -> Tuple[int, float]:
+        """Best indexed passage for a sketch as (passage index, similarity), or (-1, 0.0)."""
+        hits: Dict[int, int] = {}
+        for v in sk:
+            lo = bisect_left(self.post_values, v)
+            hi = bisect_right(self.post_values, v, lo)
+            for j in range(lo, hi):
+                pid = self.post_ids[j]
+                hits[pid] = hits.get(pid, 0) + 1
+        # a passage sharing fewer than threshold*k/2 sketch values cannot reach the threshold
+        need = max(1, int(threshold * min(len(sk), self.k) / 2))
+        best, best_sim = -1, 0.0
+        for pid, n in sorted(hits.items(), key=lambda kv: -kv[1])[:8]:
+            if n < need:
+                break
+            sim = similarity(sk, self._sketch_of(pid), self.k)
+            if sim > best_sim:
+                best, best_sim = pid, sim
+        return (best, best_sim) if best_sim >= threshold else (-1, 0.0)
+
+    def questions(self, pid: int) -> List[dict]:
+        return self.meta["questions"][self.q_offsets[pid]:self.q_offsets[pid + 1]]
+
+    def job_of(self, pid: int) -> str:
+        return self.meta["jobs"][pid]
+
+    def add(self, sk: List[int], job_id: str, questions: List[dict]):
+        """Queue a passage and its questions; they become part of the arrays on to_bytes()."""
+        if sk and questions:
+            self._pending.append((list(sk), job_id, questions))
+
+    def _flush(self):
+        if not self._pending:
+            return
+        meta = self.meta
+        for sk, job_id, qs in self._pending:
+            pid = len(self.sizes)
+            self.sketches.extend(sk[:self.k] + [0] * (self.k - len(sk[:self.k])))
+            self.sizes.append(min(len(sk), self.k))
+            meta["questions"].extend(qs)
+            meta["jobs"].append(job_id)
+            self.q_offsets.append(len(meta["questions"]))
+            for v in sk[:self.k]:
+                self.post_values.append(v)
+                self.post_ids.append(pid)
+        self._pending = []
+        order = sorted(range(len(self.post_values)), key=self.post_values.__getitem__)
+        self.post_values = array("I", (self.post_values[i] for i in order))
+        self.post_ids = array("I", (self.post_ids[i] for i in order))
+        self._blob = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def to_bytes(self) -> bytes:
+        self._flush()
+        head = _HEADER.pack(_MAGIC, self.k, len(self.sizes), len(self.post_values), len(self._blob))
+        return b"".join((head, self.sketches.tobytes(), self.sizes.tobytes(), self.q_offsets.tobytes(),
+                         self.post_values.tobytes(), self.post_ids.tobytes(), self._blob))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "QuestionBank":
+        magic, k, n, n_post, n_blob = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC:
+            raise ValueError("not a question bank object")
+        bank = cls(k)
+        pos = _HEADER.size
+        for name, count in (("sketches", n * k), ("sizes", n), ("q_offsets", n + 1),
+                            ("post_values", n_post), ("post_ids", n_post)):
+            arr = array("I")
+            arr.frombytes(data[pos:pos + 4 * count])
+            setattr(bank, name, arr)
+            pos += 4 * count
+        bank._blob = bytes(data[pos:pos + n_blob])
+        return bank
+
+
+def _terms(text: str) -> set:
+    # words plus word bigrams: bigrams tell apart passages that share a vocabulary
+    words = _words(text)
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def attribute(passage_texts: List[str], questions: List[dict]) -> List[List[dict]]:
+    """Assign each question to the passage sharing most terms with its question, answer and explanation."""
+    sets = [_terms(p) for p in passage_texts]
+    out: List[List[dict]] = [[] for _ in passage_texts]
+    for q in questions:
+        terms = _terms(" ".join(str(q.get(f, "")) for f in ("question", "correctAnswer", "explanation")))
+        if not sets or not terms:
+            continue
+        best = max(range(len(sets)), key=lambda i: len(terms & sets[i]))
+        if terms & sets[best]:
+            out[best].append({k: v for k, v in q.items() if k != "sourceChunk"})
+    return out
+
+
+# ---------- per-container copy of the S3 object ----------
+_lock = threading.Lock()
+_cached: Dict[Tuple[str, str], Tuple[QuestionBank, Optional[str], float]] = {}
+
+
+def _fetch(s3, bucket: str, key: str) -> Tuple[QuestionBank, Optional[str]]:
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+            raise
+        return QuestionBank(), None
+    return QuestionBank.from_bytes(obj["Body"].read()), obj.get("ETag")
+
+
+def load(s3, bucket: str, key: str) -> Tuple[QuestionBank, Optional[str]]:
+    """The bank and its ETag; a warm container re-downloads only when the object changed."""
+    with _lock:
+        hit = _cached.get((bucket, key))
+    if hit and time.monotonic() - hit[2] < CHECK_INTERVAL_SEC:
+        return hit[0], hit[1]
+    if hit and hit[1]:
+        try:
+            if s3.head_object(Bucket=bucket, Key=key).get("ETag") == hit[1]:
+                with _lock:
+                    _cached[(bucket, key)] = (hit[0], hit[1], time.monotonic())
+                return hit[0], hit[1]
+        except ClientError:
+            pass
+    bank, etag = _fetch(s3, bucket, key)
+    with _lock:
+        _cached[(bucket, key)] = (bank, etag, time.monotonic())
+    return bank, etag
+
+
+def _conflict(e: ClientError) -> bool:
+    code = e.response.get("Error", {}).get("Code")
+    status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in ("PreconditionFailed", "ConditionalRequestConflict") or status in (409, 412)
+
+
+def save(s3, bucket: str, key: str, additions: List[Tuple[List[int], str, List[dict]]]) -> bool:
+    """Merge new passages into the latest stored bank and write it back; False if every write lost a race.
+
+    Works on a private copy, so lookups on the cached bank are never disturbed.
+    The write is conditional on the ETag that was read; when another
+    generation saved in between, the merge is redone on its bank.
+    """
+    for attempt in range(SAVE_RETRIES):
+        bank, etag = _fetch(s3, bucket, key)
+        for sk, job_id, qs in additions:
+            bank.add(sk, job_id, qs)
+        body = bank.to_bytes()
+        cond = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+        try:
+            resp = s3.put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/octet-stream", **cond)
+        except ClientError as e:
+            if not _conflict(e):
+                raise
+            # many generations finish at once: back off before re-reading
+            time.sleep(random.uniform(0, 0.05 * (attempt + 1)))
+            continue
+        with _lock:
+            _cached[(bucket, key)] = (bank, resp.get("ETag"), time.monotonic())
+        log.info("bank saved", passages=len(bank), bytes=len(body), attempts=attempt + 1)
+        return True
+    log.warning("bank changed under every save, %d passages not added", len(additions))
+    return False
+
+
+def reset():
+    with _lock:
+        _cached.clear()
@@ -0,0 +1,39 @@
+import json
+
+import quiz_segments
+import runtime_context
+import telemetry
+
+# ---------- scheduled quiz compaction ----------
+# Invoked by an EventBridge schedule (e.g. rate(15 minutes)); each run rolls
+# the quizzes finished since the last one into segments (see quiz_segments).
+# {"rebuild": true} rewrites every quiz into fresh segments.
+# Reserved concurrency 1 keeps runs from overlapping; if two ever do, the
+# index's If-Match write makes the second one give up and retry next time.
+
+log = telemetry.get_logger("quiz_compactor")
+
+
+def _resp(code: int, obj) -> dict:
+    return {"statusCode": code, "headers": {"Content-Type": "application/json"}, "body": json.dumps(obj)}
+
+
+def lambda_handler(event, context):
+    timings = {}
+    with telemetry.Invocation("quiz_compactor", timings) as inv:
+        return inv.result(_handle(event or {}, inv))
+
+
+def _handle(event: dict, inv: telemetry.Invocation) -> dict:
+    try:
+        with inv.span("ssm_fetch"):
+            bucket, prefix = runtime_context.get_s3_location("/ai-quiz/gen-quiz/quiz-output-folder")
+        flag = (event.get("detail") or {}).get("rebuild", event.get("rebuild"))
+        rebuild = str(flag).strip().lower() in ("1", "true", "yes", "on")
+        stats = quiz_segments.compact(runtime_context.client("s3"), bucket, prefix, rebuild=rebuild, inv=inv)
+    except Exception as e:
+        log.error("compaction failed: %s", e)
+        return _resp(500, {"error": f"compaction failed: {e}"})
+    for k in ("listed", "new", "changed", "segmentsWritten", "merged"):
+        inv.timings[f"compact_{k}"] = stats.get(k, 0)
+    return _resp(409 if stats.get("conflict") else 200, dict(stats, timings=inv.timings))
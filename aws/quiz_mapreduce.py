@@ -0,0 +1,149 @@
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import telemetry
+
+# ---------- chunked map-reduce quiz generation ----------
+# segment() cuts the extracted text into token-budgeted chunks on paragraph
+# (then line) boundaries, map_chunks() asks the LLM for candidate questions per
+# chunk on a bounded pool, and select() dedupes the candidates and picks the
+# final set round-robin across chunks so the whole document is covered.
+
+log = telemetry.get_logger("quiz_mapreduce")
+
+CHUNK_TOKENS = int(os.getenv("QUIZ_CHUNK_TOKENS", "3000"))
+MAX_CHUNKS = int(os.getenv("QUIZ_MAX_CHUNKS", "8"))
+MAP_CONCURRENCY = int(os.getenv("QUIZ_MAP_CONCURRENCY", "4"))
+OVERGENERATE = float(os.getenv("QUIZ_OVERGENERATE", "1.5"))
+CHARS_PER_TOKEN = 4
+DUP_JACCARD = 0.8
+
+_WORD = re.compile(r"[a-z0-9]+")
+_PARA_SPLIT = re.compile(r"\n\s*\n")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _pieces(text: str, budget_chars: int) -> List[str]:
+    """Paragraphs, with oversized ones broken on lines and then hard-cut."""
+    out = []
+    for para in _PARA_SPLIT.split(text):
+        para = para.strip()
+        if not para:
+            continue
+        if len(para) <= budget_chars:
+            out.append(para)
+            continue
+        for line in para.split("\n"):
+            while len(line) > budget_chars:
+                out.append(line[:budget_chars])
+                line = line[budget_chars:]
+            if line.strip():
+                out.append(line)
+    return out
+
+
+def segment(text: str, chunk_tokens: int = CHUNK_TOKENS, max_chunks: int = MAX_CHUNKS) -> List[str]:
+    budget_chars = max(1, chunk_tokens) * CHARS_PER_TOKEN
+    chunks, cur, cur_len = [], [], 0
+    for piece in _pieces(text, budget_chars):
+        if cur and cur_len + len(piece) + 2 > budget_chars:
+            chunks.append("\n\n".join(cur))
+            cur, cur_len = [], 0
+        cur.append(piece)
+        cur_len += len(piece) + 2
+    if cur:
+        chunks.append("\n\n".join(cur))
+    if max_chunks > 0 and len(chunks) > max_chunks:
+        # Too long for the budget: keep evenly spaced chunks so coverage spans the document.
+        step = len(chunks) / max_chunks
+        chunks = [chunks[int(i * step)] for i in range(max_chunks)]
+    return chunks
+
+
+def questions_per_chunk(count: int, n_chunks: int, overgenerate: float = OVERGENERATE) -> int:
+    if n_chunks <= 0:
+        return 0
+    return max(2, -(-int(count * overgenerate) // n_chunks))
+
+
+def map_chunks(chunks: List[str], generate: Callable[[str, int, int, int], List[dict]], per_chunk: int,
+               concurrency: int = MAP_CONCURRENCY) -> List[List[dict]]:
+    """Run ``generate(chunk, index, total, n_questions)`` for every chunk; failed chunks yield []."""
+    def _one(i: int) -> List[dict]:
+        try:
+            return list(generate(chunks[i], i, len(chunks), per_chunk) or [])
+        except Exception as e:
+            log.warning("chunk %d/%d failed: %s", i + 1, len(chunks), e)
+            return []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as pool:
+        results = list(pool.map(_one, range(len(chunks))))
+    if chunks and not any(results):
+        raise RuntimeError("every chunk failed to generate questions")
+    return results
+
+
+def _fingerprint(question: dict) -> frozenset:
+    return frozenset(_WORD.findall(str(question.get("question", "")).lower()))
+
+
+def _is_valid(q: dict) -> bool:
+    if not isinstance(q, dict):
+        return False
+    opts = q.get("options")
+    return (bool(q.get("question")) and isinstance(opts, list)
+            and len(opts) >= 2 and q.get("correctAnswer") in opts)
+
+
+def select(per_chunk: List[List[dict]], count: int) -> List[dict]:
+    """Dedupe near-identical questions, then take them round-robin across chunks."""
+    seen: List[frozenset] = []
+    queues = []
+    for chunk_idx, questions in enumerate(per_chunk):
+        keep = []
+        for q in questions:
+            if not _is_valid(q):
+                continue
+            fp = _fingerprint(q)
+            if any(fp and len(fp & s) / len(fp | s) >= DUP_JACCARD for s in seen):
+                continue
+            seen.append(fp)
+            keep.append(dict(q, sourceChunk=chunk_idx))
+        queues.append(keep)
+
+    picked = []
+    depth = 0
+    while len(picked) < count and any(len(q) > depth for q in queues):
+        for q in queues:
+            if len(q) > depth and len(picked) < count:
+                picked.append(q[depth])
+        depth += 1
+    return picked
+
+
+def generate(text: str, count: int, gen_chunk: Callable[[str, int, int, int], List[dict]],
+             chunk_tokens: int = CHUNK_TOKENS, max_chunks: int = MAX_CHUNKS,
+             concurrency: int = MAP_CONCURRENCY, timings: Optional[Dict[str, float]] = None) -> List[dict]:
+    timings = timings if timings is not None else {}
+    t0 = time.perf_counter()
+    chunks = segment(text, chunk_tokens, max_chunks)
+    t1 = time.perf_counter()
+    candidates = map_chunks(chunks, gen_chunk, questions_per_chunk(count, len(chunks)), concurrency)
+    t2 = time.perf_counter()
+    picked = select(candidates, count)
+    t3 = time.perf_counter()
+    timings.update({
+        "segment_ms": round((t1 - t0) * 1000, 1),
+        "map_ms": round((t2 - t1) * 1000, 1),
+        "reduce_ms": round((t3 - t2) * 1000, 1),
+        "chunks": len(chunks),
+        "candidates": sum(len(c) for c in candidates),
+    })
+    # sourceChunk is the reduce step's bookkeeping, not part of a quiz question
+    return [{k: v for k, v in q.items() if k != "sourceChunk"} for q in picked]
@@ -0,0 +1,177 @@
+from io import BytesIO
+from types import SimpleNamespace
+from typing import Dict, List
+
+import telemetry
+
+log = telemetry.get_logger("quiz_render")
+
+# ---------- quiz PDF rendering ----------
+# Word widths come from a per-font glyph table (prebuilt for printable ASCII,
+# filled lazily for anything else) and are memoized, so wrapping is linear in
+# the text length. Pages share one precomputed template and are written with
+# a single text object each.
+
+FONT = "Times-Roman"
+FONT_SIZE = 11
+OPTION_INDENT = "   "
+WORD_CACHE_MAX = 50_000
+
+# Optional PDF: reportlab costs ~50 ms to import, so it loads on the first render
+# rather than on every cold start (dedup hits never render).
+_rl = None
+
+
+def _reportlab():
+    global _rl
+    if _rl is None:
+        try:
+            from reportlab.lib.pagesizes import A4
+            from reportlab.lib.units import cm
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfgen import canvas
+            _rl = SimpleNamespace(A4=A4, cm=cm, pdfmetrics=pdfmetrics, canvas=canvas)
+        except Exception as e:
+            log.warning("reportlab unavailable: %s", e)
+            _rl = False
+    if not _rl:
+        raise RuntimeError("reportlab not installed")
+    return _rl
+
+
+class GlyphWidths:
+    """Advance widths for one font at size 1, plus a bounded word-width memo."""
+
+    def __init__(self, font: str):
+        self.font = font
+        self.string_width = _reportlab().pdfmetrics.stringWidth
+        self.chars: Dict[str, float] = {
+            chr(c): self.string_width(chr(c), font, 1) for c in range(32, 127)
+        }
+        self.words: Dict[str, float] = {}
+
+    def char(self, ch: str) -> float:
+        w = self.chars.get(ch)
+        if w is None:
+            w = self.chars[ch] = self.string_width(ch, self.font, 1)
+        return w
+
+    def word(self, word: str) -> float:
+        w = self.words.get(word)
+        if w is None:
+            chars = self.chars
+            try:
+                w = sum(chars[ch] for ch in word)
+            except KeyError:
+                w = sum(self.char(ch) for ch in word)
+            if len(self.words) >= WORD_CACHE_MAX:
+                self.words.clear()
+            self.words[word] = w
+        return w
+
+
+_glyph_tables: Dict[str, GlyphWidths] = {}
+
+
+def glyph_widths(font: str = FONT) -> GlyphWidths:
+    t = _glyph_tables.get(font)
+    if t is None:
+        t = _glyph_tables[font] = GlyphWidths(font)
+    return t
+
+
+class PageTemplate:
+    def __init__(self, font: str = FONT, size: float = FONT_SIZE):
+        rl = _reportlab()
+        cm = rl.cm
+        width, height = rl.A4
+        self.font = font
+        self.size = size
+        self.left = 2 * cm
+        self.top = height - 2 * cm
+        self.bottom = 2 * cm
+        self.max_w = width - 4 * cm
+        self.line_h = 0.6 * cm
+        self.widths = glyph_widths(font)
+        self.space_w = self.widths.char(" ") * size
+
+    def wrap(self, s: str, indent: str = "") -> List[str]:
+        size, word_w = self.size, self.widths.word
+        max_w = self.max_w - (self.widths.word(indent) * size if indent else 0)
+        lines, line, line_w = [], [], 0.0
+        for w in s.split():
+            ww = word_w(w) * size
+            if line and line_w + self.space_w + ww > max_w:
+                lines.append(indent + " ".join(line))
+                line, line_w = [w], ww
+            else:
+                line_w += (self.space_w if line else 0) + ww
+                line.append(w)
+        if line:
+            lines.append(indent + " ".join(line))
+        return lines
+
+
+_default_template = None
+
+
+def default_template() -> PageTemplate:
+    global _default_template
+    if _default_template is None:
+        _default_template = PageTemplate()
+    return _default_template
+
+
+def quiz_lines(quiz: dict, tpl: PageTemplate):
+    """Wrapped lines straight from the quiz JSON; None marks a blank line."""
+    yield from tpl.wrap(str(quiz.get("title", "")))
+    yield None
+    for i, q in enumerate(quiz.get("questions", [])):
+        yield from tpl.wrap(f"{i + 1}. {q['question']}")
+        for j, option in enumerate(q["options"]):
+            yield from tpl.wrap(f"{chr(65 + j)}. {option}", OPTION_INDENT)
+        yield from tpl.wrap(f"Answer: {q['correctAnswer']}")
+        if q.get("explanation"):
+            yield from tpl.wrap(f"Explanation: {q['explanation']}")
+        yield None
+
+
+def render_quiz(quiz: dict, tpl: PageTemplate = None) -> bytes:
+    rl = _reportlab()
+    tpl = tpl or default_template()
+    buf = BytesIO()
+    c = rl.canvas.Canvas(buf, pagesize=rl.A4)
+    y = tpl.top
+    text = c.beginText(tpl.left, y)
+    text.setFont(tpl.font, tpl.size)
+    for ln in quiz_lines(quiz, tpl):
+        if y < tpl.bottom:
+            c.drawText(text)
+            c.showPage()
+            y = tpl.top
+            text = c.beginText(tpl.left, y)
+            text.setFont(tpl.font, tpl.size)
+        if ln is not None:
+            text.setTextOrigin(tpl.left, y)
+            text.textOut(ln)
+        y -= tpl.line_h
+    c.drawText(text)
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+# Where render() runs: None renders in the calling thread (Lambda); the local
+# server hands rendering to its process pool so it does not hold the GIL.
+_executor = None
+
+
+def set_executor(executor):
+    global _executor
+    _executor = executor
+
+
+def render(quiz: dict) -> bytes:
+    if _executor is None:
+        return render_quiz(quiz)
+    return _executor.submit(render_quiz, quiz).result()
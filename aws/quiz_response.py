@@ -0,0 +1,180 @@
+import os
+import re
+import json
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# ---------- Gemini response processing ----------
+# Quiz JSON is requested in JSON mode with a response schema, parsed while it
+# streams in, and each question object is validated the moment its closing
+# brace arrives. Only the questions that fail validation are re-requested.
+
+JSON_MODE = os.getenv("GEMINI_JSON_MODE", "1").strip().lower() in ("1", "true", "yes", "on")
+
+QUESTION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "question": {"type": "STRING"},
+        "options": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "correctAnswer": {"type": "STRING"},
+        "explanation": {"type": "STRING"},
+    },
+    "required": ["question", "options", "correctAnswer"],
+}
+
+QUIZ_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING"},
+        "questions": {"type": "ARRAY", "items": QUESTION_SCHEMA},
+    },
+    "required": ["questions"],
+}
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_TITLE = re.compile(r'"title"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_LETTER = re.compile(r"^\s*\(?([A-Da-d])[\).:]?\s*$")
+
+
+def generation_config() -> Optional[dict]:
+    if not JSON_MODE:
+        return None
+    return {"responseMimeType": "application/json", "responseSchema": QUIZ_SCHEMA}
+
+
+def strip_code_fence(s: str) -> str:
+    s = s.strip()
+    if s.startswith("```"):
+        s = s.split("\n", 1)[1] if "\n" in s else ""
+        if s.rstrip().endswith("```"):
+            s = s.rstrip()[:-3]
+    return s.strip()
+
+
+def validate_question(q) -> List[str]:
+    if not isinstance(q, dict):
+        return ["not an object"]
+    problems = []
+    if not str(q.get("question") or "").strip():
+        problems.append("missing question")
+    opts = q.get("options")
+    if not isinstance(opts, list) or len(opts) < 2 or not all(isinstance(o, str) and o.strip() for o in opts):
+        problems.append("bad options")
+    elif q.get("correctAnswer") not in opts:
+        problems.append("correctAnswer not in options")
+    return problems
+
+
+def repair_question(q):
+    """Cheap local fixes before giving up on a question; returns the (possibly fixed) object."""
+    if not isinstance(q, dict):
+        return q
+    q = dict(q)
+    opts = q.get("options")
+    ans = q.get("correctAnswer")
+    if isinstance(opts, list) and isinstance(ans, str) and ans not in opts:
+        m = _LETTER.match(ans)
+        stripped = [str(o).strip() for o in opts]
+        if m and ord(m.group(1).upper()) - 65 < len(opts):
+            q["correctAnswer"] = opts[ord(m.group(1).upper()) - 65]
+        elif ans.strip() in stripped:
+            q["correctAnswer"] = opts[stripped.index(ans.strip())]
+    return q
+
+
+def loads_lenient(s: str):
+    try:
+        return json.loads(s)
+    except json.JSONDecodeError:
+        return json.loads(_TRAILING_COMMA.sub(r"\1", s))
+
+
+class IncrementalQuestionParser:
+    """Feed streamed text; complete objects of the top-level ``questions`` array come out as they close."""
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.in_array = False
+        self.array_done = False
+        self.depth = 0
+        self.obj_start = -1
+        self.in_str = False
+        self.escape = False
+        self.title: Optional[str] = None
+
+    def _find_array(self) -> bool:
+        k = self.buf.find('"questions"', self.pos)
+        if k < 0:
+            return False
+        b = self.buf.find("[", k)
+        if b < 0:
+            return False
+        self.pos = b + 1
+        self.in_array = True
+        return True
+
+    def feed(self, text: str) -> Iterator[Tuple[Optional[dict], str]]:
+        """Yield (question or None, raw object text) for every object completed by ``text``."""
+        self.buf += text
+        if self.title is None and not self.in_array:
+            m = _TITLE.search(self.buf)
+            if m:
+                self.title = json.loads(f'"{m.group(1)}"')
+        if self.array_done or (not self.in_array and not self._find_array()):
+            return
+        buf = self.buf
+        i = self.pos
+        while i < len(buf):
+            ch = buf[i]
+            if self.in_str:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_str = False
+            elif ch == '"':
+                self.in_str = True
+            elif ch == "{":
+                if self.depth == 0:
+                    self.obj_start = i
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0 and self.obj_start >= 0:
+                    raw = buf[self.obj_start:i + 1]
+                    self.obj_start = -1
+                    try:
+                        q = loads_lenient(raw)
+                    except json.JSONDecodeError:
+                        q = None
+                    yield q, raw
+            elif ch == "]" and self.depth == 0:
+                self.array_done = True
+                i += 1
+                break
+            i += 1
+        self.pos = i
+
+
+def collect(chunks: Iterable[str], on_question=None) -> Tuple[List[dict], List[str], Optional[str], str]:
+    """Consume a stream; returns (valid questions, invalid raw objects, title, full text)."""
+    parser = IncrementalQuestionParser()
+    valid, invalid, parts = [], [], []
+    # A leading ```json fence needs no special handling: the parser only looks for "questions": [
+    for chunk in chunks:
+        parts.append(chunk)
+        for q, raw in parser.feed(chunk):
+            q = repair_question(q)
+            if q is not None and not validate_question(q):
+                valid.append(q)
+                if on_question:
+                    on_question(q)
+            else:
+                invalid.append(raw)
+    return valid, invalid, parser.title, "".join(parts)
+
+
+def parse_questions(text: str) -> Tuple[List[dict], List[str], Optional[str]]:
+    valid, invalid, title, _ = collect([strip_code_fence(text)])
+    return valid, invalid, title
@@ -0,0 +1,563 @@
+import os
+import json
+import contextlib
+import time
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+import artifacts
+import telemetry
+
+# ---------- columnar quiz segments ----------
+# Every <quiz-output-folder>/<jobId>/quiz.json rolled into a few segment
+# objects, so analytics can read all quizzes in one GET per few thousand
+# instead of one GET (and json.loads) per job:
+#
+#   _segments/seg-<seq>-<rand>.bin   quizzes as typed columns
+#   _segments/index.bin              jobId -> (segment, row), sorted by jobId,
+#                                    with title, question count, ETag and
+#                                    LastModified for listing without segments
+#
+# A segment holds uint32/int32 arrays per level (quiz: job, title, first
+# question; question: text, index of the correct option, explanation, first
+# option; option: text) pointing into one deduplicated UTF-8 string heap.
+# Fields a quiz or question has beyond these go into a per-row JSON "extra"
+# string, so quiz() gives back the stored quiz.json content.
+#
+# compact() is incremental: it lists quiz.json objects, fetches only those
+# whose ETag the index doesn't have yet (new jobs and forced regenerations),
+# appends them as new segments, and rewrites small or mostly-superseded
+# segments into one. The index is written with If-Match, so two compactions
+# never lose each other's work; a loser just retries on its next run.
+# Segment keys are never reused and superseded segments are deleted only
+# after RETIRE_SEC, so readers holding an older index keep working.
+
+log = telemetry.get_logger("quiz_segments")
+
+SEGMENTS_DIR = os.getenv("QUIZ_SEGMENTS_DIR", "_segments/")
+INDEX_NAME = SEGMENTS_DIR + "index.bin"
+SEGMENT_QUIZZES = int(os.getenv("QUIZ_SEGMENT_QUIZZES", "5000"))
+MERGE_FANIN = int(os.getenv("QUIZ_SEGMENT_MERGE_FANIN", "4"))
+RETIRE_SEC = float(os.getenv("QUIZ_SEGMENT_RETIRE_SEC", "3600"))
+FETCH_CONCURRENCY = int(os.getenv("QUIZ_COMPACT_CONCURRENCY", "16"))
+MAX_NEW_PER_RUN = int(os.getenv("QUIZ_COMPACT_MAX_NEW", "50000"))
+CHECK_INTERVAL_SEC = float(os.getenv("QUIZ_INDEX_CHECK_SEC", "30"))
+SEGMENT_CACHE = int(os.getenv("QUIZ_SEGMENT_CACHE", "8"))
+
+NONE = 0xFFFFFFFF  # string id of an absent field
+ANSWER_OTHER = -1  # answer column: correctAnswer is not one of the options (kept in extra, if any)
+NO_OPTIONS = -2    # answer column: no list of strings under "options" (kept in extra, if any)
+
+_SEG_MAGIC = b"QSG1"
+_SEG_HEADER = struct.Struct("<4sIIII")  # magic, quizzes, questions, options, strings
+_IDX_MAGIC = b"QSX1"
+_IDX_HEADER = struct.Struct("<4sIIIII")  # magic, entries, jobs bytes, etags bytes, titles bytes, json bytes
+
+_QUESTION_FIELDS = ("question", "options", "correctAnswer", "explanation")
+
+
+def _missing(e: ClientError) -> bool:
+    return e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+
+def _read_arrays(data: bytes, pos: int, spec) -> int:
+    for arr, count in spec:
+        n = arr.itemsize * count
+        arr.frombytes(data[pos:pos + n])
+        pos += n
+    return pos
+
+
+# ---------- segment ----------
+class _Heap:
+    """Deduplicated string heap being built: string -> id."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.offsets = array("I", [0])
+        self.parts: List[bytes] = []
+
+    def add(self, s) -> int:
+        if s is None:
+            return NONE
+        sid = self.ids.get(s)
+        if sid is None:
+            b = s.encode("utf-8")
+            sid = self.ids[s] = len(self.parts)
+            self.parts.append(b)
+            self.offsets.append(self.offsets[-1] + len(b))
+        return sid
+
+
+def _extra(obj: dict, known) -> Optional[str]:
+    rest = {k: v for k, v in obj.items() if k not in known}
+    return json.dumps(rest, ensure_ascii=False, separators=(",", ":")) if rest else None
+
+
+def build_segment(quizzes: List[Tuple[str, dict]]) -> bytes:
+    """A segment object for (jobId, quiz) pairs, in that order."""
+    heap = _Heap()
+    q_job, q_title, q_extra, q_start = array("I"), array("I"), array("I"), array("I", [0])
+    t_text, t_answer, t_expl, t_extra, t_opt = array("I"), array("i"), array("I"), array("I"), array("I", [0])
+    o_text = array("I")
+    for job_id, quiz in quizzes:
+        # fields that don't fit the typed columns are kept verbatim in the extra JSON
+        title, questions = quiz.get("title"), quiz.get("questions")
+        known = {k for k, ok in (("title", isinstance(title, str)), ("questions", isinstance(questions, list))) if ok}
+        q_job.append(heap.add(job_id))
+        q_title.append(heap.add(title if "title" in known else None))
+        q_extra.append(heap.add(_extra(quiz, known)))
+        for q in questions if "questions" in known else ():
+            if not isinstance(q, dict):
+                continue
+            text, opts, answer, expl = (q.get(f) for f in _QUESTION_FIELDS)
+            typed = {f for f, v in (("question", text), ("explanation", expl)) if isinstance(v, str)}
+            if isinstance(opts, list) and all(isinstance(o, str) for o in opts):
+                typed.add("options")
+                answer_idx = opts.index(answer) if isinstance(answer, str) and answer in opts else ANSWER_OTHER
+                if answer_idx >= 0:
+                    typed.add("correctAnswer")
+                for o in opts:
+                    o_text.append(heap.add(o))
+            else:
+                answer_idx = NO_OPTIONS
+            t_text.append(heap.add(text if "question" in typed else None))
+            t_expl.append(heap.add(expl if "explanation" in typed else None))
+            t_answer.append(answer_idx)
+            t_extra.append(heap.add(_extra(q, typed)))
+            t_opt.append(len(o_text))
+        q_start.append(len(t_text))
+    head = _SEG_HEADER.pack(_SEG_MAGIC, len(q_job), len(t_text), len(o_text), len(heap.parts))
+    return b"".join((head, q_job.tobytes(), q_title.tobytes(), q_extra.tobytes(), q_start.tobytes(),
+                     t_text.tobytes(), t_answer.tobytes(), t_expl.tobytes(), t_extra.tobytes(), t_opt.tobytes(),
+                     o_text.tobytes(), heap.offsets.tobytes(), b"".join(heap.parts)))
+
+
+class Segment:
+    """A loaded segment: column arrays plus the string heap, decoded per string on access."""
+
+    def __init__(self):
+        self.q_job, self.q_title, self.q_extra, self.q_start = array("I"), array("I"), array("I"), array("I")
+        self.t_text, self.t_answer, self.t_expl = array("I"), array("i"), array("I")
+        self.t_extra, self.t_opt = array("I"), array("I")
+        self.o_text = array("I")
+        self.offsets = array("I")
+        self.heap = b""
+
+    def __len__(self) -> int:
+        return len(self.q_job)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Segment":
+        magic, n, m, k, s = _SEG_HEADER.unpack_from(data, 0)
+        if magic != _SEG_MAGIC:
+            raise ValueError("not a quiz segment object")
+        seg = cls()
+        pos = _read_arrays(data, _SEG_HEADER.size, (
+            (seg.q_job, n), (seg.q_title, n), (seg.q_extra, n), (seg.q_start, n + 1),
+            (seg.t_text, m), (seg.t_answer, m), (seg.t_expl, m), (seg.t_extra, m), (seg.t_opt, m + 1),
+            (seg.o_text, k), (seg.offsets, s + 1)))
+        seg.heap = bytes(data[pos:pos + seg.offsets[-1]])
+        return seg
+
+    def string(self, sid: int) -> Optional[str]:
+        if sid == NONE:
+            return None
+        return self.heap[self.offsets[sid]:self.offsets[sid + 1]].decode("utf-8")
+
+    def job_id(self, row: int) -> str:
+        return self.string(self.q_job[row])
+
+    def title(self, row: int) -> Optional[str]:
+        return self.string(self.q_title[row])
+
+    def question_range(self, row: int) -> range:
+        return range(self.q_start[row], self.q_start[row + 1])
+
+    def options(self, qi: int) -> List[str]:
+        return [self.string(self.o_text[j]) for j in range(self.t_opt[qi], self.t_opt[qi + 1])]
+
+    def question(self, qi: int) -> dict:
+        out = {}
+        text = self.string(self.t_text[qi])
+        if text is not None:
+            out["question"] = text
+        answer = self.t_answer[qi]
+        if answer != NO_OPTIONS:
+            out["options"] = opts = self.options(qi)
+            if answer >= 0:
+                out["correctAnswer"] = opts[answer]
+        expl = self.string(self.t_expl[qi])
+        if expl is not None:
+            out["explanation"] = expl
+        if self.t_extra[qi] != NONE:
+            out.update(json.loads(self.string(self.t_extra[qi])))
+        return out
+
+    def quiz(self, row: int) -> dict:
+        """The quiz.json content of one row."""
+        out = {}
+        title = self.title(row)
+        if title is not None:
+            out["title"] = title
+        out["questions"] = [self.question(qi) for qi in self.question_range(row)]
+        if self.q_extra[row] != NONE:
+            out.update(json.loads(self.string(self.q_extra[row])))
+        return out
+
+
+# ---------- index ----------
+class QuizIndex:
+    """Every compacted quiz, sorted by jobId; string columns are newline-joined blobs."""
+
+    def __init__(self):
+        self.jobs: List[str] = []
+        self.etags: List[str] = []
+        self.titles: List[str] = []
+        self.seg = array("I")        # position in self.segments
+        self.row = array("I")
+        self.questions = array("I")
+        self.modified = array("d")   # S3 LastModified of quiz.json, epoch seconds
+        self.segments: List[dict] = []  # {"key", "quizzes", "bytes"}
+        self.retired: List[dict] = []   # {"key", "at"}: superseded, deleted after RETIRE_SEC
+        self.next_segment = 0
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+    def find(self, job_id: str) -> int:
+        i = bisect_left(self.jobs, job_id)
+        return i if i < len(self.jobs) and self.jobs[i] == job_id else -1
+
+    def after(self, job_id: Optional[str]) -> int:
+        """Position of the first jobId greater than ``job_id`` (pagination cursor)."""
+        return 0 if not job_id else bisect_right(self.jobs, job_id)
+
+    def entry(self, i: int) -> dict:
+        return {"jobId": self.jobs[i], "title": self.titles[i], "questions": self.questions[i],
+                "lastModified": self.modified[i], "etag": self.etags[i]}
+
+    def live_rows(self) -> List[int]:
+        """Live quizzes per segment position."""
+        live = [0] * len(self.segments)
+        for s in self.seg:
+            live[s] += 1
+        return live
+
+    def upsert(self, rows: List[Tuple[str, str, str, int, float, int, int]]):
+        """Merge (jobId, etag, title, questions, modified, segment, row) rows; a jobId already present is repointed."""
+        merged = {self.jobs[i]: (self.etags[i], self.titles[i], self.questions[i], self.modified[i],
+                                 self.seg[i], self.row[i]) for i in range(len(self.jobs))}
+        for job_id, etag, title, nq, modified, seg, row in rows:
+            merged[job_id] = (etag, title, nq, modified, seg, row)
+        self._set(sorted(merged.items()))
+
+    def _set(self, items):
+        self.jobs = [k for k, _ in items]
+        self.etags = [v[0] for _, v in items]
+        self.titles = [v[1] for _, v in items]
+        self.questions = array("I", (v[2] for _, v in items))
+        self.modified = array("d", (v[3] for _, v in items))
+        self.seg = array("I", (v[4] for _, v in items))
+        self.row = array("I", (v[5] for _, v in items))
+
+    def drop_segments(self, positions: set):
+        """Forget segments at ``positions`` (their rows must already be repointed) and renumber the rest."""
+        remap, kept = {}, []
+        for i, s in enumerate(self.segments):
+            if i in positions:
+                self.retired.append({"key": s["key"], "at": time.time()})
+            else:
+                remap[i] = len(kept)
+                kept.append(s)
+        self.segments = kept
+        self.seg = array("I", (remap[s] for s in self.seg))
+
+    def to_bytes(self) -> bytes:
+        jobs = "\n".join(self.jobs).encode("utf-8")
+        etags = "\n".join(self.etags).encode("utf-8")
+        titles = "\n".join(t.replace("\n", " ") for t in self.titles).encode("utf-8")
+        meta = json.dumps({"segments": self.segments, "retired": self.retired, "next": self.next_segment},
+                          separators=(",", ":")).encode("utf-8")
+        head = _IDX_HEADER.pack(_IDX_MAGIC, len(self.jobs), len(jobs), len(etags), len(titles), len(meta))
+        return b"".join((head, self.seg.tobytes(), self.row.tobytes(), self.questions.tobytes(),
+                         self.modified.tobytes(), jobs, etags, titles, meta))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "QuizIndex":
+        magic, n, n_jobs, n_etags, n_titles, n_meta = _IDX_HEADER.unpack_from(data, 0)
+        if magic != _IDX_MAGIC:
+            raise ValueError("not a quiz index object")
+        idx = cls()
+        pos = _read_arrays(data, _IDX_HEADER.size, ((idx.seg, n), (idx.row, n), (idx.questions, n),
+                                                    (idx.modified, n)))
+        blobs = []
+        for size in (n_jobs, n_etags, n_titles, n_meta):
+            blobs.append(data[pos:pos + size].decode("utf-8"))
+            pos += size
+        if n:
+            idx.jobs, idx.etags, idx.titles = (b.split("\n") for b in blobs[:3])
+        meta = json.loads(blobs[3])
+        idx.segments, idx.retired, idx.next_segment = meta["segments"], meta.get("retired", []), meta["next"]
+        return idx
+
+
+# ---------- storage ----------
+def _fetch_index(s3, bucket: str, key: str) -> Tuple[QuizIndex, Optional[str]]:
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if not _missing(e):
+            raise
+        return QuizIndex(), None
+    return QuizIndex.from_bytes(artifacts.read_body(obj)), obj.get("ETag")
+
+
+def _put_segment(s3, bucket: str, prefix: str, idx: QuizIndex, quizzes: List[Tuple[str, dict]]) -> dict:
+    body = build_segment(quizzes)
+    # random suffix: a concurrent compaction writing the same quizzes never gets the same key,
+    # so the one that loses the index write can delete its own segments safely
+    key = f"{prefix}{SEGMENTS_DIR}seg-{idx.next_segment:08d}-{os.urandom(6).hex()}.bin"
+    stored = artifacts.put(s3, bucket, key, body, "application/octet-stream")
+    idx.next_segment += 1
+    return {"key": key, "quizzes": len(quizzes), "bytes": len(stored)}
+
+
+_seg_lock = threading.Lock()
+_segments: "OrderedDict[Tuple[str, str], Segment]" = OrderedDict()
+
+
+def load_segment(s3, bucket: str, key: str) -> Segment:
+    """A segment, from the per-container LRU when possible (segment objects never change)."""
+    with _seg_lock:
+        seg = _segments.get((bucket, key))
+        if seg is not None:
+            _segments.move_to_end((bucket, key))
+            return seg
+    seg = Segment.from_bytes(artifacts.get_bytes(s3, bucket, key))
+    with _seg_lock:
+        _segments[(bucket, key)] = seg
+        while len(_segments) > max(1, SEGMENT_CACHE):
+            _segments.popitem(last=False)
+    return seg
+
+
+_idx_lock = threading.Lock()
+_indexes: Dict[Tuple[str, str], Tuple[QuizIndex, Optional[str], float]] = {}
+
+
+def load_index(s3, bucket: str, prefix: str) -> QuizIndex:
+    """The index; a warm container re-downloads it only when its ETag changed."""
+    key = prefix + INDEX_NAME
+    with _idx_lock:
+        hit = _indexes.get((bucket, key))
+    if hit and time.monotonic() - hit[2] < CHECK_INTERVAL_SEC:
+        return hit[0]
+    if hit and hit[1]:
+        try:
+            if s3.head_object(Bucket=bucket, Key=key).get("ETag") == hit[1]:
+                with _idx_lock:
+                    _indexes[(bucket, key)] = (hit[0], hit[1], time.monotonic())
+                return hit[0]
+        except ClientError:
+            pass
+    idx, etag = _fetch_index(s3, bucket, key)
+    with _idx_lock:
+        _indexes[(bucket, key)] = (idx, etag, time.monotonic())
+    return idx
+
+
+def quiz(s3, bucket: str, idx: QuizIndex, i: int) -> dict:
+    """The full quiz at index position ``i``."""
+    seg = load_segment(s3, bucket, idx.segments[idx.seg[i]]["key"])
+    return seg.quiz(idx.row[i])
+
+
+def scan(s3, bucket: str, prefix: str, workers: int = 4) -> Iterator[Tuple[Segment, List[int]]]:
+    """(segment, live rows) for every segment, fetched ``workers`` at a time, in segment order.
+
+    Rows superseded by a later compaction of the same jobId are left out.
+    """
+    idx = load_index(s3, bucket, prefix)
+    live: List[List[int]] = [[] for _ in idx.segments]
+    for s, r in zip(idx.seg, idx.row):
+        live[s].append(r)
+    keys = [s["key"] for s in idx.segments]
+
+    def fetch(key):
+        return Segment.from_bytes(artifacts.get_bytes(s3, bucket, key))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="segment-scan") as pool:
+        for pos, seg in enumerate(pool.map(fetch, keys)):
+            yield seg, sorted(live[pos])
+
+
+# ---------- compaction ----------
+def _list_quizzes(s3, bucket: str, prefix: str) -> Iterator[dict]:
+    """Every <prefix><jobId>/quiz.json object (variants and other artifacts excluded)."""
+    token = None
+    while True:
+        kw = {"Bucket": bucket, "Prefix": prefix}
+        if token:
+            kw["ContinuationToken"] = token
+        page = s3.list_objects_v2(**kw)
+        for obj in page.get("Contents", ()):
+            rest = obj["Key"][len(prefix):]
+            job_id, _, name = rest.partition("/")
+            if name == "quiz.json" and job_id and not job_id.startswith("_"):
+                yield {"jobId": job_id, "key": obj["Key"], "etag": obj.get("ETag", ""),
+                       "modified": obj["LastModified"].timestamp() if obj.get("LastModified") else 0.0}
+        if not page.get("IsTruncated"):
+            return
+        token = page.get("NextContinuationToken")
+
+
+def _fetch_quiz(s3, bucket: str, item: dict) -> Optional[Tuple[dict, dict]]:
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=item["key"])
+        data = json.loads(artifacts.read_body(obj).decode("utf-8"))
+    except ClientError as e:
+        if _missing(e):
+            return None
+        raise
+    except ValueError as e:
+        log.warning("skipping unreadable quiz", jobId=item["jobId"], error=str(e))
+        return None
+    # the ETag of what was read, in case quiz.json was replaced since the listing
+    return dict(item, etag=obj.get("ETag") or item["etag"]), (data if isinstance(data, dict) else {})
+
+
+def _rows(pos: int, batch: List[Tuple[dict, dict]]) -> list:
+    return [(item["jobId"], item["etag"], str(q.get("title") or ""),
+             len(q["questions"]) if isinstance(q.get("questions"), list) else 0, item["modified"], pos, row)
+            for row, (item, q) in enumerate(batch)]
+
+
+def _merge(s3, bucket: str, prefix: str, idx: QuizIndex, stats: dict):
+    """Rewrite small or mostly-superseded segments into full ones, dropping superseded rows."""
+    live = idx.live_rows()
+    small = [i for i, s in enumerate(idx.segments)
+             if live[i] < SEGMENT_QUIZZES // 4 or live[i] < s["quizzes"] // 2]
+    if len(small) < max(2, MERGE_FANIN):
+        return
+    chosen = set(small)
+    moving = [i for i in range(len(idx.jobs)) if idx.seg[i] in chosen]
+    moving.sort(key=lambda i: (idx.seg[i], idx.row[i]))
+    rows = []
+    for start in range(0, len(moving), SEGMENT_QUIZZES):
+        part = moving[start:start + SEGMENT_QUIZZES]
+        batch = []
+        for i in part:
+            seg = load_segment(s3, bucket, idx.segments[idx.seg[i]]["key"])
+            batch.append((idx.jobs[i], seg.quiz(idx.row[i])))
+        info = _put_segment(s3, bucket, prefix, idx, batch)
+        pos = len(idx.segments)
+        idx.segments.append(info)
+        rows.extend((idx.jobs[i], idx.etags[i], idx.titles[i], idx.questions[i], idx.modified[i], pos, r)
+                    for r, i in enumerate(part))
+    idx.upsert(rows)
+    idx.drop_segments(chosen)
+    stats["merged"] = len(chosen)
+
+
+def _delete(s3, bucket: str, keys: List[str]) -> int:
+    deleted = 0
+    for key in keys:
+        try:
+            s3.delete_object(Bucket=bucket, Key=key)
+            deleted += 1
+        except ClientError as e:
+            log.warning("failed to delete segment %s: %s", key, e)
+    return deleted
+
+
+def compact(s3, bucket: str, prefix: str, rebuild: bool = False, inv: telemetry.Invocation = None) -> dict:
+    """Roll quiz.json objects the index doesn't have yet into new segments; returns run stats.
+
+    ``rebuild`` ignores the current index and writes every quiz into fresh segments.
+    """
+    span = inv.span if inv is not None else (lambda name: contextlib.nullcontext())
+    key = prefix + INDEX_NAME
+    stats = {"listed": 0, "new": 0, "changed": 0, "segmentsWritten": 0, "merged": 0, "deleted": 0,
+             "skipped": 0, "conflict": False}
+    with span("index_read"):
+        idx, etag = _fetch_index(s3, bucket, key)
+    committed = {s["key"] for s in idx.segments} | {r["key"] for r in idx.retired}
+    # retired long enough ago that no reader can still hold an index pointing at them;
+    # deleted only once the index without them is committed
+    now = time.time()
+    expired = [r["key"] for r in idx.retired if now - r["at"] >= RETIRE_SEC]
+    idx.retired = [r for r in idx.retired if now - r["at"] < RETIRE_SEC]
+    if rebuild:
+        old, idx = idx, QuizIndex()
+        idx.next_segment = old.next_segment
+        idx.retired = old.retired + [{"key": s["key"], "at": now} for s in old.segments]
+
+    with span("list"):
+        todo = []
+        for item in _list_quizzes(s3, bucket, prefix):
+            stats["listed"] += 1
+            i = idx.find(item["jobId"])
+            if i >= 0 and idx.etags[i] == item["etag"]:
+                continue
+            stats["new" if i < 0 else "changed"] += 1
+            todo.append(item)
+    if len(todo) > MAX_NEW_PER_RUN:
+        stats["deferred"] = len(todo) - MAX_NEW_PER_RUN
+        todo = todo[:MAX_NEW_PER_RUN]
+
+    with span("fetch"):
+        with ThreadPoolExecutor(max_workers=max(1, FETCH_CONCURRENCY), thread_name_prefix="compact-io") as pool:
+            fetched = [r for r in pool.map(lambda it: _fetch_quiz(s3, bucket, it), todo) if r is not None]
+    stats["skipped"] = len(todo) - len(fetched)
+
+    with span("segment_write"):
+        rows = []
+        for start in range(0, len(fetched), SEGMENT_QUIZZES):
+            batch = fetched[start:start + SEGMENT_QUIZZES]
+            info = _put_segment(s3, bucket, prefix, idx, [(item["jobId"], q) for item, q in batch])
+            rows.extend(_rows(len(idx.segments), batch))
+            idx.segments.append(info)
+            stats["segmentsWritten"] += 1
+        if rows:
+            idx.upsert(rows)
+        _merge(s3, bucket, prefix, idx, stats)
+
+    if not rows and not stats["merged"] and not expired and not rebuild:
+        stats.update(quizzes=len(idx), segments=len(idx.segments))
+        return stats
+    body, enc = artifacts.encode(idx.to_bytes())
+    cond = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+    with span("index_write"):
+        try:
+            s3.put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/octet-stream",
+                          **artifacts.extra_args(enc), **cond)
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+            if code not in ("PreconditionFailed", "ConditionalRequestConflict") and status not in (409, 412):
+                raise
+            # another compaction committed first; the segments written here are orphans
+            stats["conflict"] = True
+            written = [s["key"] for s in idx.segments] + [r["key"] for r in idx.retired]
+            _delete(s3, bucket, [k for k in written if k not in committed])
+            log.warning("index changed during compaction, will retry next run")
+            return stats
+    stats["deleted"] = _delete(s3, bucket, expired)
+    stats.update(quizzes=len(idx), segments=len(idx.segments), indexBytes=len(body))
+    log.info("quizzes compacted", **stats)
+    return stats
+
+
+def reset():
+    with _idx_lock:
+        _indexes.clear()
+    with _seg_lock:
+        _segments.clear()
@@ -0,0 +1,172 @@
+import os
+import re
+import json
+import hashlib
+from typing import List, Optional, Tuple
+
+import quiz_response
+import telemetry
+
+# ---------- quiz variants ----------
+# Several quizzes (question count, difficulty, topic focus, language) from one
+# extraction. Every variant prompt starts with the same instructions and the
+# same source text and only the variant's own requirements come last, so the
+# prompts share one long prefix that Gemini's implicit context cache can reuse.
+# The variant calls are fanned out together with agenerate_many().
+#
+#   <quiz-output-folder>/<jobId>/variants/<variantId>/quiz.json
+
+log = telemetry.get_logger("quiz_variants")
+
+MAX_VARIANTS = int(os.getenv("QUIZ_MAX_VARIANTS", "8"))
+CONCURRENCY = int(os.getenv("QUIZ_VARIANT_CONCURRENCY", "8"))
+SOURCE_MAX_CHARS = int(os.getenv("QUIZ_VARIANT_SOURCE_MAX_CHARS", "12000"))
+MAX_QUESTIONS = 30
+DIFFICULTIES = ("easy", "medium", "hard", "mixed")
+
+_ID = re.compile(r"^[0-9a-f]{12}$")
+_DIFFICULTY_HINT = {
+    "easy": "Keep the questions easy: recall of facts stated directly in the text.",
+    "medium": "Use medium difficulty: understanding and simple application of the text.",
+    "hard": "Make the questions hard: multi-step reasoning, comparisons and edge cases, with plausible distractors.",
+    "mixed": "Mix easy, medium and hard questions in roughly equal parts.",
+}
+
+
+def parse_spec(raw) -> dict:
+    """Normalise one variant request; raises ValueError on anything unusable."""
+    if not isinstance(raw, dict):
+        raise ValueError("variant must be an object")
+    try:
+        count = int(raw.get("count", 10))
+    except (TypeError, ValueError):
+        raise ValueError("count must be an integer")
+    if not 1 <= count <= MAX_QUESTIONS:
+        raise ValueError(f"count must be between 1 and {MAX_QUESTIONS}")
+    difficulty = str(raw.get("difficulty") or "medium").strip().lower()
+    if difficulty not in DIFFICULTIES:
+        raise ValueError(f"difficulty must be one of {', '.join(DIFFICULTIES)}")
+    focus = " ".join(str(raw.get("focus") or "").split())
+    language = " ".join(str(raw.get("language") or "English").split())
+    if len(focus) > 200 or len(language) > 40:
+        raise ValueError("focus/language too long")
+    return {"count": count, "difficulty": difficulty, "focus": focus, "language": language}
+
+
+def parse_specs(raw) -> List[dict]:
+    if not isinstance(raw, list) or not raw:
+        raise ValueError("variants must be a non-empty list")
+    if len(raw) > MAX_VARIANTS:
+        raise ValueError(f"at most {MAX_VARIANTS} variants per request")
+    specs, seen = [], set()
+    for item in raw:
+        spec = parse_spec(item)
+        vid = variant_id(spec)
+        if vid not in seen:  # identical specs would only produce the same quiz twice
+            seen.add(vid)
+            specs.append(spec)
+    return specs
+
+
+def variant_id(spec: dict) -> str:
+    # Same spec + same jobId (a content hash) -> same key, so finished variants are reused.
+    canon = json.dumps(spec, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()[:12]
+
+
+def is_variant_id(value: Optional[str]) -> bool:
+    return bool(value) and bool(_ID.match(value))
+
+
+def variant_key(out_prefix: str, job_id: str, vid: str) -> str:
+    return f"{out_prefix}{job_id}/variants/{vid}/quiz.json"
+
+
+def build_prompt(src_text: str, job_id: str, spec: dict, avoid: Optional[List[str]] = None) -> str:
+    # Shared prefix first (identical for every variant of this job), variant specifics last.
+    lines = [
+        "You are a quiz generator. Your task is to generate a quiz from the source text.",
+        "Your response must be a single JSON object: {\"title\": \"string\", \"questions\": [{\"question\": \"string\", "
+        "\"options\": [\"string\", \"string\", \"string\", \"string\"], \"correctAnswer\": \"string\", "
+        "\"explanation\": \"string\"}]}. correctAnswer is copied exactly from options.",
+        "Ensure the JSON is well-formed and does not contain any extra text or code blocks.",
+        "",
+        f"JOB_ID: {job_id}",
+        "",
+        "=== SOURCE TEXT START ===",
+        src_text[:SOURCE_MAX_CHARS],
+        "=== SOURCE TEXT END ===",
+        "",
+        f"Write exactly {spec['count']} multiple-choice questions.",
+        _DIFFICULTY_HINT[spec["difficulty"]],
+        f"Write the title, questions, options and explanations in {spec['language']}.",
+    ]
+    if spec["focus"]:
+        lines.append(f"Focus on this topic: {spec['focus']}.")
+    if avoid:
+        lines.append("Do not repeat any of these existing questions:")
+        lines.extend(f"- {q}" for q in avoid)
+    return "\n".join(lines)
+
+
+def _run(client, prompts: List[str], config: Optional[dict], concurrency: int) -> list:
+    import asyncio
+    return asyncio.run(client.agenerate_many(prompts, concurrency=concurrency, generation_config=config,
+                                             return_exceptions=True))
+
+
+def _fan_out(client, prompts: List[str], concurrency: int) -> list:
+    config = quiz_response.generation_config()
+    results = _run(client, prompts, config, concurrency)
+    if config:
+        # Model without JSON mode / response schema support: ask those again in plain text.
+        retry = [i for i, r in enumerate(results) if isinstance(r, Exception) and getattr(r, "status", None) == 400]
+        if retry:
+            log.warning("JSON mode rejected for %d variants, retrying without it", len(retry))
+            for i, r in zip(retry, _run(client, [prompts[i] for i in retry], None, concurrency)):
+                results[i] = r
+    return results
+
+
+def generate(client, source_text: str, job_id: str, specs: List[dict],
+             concurrency: int = CONCURRENCY, repair: bool = True) -> List[Tuple[Optional[dict], Optional[str], int]]:
+    """One (quiz, error, invalid question count) per spec, in order.
+
+    Variants that come back short get one follow-up round, again fanned out together.
+    """
+    results = _fan_out(client, [build_prompt(source_text, job_id, s) for s in specs], concurrency)
+    quizzes: List[Optional[dict]] = [None] * len(specs)
+    errors: List[Optional[str]] = [None] * len(specs)
+    invalid = [0] * len(specs)
+    for i, r in enumerate(results):
+        if isinstance(r, Exception):
+            errors[i] = str(r)
+            continue
+        valid, bad, title = quiz_response.parse_questions(r)
+        quizzes[i] = {"title": title or "Quiz from the document", "questions": valid}
+        invalid[i] = len(bad)
+
+    short = [i for i, q in enumerate(quizzes) if q is not None and len(q["questions"]) < specs[i]["count"]]
+    if repair and short:
+        log.info("re-requesting questions for %d short variants", len(short))
+        prompts = []
+        for i in short:
+            have = quizzes[i]["questions"]
+            spec = dict(specs[i], count=specs[i]["count"] - len(have))
+            prompts.append(build_prompt(source_text, job_id, spec, [q["question"] for q in have]))
+        for i, r in zip(short, _fan_out(client, prompts, concurrency)):
+            if isinstance(r, Exception):
+                continue
+            more, bad, _ = quiz_response.parse_questions(r)
+            quizzes[i]["questions"] += more
+            invalid[i] += len(bad)
+
+    out = []
+    for i, spec in enumerate(specs):
+        q = quizzes[i]
+        if q is not None:
+            q["questions"] = q["questions"][:spec["count"]]
+            if not q["questions"]:
+                q, errors[i] = None, "no valid questions in Gemini response"
+        out.append((q, errors[i], invalid[i]))
+    return out
@@ -0,0 +1,166 @@
+import json
+import time
+import base64
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+import artifacts
+import dedup
+import delivery
+import gemini_client
+import job_status
+import prompt_pack
+import quiz_mapreduce
+import quiz_variants
+import runtime_context
+import telemetry
+
+log = telemetry.get_logger("quiz_variants")
+
+# Uploads of the finished variants run side by side.
+_io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="variant-io")
+
+# Helper function to format the HTTP response
+def _resp(code: int, obj) -> dict:
+    return {
+        "statusCode": code,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "POST",
+            "Access-Control-Allow-Headers": "Content-Type",
+            "Cache-Control": delivery.NO_STORE,
+        },
+        "body": json.dumps(obj, ensure_ascii=False),
+    }
+
+def _request(event: dict):
+    """(job_id, raw variant list, force) from an API Gateway POST or a direct invocation."""
+    body = event.get("body")
+    if isinstance(body, str):
+        if event.get("isBase64Encoded"):
+            body = base64.b64decode(body).decode("utf-8")
+        body = json.loads(body or "{}")
+    body = body if isinstance(body, dict) else {}
+    job_id = ((event.get("pathParameters") or {}).get("jobId") or body.get("job_id")
+              or event.get("job_id") or "")
+    variants = body.get("variants", event.get("variants"))
+    force = dedup.is_forced(body.get("force_regenerate", event.get("force_regenerate")))
+    return str(job_id).strip(), variants, force
+
+def _put_variant(s3, bucket: str, key: str, quiz: dict) -> str:
+    # cached like quiz.json: the key is derived from the spec and the content-hash jobId,
+    # and a forced run rewrites it in place
+    body = artifacts.put(s3, bucket, key, json.dumps(quiz, ensure_ascii=False).encode("utf-8"),
+                         "application/json; charset=utf-8", delivery.REVALIDATE, artifacts.PUBLIC_ENCODING)
+    return job_status.etag_of(body)
+
+def lambda_handler(event, context):
+    timings = {}
+    with telemetry.Invocation("quiz_variants", timings) as inv:
+        return inv.result(_handle(event, inv))
+
+def _handle(event: dict, inv: telemetry.Invocation) -> dict:
+    # 1. Job and variant specs
+    try:
+        job_id, raw_variants, force = _request(event)
+        specs = quiz_variants.parse_specs(raw_variants)
+    except ValueError as e:  # includes malformed JSON bodies
+        log.warning("bad request: %s", e)
+        return _resp(400, {"error": str(e)})
+    if not job_id:
+        return _resp(400, {"error": "Missing jobId in path."})
+    inv.bind(jobId=job_id, variants=len(specs))
+
+    try:
+        s3 = runtime_context.client("s3")
+        with inv.span("ssm_fetch"):
+            in_bucket, in_prefix = runtime_context.get_s3_location("/ai-quiz/pdf-extract/text-output-folder")
+            out_bucket, out_prefix = runtime_context.get_s3_location("/ai-quiz/gen-quiz/quiz-output-folder")
+
+        # 2. Variants that already exist are returned as-is unless forced
+        todo, results = [], []
+        for spec in specs:
+            vid = quiz_variants.variant_id(spec)
+            key = quiz_variants.variant_key(out_prefix, job_id, vid)
+            entry = {"id": vid, "spec": spec, "key": key}
+            if not force and dedup.object_exists(s3, out_bucket, key):
+                dedup.record("variant", "hit", job_id)
+                entry["status"] = "exists"
+            else:
+                todo.append(entry)
+            results.append(entry)
+        if not todo:
+            return _resp(200, {"job_id": job_id, "variants": results, "timings": inv.timings})
+
+        # 3. The extracted text is read once for all variants
+        data_key = f"{in_prefix}{job_id}/data.txt"
+        with inv.span("s3_read"):
+            try:
+                obj = s3.get_object(Bucket=in_bucket, Key=data_key)
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                    return _resp(404, {"error": "Extracted text not found; upload the document first."})
+                raise
+            source_text = artifacts.read_body(obj).decode("utf-8", errors="ignore")
+
+        with inv.span("ssm_fetch"):
+            model = runtime_context.get_param("/ai-quiz/gen-quiz/gemini-model")
+            api_key = runtime_context.get_secret("/ai-quiz/gen-quiz/gemini-api-key")
+        inv.bind(model=model)
+
+        # 4. All variant prompts go out together, sharing one packed source text
+        if prompt_pack.ENABLED:
+            with inv.span("prompt_pack"):
+                source_text, packed = prompt_pack.pack(
+                    source_text, quiz_variants.SOURCE_MAX_CHARS // quiz_mapreduce.CHARS_PER_TOKEN)
+            inv.timings.update(prompt_tokens_before=packed["tokensBefore"], prompt_tokens_after=packed["tokensAfter"])
+        log.info("generating %d variants", len(todo), chars=len(source_text))
+        with inv.span("llm_call"):
+            generated = quiz_variants.generate(gemini_client.shared(api_key, model), source_text, job_id,
+                                               [e["spec"] for e in todo])
+
+        # 5. Each result under its own key
+        t_write = time.perf_counter()
+        uploads = {}
+        for entry, (quiz, error, n_invalid) in zip(todo, generated):
+            inv.add("invalid_questions", n_invalid)
+            if quiz is None:
+                entry.update(status="failed", error=error)
+                continue
+            entry["questions"] = len(quiz["questions"])
+            uploads[entry["id"]] = _io_pool.submit(_put_variant, s3, out_bucket, entry["key"], quiz)
+        saved = {}
+        for entry in todo:
+            future = uploads.get(entry["id"])
+            if future is None:
+                continue
+            try:
+                saved[entry["id"]] = {"json": entry["key"], "jsonETag": future.result(), "spec": entry["spec"]}
+                entry["status"] = "created"
+            except Exception as e:
+                log.warning("variant upload failed: %s", e, variant=entry["id"])
+                entry.update(status="failed", error=f"upload failed: {e}")
+        inv.add("s3_write", (time.perf_counter() - t_write) * 1000)
+
+        # 6. Record the new variants next to the job's other outputs
+        if saved:
+            try:
+                record, _ = job_status.store().get(job_id)
+                known = ((record or {}).get("outputs") or {}).get("variants") or {}
+                job_status.update(job_id, outputs={"variants": {**known, **saved}})
+            except Exception as e:
+                log.warning("failed to record variants: %s", e)
+
+        failed = sum(1 for e in todo if e["status"] == "failed")
+        inv.timings["variants_created"] = len(saved)
+        inv.timings["variants_failed"] = failed
+        log.info("variants done", created=len(saved), failed=failed)
+        code = 500 if failed == len(results) else 200
+        return _resp(code, {"job_id": job_id, "model": model, "variants": results, "timings": inv.timings})
+
+    except Exception as e:
+        log.error("unhandled %s: %s", type(e).__name__, e, exc_info=traceback.format_exc())
+        return _resp(500, {"error": f"unhandled: {e}"})
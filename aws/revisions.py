@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import random
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+import artifacts
+import question_bank
+import telemetry
+
+# ---------- revised documents ----------
+# A re-uploaded deck with a few edited slides hashes to a new jobId. Every
+# extraction writes pages.json next to data.txt (per page: content-stream
+# signature, text hash and byte span in data.txt) and adds its signatures to
+# one page index object. A new upload looks up the prior job sharing most
+# page signatures, copies the text of unchanged pages out of that job's
+# data.txt, and gemini_quiz later keeps the questions written from them.
+#
+#   pages.json: {"jobId", "basedOn", "pages": [{"c": sig, "t": text hash, "s": start, "e": end}]}
+
+log = telemetry.get_logger("revisions")
+
+ENABLED = os.getenv("REVISIONS", "1").strip().lower() in ("1", "true", "yes", "on")
+PAGES_NAME = "pages.json"
+INDEX_NAME = os.getenv("REVISIONS_INDEX_NAME", "_pages/page_index.bin")
+MIN_OVERLAP = float(os.getenv("REVISIONS_MIN_OVERLAP", "0.5"))
+CHECK_INTERVAL_SEC = float(os.getenv("REVISIONS_CHECK_SEC", "30"))
+SAVE_RETRIES = 8
+
+_MAGIC = b"PGX1"
+_HEADER = struct.Struct("<4sII")  # magic, entries, json bytes
+
+
+def _missing(e: ClientError) -> bool:
+    return e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+
+def _conflict(e: ClientError) -> bool:
+    code = e.response.get("Error", {}).get("Code")
+    status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in ("PreconditionFailed", "ConditionalRequestConflict") or status in (409, 412)
+
+
+class PageIndex:
+    """Sorted page signatures (uint64) with the job each came from; jobs as [[jobId, pages], ...]."""
+
+    def __init__(self):
+        self.sigs = array("Q")
+        self.owners = array("I")
+        self.jobs: List[list] = []
+
+    def closest(self, sigs: List[str], exclude: Optional[str] = None) -> Tuple[Optional[str], float]:
+        """The job sharing the largest share of pages with ``sigs``, as (jobId, overlap)."""
+        wanted = {int(s, 16) for s in sigs}
+        votes: Dict[int, int] = {}
+        for v in wanted:
+            lo = bisect_left(self.sigs, v)
+            for j in {self.owners[i] for i in range(lo, bisect_right(self.sigs, v, lo))}:
+                votes[j] = votes.get(j, 0) + 1
+        best, best_overlap = None, 0.0
+        for j, n in votes.items():
+            job_id, pages = self.jobs[j]
+            overlap = n / max(len(wanted), pages, 1)
+            if job_id != exclude and overlap > best_overlap:
+                best, best_overlap = job_id, overlap
+        return best, best_overlap
+
+    def add(self, job_id: str, sigs: List[str]):
+        j = len(self.jobs)
+        self.jobs.append([job_id, len(sigs)])
+        pairs = sorted(list(zip(self.sigs, self.owners)) + [(int(s, 16), j) for s in set(sigs)])
+        self.sigs = array("Q", (p[0] for p in pairs))
+        self.owners = array("I", (p[1] for p in pairs))
+
+    def to_bytes(self) -> bytes:
+        blob = json.dumps(self.jobs, separators=(",", ":")).encode("utf-8")
+        return b"".join((_HEADER.pack(_MAGIC, len(self.sigs), len(blob)),
+                         self.sigs.tobytes(), self.owners.tobytes(), blob))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "PageIndex":
+        magic, n, n_blob = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC:
+            raise ValueError("not a page index object")
+        idx, pos = cls(), _HEADER.size
+        idx.sigs.frombytes(data[pos:pos + 8 * n])
+        pos += 8 * n
+        idx.owners.frombytes(data[pos:pos + 4 * n])
+        pos += 4 * n
+        idx.jobs = json.loads(data[pos:pos + n_blob].decode("utf-8"))
+        return idx
+
+
+# ---------- per-container copy of the index ----------
+_lock = threading.Lock()
+_save_lock = threading.Lock()
+_cached: Dict[Tuple[str, str], Tuple[PageIndex, Optional[str], float]] = {}
+
+
+def _fetch(s3, bucket: str, key: str) -> Tuple[PageIndex, Optional[str]]:
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if not _missing(e):
+            raise
+        return PageIndex(), None
+    return PageIndex.from_bytes(obj["Body"].read()), obj.get("ETag")
+
+
+def load_index(s3, bucket: str, key: str) -> PageIndex:
+    with _lock:
+        hit = _cached.get((bucket, key))
+    if hit and time.monotonic() - hit[2] < CHECK_INTERVAL_SEC:
+        return hit[0]
+    idx, etag = _fetch(s3, bucket, key)
+    with _lock:
+        _cached[(bucket, key)] = (idx, etag, time.monotonic())
+    return idx
+
+
+def index_job(s3, bucket: str, key: str, job_id: str, sigs: List[str]) -> bool:
+    """Add a job's page signatures to the stored index; False if every write lost a race.
+
+    Serialised within the container (records of one batch run in parallel).
+    Across containers the write is conditional on the ETag that was read, and
+    redone on the newer index when another extraction saved in between.
+    """
+    with _save_lock:
+        for attempt in range(SAVE_RETRIES):
+            idx, etag = _fetch(s3, bucket, key)
+            if any(j[0] == job_id for j in idx.jobs):
+                return True
+            idx.add(job_id, sigs)
+            cond = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+            try:
+                resp = s3.put_object(Bucket=bucket, Key=key, Body=idx.to_bytes(),
+                                     ContentType="application/octet-stream", **cond)
+            except ClientError as e:
+                if not _conflict(e):
+                    raise
+                time.sleep(random.uniform(0, 0.05 * (attempt + 1)))
+                continue
+            with _lock:
+                _cached[(bucket, key)] = (idx, resp.get("ETag"), time.monotonic())
+            return True
+    log.warning("page index changed under every write, %s not indexed", job_id)
+    return False
+
+
+def reset():
+    with _lock:
+        _cached.clear()
+
+
+# ---------- pages.json ----------
+def read_pages(s3, bucket: str, job_prefix: str) -> Optional[dict]:
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=f"{job_prefix}{PAGES_NAME}")
+    except ClientError as e:
+        if _missing(e):
+            return None
+        raise
+    return json.loads(artifacts.read_body(obj).decode("utf-8"))
+
+
+def write_pages(s3, bucket: str, job_prefix: str, pages: dict):
+    artifacts.put(s3, bucket, f"{job_prefix}{PAGES_NAME}",
+                  json.dumps(pages, separators=(",", ":")).encode("utf-8"), "application/json")
+
+
+def page_texts(data: bytes, pages: dict) -> List[str]:
+    return [data[p["s"]:p["e"]].decode("utf-8", errors="ignore") for p in pages["pages"]]
+
+
+def reusable_pages(sigs: List[str], prior_pages: dict, prior_data: bytes) -> Dict[int, str]:
+    """New page index -> text copied from the prior job, for every page whose signature it already has."""
+    texts = dict(zip((p["c"] for p in prior_pages["pages"]), page_texts(prior_data, prior_pages)))
+    return {i: texts[s] for i, s in enumerate(sigs) if s in texts}
+
+
+def plan_questions(prior_data: bytes, prior_pages: dict, prior_questions: List[dict],
+                   new_data: bytes, new_pages: dict, count: int) -> Tuple[List[dict], str, dict]:
+    """Split a revision's quiz into questions to keep and text to ask the LLM about.
+
+    Prior questions are attributed to the prior page they were written from;
+    those whose page text is unchanged are kept. The rest of the quiz is
+    generated from the pages that are new or changed. Returns
+    (kept questions, changed-page text, stats).
+    """
+    new_hashes = {p["t"] for p in new_pages["pages"]}
+    prior_hashes = {p["t"] for p in prior_pages["pages"]}
+    per_page = question_bank.attribute(page_texts(prior_data, prior_pages), prior_questions)
+    kept = [q for p, qs in zip(prior_pages["pages"], per_page) if p["t"] in new_hashes for q in qs][:count]
+    changed = [t for p, t in zip(new_pages["pages"], page_texts(new_data, new_pages))
+               if p["t"] not in prior_hashes and t.strip()]
+    return kept, "\n".join(changed), {"changedPages": len(changed), "keptQuestions": len(kept)}
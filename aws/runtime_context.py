@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+import telemetry
+
+# ---------- per-container runtime context ----------
+# Everything in this module lives for the lifetime of the Lambda container, so
+# warm invocations reuse clients, SSM parameters, secrets and parsed S3
+# locations instead of fetching them again on every request.
+
+log = telemetry.get_logger("runtime_context")
+
+PARAM_ROOT = os.getenv("AI_QUIZ_PARAM_ROOT", "/ai-quiz")
+CACHE_TTL_SEC = float(os.getenv("CONFIG_CACHE_TTL_SEC", "300"))
+
+# SigV4 with virtual-hosted addressing so presigned S3 URLs are valid in
+# every region (SigV2 is rejected by newer regions).
+_S3_CONFIG = Config(signature_version="s3v4", s3={"addressing_style": "virtual"})
+
+
+def _boto3_client(service: str):
+    if service == "s3":
+        return boto3.client(service, config=_S3_CONFIG)
+    return boto3.client(service)
+
+
+_lock = threading.RLock()
+_client_factory: Callable = _boto3_client
+_clients: Dict[str, object] = {}
+_params: Dict[str, str] = {}
+_params_loaded_at = 0.0
+_secrets: Dict[Tuple[str, str], Tuple[str, float]] = {}
+_locations: Dict[Tuple[str, Optional[str]], Tuple[str, str]] = {}
+
+
+def _fresh(loaded_at: float) -> bool:
+    return loaded_at > 0 and (time.monotonic() - loaded_at) < CACHE_TTL_SEC
+
+
+def client(service: str):
+    c = _clients.get(service)
+    if c is None:
+        with _lock:
+            c = _clients.get(service)
+            if c is None:
+                c = _client_factory(service)
+                _clients[service] = c
+    return c
+
+
+def set_client_factory(factory: Callable):
+    """Swap the client constructor (benchmarks, local serving). Drops cached clients."""
+    global _client_factory
+    with _lock:
+        _client_factory = factory
+        _clients.clear()
+
+
+def reset():
+    """Forget clients and every cached value, as if the container were cold."""
+    global _params_loaded_at
+    with _lock:
+        _clients.clear()
+        _params.clear()
+        _params_loaded_at = 0.0
+        _secrets.clear()
+        _locations.clear()
+
+
+def refresh():
+    """Force the next lookup of any parameter, secret or location to hit AWS."""
+    global _params_loaded_at
+    with _lock:
+        _params_loaded_at = 0.0
+        _secrets.clear()
+        _locations.clear()
+
+
+def _load_params():
+    global _params_loaded_at
+    ssm = client("ssm")
+    values = {}
+    kwargs = {"Path": PARAM_ROOT, "Recursive": True, "WithDecryption": True}
+    while True:
+        r = ssm.get_parameters_by_path(**kwargs)
+        for p in r.get("Parameters", []):
+            values[p["Name"]] = (p.get("Value") or "").strip()
+        token = r.get("NextToken")
+        if not token:
+            break
+        kwargs["NextToken"] = token
+    _params.clear()
+    _params.update(values)
+    _locations.clear()
+    _params_loaded_at = time.monotonic()
+    log.info("loaded %d parameters under %s", len(values), PARAM_ROOT)
+
+
+def get_param(name: str, force_refresh: bool = False) -> str:
+    with _lock:
+        if force_refresh or not _fresh(_params_loaded_at):
+            _load_params()
+        v = _params.get(name)
+        if v is None:
+            # Outside PARAM_ROOT (or created after the last batch load).
+            r = client("ssm").get_parameter(Name=name, WithDecryption=True)
+            v = (r.get("Parameter") or {}).get("Value", "").strip()
+            _params[name] = v
+    if not v:
+        raise ValueError(f"SSM parameter empty: {name}")
+    return v
+
+
+def get_secret(secret_id: str, field: str = "apiKey", force_refresh: bool = False) -> str:
+    cache_key = (secret_id, field)
+    with _lock:
+        hit = _secrets.get(cache_key)
+        if hit and not force_refresh and _fresh(hit[1]):
+            return hit[0]
+        r = client("secretsmanager").get_secret_value(SecretId=secret_id)
+        v = (json.loads(r["SecretString"]).get(field) or "").strip()
+        if not v:
+            raise ValueError(f"empty {field} in secret: {secret_id}")
+        _secrets[cache_key] = (v, time.monotonic())
+        return v
+
+
+def _normalize_prefix(p: str) -> str:
+    return p if p.endswith("/") else p + "/"
+
+
+def parse_s3_location(value: str, fallback_bucket: Optional[str] = None) -> Tuple[str, str]:
+    for scheme in ("s3://", "arn:aws:s3:::"):
+        if value.startswith(scheme):
+            parts = value[len(scheme):].split("/", 1)
+            pref = parts[1] if len(parts) > 1 else ""
+            return parts[0], _normalize_prefix(pref)
+    if fallback_bucket is None:
+        raise ValueError(f"invalid s3 location: {value}")
+    return fallback_bucket, _normalize_prefix(value)
+
+
+def get_s3_location(name: str, fallback_bucket: Optional[str] = None,
+                    force_refresh: bool = False) -> Tuple[str, str]:
+    cache_key = (name, fallback_bucket)
+    with _lock:
+        if force_refresh or not _fresh(_params_loaded_at):
+            _load_params()
+        loc = _locations.get(cache_key)
+        if loc is None:
+            loc = parse_s3_location(get_param(name), fallback_bucket)
+            _locations[cache_key] = loc
+        return loc
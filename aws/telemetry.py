@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# ---------- structured logging and per-stage timing ----------
+# Log lines are single JSON objects on stdout, which CloudWatch Logs indexes
+# as-is. A disabled level returns before any formatting happens: messages use
+# %-style args that are only interpolated once the level passes. Each handler
+# wraps its invocation in an Invocation, times its stages with span(), and the
+# stage timings go out as ONE embedded-metric-format (EMF) record at the end.
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+NAMESPACE = os.getenv("METRICS_NAMESPACE", "AiQuiz")
+
+_level = LEVELS.get(os.getenv("LOG_LEVEL", "INFO").upper(), 20)
+_context: Dict[str, object] = {}
+_write_lock = threading.Lock()
+# One invocation per process in Lambda, so the log context is module-wide. The
+# local server runs many invocations on threads at once and switches to one
+# context per thread.
+_thread_context = threading.local()
+_per_thread = False
+
+
+def per_thread_context(enabled: bool = True):
+    global _per_thread
+    _per_thread = enabled
+
+
+def _ctx() -> Dict[str, object]:
+    if not _per_thread:
+        return _context
+    ctx = getattr(_thread_context, "fields", None)
+    if ctx is None:
+        ctx = _thread_context.fields = {}
+    return ctx
+
+
+def set_level(level: str):
+    global _level
+    _level = LEVELS[level.upper()]
+
+
+def enabled(level: str) -> bool:
+    return LEVELS[level] >= _level
+
+
+def _now_ms() -> int:
+    return int(datetime.now(timezone.utc).timestamp() * 1000)
+
+
+def _write(record: dict):
+    line = json.dumps(record, ensure_ascii=False, default=str, separators=(",", ":"))
+    with _write_lock:
+        sys.stdout.write(line + "\n")
+
+
+class Logger:
+    def __init__(self, name: str):
+        self.name = name
+
+    def _log(self, level: str, msg: str, args: tuple, fields: dict):
+        record = {"level": level, "logger": self.name, "msg": msg % args if args else msg}
+        record.update(_ctx())
+        record.update(fields)
+        _write(record)
+
+    def debug(self, msg: str, *args, **fields):
+        if _level <= 10:
+            self._log("DEBUG", msg, args, fields)
+
+    def info(self, msg: str, *args, **fields):
+        if _level <= 20:
+            self._log("INFO", msg, args, fields)
+
+    def warning(self, msg: str, *args, **fields):
+        if _level <= 30:
+            self._log("WARNING", msg, args, fields)
+
+    def error(self, msg: str, *args, **fields):
+        if _level <= 40:
+            self._log("ERROR", msg, args, fields)
+
+
+def get_logger(name: str) -> Logger:
+    return Logger(name)
+
+
+def emit_metrics(metrics: Dict[str, float], units: Dict[str, str], dimensions: Dict[str, str], **properties):
+    """Write one EMF record; CloudWatch turns every entry of ``metrics`` into a metric."""
+    record = {
+        "_aws": {
+            "Timestamp": _now_ms(),
+            "CloudWatchMetrics": [{
+                "Namespace": NAMESPACE,
+                "Dimensions": [list(dimensions)],
+                "Metrics": [{"Name": k, "Unit": units.get(k, "None")} for k in metrics],
+            }],
+        },
+    }
+    record.update(properties)
+    record.update(dimensions)
+    record.update(metrics)
+    _write(record)
+
+
+class Invocation:
+    """Per-invocation stage timings, logged context and the closing metrics record.
+
+    ``timings`` can be an existing dict (e.g. the one a handler returns in its
+    response); span durations are added to it as ``<stage>_ms``.
+    """
+
+    def __init__(self, handler: str, timings: Optional[dict] = None):
+        self.handler = handler
+        self.timings = timings if timings is not None else {}
+        self.properties: Dict[str, object] = {}
+        self.outcome = "ok"
+        self._lock = threading.Lock()
+        self._t0 = 0.0
+
+    def __enter__(self):
+        _ctx().clear()
+        _ctx()["handler"] = self.handler
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.outcome = "error"
+        self.add("total", (time.perf_counter() - self._t0) * 1000)
+        self.emit()
+        _ctx().clear()
+        return False
+
+    def bind(self, **fields):
+        """Attach fields (jobId, ...) to every following log line and to the metrics record."""
+        _ctx().update(fields)
+        self.properties.update(fields)
+
+    def result(self, resp: dict) -> dict:
+        """Record the outcome of an API-style response and pass it through."""
+        code = resp.get("statusCode", 200) if isinstance(resp, dict) else 200
+        self.outcome = "ok" if code < 400 else ("bad_request" if code < 500 else "error")
+        return resp
+
+    def add(self, stage: str, ms: float):
+        key = f"{stage}_ms"
+        with self._lock:
+            self.timings[key] = round(self.timings.get(key, 0.0) + ms, 1)
+
+    def count(self, name: str, n: int = 1):
+        # safe from the map-reduce worker threads, unlike timings[name] += n
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0) + n
+
+    @contextmanager
+    def span(self, stage: str):
+        # Repeated stages (several S3 reads, map-reduce LLM calls) accumulate.
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, (time.perf_counter() - t0) * 1000)
+
+    def emit(self):
+        metrics, units = {}, {}
+        for k, v in self.timings.items():
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                metrics[k] = v
+                units[k] = "Milliseconds" if k.endswith("_ms") else "Count"
+        emit_metrics(metrics, units, {"Handler": self.handler}, outcome=self.outcome, **self.properties)
+
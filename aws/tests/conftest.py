@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the Lambda modules are flat files in aws/, imported by name as in the image
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
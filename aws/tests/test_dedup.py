@@ -0,0 +1,26 @@
+"""Dedup counters keep each stage apart."""
+import pytest
+
+import dedup
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats():
+    dedup.STATS.clear()
+    yield
+    dedup.STATS.clear()
+
+
+def test_counters_are_kept_per_stage():
+    dedup.record("extract", "hit", "a")
+    dedup.record("extract", "hit", "b")
+    dedup.record("generate", "miss", "a")
+    dedup.record("generate", "hit", "b")
+    dedup.record("variant", "hit", "c")
+    assert dedup.STATS[("extract", "hit")] == 2
+    assert dedup.stats() == {
+        "extract": {"hit": 2},
+        "generate": {"hit": 1, "miss": 1},
+        "variant": {"hit": 1},
+    }
+
@@ -0,0 +1,76 @@
+"""Page signatures, which decide whether a page's text is reused from an earlier upload."""
+import fitz
+
+import extract_engine
+import revisions
+
+
+def _pdf(texts, placed=False) -> bytes:
+    """One page per text; ``placed`` draws each page from another document, as a form XObject."""
+    doc = fitz.open()
+    for text in texts:
+        page = doc.new_page()
+        if placed:
+            src = fitz.open()
+            src.new_page().insert_text((72, 72), text)
+            page.show_pdf_page(page.rect, src, 0)
+        else:
+            page.insert_text((72, 72), text)
+    return doc.tobytes()
+
+
+def test_equal_pages_have_equal_signatures():
+    sigs = extract_engine.page_signatures(_pdf(["alpha page", "beta page", "alpha page"]))
+    assert sigs[0] == sigs[2] != sigs[1]
+
+
+def test_pages_drawn_from_form_xobjects_do_not_collide():
+    data = _pdf(["alpha page", "beta page", "alpha page"], placed=True)
+    doc = fitz.open(stream=data, filetype="pdf")
+    # the content streams are identical; the text is only in the forms they draw
+    assert doc[0].read_contents() == doc[1].read_contents()
+    sigs = extract_engine.page_signatures(data)
+    assert sigs[0] != sigs[1]
+    assert sigs[0] == sigs[2]
+
+
+def test_unrelated_uploads_of_placed_pages_share_no_signature():
+    first = extract_engine.page_signatures(_pdf(["alpha page", "beta page"], placed=True))
+    other = extract_engine.page_signatures(_pdf(["gamma page", "delta page"], placed=True))
+    assert not set(first) & set(other)
+    idx = revisions.PageIndex()
+    idx.add("first", first)
+    # not mistaken for a revision of the first upload
+    assert idx.closest(other) == (None, 0.0)
+
+
+def _long_pdf(pages: int = 40) -> bytes:
+    # several page groups (PAGES_PER_TASK), so extraction goes to the process pool
+    return _pdf([f"page {i} text" for i in range(pages)])
+
+
+def test_in_memory_document_reaches_the_workers_without_a_temp_file(monkeypatch, tmp_path):
+    data = _long_pdf()
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(data)
+    expected = list(extract_engine.iter_pages(str(path), workers=2))
+
+    def no_temp_files(*args, **kwargs):
+        raise AssertionError("in-memory document written to /tmp")
+
+    monkeypatch.setattr(extract_engine.tempfile, "NamedTemporaryFile", no_temp_files)
+    shared = []
+    share = extract_engine._share
+    monkeypatch.setattr(extract_engine, "_share", lambda d: shared.append(len(d)) or share(d))
+    pages = list(extract_engine.iter_pages(data, workers=2))
+    assert pages == expected and len(pages) == 40
+    assert shared == [len(data)]  # copied once for all page groups
+
+
+def test_temp_file_fallback_without_shared_memory(monkeypatch):
+    def unavailable(data):
+        raise OSError("no /dev/shm")
+
+    monkeypatch.setattr(extract_engine, "_share", unavailable)
+    pages = list(extract_engine.iter_pages(_long_pdf(), workers=2))
+    assert pages[7].strip() == "page 7 text"
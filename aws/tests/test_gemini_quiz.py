@@ -0,0 +1,74 @@
+"""Streamed generation keeps the questions it validated when the stream or a re-request fails."""
+import json
+
+import pytest
+
+import gemini_client
+import gemini_quiz
+import llm_cache
+import telemetry
+
+
+def _question(n: int) -> dict:
+    return {"question": f"Question {n}?", "options": ["yes", "no"], "correctAnswer": "yes"}
+
+
+class ScriptedClient:
+    """stream_generate plays one script per call: (questions to stream, error raised after them)."""
+
+    def __init__(self, *scripts):
+        self.scripts = list(scripts)
+        self.prompts = []
+
+    def stream_generate(self, prompt, config=None):
+        self.prompts.append(prompt)
+        questions, error = self.scripts.pop(0)
+        if error is not None and not questions:
+            raise error
+        body = json.dumps({"title": "T", "questions": questions})
+        # cut inside the closing brackets, as a dropped connection would
+        yield body[:-2]
+        if error is not None:
+            raise error
+        yield body[-2:]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(llm_cache, "ENABLED", False)
+
+    def use(*scripts):
+        c = ScriptedClient(*scripts)
+        monkeypatch.setattr(gemini_client, "shared", lambda api_key, model: c)
+        return c
+    return use
+
+
+def _generate(count: int = 5) -> dict:
+    inv = telemetry.Invocation("test")
+    return gemini_quiz._generate_single("Some text.", "job", "model", "key", inv, count=count), inv.timings
+
+
+def test_cut_off_stream_keeps_its_questions_and_asks_for_the_rest(client):
+    cut = gemini_client.StreamInterrupted("connection reset", retryable=True)
+    c = client(([_question(i) for i in range(3)], cut), ([_question(i) for i in range(3, 5)], None))
+    quiz, timings = _generate()
+    assert [q["question"] for q in quiz["questions"]] == [f"Question {i}?" for i in range(5)]
+    assert timings["streams_cut_off"] == 1
+    assert len(c.prompts) == 2
+    # the re-request only asks for what is missing
+    assert "Write exactly 2 new" in c.prompts[1]
+    assert all(f"- Question {i}?" in c.prompts[1] for i in range(3))
+
+
+def test_failed_re_request_returns_the_questions_so_far(client):
+    cut = gemini_client.StreamInterrupted("connection reset", retryable=True)
+    client(([_question(i) for i in range(3)], cut), ([], gemini_client.GeminiError("overloaded", status=503)))
+    quiz, _ = _generate()
+    assert len(quiz["questions"]) == 3
+
+
+def test_failure_before_any_question_still_fails(client):
+    client(([], gemini_client.GeminiError("overloaded", status=503)))
+    with pytest.raises(gemini_client.GeminiError):
+        _generate()
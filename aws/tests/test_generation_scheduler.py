@@ -0,0 +1,177 @@
+"""Fair-share scheduling against in-memory queue and status stores; dispatches are recorded, not invoked."""
+import time
+
+import pytest
+
+import generation_scheduler as sched
+import job_status
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    """Both stores in memory, one cost unit of capacity, retries due at once; yields the dispatched tickets."""
+    st = job_status.MemoryStatusStore()
+    sched.set_store(st)
+    job_status.set_store(job_status.MemoryStatusStore())
+    monkeypatch.setattr(sched, "MAX_IN_FLIGHT", 1.0)
+    monkeypatch.setattr(sched, "RETRY_DELAYS_SEC", [0.0])
+    sent = []
+    monkeypatch.setattr(sched, "_invoke", lambda ticket: sent.append(ticket) or True)
+    yield sent
+    sched.set_store(None)
+    job_status.set_store(None)
+
+
+def _job(job_id: str, uploader: str, **detail) -> dict:
+    return dict(detail, jobId=job_id, uploader=uploader)
+
+
+def _drain(sent: list, outcome: str = sched.DONE) -> list:
+    """Finish dispatched jobs one at a time until none are left; the job ids in dispatch order."""
+    order = []
+    while sent:
+        ticket = sent.pop(0)
+        order.append(ticket["jobId"])
+        sched.finish(ticket, outcome, 1.0)
+    return order
+
+
+def test_uploaders_take_turns(queue):
+    sched.submit([_job(f"bulk-{i}", "bulk") for i in range(5)])
+    sched.submit([_job("alice-0", "alice"), _job("bob-0", "bob"), _job("alice-1", "alice")])
+    order = _drain(queue)
+    # the bulk uploader's backlog does not hold back the single files queued after it
+    assert order[:4] == ["bulk-0", "alice-0", "bob-0", "bulk-1"]
+    assert order.index("alice-1") < order.index("bulk-3")
+    assert sorted(order) == sorted([f"bulk-{i}" for i in range(5)] + ["alice-0", "alice-1", "bob-0"])
+
+
+def test_weights_and_priorities(queue, monkeypatch):
+    monkeypatch.setattr(sched, "WEIGHTS", {"heavy": 2})
+    sched.submit([_job("first", "other")])
+    sched.submit([_job(f"heavy-{i}", "heavy") for i in range(4)] + [_job(f"light-{i}", "light") for i in range(2)]
+                 + [_job("urgent", "late", priority="high")])
+    order = _drain(queue)
+    assert order[:2] == ["first", "urgent"]
+    # weight 2 gets two turns for each of weight 1; ties go to the earlier submission
+    assert order[2:] == ["heavy-0", "heavy-1", "light-0", "heavy-2", "heavy-3", "light-1"]
+
+
+def test_queued_status_has_position_and_wait(queue):
+    sched.submit([_job("a", "u1"), _job("b", "u2"), _job("c", "u3")])
+    record, _ = job_status.store().get("c")
+    assert record["state"] == job_status.QUEUED
+    assert record["queue"]["position"] == 3
+    assert record["queue"]["startAt"] > time.time()
+    assert job_status.store().get("a")[0]["queue"]["position"] == 1
+
+
+def test_throttles_halve_the_limit_and_completions_restore_it(queue, monkeypatch):
+    monkeypatch.setattr(sched, "MAX_IN_FLIGHT", 8.0)
+    monkeypatch.setattr(sched, "RETRY_DELAYS_SEC", [3600.0])  # throttled jobs wait out the test
+    sched.submit([_job(f"j{i}", f"u{i}") for i in range(8)])
+    assert len(queue) == 8
+    for _ in range(3):
+        sched.finish(queue.pop(0), sched.THROTTLED, 1.0)
+    assert sched.snapshot()["limit"] == 1.0
+    for _ in range(5):
+        sched.finish(queue.pop(0), sched.THROTTLED, 1.0)
+    assert sched.snapshot()["limit"] == sched.MIN_IN_FLIGHT  # floor: one job still runs
+
+    limits, n = [], 0
+    while sched.snapshot()["limit"] < 8.0 and n < 200:
+        sched.submit([_job(f"new-{n}", "u")])
+        n += 1
+        while queue:
+            sched.finish(queue.pop(0), sched.DONE, 1.0)
+        limits.append(sched.snapshot()["limit"])
+    assert limits[-1] == 8.0
+    assert limits == sorted(limits)  # additive increase only
+    assert n > 8  # slower on the way up than on the way down
+    sched.submit([_job(f"more-{i}", f"v{i}") for i in range(8)])
+    _drain(queue)
+    assert sched.snapshot()["limit"] == sched.MAX_IN_FLIGHT
+
+
+def test_lost_attempts_are_reaped_and_requeued(queue, monkeypatch):
+    monkeypatch.setattr(job_status, "LEASE_SEC", 0.05)
+    monkeypatch.setattr(sched, "START_SLACK_SEC", 0.0)
+    sched.submit([_job("job", "u")])
+    first = queue.pop(0)
+    assert first["attempt"] == 1
+    time.sleep(0.1)
+    stats = sched.tick()
+    assert stats["reaped"] == 1
+    second = queue.pop(0)
+    assert second["jobId"] == "job" and second["attempt"] == 2
+    assert second["id"] != first["id"]
+
+    # the lost worker reporting late does not free the new attempt's slot
+    sched.finish(first, sched.DONE, 1.0)
+    assert sched.snapshot()["running"] == 1
+    sched.finish(second, sched.DONE, 1.0)
+    assert sched.snapshot()["running"] == 0
+
+
+def test_lost_attempt_frees_its_slot_soon_after_the_generator_timeout(queue):
+    sched.submit([_job("job", "u")])
+    state, _ = sched.store().get(sched.QUEUE_NAME)
+    deadline = state["running"]["job"]["deadline"]
+    assert deadline - time.time() <= job_status.LEASE_SEC + sched.START_SLACK_SEC + 0.01  # rounded to ms
+    assert job_status.LEASE_SEC < 120  # not the 15 minutes it once was
+
+
+def test_retry_outcome_requeues_with_delay(queue, monkeypatch):
+    monkeypatch.setattr(sched, "RETRY_DELAYS_SEC", [3600.0])
+    sched.submit([_job("job", "u"), _job("other", "v")])
+    sched.finish(queue.pop(0), sched.RETRY, 1.0)
+    # the retry waits; the other job goes ahead
+    assert [t["jobId"] for t in queue] == ["other"]
+    snap = sched.snapshot()
+    assert snap["queued"] == 1 and snap["byUploader"] == {"u": 1}
+
+
+def test_duplicate_and_over_cap_submissions(queue, monkeypatch):
+    monkeypatch.setattr(sched, "TENANT_MAX_QUEUED", 2)
+    stats = sched.submit([_job(f"j{i}", "u") for i in range(4)] + [_job("j0", "u")])
+    # the cap counts what waits at admission, before j0 goes out; the second j0 is a duplicate
+    assert (stats["admitted"], stats["rejected"], stats["duplicate"]) == (2, 2, 1)
+    assert job_status.store().get("j1")[0]["state"] == job_status.QUEUED
+    assert job_status.store().get("j3")[0]["state"] == job_status.FAILED
+    assert job_status.store().get("j0")[0]["state"] == job_status.QUEUED
+
+
+class ConflictingStore(job_status.MemoryStatusStore):
+    """Once ``conflicting`` is set, every write loses to another writer."""
+
+    def __init__(self):
+        super().__init__()
+        self.conflicting = False
+        self.puts = 0
+
+    def put(self, name, record, if_match=None, if_none_match=False):
+        if not self.conflicting:
+            return super().put(name, record, if_match=if_match, if_none_match=if_none_match)
+        self.puts += 1
+        raise job_status.PreconditionFailed(name)
+
+
+def test_cas_retries_exhausted(queue, monkeypatch):
+    monkeypatch.setattr(sched, "CAS_RETRIES", 4)
+    st = ConflictingStore()
+    sched.set_store(st)
+    sched.submit([_job("job", "u")])
+    ticket = queue.pop(0)
+
+    st.conflicting = True
+    with pytest.raises(job_status.PreconditionFailed):
+        sched.submit([_job("other", "u")])
+    assert st.puts == sched.CAS_RETRIES
+    assert queue == []
+    # gemini_quiz's report never fails the attempt; the next tick reaps it instead
+    assert sched.finish(ticket, sched.DONE, 1.0) == {}
+    assert st.puts == 2 * sched.CAS_RETRIES
+
+    st.conflicting = False
+    assert sched.snapshot()["running"] == 1
+    assert sched.finish(ticket, sched.DONE, 1.0)["running"] == 0
@@ -0,0 +1,222 @@
+"""The claim/lease state machine against the in-memory status store."""
+import threading
+import time
+
+import pytest
+
+import job_status
+
+
+@pytest.fixture
+def store():
+    st = job_status.MemoryStatusStore()
+    job_status.set_store(st)
+    yield st
+    job_status.set_store(None)
+
+
+class InterleavedStore(job_status.MemoryStatusStore):
+    """Holds the first get() of each of ``n`` threads until all have read, so their writes race."""
+
+    def __init__(self, n: int):
+        super().__init__()
+        self._barrier = threading.Barrier(n)
+        self._waited = set()
+        self.racing = True
+
+    def get(self, job_id):
+        record = super().get(job_id)
+        me = threading.get_ident()
+        if self.racing and me not in self._waited:
+            self._waited.add(me)
+            self._barrier.wait(timeout=5)
+        return record
+
+
+class ConflictingStore(job_status.MemoryStatusStore):
+    """Another writer gets in between every read and write, ``conflicts`` times (-1: always)."""
+
+    def __init__(self, conflicts: int):
+        super().__init__()
+        self.conflicts = conflicts
+        self.puts = 0
+
+    def put(self, job_id, record, if_match=None, if_none_match=False):
+        self.puts += 1
+        if self.conflicts:
+            self.conflicts -= 1
+            cur = self.get(job_id)[0] or {"jobId": job_id, "stages": {}, "outputs": {}}
+            super().put(job_id, dict(cur, otherWrites=cur.get("otherWrites", 0) + 1))
+        return super().put(job_id, record, if_match=if_match, if_none_match=if_none_match)
+
+
+def _expire_lease(st, job_id: str):
+    record, _ = st.get(job_id)
+    record["lease"]["expiresAt"] = time.time() - 1
+    st.put(job_id, record)
+
+
+def test_concurrent_claims_have_one_winner():
+    st = InterleavedStore(2)
+    job_status.set_store(st)
+    try:
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(job_status.claim("job"))) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        st.racing = False
+        job_status.set_store(None)
+    assert sorted(why for _, why in results) == ["claimed", "leased"]
+    record, _ = st.get("job")
+    winner = next(lease for lease, why in results if why == "claimed")
+    assert record["state"] == job_status.GENERATING
+    assert record["lease"]["owner"] == winner["owner"]
+    assert record["attempts"] == 1
+
+
+def test_many_concurrent_deliveries_claim_once(store):
+    barrier = threading.Barrier(16)
+    results = []
+
+    def deliver():
+        barrier.wait(timeout=5)
+        results.append(job_status.claim("job")[1])
+
+    threads = [threading.Thread(target=deliver) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count("claimed") == 1
+    assert results.count("leased") == 15
+
+
+def test_expired_lease_is_taken_over(store):
+    first, _ = job_status.claim("job")
+    assert job_status.claim("job") == (None, "leased")
+    _expire_lease(store, "job")
+
+    second, why = job_status.claim("job")
+    assert why == "claimed"
+    assert second["attempt"] == 2
+    assert second["owner"] != first["owner"]
+
+    # the first worker comes back late: its failure must not touch the new attempt
+    assert job_status.fail("job", first, "late failure") is None
+    record, _ = store.get("job")
+    assert record["lease"]["owner"] == second["owner"]
+    assert "error" not in record
+
+    job_status.complete("job", second, outputs={"json": "quiz.json"})
+    record, _ = store.get("job")
+    assert record["state"] == job_status.READY
+    assert "lease" not in record
+
+
+def test_stale_worker_fails_after_takeover_and_completion(store):
+    first, _ = job_status.claim("job")
+    _expire_lease(store, "job")
+    second, _ = job_status.claim("job")
+    job_status.complete("job", second, outputs={"json": "quiz.json"})
+    _, etag = store.get("job")
+
+    assert job_status.fail("job", first, "timed out") is None
+    record, after = store.get("job")
+    assert after == etag
+    assert record["state"] == job_status.READY
+    assert record["attempts"] == 2
+    assert job_status.claim("job") == (None, "ready")
+
+
+def test_failure_after_completion_is_ignored(store):
+    lease, _ = job_status.claim("job")
+    job_status.complete("job", lease)
+    assert job_status.fail("job", lease, "late error") is None
+    assert store.get("job")[0]["state"] == job_status.READY
+
+
+class LambdaContext:
+    def __init__(self, remaining_sec: float):
+        self.remaining_sec = remaining_sec
+
+    def get_remaining_time_in_millis(self):
+        return int(self.remaining_sec * 1000)
+
+
+def test_lease_ends_shortly_after_the_invocation_would_time_out(store):
+    assert job_status.lease_length(None) == job_status.LEASE_SEC
+    job_status.claim("job", lease_sec=job_status.lease_length(LambdaContext(28)))
+    expires = store.get("job")[0]["lease"]["expiresAt"]
+    assert abs(expires - (time.time() + 28 + job_status.LEASE_MARGIN_SEC)) < 1
+
+
+def test_retrying_until_dead(store):
+    for attempt in range(1, job_status.MAX_ATTEMPTS + 1):
+        lease, why = job_status.claim("job")
+        assert why == "claimed" and lease["attempt"] == attempt
+        state = job_status.fail("job", lease, f"bad response {attempt}")
+        expected = job_status.DEAD if attempt == job_status.MAX_ATTEMPTS else job_status.RETRYING
+        assert state == expected
+    assert job_status.claim("job") == (None, "dead")
+    record, _ = store.get("job")
+    assert record["error"] == f"bad response {job_status.MAX_ATTEMPTS}"
+    # a forced regeneration starts over
+    lease, why = job_status.claim("job", force=True)
+    assert why == "claimed" and lease["attempt"] == 1
+
+
+def test_workers_dying_on_every_attempt_end_dead(store):
+    for _ in range(job_status.MAX_ATTEMPTS):
+        assert job_status.claim("job")[1] == "claimed"
+        _expire_lease(store, "job")
+    assert job_status.claim("job") == (None, "dead")
+    record, _ = store.get("job")
+    assert record["state"] == job_status.DEAD
+    assert "lease" not in record
+
+
+def test_non_retryable_failure(store):
+    lease, _ = job_status.claim("job")
+    assert job_status.fail("job", lease, "missing data.txt", retryable=False) == job_status.FAILED
+    assert job_status.claim("job") == (None, "failed")
+
+
+def test_stale_etag_is_refused(store):
+    store.put("job", {"jobId": "job", "state": job_status.EXTRACTED})
+    _, stale = store.get("job")
+    store.put("job", {"jobId": "job", "state": job_status.QUEUED})
+    with pytest.raises(job_status.PreconditionFailed):
+        store.put("job", {"jobId": "job", "state": job_status.GENERATING}, if_match=stale)
+    with pytest.raises(job_status.PreconditionFailed):
+        store.put("job", {"jobId": "job"}, if_none_match=True)
+    assert store.get("job")[0]["state"] == job_status.QUEUED
+
+
+def test_transition_reapplies_after_a_lost_write():
+    st = ConflictingStore(conflicts=0)
+    job_status.set_store(st)
+    try:
+        job_status.update("job", state=job_status.EXTRACTED)
+        st.conflicts = 2
+        lease, why = job_status.claim("job")
+    finally:
+        job_status.set_store(None)
+    assert why == "claimed"
+    record, _ = st.get("job")
+    # re-read after each 412, so the other writer's field survives
+    assert record["otherWrites"] == 2
+    assert record["lease"]["owner"] == lease["owner"]
+
+
+def test_cas_retries_exhausted():
+    st = ConflictingStore(conflicts=-1)
+    job_status.set_store(st)
+    try:
+        assert job_status.claim("job") == (None, "leased")
+        assert st.puts == job_status.CAS_RETRIES
+        assert job_status.update("job", state=job_status.READY) == {}
+    finally:
+        job_status.set_store(None)
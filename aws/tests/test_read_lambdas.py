@@ -0,0 +1,158 @@
+"""get_json_link / get_pdf_link against local stand-ins: conditional requests, long-polls, terminal errors."""
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import get_json_link_lambda
+import get_pdf_link_lambda
+import job_status
+import local_backend
+import runtime_context
+
+BUCKET = "bucket"
+PREFIX = "ai-quiz/gen-quiz/quiz-output-folder/"
+QUIZ = b'{"title":"t","questions":[]}'
+
+
+@pytest.fixture
+def s3(tmp_path, monkeypatch):
+    s3 = local_backend.FileS3(str(tmp_path))
+    runtime_context.set_client_factory(local_backend.ClientFactory(
+        s3, local_backend.LocalParams(BUCKET, "model"), local_backend.LocalSecrets(""),
+        local_backend.LocalEvents(lambda event: None)))
+    runtime_context.reset()
+    job_status.set_store(job_status.MemoryStatusStore())
+    monkeypatch.setattr(job_status, "LONG_POLL_INTERVAL_SEC", 0.02)
+    yield s3
+    job_status.set_store(None)
+    runtime_context.set_client_factory(runtime_context._boto3_client)
+    runtime_context.reset()
+
+
+def _get(handler, job_id="job", wait=None, if_none_match=None) -> dict:
+    event = {"pathParameters": {"jobId": job_id}, "headers": {}, "queryStringParameters": {}}
+    if wait is not None:
+        event["queryStringParameters"]["wait"] = str(wait)
+    if if_none_match is not None:
+        event["headers"]["If-None-Match"] = if_none_match
+    return handler(event, None)
+
+
+def _ready(s3, job_id="job"):
+    s3.put_object(Bucket=BUCKET, Key=f"{PREFIX}{job_id}/quiz.json", Body=QUIZ)
+    job_status.update(job_id, job_status.READY, outputs={"json": "quiz.json", "jsonETag": job_status.etag_of(QUIZ)})
+
+
+def _pdf(s3, job_id="job"):
+    s3.put_object(Bucket=BUCKET, Key=f"{PREFIX}{job_id}/quiz.pdf", Body=b"%PDF")
+    job_status.update(job_id, outputs={"pdf": f"{PREFIX}{job_id}/quiz.pdf"})
+
+
+def _later(delay: float, fn, *args, **kwargs) -> threading.Thread:
+    t = threading.Timer(delay, fn, args, kwargs)
+    t.start()
+    return t
+
+
+# ---------- get_json_link ----------
+def test_json_matching_etag_is_304(s3):
+    _ready(s3)
+    first = _get(get_json_link_lambda.lambda_handler)
+    assert first["statusCode"] == 200 and first["body"] == QUIZ.decode()
+    etag = first["headers"]["ETag"]
+    again = _get(get_json_link_lambda.lambda_handler, if_none_match=etag)
+    assert again["statusCode"] == 304
+    assert again["body"] == ""
+    assert _get(get_json_link_lambda.lambda_handler, if_none_match='"other"')["statusCode"] == 200
+
+
+
+def test_json_regenerated_in_place_is_revalidated_not_cached_for_good(s3):
+    _ready(s3)
+    first = _get(get_json_link_lambda.lambda_handler)
+    assert "immutable" not in first["headers"]["Cache-Control"]
+    assert "must-revalidate" in first["headers"]["Cache-Control"]
+    # a forced regeneration rewrites the same key: the old ETag no longer matches
+    new = b'{"title":"t2","questions":[]}'
+    s3.put_object(Bucket=BUCKET, Key=f"{PREFIX}job/quiz.json", Body=new)
+    job_status.update("job", outputs={"jsonETag": job_status.etag_of(new)})
+    again = _get(get_json_link_lambda.lambda_handler, if_none_match=first["headers"]["ETag"])
+    assert again["statusCode"] == 200 and again["body"] == new.decode()
+
+def test_json_long_poll_answers_once_ready(s3):
+    job_status.update("job", job_status.GENERATING)
+    assert _get(get_json_link_lambda.lambda_handler)["statusCode"] == 404  # still processing
+    t = _later(0.1, _ready, s3)
+    t0 = time.monotonic()
+    resp = _get(get_json_link_lambda.lambda_handler, wait=5)
+    t.join()
+    assert resp["statusCode"] == 200
+    assert time.monotonic() - t0 < 2
+
+
+def test_json_long_poll_times_out(s3):
+    job_status.update("job", job_status.GENERATING)
+    t0 = time.monotonic()
+    resp = _get(get_json_link_lambda.lambda_handler, wait=0.2)
+    assert resp["statusCode"] == 404
+    assert json.loads(resp["body"])["status"] == job_status.GENERATING
+    assert 0.15 < time.monotonic() - t0 < 2
+
+
+# ---------- get_pdf_link ----------
+def test_pdf_matching_etag_is_304_while_processing(s3):
+    job_status.update("job", job_status.GENERATING)
+    first = _get(get_pdf_link_lambda.lambda_handler)
+    assert first["statusCode"] == 202
+    again = _get(get_pdf_link_lambda.lambda_handler, if_none_match=first["headers"]["ETag"])
+    assert again["statusCode"] == 304
+    job_status.update("job", job_status.READY)
+    assert _get(get_pdf_link_lambda.lambda_handler, if_none_match=first["headers"]["ETag"])["statusCode"] == 202
+
+
+def test_pdf_202_then_200_within_the_wait(s3):
+    _ready(s3)
+    assert _get(get_pdf_link_lambda.lambda_handler)["statusCode"] == 202
+    t = _later(0.1, _pdf, s3)
+    t0 = time.monotonic()
+    resp = _get(get_pdf_link_lambda.lambda_handler, wait=5)
+    t.join()
+    assert resp["statusCode"] == 200
+    assert json.loads(resp["body"])["pdfUrl"]
+    assert time.monotonic() - t0 < 2
+
+
+def test_pdf_long_poll_times_out(s3):
+    job_status.update("job", job_status.GENERATING)
+    t0 = time.monotonic()
+    resp = _get(get_pdf_link_lambda.lambda_handler, wait=0.2)
+    assert resp["statusCode"] == 202
+    assert json.loads(resp["body"])["state"] == job_status.GENERATING
+    assert 0.15 < time.monotonic() - t0 < 2
+
+
+def test_pdf_that_failed_to_render_is_a_terminal_error(s3):
+    _ready(s3)
+    t = _later(0.1, job_status.update, "job", pdfError="PDF rendering failed")
+    t0 = time.monotonic()
+    resp = _get(get_pdf_link_lambda.lambda_handler, wait=5)
+    t.join()
+    assert time.monotonic() - t0 < 2  # the poll ends when the failure is recorded
+    assert resp["statusCode"] == 409
+    assert json.loads(resp["body"])["reason"] == "PDF rendering failed"
+
+
+def test_pdf_missing_long_after_ready_is_a_terminal_error(s3):
+    _ready(s3)
+    record, _ = job_status.store().get("job")
+    stale = datetime.now(timezone.utc) - timedelta(seconds=job_status.LEASE_SEC + 1)
+    record["stages"][job_status.READY] = stale.isoformat()
+    job_status.store().put("job", record)
+    _, etag = job_status.store().get("job")
+    # even for a client holding this record's ETag from an earlier 202
+    resp = _get(get_pdf_link_lambda.lambda_handler, if_none_match=etag)
+    assert resp["statusCode"] == 409
+    assert json.loads(resp["body"])["reason"] == "PDF was not saved"
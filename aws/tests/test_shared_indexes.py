@@ -0,0 +1,93 @@
+"""Concurrent writers of the shared S3 objects (question bank, page index) do not drop each other's entries."""
+import threading
+
+import pytest
+
+import local_backend
+import question_bank
+import revisions
+
+BUCKET = "bucket"
+
+
+class RacingS3(local_backend.FileS3):
+    """Holds each thread's first write until ``n`` threads have read the object, so their writes race."""
+
+    def __init__(self, root: str, n: int):
+        super().__init__(root)
+        self._barrier = threading.Barrier(n)
+        self._raced = set()
+
+    def put_object(self, **kw):
+        me = threading.get_ident()
+        if me not in self._raced:
+            self._raced.add(me)
+            self._barrier.wait(timeout=5)
+        return super().put_object(**kw)
+
+
+class _NoLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _race(fn, n: int):
+    errors = []
+
+    def run(i):
+        try:
+            fn(i)
+        except Exception as e:  # surfaced below, not lost in the thread
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+
+
+@pytest.fixture(autouse=True)
+def _fresh_caches():
+    question_bank.reset()
+    revisions.reset()
+    yield
+    question_bank.reset()
+    revisions.reset()
+
+
+def test_concurrent_bank_saves_keep_every_passage(tmp_path):
+    s3 = RacingS3(str(tmp_path), 4)
+    key = "quiz/" + question_bank.BANK_NAME
+    texts = [f"passage {i} about topic number {i} with several more words to shingle" for i in range(4)]
+
+    def save(i):
+        sk = question_bank.sketch(texts[i])
+        assert question_bank.save(s3, BUCKET, key, [(sk, f"job-{i}", [{"question": f"q{i}"}])])
+
+    _race(save, 4)
+    question_bank.reset()
+    bank, _ = question_bank.load(s3, BUCKET, key)
+    assert len(bank) == 4
+    assert sorted(bank.job_of(i) for i in range(4)) == [f"job-{i}" for i in range(4)]
+    for text in texts:
+        pid, _ = bank.lookup(question_bank.sketch(text))
+        assert pid >= 0
+
+
+def test_concurrent_extractions_all_reach_the_page_index(tmp_path, monkeypatch):
+    # as if in separate containers: the in-process lock does not serialise them
+    monkeypatch.setattr(revisions, "_save_lock", _NoLock())
+    s3 = RacingS3(str(tmp_path), 3)
+    key = "quiz/" + revisions.INDEX_NAME
+    sigs = {f"job-{i}": [f"{i:04x}{p:012x}" for p in range(5)] for i in range(3)}
+    _race(lambda i: revisions.index_job(s3, BUCKET, key, f"job-{i}", sigs[f"job-{i}"]), 3)
+    revisions.reset()
+    idx = revisions.load_index(s3, BUCKET, key)
+    assert sorted(j[0] for j in idx.jobs) == sorted(sigs)
+    for job_id, job_sigs in sigs.items():
+        assert idx.closest(job_sigs) == (job_id, 1.0)
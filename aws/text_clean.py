@@ -0,0 +1,109 @@
+import os
+import re
+from typing import Dict
+
+# ---------- extracted text clean-up ----------
+# sanitize() is the mandatory pass every page goes through: newlines
+# normalised to \n and control characters dropped with one bytes.translate()
+# delete table instead of a per-character Python loop.
+#
+# Cleaner adds the optional normalisations on top, one page at a time, so it
+# slots into the streaming extraction as the per-page sanitize callable. Each
+# is off unless its variable is set (TEXT_DEHYPHENATE, TEXT_COLLAPSE_WHITESPACE,
+# TEXT_STRIP_REPEATED): they change data.txt, and with it the prompts and the
+# page hashes that dedup and revisions compare.
+#   - words hyphenated across a line break are joined again
+#   - runs of spaces collapse to one, blank-line runs to one blank line
+#   - running headers/footers (lines at the top or bottom of a page that
+#     repeat, page numbers aside, on earlier pages) are dropped
+# Header detection only looks backwards, so the first pages of a document
+# keep theirs; nothing is buffered. Pages reused from a prior revision are not
+# cleaned again but still pass through observe(), so the header counts match a
+# full extraction as far as the reused text allows (lines the prior run
+# already stripped can't be counted).
+
+def _flag(name: str) -> bool:
+    return os.getenv(name, "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+DEHYPHENATE = _flag("TEXT_DEHYPHENATE")
+COLLAPSE_WHITESPACE = _flag("TEXT_COLLAPSE_WHITESPACE")
+STRIP_REPEATED = _flag("TEXT_STRIP_REPEATED")
+REPEAT_MIN_PAGES = int(os.getenv("TEXT_REPEAT_MIN_PAGES", "3"))
+EDGE_LINES = 2          # lines checked at the top and at the bottom of each page
+EDGE_MAX_CHARS = 100    # longer lines are body text, never a running header
+
+# C0 control bytes other than \n; UTF-8 never uses them inside a multi-byte sequence
+_CONTROL = bytes(c for c in range(32) if c != 10)
+# starts with the literal "-" so the engine can skip ahead; the letter before it is a lookbehind
+_HYPHEN_BREAK = re.compile(r"-(?<=[^\W\d_]-) *\n *(?=[a-z])")
+_SPACE_RUN = re.compile(r"  +")
+_BLANK_RUN = re.compile(r"\n{3,}")
+_DIGITS = re.compile(r"\d+")
+
+
+def sanitize(s: str) -> str:
+    """Newlines as \\n, every other C0 control character removed."""
+    s = s.replace("\r\n", "\n").replace("\r", "\n")
+    return s.encode("utf-8", "surrogatepass").translate(None, _CONTROL).decode("utf-8", "surrogatepass")
+
+
+def collapse_whitespace(s: str) -> str:
+    s = _SPACE_RUN.sub(" ", s.replace("\xa0", " "))
+    s = "\n".join(line.strip(" ") for line in s.split("\n"))
+    return _BLANK_RUN.sub("\n\n", s)
+
+
+def _edge_key(line: str) -> str:
+    # "Page 3 of 40" and "Page 4 of 40" are the same footer
+    return _DIGITS.sub("#", " ".join(line.lower().split()))
+
+
+class Cleaner:
+    """Per-document page cleaner; call it on each page in page order."""
+
+    def __init__(self, dehyphenate: bool = DEHYPHENATE, collapse: bool = COLLAPSE_WHITESPACE,
+                 strip_repeated: bool = STRIP_REPEATED, repeat_min: int = REPEAT_MIN_PAGES):
+        self.dehyphenate = dehyphenate
+        self.collapse = collapse
+        self.strip_repeated = strip_repeated
+        self.repeat_min = max(2, repeat_min)
+        self._seen: Dict[str, int] = {}  # edge line key -> pages it appeared on
+        self.stats = {"charsIn": 0, "charsOut": 0, "joinedWords": 0, "strippedLines": 0}
+
+    def __call__(self, page: str) -> str:
+        self.stats["charsIn"] += len(page)
+        text = sanitize(page)
+        if self.dehyphenate:
+            text, n = _HYPHEN_BREAK.subn("", text)
+            self.stats["joinedWords"] += n
+        if self.strip_repeated:
+            text = self._strip_edges(text)
+        if self.collapse:
+            text = collapse_whitespace(text)
+        self.stats["charsOut"] += len(text)
+        return text
+
+    def observe(self, page: str):
+        """Count the edge lines of a page that is used as it is (reused from a prior revision)."""
+        if self.strip_repeated:
+            self._strip_edges(page, strip=False)
+
+    def _strip_edges(self, text: str, strip: bool = True) -> str:
+        lines = text.split("\n")
+        body = [i for i, line in enumerate(lines) if line.strip()]
+        edges = body[:EDGE_LINES] + body[-EDGE_LINES:] if len(body) > 2 * EDGE_LINES else body
+        keys: Dict[str, list] = {}
+        for i in dict.fromkeys(edges):
+            if len(lines[i]) <= EDGE_MAX_CHARS:
+                keys.setdefault(_edge_key(lines[i]), []).append(i)
+        drop = set()
+        for key, idx in keys.items():
+            n = self._seen.get(key, 0) + 1
+            self._seen[key] = n
+            if n >= self.repeat_min:
+                drop.update(idx)
+        if not drop or not strip:
+            return text
+        self.stats["strippedLines"] += len(drop)
+        return "\n".join(line for i, line in enumerate(lines) if i not in drop)
@@ -12,6 +12,10 @@ for /f "tokens=1,* delims==" %%a in (aws_config.txt) do (
     if "%%a"=="LAMBDA_FUNCTION_NAME_2" set LAMBDA_FUNCTION_NAME_2=%%b
     if "%%a"=="LAMBDA_RETURN_PDF" set LAMBDA_RETURN_PDF=%%b
     if "%%a"=="LAMBDA_RETURN_JSON" set LAMBDA_RETURN_JSON=%%b        
+    if "%%a"=="LAMBDA_QUIZ_VARIANTS" set LAMBDA_QUIZ_VARIANTS=%%b
+    if "%%a"=="LAMBDA_GENERATION_SCHEDULER" set LAMBDA_GENERATION_SCHEDULER=%%b
+    if "%%a"=="LAMBDA_QUIZ_COMPACTOR" set LAMBDA_QUIZ_COMPACTOR=%%b
+    if "%%a"=="LAMBDA_LIST_QUIZZES" set LAMBDA_LIST_QUIZZES=%%b
 )
 
 rem Read config file and set variables
@@ -28,6 +32,10 @@ set LAMBDA_FUNCTION_NAME=%LAMBDA_FUNCTION_NAME: =%
 set LAMBDA_RETURN_PDF=%LAMBDA_RETURN_PDF: =%
 set LAMBDA_RETURN_JSON=%LAMBDA_RETURN_JSON: =%
 set LAMBDA_FUNCTION_NAME_2=%LAMBDA_FUNCTION_NAME_2: =%
+set LAMBDA_QUIZ_VARIANTS=%LAMBDA_QUIZ_VARIANTS: =%
+set LAMBDA_GENERATION_SCHEDULER=%LAMBDA_GENERATION_SCHEDULER: =%
+set LAMBDA_QUIZ_COMPACTOR=%LAMBDA_QUIZ_COMPACTOR: =%
+set LAMBDA_LIST_QUIZZES=%LAMBDA_LIST_QUIZZES: =%
 
 REM Set AWS credentials
 set "AWS_ACCESS_KEY_ID=%ACCESS_KEY%"
@@ -149,6 +157,51 @@ if errorlevel 1 (
     aws lambda update-function-code --no-cli-pager --function-name "%LAMBDA_RETURN_JSON%" --image-uri "%ECR_URI%/%REPO_NAME%@%IMAGE_DIGEST%" --region "%REGION%"
 )
 
+REM Check if Lambda function exists and update or create accordingly
+aws lambda get-function  --no-cli-pager --function-name "%LAMBDA_QUIZ_VARIANTS%" --region "%REGION%" >nul 2>nul
+if errorlevel 1 (
+    echo Lambda function does not exist, creating new function...
+    aws lambda create-function  --no-cli-pager --function-name "%LAMBDA_QUIZ_VARIANTS%" --package-type Image --code ImageUri="%ECR_URI%/%REPO_NAME%@%IMAGE_DIGEST%" --role "%ROLE_ARN%" --memory-size 256 --timeout 30 --image-config Command="quiz_variants_lambda.lambda_handler" --region "%REGION%"
+) else (
+    echo Lambda function exists, updating with new image...
+    aws lambda update-function-code --no-cli-pager --function-name "%LAMBDA_QUIZ_VARIANTS%" --image-uri "%ECR_URI%/%REPO_NAME%@%IMAGE_DIGEST%" --region "%REGION%"
+)
+
+REM Generation scheduler: the pdf-extract-finished rule (through SQS) and a rate(1 minute)
+REM tick invoke it, see lambda_template.yaml. One instance at a time keeps its queue writes serial.
+aws lambda get-function  --no-cli-pager --function-name "%LAMBDA_GENERATION_SCHEDULER%" --region "%REGION%" >nul 2>nul
+if errorlevel 1 (
+    echo Lambda function does not exist, creating new function...
+    aws lambda create-function  --no-cli-pager --function-name "%LAMBDA_GENERATION_SCHEDULER%" --package-type Image --code ImageUri="%ECR_URI%/%REPO_NAME%@%IMAGE_DIGEST%" --role "%ROLE_ARN%" --memory-size 256 --timeout 60 --image-config Command="generation_scheduler_lambda.lambda_handler" --environment "Variables={SCHED_GENERATOR_FUNCTION=%LAMBDA_FUNCTION_NAME_2%}" --region "%REGION%"
+    aws lambda put-function-concurrency --no-cli-pager --function-name "%LAMBDA_GENERATION_SCHEDULER%" --reserved-concurrent-executions 1 --region "%REGION%"
+) else (
+    echo Lambda function exists, updating with new image...
+    aws lambda update-function-code --no-cli-pager --function-name "%LAMBDA_GENERATION_SCHEDULER%" --image-uri "%ECR_URI%/%REPO_NAME%@%IMAGE_DIGEST%" --region "%REGION%"
+)
+
+REM Quiz compactor: a rate(15 minutes) schedule rolls new quiz.json objects into segments
+aws lambda get-function  --no-cli-pager --function-name "%LAMBDA_QUIZ_COMPACTOR%" --region "%REGION%" >nul 2>nul
+if errorlevel 1 (
+    echo Lambda function does not exist, creating new function...
+    aws lambda create-function  --no-cli-pager --function-name "%LAMBDA_QUIZ_COMPACTOR%" --package-type Image --code ImageUri="%ECR_URI%/%REPO_NAME%@%IMAGE_DIGEST%" --role "%ROLE_ARN%" --memory-size 512 --timeout 300 --image-config Command="quiz_compactor_lambda.lambda_handler" --region "%REGION%"
+    aws lambda put-function-concurrency --no-cli-pager --function-name "%LAMBDA_QUIZ_COMPACTOR%" --reserved-concurrent-executions 1 --region "%REGION%"
+) else (
+    echo Lambda function exists, updating with new image...
+    aws lambda update-function-code --no-cli-pager --function-name "%LAMBDA_QUIZ_COMPACTOR%" --image-uri "%ECR_URI%/%REPO_NAME%@%IMAGE_DIGEST%" --region "%REGION%"
+)
+
+REM Quiz listing: GET /quizzes, answered from the compacted segments
+aws lambda get-function  --no-cli-pager --function-name "%LAMBDA_LIST_QUIZZES%" --region "%REGION%" >nul 2>nul
+if errorlevel 1 (
+    echo Lambda function does not exist, creating new function...
+    aws lambda create-function  --no-cli-pager --function-name "%LAMBDA_LIST_QUIZZES%" --package-type Image --code ImageUri="%ECR_URI%/%REPO_NAME%@%IMAGE_DIGEST%" --role "%ROLE_ARN%" --memory-size 256 --timeout 30 --image-config Command="list_quizzes_lambda.lambda_handler" --region "%REGION%"
+) else (
+    echo Lambda function exists, updating with new image...
+    aws lambda update-function-code --no-cli-pager --function-name "%LAMBDA_LIST_QUIZZES%" --image-uri "%ECR_URI%/%REPO_NAME%@%IMAGE_DIGEST%" --region "%REGION%"
+)
+
+REM gemini_quiz retries go back through the scheduler's queue, not Lambda's async retries
+aws lambda put-function-event-invoke-config --no-cli-pager --function-name "%LAMBDA_FUNCTION_NAME_2%" --maximum-retry-attempts 0 --region "%REGION%"
 
 @REM echo Updating handler for %LAMBDA_FUNCTION_NAME% to %IMAGE_NAME%.lambda_handler
 @REM aws lambda update-function-configuration --no-cli-pager --function-name "%LAMBDA_FUNCTION_NAME%" --handler "%IMAGE_NAME%.lambda_handler" --region "%REGION%"